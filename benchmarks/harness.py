@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Minimal benchmark harness used by the benchmark suite (see
+suite.py). Only the standard library is used, so benchmarks can be run
+against any installation of Gimmecert.
+
+Benchmarks are registered with the benchmark decorator. Decorated
+function is a setup function - it receives a workspace directory and
+one value for each benchmark parameter, prepares everything needed,
+and returns the operation to time. The operation is either a callable,
+or a (prepare, callable) tuple, in which case prepare is invoked
+(outside of timing) before each run of the operation. This is used for
+resetting caches in "cold" variants of benchmarks.
+
+Parameters are given per scale, allowing for quick runs (e.g. during
+development) and full runs (e.g. prior to release) to cover different
+ranges.
+"""
+
+import collections
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+#: Version of results file format.
+RESULTS_VERSION = 1
+
+#: Supported benchmark scales.
+SCALES = ('quick', 'full')
+
+#: Minimum duration (in seconds) of a single sample. Fast operations
+#: are run multiple times within a single sample in order to reduce
+#: timer overhead.
+MIN_SAMPLE_TIME = 0.05
+
+#: Registered benchmarks, mapping benchmark names to Benchmark instances.
+BENCHMARKS = collections.OrderedDict()
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'setup', 'params'])
+
+
+def benchmark(name, **params):
+    """
+    Decorator for registering benchmark setup functions.
+
+    :param name: Benchmark name. Dotted names are used for grouping related benchmarks (e.g. ``status.command``).
+    :type name: str
+
+    :param params: Benchmark parameters, mapping scale names to dictionaries with lists of parameter values.
+    :type params: dict[str, collections.OrderedDict[str, list]]
+
+    :returns: Decorator that registers the passed-in function.
+    :rtype: callable
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, params)
+        return setup
+
+    return register
+
+
+def get_cases(benchmark_, scale):
+    """
+    Returns all parameter combinations of benchmark for passed-in
+    scale.
+
+    :returns: List of parameter dictionaries.
+    :rtype: list[collections.OrderedDict]
+    """
+
+    params = benchmark_.params[scale]
+    names = list(params)
+
+    return [collections.OrderedDict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+
+def get_case_id(name, params):
+    """
+    Returns unique identifier of a benchmark case, used for matching
+    results between runs.
+
+    :rtype: str
+    """
+
+    return "%s[%s]" % (name, ",".join("%s=%s" % (key, value) for key, value in params.items()))
+
+
+def time_operation(operation, repeat):
+    """
+    Times the passed-in operation (see module documentation).
+
+    :returns: Number of operation runs per sample, and list of per-run durations (one for each sample).
+    :rtype: (int, list[float])
+    """
+
+    if isinstance(operation, tuple):
+        prepare, run = operation
+    else:
+        prepare, run = None, operation
+
+    # Warm-up run, also used for calibrating number of runs per sample
+    # for operations that do not need preparation.
+    if prepare is not None:
+        prepare()
+
+    start = time.perf_counter()
+    run()
+    duration = time.perf_counter() - start
+
+    number = 1
+
+    if prepare is None and duration < MIN_SAMPLE_TIME:
+        number = int(MIN_SAMPLE_TIME / max(duration, 1e-9)) + 1
+
+    samples = []
+
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / number)
+
+    return number, samples
+
+
+def get_metadata(scale, repeat):
+    """
+    Returns information about the environment the benchmarks are run
+    in, stored alongside the results.
+
+    :rtype: dict
+    """
+
+    import cryptography
+
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                           stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        'version': RESULTS_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': revision,
+        'scale': scale,
+        'repeat': repeat,
+        'python': "%s %s" % (platform.python_implementation(), platform.python_version()),
+        'cryptography': cryptography.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(scale, repeat, pattern=None, output=sys.stdout):
+    """
+    Runs registered benchmarks, reporting progress as it goes along.
+
+    :param scale: Scale at which to run the benchmarks, one of SCALES.
+    :type scale: str
+
+    :param repeat: Number of samples to collect for each benchmark case.
+    :type repeat: int
+
+    :param pattern: Run only benchmark cases whose identifier contains the pattern. Set to None to run all cases.
+    :type pattern: str or None
+
+    :param output: Stream where the progress should be reported.
+    :type output: io.IOBase
+
+    :returns: Results, ready to be serialised as JSON.
+    :rtype: dict
+    """
+
+    results = []
+
+    workspace = tempfile.mkdtemp(prefix='gimmecert-benchmarks-')
+
+    try:
+        for benchmark_ in BENCHMARKS.values():
+            for params in get_cases(benchmark_, scale):
+                case_id = get_case_id(benchmark_.name, params)
+
+                if pattern and pattern not in case_id:
+                    continue
+
+                case_directory = tempfile.mkdtemp(dir=workspace)
+                operation = benchmark_.setup(case_directory, **params)
+                number, samples = time_operation(operation, repeat)
+                shutil.rmtree(case_directory)
+
+                result = {
+                    'id': case_id,
+                    'name': benchmark_.name,
+                    'params': params,
+                    'number': number,
+                    'samples': samples,
+                    'min': min(samples),
+                    'median': statistics.median(samples),
+                    'mean': statistics.mean(samples),
+                    'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+                }
+                results.append(result)
+
+                print("%-80s %12s %12.1f/s" % (case_id, format_duration(result['median']), 1 / result['median']), file=output)
+                output.flush()
+    finally:
+        shutil.rmtree(workspace)
+
+    return {'metadata': get_metadata(scale, repeat), 'results': results}
+
+
+def format_duration(seconds):
+    """
+    Formats duration using the most readable unit.
+
+    :rtype: str
+    """
+
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return "%.2f %s" % (seconds * factor, unit)
+
+    return "%.0f ns" % (seconds * 1e9)
+
+
+def read_results(path):
+    """
+    Reads benchmark results from a JSON file.
+
+    :rtype: dict
+    """
+
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def write_results(results, path):
+    """
+    Writes benchmark results to a JSON file.
+    """
+
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+        results_file.write('\n')
+
+
+def compare_results(baseline, current, threshold, statistic='median', output=sys.stdout):
+    """
+    Compares two sets of benchmark results, reporting the relative
+    change for each benchmark case present in both.
+
+    :param baseline: Baseline results.
+    :type baseline: dict
+
+    :param current: Current results.
+    :type current: dict
+
+    :param threshold: Relative slow-down (e.g. 0.1 for 10%) above which benchmark case is considered to have regressed.
+    :type threshold: float
+
+    :param statistic: Statistic to compare, one of ``min``, ``median``, or ``mean``.
+    :type statistic: str
+
+    :param output: Stream where the comparison should be reported.
+    :type output: io.IOBase
+
+    :returns: List of identifiers of regressed benchmark cases.
+    :rtype: list[str]
+    """
+
+    baseline_results = {result['id']: result for result in baseline['results']}
+    current_results = {result['id']: result for result in current['results']}
+
+    regressions = []
+
+    print("%-80s %12s %12s %8s  %s" % ("Benchmark", "Baseline", "Current", "Ratio", "Result"), file=output)
+
+    for case_id in sorted(set(baseline_results) | set(current_results)):
+        if case_id not in current_results:
+            print("%-80s %12s %12s %8s  %s" % (case_id, format_duration(baseline_results[case_id][statistic]), "-", "-", "missing"), file=output)
+            continue
+
+        if case_id not in baseline_results:
+            print("%-80s %12s %12s %8s  %s" % (case_id, "-", format_duration(current_results[case_id][statistic]), "-", "new"), file=output)
+            continue
+
+        baseline_value = baseline_results[case_id][statistic]
+        current_value = current_results[case_id][statistic]
+        ratio = current_value / baseline_value
+
+        if ratio > 1 + threshold:
+            verdict = "REGRESSED"
+            regressions.append(case_id)
+        elif ratio < 1 / (1 + threshold):
+            verdict = "improved"
+        else:
+            verdict = "ok"
+
+        print("%-80s %12s %12s %7.2fx  %s" % (case_id, format_duration(baseline_value), format_duration(current_value), ratio, verdict), file=output)
+
+    return regressions
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmark for concurrent issuance of server certificates within a
+single project directory.
+
+Each round initialises a fresh project, and then runs the requested
+number of issuers in parallel. Every issuer is a sequence of separate
+``gimmecert server`` processes (mimicking build system jobs), and
+issues certificates for its own share of entities. In addition, all
+issuers race to issue a certificate for one shared entity.
+
+After each round the project is verified:
+
+- Every distinct entity must have been issued successfully (no false
+  "already issued" errors).
+- Certificate for the shared entity must have been issued exactly
+  once.
+- All certificates must be readable, and signed by the issuing CA.
+- Status command must list all entities.
+
+Usage::
+
+    python benchmarks/parallel_issuance.py --issuers 1 2 4 8 --entities 64
+"""
+
+import argparse
+import concurrent.futures
+import subprocess
+import sys
+import tempfile
+import time
+
+import gimmecert.commands
+import gimmecert.storage
+
+
+#: Name of entity for which all issuers try to issue certificate.
+CONTENDED_ENTITY_NAME = 'contended'
+
+
+def run_gimmecert(project_directory, *arguments):
+    """
+    Runs gimmecert in a separate process within the project directory.
+
+    :returns: Exit code of the process.
+    :rtype: int
+    """
+
+    command = [sys.executable, '-c', 'import gimmecert.cli; gimmecert.cli.main()'] + list(arguments)
+
+    return subprocess.run(command, cwd=project_directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+
+def run_issuer(project_directory, entity_names, key_specification):
+    """
+    Issues server certificates for the passed-in entities one by one,
+    starting with the contended entity.
+
+    :returns: List of entity names and exit codes.
+    :rtype: list[(str, int)]
+    """
+
+    return [(entity_name, run_gimmecert(project_directory, 'server', '--key-specification', key_specification, entity_name))
+            for entity_name in [CONTENDED_ENTITY_NAME] + entity_names]
+
+
+def verify_project(project_directory, entity_names, results):
+    """
+    Verifies that the project has not been corrupted by concurrent
+    issuance.
+
+    :returns: List of problems found.
+    :rtype: list[str]
+    """
+
+    problems = []
+
+    for entity_name, exit_code in results:
+        if entity_name != CONTENDED_ENTITY_NAME and exit_code != gimmecert.commands.ExitCode.SUCCESS:
+            problems.append("Issuance for %s failed with exit code %d." % (entity_name, exit_code))
+
+    contended_exit_codes = sorted(exit_code for entity_name, exit_code in results if entity_name == CONTENDED_ENTITY_NAME)
+    expected_exit_codes = [gimmecert.commands.ExitCode.SUCCESS] + \
+        [gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED] * (len(contended_exit_codes) - 1)
+
+    if contended_exit_codes != expected_exit_codes:
+        problems.append("Unexpected exit codes for contended entity: %s" % contended_exit_codes)
+
+    storage = gimmecert.storage.get_storage_backend(project_directory)
+    issuer_private_key, issuer_certificate = storage.read_ca_hierarchy()[-1]
+    expected_names = sorted(entity_names + [CONTENDED_ENTITY_NAME])
+
+    issued_names = []
+    for _, entity_name, certificate, _, _ in storage.read_entities():
+        issued_names.append(entity_name)
+
+        if certificate.issuer != issuer_certificate.subject:
+            problems.append("Certificate for %s has not been issued by the issuing CA." % entity_name)
+
+    if sorted(issued_names) != expected_names:
+        problems.append("Issued certificates do not match requested entities.")
+
+    if sorted(storage.get_index(False)['server']) != expected_names:
+        problems.append("Status index does not list all entities.")
+
+    return problems
+
+
+def run_round(issuer_count, entity_count, key_specification, storage_backend):
+    """
+    Runs a single benchmark round.
+
+    :returns: Wall time in seconds, and list of problems found.
+    :rtype: (float, list[str])
+    """
+
+    entity_names = ['server%d' % i for i in range(entity_count)]
+    shares = [entity_names[i::issuer_count] for i in range(issuer_count)]
+
+    with tempfile.TemporaryDirectory() as project_directory:
+        run_gimmecert(project_directory, 'init', '--key-specification', key_specification, '--storage-backend', storage_backend)
+
+        start = time.monotonic()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=issuer_count) as executor:
+            futures = [executor.submit(run_issuer, project_directory, share, key_specification) for share in shares]
+            results = [result for future in futures for result in future.result()]
+
+        wall_time = time.monotonic() - start
+
+        return wall_time, verify_project(project_directory, entity_names, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent issuance of server certificates within a single project.")
+    parser.add_argument('--issuers', '-n', type=int, nargs='+', default=[1, 2, 4, 8], help="Numbers of parallel issuers to benchmark.")
+    parser.add_argument('--entities', '-e', type=int, default=64, help="Number of distinct entities to issue certificates for in each round.")
+    parser.add_argument('--key-specification', '-k', default='ed25519', help="Key specification to use for all private keys.")
+    parser.add_argument('--storage-backend', '-s', default='files', choices=gimmecert.commands.STORAGE_BACKEND_NAMES,
+                        help="Storage backend to use.")
+    args = parser.parse_args()
+
+    print("%8s %10s %12s %10s %s" % ("Issuers", "Wall (s)", "Certs/s", "Speed-up", "Result"))
+
+    baseline = None
+    failed = False
+
+    for issuer_count in args.issuers:
+        wall_time, problems = run_round(issuer_count, args.entities, args.key_specification, args.storage_backend)
+        throughput = (args.entities + 1) / wall_time
+        baseline = baseline or throughput
+        failed = failed or bool(problems)
+
+        print("%8d %10.2f %12.1f %9.2fx %s" % (issuer_count, wall_time, throughput, throughput / baseline, "OK" if not problems else "CORRUPTED"))
+
+        for problem in problems:
+            print("    %s" % problem)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
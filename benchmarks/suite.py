@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Benchmark suite covering CA hierarchy generation and loading,
+certificate issuance and renewal, status reporting, CLI start-up, and
+unit test suite run time.
+
+Benchmarks are run at one of two scales - ``quick`` (default, suitable
+for development), and ``full`` (covering CA hierarchy depths 1-10,
+projects with up to 50000 issued certificates, RSA and ECDSA keys, and
+cold and warm caches). Results are written out in JSON format, and two
+sets of results can be compared, flagging regressions.
+
+Usage::
+
+    # Run the quick benchmarks, storing results.
+    python benchmarks/suite.py run --output baseline.json
+
+    # Run only the status benchmarks at full scale.
+    python benchmarks/suite.py run --scale full --filter status. --output current.json
+
+    # Compare results, exiting with non-zero status if any benchmark slowed down by more than 10%.
+    python benchmarks/suite.py compare baseline.json current.json --threshold 10
+"""
+
+import argparse
+import atexit
+import collections
+import io
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import gimmecert.commands
+import gimmecert.crypto
+import gimmecert.storage
+import gimmecert.utils
+
+import harness
+from harness import benchmark
+
+
+#: Key specifications covered by benchmarks that compare key algorithms.
+KEY_SPECIFICATIONS = ['rsa:2048', 'ecdsa:secp256r1', 'ed25519']
+
+#: Number of entities written to storage at once when populating projects.
+POPULATE_CHUNK_SIZE = 1000
+
+#: Directory holding pre-populated projects, shared between benchmarks.
+_project_templates_directory = None
+
+#: Pre-populated projects, mapping (entity count, storage backend) to project directory.
+_project_templates = {}
+
+#: Counter used for generating unique entity names.
+_entity_counter = itertools.count()
+
+
+def params(**scales):
+    """
+    Small helper for specifying benchmark parameters in a fixed order.
+    """
+
+    return {scale: collections.OrderedDict(values) for scale, values in scales.items()}
+
+
+def get_populated_project(entity_count, storage_backend):
+    """
+    Returns path to project with CA hierarchy of depth 1 and the
+    passed-in number of issued certificates (alternating between server
+    and client). Projects are created once, and shared between
+    benchmarks - benchmarks using them should not issue certificates
+    for new entities.
+
+    All entities share the same (Ed25519) private key in order to keep
+    the set-up time reasonable for large projects.
+    """
+
+    global _project_templates_directory
+
+    key = (entity_count, storage_backend)
+
+    if key in _project_templates:
+        return _project_templates[key]
+
+    if _project_templates_directory is None:
+        _project_templates_directory = tempfile.mkdtemp(prefix='gimmecert-benchmark-projects-')
+        atexit.register(shutil.rmtree, _project_templates_directory)
+
+    project_directory = tempfile.mkdtemp(dir=_project_templates_directory)
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), project_directory, 'benchmark', 1, ('ed25519', None), storage_backend)
+
+    storage = gimmecert.storage.get_storage_backend(project_directory)
+    issuer_private_key, issuer_certificate = storage.read_ca_hierarchy()[-1]
+    private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+    public_key = private_key.public_key()
+
+    for start in range(0, entity_count, POPULATE_CHUNK_SIZE):
+        entities = []
+
+        for i in range(start, min(start + POPULATE_CHUNK_SIZE, entity_count)):
+            if i % 2 == 0:
+                certificate = gimmecert.crypto.issue_server_certificate('server%d' % i, public_key, issuer_private_key, issuer_certificate)
+                entities.append(('server', 'server%d' % i, certificate, private_key, None))
+            else:
+                certificate = gimmecert.crypto.issue_client_certificate('client%d' % i, public_key, issuer_private_key, issuer_certificate)
+                entities.append(('client', 'client%d' % i, certificate, private_key, None))
+
+        storage.write_entities(entities)
+
+    _project_templates[key] = project_directory
+
+    return project_directory
+
+
+def clear_caches(project_directory, cache):
+    """
+    Clears CA hierarchy and status index caches of the project in
+    order to simulate a cold start. Cache can be ``cold`` (all caches
+    are cleared), ``disk`` (only in-process caches are cleared), or
+    ``warm`` (nothing is cleared).
+    """
+
+    if cache == 'warm':
+        return
+
+    gimmecert.storage._ca_hierarchy_memo.clear()
+
+    if cache == 'cold':
+        for path in (os.path.join(project_directory, '.gimmecert', 'ca', gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME),
+                     gimmecert.storage.get_index_path(project_directory)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@benchmark('ca_hierarchy.generate',
+           **params(quick=[('depth', [1, 3]), ('key_specification', KEY_SPECIFICATIONS), ('jobs', ['1', 'cpus'])],
+                    full=[('depth', [1, 2, 5, 10]), ('key_specification', KEY_SPECIFICATIONS), ('jobs', ['1', 'cpus'])]))
+def ca_hierarchy_generate(workspace, depth, key_specification, jobs):
+    key_specification = gimmecert.utils.key_specification(key_specification)
+    jobs = None if jobs == 'cpus' else int(jobs)
+
+    return lambda: gimmecert.crypto.generate_ca_hierarchy('benchmark', depth, key_specification, jobs)
+
+
+@benchmark('ca_hierarchy.read',
+           **params(quick=[('depth', [1, 3]), ('key_specification', ['rsa:2048', 'ecdsa:secp256r1']), ('cache', ['cold', 'disk', 'warm'])],
+                    full=[('depth', [1, 2, 5, 10]), ('key_specification', KEY_SPECIFICATIONS), ('cache', ['cold', 'disk', 'warm'])]))
+def ca_hierarchy_read(workspace, depth, key_specification, cache):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), workspace, 'benchmark', depth, gimmecert.utils.key_specification(key_specification))
+    storage = gimmecert.storage.get_storage_backend(workspace)
+
+    return lambda: clear_caches(workspace, cache), storage.read_ca_hierarchy
+
+
+@benchmark('issuance.certificate',
+           **params(quick=[('key_specification', KEY_SPECIFICATIONS)],
+                    full=[('key_specification', KEY_SPECIFICATIONS)]))
+def issuance_certificate(workspace, key_specification):
+    ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('benchmark', 1, gimmecert.utils.key_specification(key_specification))
+    issuer_private_key, issuer_certificate = ca_hierarchy[-1]
+    public_key = gimmecert.crypto.generate_private_key(('ed25519', None)).public_key()
+
+    return lambda: gimmecert.crypto.issue_server_certificate('myserver', public_key, issuer_private_key, issuer_certificate)
+
+
+@benchmark('issuance.command',
+           **params(quick=[('key_specification', KEY_SPECIFICATIONS), ('storage_backend', ['files'])],
+                    full=[('key_specification', KEY_SPECIFICATIONS), ('storage_backend', ['files', 'sqlite'])]))
+def issuance_command(workspace, key_specification, storage_backend):
+    key_specification = gimmecert.utils.key_specification(key_specification)
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), workspace, 'benchmark', 1, key_specification, storage_backend)
+
+    def issue():
+        entity_name = 'server%d' % next(_entity_counter)
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), workspace, entity_name, None, None, key_specification)
+
+    return issue
+
+
+@benchmark('renewal.command',
+           **params(quick=[('entities', [1, 100]), ('storage_backend', ['files', 'sqlite'])],
+                    full=[('entities', [1, 1000, 10000, 50000]), ('storage_backend', ['files', 'sqlite'])]))
+def renewal_command(workspace, entities, storage_backend):
+    project_directory = get_populated_project(entities, storage_backend)
+
+    return lambda: gimmecert.commands.renew(io.StringIO(), io.StringIO(), project_directory, 'server', 'server0', False, None, None)
+
+
+@benchmark('renewal.bulk',
+           **params(quick=[('entities', [10, 100])],
+                    full=[('entities', [100, 1000])]))
+def renewal_bulk(workspace, entities):
+    project_directory = get_populated_project(entities, 'files')
+
+    return lambda: gimmecert.commands.renew_bulk(io.StringIO(), io.StringIO(), project_directory, jobs=1)
+
+
+@benchmark('status.command',
+           **params(quick=[('entities', [1, 100, 1000]), ('storage_backend', ['files', 'sqlite']), ('cache', ['cold', 'warm'])],
+                    full=[('entities', [1, 1000, 10000, 50000]), ('storage_backend', ['files', 'sqlite']), ('cache', ['cold', 'warm'])]))
+def status_command(workspace, entities, storage_backend, cache):
+    project_directory = get_populated_project(entities, storage_backend)
+
+    def status():
+        gimmecert.commands.status(io.StringIO(), io.StringIO(), project_directory, rebuild_index=(cache == 'cold'))
+
+    return lambda: clear_caches(project_directory, cache), status
+
+
+@benchmark('startup.cli',
+           **params(quick=[('command', ['usage', 'status', 'server']), ('cache', ['cold', 'warm'])],
+                    full=[('command', ['usage', 'status', 'server']), ('cache', ['cold', 'warm'])]))
+def startup_cli(workspace, command, cache):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), workspace, 'benchmark', 1, ('ed25519', None))
+
+    def run():
+        arguments = {
+            'usage': [],
+            'status': ['status'],
+            'server': ['server', '--key-specification', 'ed25519', 'server%d' % next(_entity_counter)],
+        }[command]
+
+        subprocess.check_call([sys.executable, '-c', 'import gimmecert.cli; gimmecert.cli.main()'] + arguments,
+                              cwd=workspace, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return lambda: clear_caches(workspace, cache), run
+
+
+@benchmark('tests.unit',
+           **params(quick=[('tests', ['tests/test_crypto.py']), ('key_cache', ['off', 'on'])],
+                    full=[('tests', ['tests']), ('key_cache', ['off', 'on'])]))
+def tests_unit(workspace, tests, key_cache):
+    repository_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, GIMMECERT_TEST_KEY_CACHE='1' if key_cache == 'on' else '0')
+
+    def run():
+        # Only the duration is of interest - outcome of the tests is
+        # reported by the test suite itself.
+        subprocess.call([sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', '-o', 'addopts=', tests],
+                        cwd=repository_directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Gimmecert benchmark suite, or compare benchmark results.")
+    subparsers = parser.add_subparsers(dest='action')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="Run benchmarks.")
+    run_parser.add_argument('--scale', '-s', choices=harness.SCALES, default='quick', help="Scale at which to run benchmarks. Default is quick.")
+    run_parser.add_argument('--repeat', '-r', type=int, default=5, help="Number of samples to collect for each benchmark. Default is 5.")
+    run_parser.add_argument('--filter', '-f', dest='pattern', default=None,
+                            help="Run only benchmarks whose identifier (e.g. status.command[entities=100,...]) contains passed-in string.")
+    run_parser.add_argument('--output', '-o', default=None, help="Path to JSON file where results should be written.")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare benchmark results.")
+    compare_parser.add_argument('baseline', help="Path to JSON file with baseline results.")
+    compare_parser.add_argument('current', help="Path to JSON file with current results.")
+    compare_parser.add_argument('--threshold', '-t', type=float, default=10,
+                                help="Slow-down (in percent) above which benchmark is considered to have regressed. Default is 10.")
+    compare_parser.add_argument('--statistic', choices=['min', 'median', 'mean'], default='median',
+                                help="Statistic to compare. Default is median.")
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        results = harness.run_benchmarks(args.scale, args.repeat, args.pattern)
+
+        if args.output:
+            harness.write_results(results, args.output)
+
+        return 0
+
+    regressions = harness.compare_results(harness.read_results(args.baseline), harness.read_results(args.current),
+                                          args.threshold / 100, args.statistic)
+
+    if regressions:
+        print("\n%d benchmarks regressed by more than %g%%." % (len(regressions), args.threshold))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
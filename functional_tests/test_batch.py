@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from .base import run_command
+
+
+def test_batch_command_available_with_help():
+    # John needs to issue certificates for a whole environment worth
+    # of servers and clients. He runs the tool to see if there is
+    # something that could help him out.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at output, John notices the batch command.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "batch" in stdout
+
+    # He has a look at the command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "batch", "-h")
+
+    # John can see that the command accepts a single positional
+    # argument - path to manifest.
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout.startswith("usage: gimmecert batch")
+    assert stdout.split('\n')[0].endswith(" manifest")
+
+
+def test_batch_issues_certificates_from_manifest(tmpdir):
+    # John switches to his project directory, and initialises the CA
+    # hierarchy.
+    tmpdir.chdir()
+    run_command("gimmecert", "init")
+
+    # He writes down a manifest listing all of the entities.
+    tmpdir.join("manifest.csv").write("type,name,dns_names,csr\n"
+                                      "server,myserver1,myserver1.local,\n"
+                                      "client,myclient1,,\n")
+
+    # John issues all certificates in one go.
+    stdout, stderr, exit_code = run_command("gimmecert", "batch", "manifest.csv")
+
+    # The command finishes successfully, and reports what has been
+    # issued.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "Issued server certificate for myserver1." in stdout
+    assert "Issued client certificate for myclient1." in stdout
+    assert "Processed 2 entities, issued 2 certificates, 0 failures." in stdout
+
+    # Running the command again does not overwrite anything, and John
+    # is informed about this.
+    stdout, stderr, exit_code = run_command("gimmecert", "batch", "manifest.csv")
+
+    assert exit_code != 0
+    assert "server myserver1: Certificate has already been issued." in stderr
+    assert "client myclient1: Certificate has already been issued." in stderr
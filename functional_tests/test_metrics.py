@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+
+from .base import run_command
+
+
+def test_metrics_command_available_with_help():
+    # John would like to get alerted before any of the certificates in
+    # his projects expire. His monitoring is based on Prometheus, so
+    # he checks if Gimmecert can provide something that Prometheus
+    # could consume.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at the output, John notices the metrics command.
+    assert exit_code == 0
+    assert "metrics" in stdout
+
+    # He has a look at command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "metrics", "-h")
+
+    # John can see that the command does not take any positional
+    # arguments, but that it can write the metrics into a text file,
+    # and rebuild the status index.
+    assert exit_code == 0
+    assert stdout.split('\n\n')[0].split() == ["usage:", "gimmecert", "metrics", "[-h]", "[--textfile", "TEXTFILE]", "[--rebuild-index]"]
+
+
+def test_metrics_on_uninitialised_directory(tmpdir):
+    # John runs the metrics command in a directory that has not been
+    # initialised.
+    tmpdir.chdir()
+
+    stdout, stderr, exit_code = run_command('gimmecert', 'metrics')
+
+    # Command fails, and informs John that Gimmecert has not been
+    # initialised yet, keeping the standard output clean.
+    assert exit_code != 0
+    assert stdout == ""
+    assert "CA hierarchy has not been initialised in current directory." in stderr
+
+
+def test_metrics_exported_for_textfile_collector(tmpdir):
+    # John has a project with a two-level CA hierarchy, and a couple
+    # of issued certificates.
+    project_directory = tmpdir.mkdir('project')
+    project_directory.chdir()
+
+    run_command('gimmecert', 'init', '-d', '2')
+    run_command('gimmecert', 'server', 'myserver1')
+    run_command('gimmecert', 'server', 'myserver2')
+    run_command('gimmecert', 'client', 'myclient1')
+
+    # He runs the metrics command, and gets the metrics written to
+    # standard output.
+    stdout, stderr, exit_code = run_command('gimmecert', 'metrics')
+
+    assert exit_code == 0
+
+    # Output contains help and type information, and lists expiry of
+    # each CA level and issued certificate, in seconds.
+    assert "# TYPE gimmecert_certificate_expiry_seconds gauge" in stdout
+
+    expiry_lines = [line for line in stdout.split('\n') if line.startswith('gimmecert_certificate_expiry_seconds{')]
+    assert len(expiry_lines) == 5
+    assert 'type="ca",name="level2"}' in expiry_lines[1]
+    assert 'type="server",name="myserver2"}' in expiry_lines[3]
+    assert all(float(line.split()[-1]) > 360 * 24 * 60 * 60 for line in expiry_lines)
+
+    # Number of issued certificates is listed per type as well,
+    # alongside number of expired and not yet valid ones.
+    assert 'gimmecert_certificates{project="%s",type="server"} 2' % project_directory.strpath in stdout
+    assert 'gimmecert_certificates_expired{project="%s",type="server"} 0' % project_directory.strpath in stdout
+    assert 'gimmecert_certificates_not_valid_yet{project="%s",type="client"} 0' % project_directory.strpath in stdout
+
+    # John sets-up a directory for the textfile collector of node
+    # exporter, and points the metrics command at it.
+    collector_directory = tmpdir.mkdir('collector')
+    textfile = collector_directory.join('gimmecert.prom')
+
+    stdout, stderr, exit_code = run_command('gimmecert', 'metrics', '--textfile', textfile.strpath)
+
+    # Command informs him where the metrics have been written to.
+    assert exit_code == 0
+    assert stdout == "Metrics written to %s.\n" % textfile.strpath
+
+    # The collector directory contains only the metrics file, with
+    # the same kind of content as before.
+    assert os.listdir(collector_directory.strpath) == ['gimmecert.prom']
+    assert 'gimmecert_certificates{project="%s",type="server"} 2' % project_directory.strpath in textfile.read()
+
+    # John issues another certificate, and updates the metrics,
+    # this time passing-in a relative path to the metrics file.
+    run_command('gimmecert', 'client', 'myclient2')
+    stdout, stderr, exit_code = run_command('gimmecert', 'metrics', '-o', '../collector/gimmecert.prom')
+
+    # Metrics file now includes the new certificate.
+    assert exit_code == 0
+    assert 'gimmecert_certificates{project="%s",type="client"} 2' % project_directory.strpath in textfile.read()
+    assert 'type="client",name="myclient2"}' in textfile.read()
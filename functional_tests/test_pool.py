@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from .base import run_command
+
+
+def test_pool_command_available_with_help():
+    # John has noticed that issuing a large number of certificates for
+    # his CI runs takes a while. He has heard that Gimmecert can
+    # generate private keys ahead of time, so he looks at the list of
+    # available commands.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at output, John notices the pool command.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "pool" in stdout
+
+    # He has a look at the command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "pool", "fill", "-h")
+
+    # John can see that the fill command accepts a single positional
+    # argument - number of keys to generate.
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout.startswith("usage: gimmecert pool fill")
+    assert stdout.split('\n')[0].endswith(" count")
+
+
+def test_pool_fill_and_issuance(tmpdir):
+    # John switches to his project directory, and initialises the CA
+    # hierarchy.
+    tmpdir.chdir()
+    run_command("gimmecert", "init")
+
+    # He fills the key pool with a couple of private keys.
+    stdout, stderr, exit_code = run_command("gimmecert", "pool", "fill", "2")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "Private keys available in key pool: 2" in stdout
+
+    # John issues a server and a client certificate.
+    run_command("gimmecert", "server", "myserver")
+    run_command("gimmecert", "client", "myclient")
+
+    # He checks the pool status, and notices that both keys have been
+    # consumed.
+    stdout, stderr, exit_code = run_command("gimmecert", "pool")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout == "Private keys available in key pool: 0\n"
+
+    # Certificates have been issued as usual.
+    assert tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'client', 'myclient.key.pem').check(file=1)
@@ -42,11 +42,14 @@ def test_renew_command_available_with_help():
     stdout, stderr, exit_code = run_command("gimmecert", "renew", "-h")
 
     # John can see that the command accepts two positional argument -
-    # type of entity, and entity name.
+    # type of entity, and entity name. Both seem to be optional
+    # though, and there are some bulk renewal options as well.
     assert exit_code == 0
     assert stderr == ""
     assert stdout.startswith("usage: gimmecert renew")
-    assert stdout.split('\n')[2].endswith("{server,client} entity_name")  # Third line of help (first two are options)
+    assert "[{server,client}] [entity_name]" in stdout
+    assert "--all" in stdout
+    assert "--expiring-within" in stdout
 
 
 def test_renew_command_requires_initialised_hierarchy(tmpdir):
@@ -340,3 +343,47 @@ def test_renew_update_dns_option(tmpdir):
     # finally move ahead with his project.
     assert "DNS:myserver1," in stdout
     assert "DNS:myservice.example.com\n" in stdout
+
+
+def test_renew_certificates_in_bulk(tmpdir):
+    # John has a project with a whole bunch of web server, database,
+    # and client certificates.
+    tmpdir.chdir()
+    run_command('gimmecert', 'init')
+    for entity_name in ['web1', 'web2', 'web3', 'db1']:
+        run_command('gimmecert', 'server', entity_name)
+    run_command('gimmecert', 'client', 'myclient')
+
+    old_web1_certificate = tmpdir.join('.gimmecert', 'server', 'web1.cert.pem').read()
+    old_db1_certificate = tmpdir.join('.gimmecert', 'server', 'db1.cert.pem').read()
+
+    # Renewing web server certificates one by one seems tedious, so
+    # he renews all of them at once using a name pattern.
+    stdout, stderr, exit_code = run_command('gimmecert', 'renew', '--name-glob', 'web*', 'server')
+
+    # John is informed about every renewed certificate.
+    assert exit_code == 0
+    assert "Renewed certificate for server web1." in stdout
+    assert "Renewed certificate for server web2." in stdout
+    assert "Renewed certificate for server web3." in stdout
+    assert "db1" not in stdout
+    assert "Renewed 3 certificates." in stdout
+
+    # Web server certificates have been replaced, while the database
+    # one has been left untouched.
+    assert tmpdir.join('.gimmecert', 'server', 'web1.cert.pem').read() != old_web1_certificate
+    assert tmpdir.join('.gimmecert', 'server', 'db1.cert.pem').read() == old_db1_certificate
+
+    # Since certificates have just been issued, asking for renewal of
+    # certificates expiring within next 30 days does nothing.
+    stdout, stderr, exit_code = run_command('gimmecert', 'renew', '--expiring-within', '30')
+
+    assert exit_code == 0
+    assert stdout == "No certificates matched the selection criteria.\n"
+
+    # Finally, he renews every single certificate in the project.
+    stdout, stderr, exit_code = run_command('gimmecert', 'renew', '--all')
+
+    assert exit_code == 0
+    assert "Renewed certificate for client myclient." in stdout
+    assert "Renewed 5 certificates." in stdout
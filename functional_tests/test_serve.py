@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+from .base import run_command
+
+
+def test_serve_command_available_with_help():
+    # John's test harness invokes Gimmecert thousands of times per
+    # run. He has heard that Gimmecert can keep the CA hierarchy warm
+    # in a long-running process, so he looks at the list of available
+    # commands.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at output, John notices the serve command.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "serve" in stdout
+
+    # He has a look at the command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "serve", "-h")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout.startswith("usage: gimmecert serve")
+
+
+def test_serve_forwards_commands_to_daemon(tmpdir, monkeypatch):
+    # John switches to his project directory, and initialises the CA
+    # hierarchy.
+    tmpdir.chdir()
+    run_command("gimmecert", "init")
+
+    # His project directory lives deep within the file system, so he
+    # picks a shorter path for the daemon socket, and tells Gimmecert
+    # about it via environment variable.
+    socket_directory = tempfile.mkdtemp()
+    socket_path = os.path.join(socket_directory, 'daemon.sock')
+    monkeypatch.setenv('GIMMECERT_SOCKET', socket_path)
+
+    # John starts the daemon in the background.
+    daemon = subprocess.Popen(["gimmecert", "serve", "--socket", socket_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(socket_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # He issues a server certificate, just like he usually does.
+        stdout, stderr, exit_code = run_command("gimmecert", "server", "myserver")
+
+        assert exit_code == 0
+        assert stderr == ""
+        assert "Server certificate issued." in stdout
+        assert tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').check(file=1)
+        assert tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').check(file=1)
+
+        # Trying to issue the same certificate again results in the
+        # usual error.
+        stdout, stderr, exit_code = run_command("gimmecert", "server", "myserver")
+
+        assert exit_code != 0
+        assert "already been issued" in stderr
+
+        # The status command reports the issued certificate.
+        stdout, stderr, exit_code = run_command("gimmecert", "status")
+
+        assert exit_code == 0
+        assert "CN=myserver" in stdout
+
+        # Once done, John stops the daemon.
+        daemon.send_signal(signal.SIGTERM)
+        stdout, stderr = daemon.communicate(timeout=30)
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+            daemon.wait()
+
+    # Daemon exits cleanly, and cleans-up after itself.
+    assert daemon.returncode == 0
+    assert "Serving requests on socket %s." % socket_path in stdout.decode()
+    assert "Daemon stopped." in stdout.decode()
+    assert not os.path.exists(socket_path)
+
+    shutil.rmtree(socket_directory)
+
+    # With the daemon gone, commands are run directly again.
+    stdout, stderr, exit_code = run_command("gimmecert", "client", "myclient")
+
+    assert exit_code == 0
+    assert "Client certificate issued." in stdout
+
+
+def test_serve_for_other_project_does_not_prevent_running_commands(tmpdir, monkeypatch):
+    # John runs a daemon for one of his projects, and keeps the
+    # environment variable pointing to its socket exported in his
+    # shell.
+    tmpdir.mkdir('project1').chdir()
+    run_command("gimmecert", "init")
+
+    socket_directory = tempfile.mkdtemp()
+    socket_path = os.path.join(socket_directory, 'daemon.sock')
+    monkeypatch.setenv('GIMMECERT_SOCKET', socket_path)
+
+    daemon = subprocess.Popen(["gimmecert", "serve", "--socket", socket_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(socket_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # He then switches to another project, and issues a server
+        # certificate there.
+        tmpdir.mkdir('project2').chdir()
+        run_command("gimmecert", "init")
+
+        stdout, stderr, exit_code = run_command("gimmecert", "server", "myserver")
+
+        # The daemon does not serve this project, so the command is
+        # simply run directly.
+        assert exit_code == 0
+        assert stderr == ""
+        assert "Server certificate issued." in stdout
+        assert tmpdir.join('project2', '.gimmecert', 'server', 'myserver.cert.pem').check(file=1)
+        assert not tmpdir.join('project1', '.gimmecert', 'server', 'myserver.cert.pem').check()
+    finally:
+        daemon.send_signal(signal.SIGTERM)
+        try:
+            daemon.communicate(timeout=30)
+        except subprocess.TimeoutExpired:
+            daemon.kill()
+            daemon.wait()
+
+    shutil.rmtree(socket_directory)
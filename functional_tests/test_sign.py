@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from .base import run_command
+
+
+def test_sign_command_available_with_help():
+    # John's agents generate their own private keys, and drop CSRs
+    # into a spool directory. He runs the tool to see if there is a
+    # way to sign them all at once.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at output, John notices the sign command.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "sign" in stdout
+
+    # He has a look at the command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "sign", "-h")
+
+    # John can see that the command requires the type of certificates
+    # to issue, and accepts a single positional argument - source of
+    # CSRs.
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout.startswith("usage: gimmecert sign")
+    assert "--type" in stdout
+    assert stdout.split('\n')[0].endswith(" csr_source")
+
+
+def test_sign_issues_certificates_for_csrs_in_spool_directory(tmpdir):
+    # John switches to his project directory, and initialises the CA
+    # hierarchy.
+    tmpdir.chdir()
+    run_command("gimmecert", "init")
+
+    # His agents have dropped a couple of CSRs into the spool
+    # directory.
+    tmpdir.mkdir("spool")
+    for name in ("agent1", "agent2"):
+        run_command("openssl", "req", "-new", "-newkey", "rsa:2048", "-nodes", "-keyout", "%s.key.pem" % name,
+                    "-subj", "/CN=%s.local" % name, "-out", "spool/%s.csr.pem" % name)
+
+    # John signs all of them in one go.
+    stdout, stderr, exit_code = run_command("gimmecert", "sign", "--type", "server", "spool")
+
+    # He is presented with a summary table, listing the issued
+    # certificates, named after common names from CSRs.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "agent1.csr.pem  agent1.local  Issued: .gimmecert/server/agent1.local.cert.pem" in stdout
+    assert "agent2.csr.pem  agent2.local  Issued: .gimmecert/server/agent2.local.cert.pem" in stdout
+    assert "Processed 2 CSRs, issued 2 server certificates, 0 failures." in stdout
+
+    # The certificates match the private keys of his agents.
+    for name in ("agent1", "agent2"):
+        public_key, _, _ = run_command("openssl", "rsa", "-pubout", "-in", "%s.key.pem" % name)
+        certificate_public_key, _, _ = run_command("openssl", "x509", "-pubkey", "-noout", "-in", ".gimmecert/server/%s.local.cert.pem" % name)
+        assert certificate_public_key == public_key
+
+    # Later on, John runs the command again, forgetting that he has
+    # already processed the spool directory.
+    stdout, stderr, exit_code = run_command("gimmecert", "sign", "--type", "server", "spool")
+
+    # This time around he is informed that certificates have already
+    # been issued.
+    assert exit_code != 0
+    assert "Failed: Certificate has already been issued." in stdout
+    assert "Processed 2 CSRs, issued 0 server certificates, 2 failures." in stdout
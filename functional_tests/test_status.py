@@ -19,6 +19,8 @@
 #
 
 
+import json
+
 from .base import run_command
 
 
@@ -44,11 +46,13 @@ def test_status_command_available_with_help():
     # kind of parameters he might need to provide.
     stdout, stderr, exit_code = run_command("gimmecert", "status", "-h")
 
-    # John can see that the command does not take any additional
-    # arguments.
+    # John can see that the command does not take any positional
+    # arguments. It only has options for rebuilding some kind of
+    # index, and for choosing the output format.
     assert exit_code == 0
     assert stderr == ""
-    assert stdout.split('\n')[0] == "usage: gimmecert status [-h]"
+    assert stdout.split('\n')[0] == "usage: gimmecert status [-h] [--rebuild-index]"
+    assert stdout.split('\n')[1].strip() == "[--format {text,json,jsonl,csv}]"
 
 
 def test_status_on_uninitialised_directory(tmpdir):
@@ -173,3 +177,72 @@ def test_status_on_initialised_directory(tmpdir):
     assert stdout_lines[index_myclient3+1].startswith("    Validity: ")
     assert stdout_lines[index_myclient3+2] == "    CSR: .gimmecert/client/myclient3.csr.pem"
     assert stdout_lines[index_myclient3+3] == "    Certificate: .gimmecert/client/myclient3.cert.pem"
+
+
+def test_status_picks_up_changes_made_outside_of_gimmecert(tmpdir):
+    # John has initialised a project and issued a couple of server
+    # certificates.
+    tmpdir.chdir()
+    run_command('gimmecert', 'init')
+    run_command('gimmecert', 'server', 'myserver1')
+    run_command('gimmecert', 'server', 'myserver2')
+
+    # He decides to clean-up one of the servers by hand, removing its
+    # certificate and private key directly from the directory.
+    tmpdir.join('.gimmecert', 'server', 'myserver2.cert.pem').remove()
+    tmpdir.join('.gimmecert', 'server', 'myserver2.key.pem').remove()
+
+    # When he runs the status command, the removed server is no longer
+    # listed.
+    stdout, stderr, exit_code = run_command('gimmecert', 'status')
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "CN=myserver1" in stdout
+    assert "CN=myserver2" not in stdout
+
+    # Being a bit paranoid, he asks for the status index to be rebuilt
+    # from scratch, and gets the very same output.
+    stdout_rebuild, stderr, exit_code = run_command('gimmecert', 'status', '--rebuild-index')
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout_rebuild == stdout
+
+
+def test_status_in_machine_readable_format(tmpdir):
+    # John has a project with a couple of server and client
+    # certificates.
+    tmpdir.chdir()
+    run_command('gimmecert', 'init')
+    run_command('gimmecert', 'server', 'myserver1', 'myservice.example.com')
+    run_command('gimmecert', 'client', 'myclient1')
+
+    # His monitoring team would like to keep track of certificate
+    # expiry without parsing the human-readable output of the status
+    # command. John asks for the status to be output as JSON lines
+    # instead.
+    stdout, stderr, exit_code = run_command('gimmecert', 'status', '--format', 'jsonl')
+
+    assert exit_code == 0
+
+    # He gets a single record for the CA, server, and client.
+    records = [json.loads(line) for line in stdout.splitlines()]
+
+    assert [(r['type'], r['name']) for r in records] == [('ca', 'level1'), ('server', 'myserver1'), ('client', 'myclient1')]
+
+    # Each record contains the same information he is used to from
+    # the human-readable output.
+    assert records[1]['subject'] == "CN=myserver1"
+    assert records[1]['dns_names'] == ['myserver1', 'myservice.example.com']
+    assert records[1]['validity_status'] == 'valid'
+    assert records[1]['private_key'] == '.gimmecert/server/myserver1.key.pem'
+    assert records[1]['certificate'] == '.gimmecert/server/myserver1.cert.pem'
+
+    # For spreadsheet lovers in the team, he also tries out the CSV
+    # format, which comes with a header.
+    stdout, stderr, exit_code = run_command('gimmecert', 'status', '--format', 'csv')
+
+    assert exit_code == 0
+    assert stdout.splitlines()[0] == "type,name,subject,validity,validity_status,dns_names,private_key,csr,certificate"
+    assert len(stdout.splitlines()) == 4
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+from .base import run_command
+
+
+def test_sqlite_storage_backend_and_exporting_files(tmpdir):
+    # John's CI project has accumulated tens of thousands of
+    # certificates, and backing-up all of the small files has become
+    # slow. He has heard that Gimmecert can store everything in a
+    # single database, and has a look at the init command help.
+    stdout, stderr, exit_code = run_command("gimmecert", "init", "-h")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "--storage-backend" in stdout
+    assert "sqlite" in stdout
+
+    # He switches to a new project directory, and initialises the CA
+    # hierarchy using the SQLite storage backend.
+    tmpdir.chdir()
+    stdout, stderr, exit_code = run_command("gimmecert", "init", "--storage-backend", "sqlite")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "CA hierarchy initialised" in stdout
+    assert "export-files" in stdout
+
+    # John notices that only a single file has been created.
+    assert [f.basename for f in tmpdir.join('.gimmecert').listdir()] == ['storage.sqlite']
+
+    # He issues a server and client certificate, and renews the server
+    # certificate.
+    run_command("gimmecert", "server", "myserver", "myserver.local")
+    run_command("gimmecert", "client", "myclient")
+    stdout, stderr, exit_code = run_command("gimmecert", "renew", "server", "myserver")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "Renewed certificate for server myserver." in stdout
+
+    # Status command shows information about both certificates.
+    stdout, stderr, exit_code = run_command("gimmecert", "status")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "CN=myserver" in stdout
+    assert "CN=myclient" in stdout
+
+    # Still, no artefacts have been written-out as files. Only lock
+    # files used for coordinating concurrent commands are present.
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert').listdir()) == ['locks', 'storage.sqlite']
+
+    # John needs the artefacts as files for configuring his test
+    # server, so he exports them.
+    stdout, stderr, exit_code = run_command("gimmecert", "export-files")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert "Server certificates: 1" in stdout
+    assert "Client certificates: 1" in stdout
+
+    # Files have been written-out using the usual layout.
+    assert tmpdir.join('.gimmecert', 'ca', 'level1.key.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'ca', 'level1.cert.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'ca', 'chain-full.cert.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'client', 'myclient.key.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'client', 'myclient.cert.pem').check(file=1)
+
+    # He also exports the artefacts to a separate directory for
+    # another team.
+    stdout, stderr, exit_code = run_command("gimmecert", "export-files", "exported")
+
+    assert exit_code == 0
+    assert stderr == ""
+    assert tmpdir.join('exported', 'server', 'myserver.cert.pem').read() == tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').read()
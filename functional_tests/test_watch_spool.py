@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import signal
+import subprocess
+import time
+
+from .base import run_command
+
+
+def test_watch_spool_command_available_with_help():
+    # John's agents drop CSRs into a spool directory, and he has so far
+    # been running a cron job that issues certificates for them one by
+    # one. He runs the tool to see if there is a better way.
+    stdout, stderr, exit_code = run_command("gimmecert")
+
+    # Looking at output, John notices the watch-spool command.
+    assert exit_code == 0
+    assert stderr == ""
+    assert "watch-spool" in stdout
+
+    # He has a look at the command invocation.
+    stdout, stderr, exit_code = run_command("gimmecert", "watch-spool", "-h")
+
+    # John can see that the command requires the type of certificates
+    # to issue, and accepts a single positional argument - the spool
+    # directory.
+    assert exit_code == 0
+    assert stderr == ""
+    assert stdout.startswith("usage: gimmecert watch-spool")
+    assert "--type" in stdout
+    assert stdout.split('\n\n')[0].endswith(" spool_directory")
+
+
+def wait_for(condition, timeout=30):
+    """
+    Helper function that waits for the passed-in condition to become
+    true.
+    """
+
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_watch_spool_issues_certificates_for_csrs_as_they_arrive(tmpdir):
+    # John switches to his project directory, and initialises the CA
+    # hierarchy.
+    tmpdir.chdir()
+    run_command("gimmecert", "init")
+
+    # One of his agents has already dropped a CSR into the spool
+    # directory.
+    spool = tmpdir.mkdir("spool")
+    run_command("openssl", "req", "-new", "-newkey", "rsa:2048", "-nodes", "-keyout", "agent1.key.pem",
+                "-subj", "/CN=agent1.local", "-out", "spool/agent1.csr.pem")
+
+    # John starts watching the spool directory in the background.
+    watcher = subprocess.Popen(["gimmecert", "watch-spool", "--type", "server", "spool"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    try:
+        # The CSR that was already in the spool directory gets
+        # processed straight away.
+        wait_for(lambda: tmpdir.join(".gimmecert", "server", "agent1.local.cert.pem").check())
+
+        assert tmpdir.join(".gimmecert", "server", "agent1.local.cert.pem").check(file=1)
+        assert tmpdir.join(".gimmecert", "server", "agent1.local.csr.pem").check(file=1)
+        assert not spool.join("agent1.csr.pem").check()
+
+        # Another agent drops its CSR into the spool directory,
+        # writing it under a temporary name first.
+        run_command("openssl", "req", "-new", "-newkey", "rsa:2048", "-nodes", "-keyout", "agent2.key.pem",
+                    "-subj", "/CN=agent2.local", "-out", "spool/agent2.tmp")
+        os.rename(spool.join("agent2.tmp").strpath, spool.join("agent2.csr.pem").strpath)
+
+        # Shortly afterwards, the certificate is issued.
+        wait_for(lambda: tmpdir.join(".gimmecert", "server", "agent2.local.cert.pem").check())
+
+        assert tmpdir.join(".gimmecert", "server", "agent2.local.cert.pem").check(file=1)
+        assert not spool.join("agent2.csr.pem").check()
+
+        # A misbehaving agent drops garbage into the spool directory.
+        spool.join("agent3.csr.pem").write("garbage")
+
+        # It gets moved out of the way (after giving the agent some
+        # time to finish writing the file).
+        wait_for(lambda: spool.join("rejected", "agent3.csr.pem").check())
+
+        assert spool.join("rejected", "agent3.csr.pem").check(file=1)
+
+        # Once done, John stops watching the spool directory.
+        watcher.send_signal(signal.SIGTERM)
+        stdout, stderr = watcher.communicate(timeout=30)
+    finally:
+        if watcher.poll() is None:
+            watcher.kill()
+            watcher.wait()
+
+    stdout, stderr = stdout.decode(), stderr.decode()
+
+    # He has a look at the output, which lists issued certificates and
+    # rejected CSRs.
+    assert watcher.returncode == 0
+    assert "Issued server certificate for agent1.csr.pem: .gimmecert/server/agent1.local.cert.pem" in stdout
+    assert "Issued server certificate for agent2.csr.pem: .gimmecert/server/agent2.local.cert.pem" in stdout
+    assert "Rejected agent3.csr.pem: Failed to read CSR" in stderr
+    assert "Issued 2 server certificates, rejected 1 CSRs." in stdout
+
+    # The certificates match the private keys of his agents.
+    for name in ("agent1", "agent2"):
+        public_key, _, _ = run_command("openssl", "rsa", "-pubout", "-in", "%s.key.pem" % name)
+        certificate_public_key, _, _ = run_command("openssl", "x509", "-pubkey", "-noout", "-in", ".gimmecert/server/%s.local.cert.pem" % name)
+        assert certificate_public_key == public_key
@@ -17,3 +17,11 @@
 # You should have received a copy of the GNU General Public License along with
 # Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
 #
+
+# Importing the library API does not pull in cryptography, since
+# modules that depend on it are imported only once they are needed (see
+# gimmecert.project). This keeps the CLI start-up fast.
+from .project import Project
+
+
+__all__ = ['Project']
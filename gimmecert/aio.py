@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import concurrent.futures
+import functools
+
+import gimmecert.crypto
+import gimmecert.locking
+import gimmecert.parallel
+import gimmecert.project
+import gimmecert.storage
+import gimmecert.utils
+
+
+class AsyncProject:
+    """
+    Asyncio interface to a single Gimmecert project, providing
+    awaitable counterparts of gimmecert.project.Project methods for
+    issuing certificates.
+
+    CPU-bound work (private key generation, CSR verification, and
+    signing) is run in a configurable executor, while storage access
+    runs in a thread pool, so the event loop is never blocked.
+    Independent operations can be run concurrently (for example using
+    asyncio.gather), with number of operations in progress limited by a
+    semaphore.
+
+    Work is passed to the executor using the task functions from
+    gimmecert.parallel, which operate on DER-encoded data. Both thread
+    and process pool executors can therefore be used.
+
+    Since no locks are held while waiting for the executor, entity
+    existence is checked before starting the work, and once more
+    (while holding the entity lock) right before storing the
+    artefacts.
+    """
+
+    def __init__(self, project_directory, executor=None, io_executor=None, concurrency=None):
+        """
+        Initialises the project interface. Project directory is not
+        accessed until the first method invocation.
+
+        :param project_directory: Path to project directory.
+        :type project_directory: str
+
+        :param executor: Executor for running CPU-bound work. Set to None (default) to use a process pool executor with one
+            worker per available CPU, which gets shut down by the close method.
+        :type executor: concurrent.futures.Executor or None
+
+        :param io_executor: Executor for accessing storage. Set to None (default) to use default executor of the event loop.
+        :type io_executor: concurrent.futures.ThreadPoolExecutor or None
+
+        :param concurrency: Maximum number of operations in progress at the same time. Set to None (default) to use number of
+            available CPUs.
+        :type concurrency: int or None
+        """
+
+        self.project = gimmecert.project.Project(project_directory)
+        self.io_executor = io_executor
+        self.concurrency = concurrency or gimmecert.parallel.get_default_jobs()
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._semaphore = None
+        self._issuer = None
+
+    @property
+    def project_directory(self):
+        """
+        Absolute path to project directory.
+        """
+
+        return self.project.project_directory
+
+    @property
+    def executor(self):
+        """
+        Executor for running CPU-bound work.
+        """
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=gimmecert.parallel.get_default_jobs())
+
+        return self._executor
+
+    async def close(self):
+        """
+        Shuts down the executor for CPU-bound work, unless it has been
+        passed-in during initialisation.
+        """
+
+        if self._owns_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            await self._run_io(executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_semaphore(self):
+        """
+        Returns semaphore limiting number of operations in progress.
+        Semaphore is created on first use within the running event
+        loop, and re-created if the project is used from another event
+        loop.
+        """
+
+        loop = asyncio.get_event_loop()
+
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.concurrency))
+
+        return self._semaphore[1]
+
+    def _run_io(self, function, *args):
+        """
+        Runs function that accesses storage in the I/O executor.
+        """
+
+        return asyncio.get_event_loop().run_in_executor(self.io_executor, functools.partial(function, *args))
+
+    def _run_cpu(self, function, *args):
+        """
+        Runs CPU-bound function in the executor. Function and arguments
+        must be picklable.
+        """
+
+        return asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    def _load_issuer(self):
+        """
+        Loads private key and certificate of the issuing CA, returning
+        them DER-encoded. Runs in the I/O executor.
+        """
+
+        storage = self.project.storage
+
+        with gimmecert.locking.project_lock(self.project_directory):
+            issuer_private_key, issuer_certificate = storage.read_ca_hierarchy()[-1]
+
+        return gimmecert.parallel.private_key_to_der(issuer_private_key), gimmecert.parallel.certificate_to_der(issuer_certificate)
+
+    async def _get_issuer(self):
+        """
+        Returns DER-encoded private key and certificate of the issuing
+        CA. Issuer is loaded only once.
+        """
+
+        if self._issuer is None:
+            self._issuer = await self._run_io(self._load_issuer)
+
+        return self._issuer
+
+    async def _get_private_key(self, key_specification):
+        """
+        Obtains a private key for issuing an end entity certificate,
+        taking it from the project key pool if available, and
+        generating it in the executor otherwise. Returns the private
+        key, and whether it has been taken from the pool.
+        """
+
+        private_key = await self._run_io(gimmecert.storage.take_pooled_private_key, self.project_directory, key_specification)
+
+        if private_key is not None:
+            return private_key, True
+
+        private_key_der = await self._run_cpu(gimmecert.parallel.generate_private_key_task, key_specification)
+        private_key = await self._run_io(gimmecert.parallel.private_key_from_der, private_key_der)
+
+        return private_key, False
+
+    async def _return_private_key(self, private_key, key_specification):
+        """
+        Puts private key taken from the project key pool back into the
+        pool, so it does not get lost if it ends up not being used (for
+        example if another operation has issued the certificate in the
+        meantime).
+        """
+
+        await self._run_io(gimmecert.storage.add_pooled_private_key, self.project_directory, private_key, key_specification)
+
+    def _entity_exists(self, entity_type, entity_name):
+        """
+        Checks if entity exists. Runs in the I/O executor.
+        """
+
+        return self.project.storage.entity_exists(entity_type, entity_name)
+
+    def _read_certificate(self, entity_type, entity_name):
+        """
+        Reads certificate of an existing entity. Runs in the I/O
+        executor.
+        """
+
+        certificate = self.project.storage.read_certificate(entity_type, entity_name)
+
+        if certificate is None:
+            raise gimmecert.project.UnknownEntityError("No existing certificate found for %s %s." % (entity_type, entity_name))
+
+        return certificate
+
+    def _store(self, entity_type, entity_name, certificate_der, private_key, csr, renewal):
+        """
+        Stores artefacts of an issued or renewed certificate while
+        holding the entity lock, ensuring that the entity still does
+        not exist (or, for renewals, that it still exists). Runs in the
+        I/O executor.
+        """
+
+        certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+        storage = self.project.storage
+
+        with gimmecert.locking.project_lock(self.project_directory), gimmecert.locking.entity_lock(self.project_directory, entity_type, entity_name):
+            entity_exists = storage.entity_exists(entity_type, entity_name)
+
+            if renewal and not entity_exists:
+                raise gimmecert.project.UnknownEntityError("No existing certificate found for %s %s." % (entity_type, entity_name))
+            elif not renewal and entity_exists:
+                raise gimmecert.project.CertificateAlreadyIssuedError("Certificate has already been issued for %s %s." % (entity_type, entity_name))
+
+            old_key_or_csr = storage.get_key_or_csr(entity_type, entity_name)
+
+            # Storing private key removes the CSR, and vice versa.
+            storage.write_entities([(entity_type, entity_name, certificate, private_key, csr)])
+
+        key_or_csr = 'csr' if csr is not None else 'key' if private_key is not None else old_key_or_csr
+
+        return gimmecert.project.make_entity(self.project_directory, entity_type, entity_name, certificate, private_key, csr, key_or_csr)
+
+    async def _issue(self, entity_type, entity_name, extra_dns_names, csr, key_specification):
+        """
+        Issues certificate for a new entity.
+        """
+
+        async with self._get_semaphore():
+            if await self._run_io(self._entity_exists, entity_type, entity_name):
+                raise gimmecert.project.CertificateAlreadyIssuedError("Certificate has already been issued for %s %s." % (entity_type, entity_name))
+
+            issuer_private_key_der, issuer_certificate_der = await self._get_issuer()
+
+            # Only the public key is used from the CSR.
+            if csr is not None:
+                private_key, pooled = None, False
+                public_key = csr.public_key()
+            else:
+                private_key, pooled = await self._get_private_key(key_specification)
+                public_key = private_key.public_key()
+
+            try:
+                _, certificate_der = await self._run_cpu(gimmecert.parallel.issue_certificate_task, entity_type, entity_name, extra_dns_names,
+                                                         gimmecert.parallel.public_key_to_der(public_key), None,
+                                                         issuer_private_key_der, issuer_certificate_der)
+
+                return await self._run_io(self._store, entity_type, entity_name, certificate_der, private_key, csr, False)
+            except BaseException:
+                if pooled:
+                    await self._return_private_key(private_key, key_specification)
+                raise
+
+    async def issue_server(self, entity_name, extra_dns_names=None, csr=None, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+        """
+        Issues a server certificate. See
+        gimmecert.project.Project.issue_server for details.
+
+        :returns: Issued entity.
+        :rtype: gimmecert.project.Entity
+
+        :raises gimmecert.project.NotInitialisedError: If project has not been initialised.
+        :raises gimmecert.project.CertificateAlreadyIssuedError: If certificate has already been issued for the server.
+        """
+
+        return await self._issue('server', entity_name, extra_dns_names, csr, key_specification)
+
+    async def issue_client(self, entity_name, csr=None, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+        """
+        Issues a client certificate. See
+        gimmecert.project.Project.issue_client for details.
+
+        :returns: Issued entity.
+        :rtype: gimmecert.project.Entity
+
+        :raises gimmecert.project.NotInitialisedError: If project has not been initialised.
+        :raises gimmecert.project.CertificateAlreadyIssuedError: If certificate has already been issued for the client.
+        """
+
+        return await self._issue('client', entity_name, None, csr, key_specification)
+
+    async def renew(self, entity_type, entity_name, generate_new_private_key=False, csr=None, dns_names=None, key_specification=None):
+        """
+        Renews existing certificate. See gimmecert.project.Project.renew
+        for details.
+
+        :returns: Renewed entity. Private key and CSR are set only if new private key has been generated or CSR has been passed-in.
+        :rtype: gimmecert.project.Entity
+
+        :raises ValueError: If conflicting arguments are passed-in.
+        :raises gimmecert.project.NotInitialisedError: If project has not been initialised.
+        :raises gimmecert.project.UnknownEntityError: If no certificate has been issued for the entity.
+        """
+
+        gimmecert.project.validate_renew_arguments(entity_type, generate_new_private_key, csr, dns_names, key_specification)
+
+        async with self._get_semaphore():
+            old_certificate = await self._run_io(self._read_certificate, entity_type, entity_name)
+            issuer_private_key_der, issuer_certificate_der = await self._get_issuer()
+
+            private_key, pooled = None, False
+
+            if generate_new_private_key:
+                if key_specification is None:
+                    key_specification = gimmecert.crypto.key_specification_from_public_key(old_certificate.public_key())
+                private_key, pooled = await self._get_private_key(key_specification)
+                public_key = private_key.public_key()
+            elif csr is not None:
+                public_key = csr.public_key()
+            else:
+                public_key = old_certificate.public_key()
+
+            public_key_der = gimmecert.parallel.public_key_to_der(public_key)
+
+            try:
+                if entity_type == 'server' and dns_names is not None:
+                    _, certificate_der = await self._run_cpu(gimmecert.parallel.issue_certificate_task, entity_type, entity_name, dns_names,
+                                                             public_key_der, None, issuer_private_key_der, issuer_certificate_der)
+                else:
+                    certificate_der = await self._run_cpu(gimmecert.parallel.renew_certificate_task,
+                                                          gimmecert.parallel.certificate_to_der(old_certificate),
+                                                          issuer_private_key_der, issuer_certificate_der, public_key_der)
+
+                return await self._run_io(self._store, entity_type, entity_name, certificate_der, private_key, csr, True)
+            except BaseException:
+                if pooled:
+                    await self._return_private_key(private_key, key_specification)
+                raise
+
+    async def sign_csr(self, entity_type, csr, fallback_name=None):
+        """
+        Issues server or client certificate for the passed-in CSR. See
+        gimmecert.project.Project.sign_csr for details. CSR signature is
+        verified in the executor.
+
+        :returns: Issued entity.
+        :rtype: gimmecert.project.Entity
+
+        :raises gimmecert.project.InvalidCSRError: If CSR signature is invalid, or if no entity name could be determined.
+        :raises gimmecert.project.NotInitialisedError: If project has not been initialised.
+        :raises gimmecert.project.CertificateAlreadyIssuedError: If certificate has already been issued for the entity.
+        """
+
+        if not await self._run_cpu(gimmecert.parallel.verify_csr_task, gimmecert.parallel.csr_to_der(csr)):
+            raise gimmecert.project.InvalidCSRError("Invalid CSR signature.")
+
+        entity_name = gimmecert.project.get_csr_entity_name(csr, fallback_name)
+
+        if entity_name is None:
+            raise gimmecert.project.InvalidCSRError("Unable to determine entity name.")
+
+        if entity_type == 'server':
+            return await self.issue_server(entity_name, csr=csr)
+
+        return await self.issue_client(entity_name, csr=csr)
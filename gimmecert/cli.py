@@ -21,14 +21,22 @@
 
 import argparse
 import os
+import signal
 import sys
+import time
 
+import gimmecert.timings
 from .decorators import subcommand_parser, get_subcommand_parser_setup_functions
-from .commands import client, help_, init, renew, server, status, usage, ExitCode
+from .utils import key_specification
+from .commands import (batch, client, export_files, help_, init, metrics, pool_fill, pool_status, renew, renew_bulk, serve, server, sign, status,
+                       usage, watch_spool, ExitCode, STATUS_OUTPUT_FORMATS, STORAGE_BACKEND_NAMES)
 
 
 ERROR_GENERIC = 10
 
+KEY_SPECIFICATION_HELP = '''Key specification to use when generating private keys. Supported values are: rsa:2048, rsa:3072, rsa:4096, \
+ecdsa:secp256r1, ecdsa:secp384r1, ed25519.'''
+
 
 DESCRIPTION = """\
 Issues server and client X.509 certificates using a local CA hierarchy.
@@ -42,6 +50,12 @@ Examples:
     # Initialise the local CA hierarchy and all the necessary directories.
     gimmecert init
 
+    # Initialise the local CA hierarchy, using ECDSA keys instead of RSA ones.
+    gimmecert init --key-specification ecdsa:secp256r1
+
+    # Initialise the local CA hierarchy, storing all artefacts in a single SQLite database.
+    gimmecert init --storage-backend sqlite
+
     # Issue a TLS server certificate with only the server name in DNS subject alternative name.
     gimmecert server myserver
 
@@ -54,6 +68,9 @@ Examples:
     # Issue a TLS client certificate.
     gimmecert client myclient
 
+    # Issue a TLS client certificate with Ed25519 private key.
+    gimmecert client myclient --key-specification ed25519
+
     # Issue a TLS client certificate by using public key from the CSR (naming/extensions are ignored).
     gimmecert client myclient --csr /tmp/myclient.csr.pem
 
@@ -71,23 +88,123 @@ Examples:
     # Renew a TLS client certificate, preserving naming and private key.
     gimmecert renew client myclient
 
+    # Renew all server certificates expiring within 30 days, preserving naming and private keys.
+    gimmecert renew --expiring-within 30 server
+
     # Show information about CA hierarchy and issued certificates.
     gimmecert status
+
+    # Export certificate expiry metrics for the textfile collector of Prometheus node exporter.
+    gimmecert metrics --textfile /var/lib/node_exporter/textfile_collector/gimmecert.prom
+
+    # Write-out artefacts stored in SQLite database as files under the .gimmecert directory.
+    gimmecert export-files
+
+    # Issue certificates for all entities listed in a manifest (JSON, CSV, or YAML).
+    gimmecert batch manifest.json
+
+    # Issue server certificates for all CSRs in a directory, naming entities after CSR common names.
+    gimmecert sign --type server /var/spool/csrs/
+
+    # Issue client certificates for multiple CSRs passed-in via standard input.
+    cat *.csr.pem | gimmecert sign --type client -
+
+    # Keep issuing server certificates for CSRs as they get dropped into a spool directory.
+    gimmecert watch-spool --type server /var/spool/csrs/
+
+    # Pre-generate private keys for speeding-up subsequent issuance.
+    gimmecert pool fill 20
+
+    # Keep CA hierarchy and private keys warm in a daemon. Subsequent server, client, renew, and status
+    # commands are forwarded to the daemon automatically.
+    gimmecert serve
 """
 
 
+class ArgumentParser(argparse.ArgumentParser):
+    """
+    Argument parser that can optionally allow options to be intermixed
+    with positional arguments (see
+    argparse.ArgumentParser.parse_intermixed_args). This is useful
+    for subcommands with optional positional arguments, where the
+    standard parser would otherwise fail to assign positional arguments
+    passed-in after options.
+
+    Intermixed parsing is enabled by setting the intermixed attribute
+    on the parser instance to True.
+    """
+
+    intermixed = False
+
+    _parsing_intermixed = False
+
+    def parse_known_args(self, args=None, namespace=None):
+        # Intermixed parsing is implemented in terms of the regular
+        # parsing, so avoid recursing into it.
+        if not self.intermixed or self._parsing_intermixed:
+            return super().parse_known_args(args, namespace)
+
+        self._parsing_intermixed = True
+
+        try:
+            if hasattr(argparse.ArgumentParser, 'parse_known_intermixed_args'):
+                return self.parse_known_intermixed_args(args, namespace)
+
+            return self._parse_known_intermixed_args_fallback(args, namespace)
+        finally:
+            self._parsing_intermixed = False
+
+    def _parse_known_intermixed_args_fallback(self, args, namespace):
+        """
+        Parses intermixed options and positional arguments on Python
+        versions that do not provide
+        argparse.ArgumentParser.parse_known_intermixed_args (added in
+        Python 3.7). Options are parsed first (with positional
+        arguments disabled), followed by parsing of positional arguments
+        from the remaining arguments (with options disabled).
+        """
+
+        actions = self._actions
+        required_groups = [group for group in self._mutually_exclusive_groups if group.required]
+
+        try:
+            self._actions = [action for action in actions if action.option_strings]
+            namespace, remaining_args = super().parse_known_args(args, namespace)
+
+            # Required mutually exclusive groups have already been
+            # taken care of while parsing the options.
+            self._actions = [action for action in actions if not action.option_strings]
+            for group in required_groups:
+                group.required = False
+
+            return super().parse_known_args(remaining_args, namespace)
+        finally:
+            self._actions = actions
+            for group in required_groups:
+                group.required = True
+
+
 @subcommand_parser
 def setup_init_subcommand_parser(parser, subparsers):
     subparser = subparsers.add_parser('init', description='Initialise CA hierarchy.')
     subparser.add_argument('--ca-base-name', '-b', help="Base name to use for CA naming. Default is to use the working directory base name.")
     subparser.add_argument('--ca-hierarchy-depth', '-d', type=int, help="Depth of CA hierarchy to generate. Default is 1", default=1)
+    subparser.add_argument('--key-specification', '-k', type=key_specification, default='rsa:2048',
+                           help=KEY_SPECIFICATION_HELP + ' Default is rsa:2048.')
+    subparser.add_argument('--storage-backend', '-s', choices=STORAGE_BACKEND_NAMES, default='files',
+                           help='''Storage backend to use for artefacts. The files backend stores each artefact as a separate PEM file. \
+    The sqlite backend stores all artefacts in a single SQLite database, from which they can be written-out as files using the \
+    export-files command. Default is %(default)s.''')
+    subparser.add_argument('--jobs', '-j', type=int, default=None, help='''Number of worker processes to use for generating CA private \
+    keys. Default is to use number of available CPUs.''')
 
     def init_wrapper(args):
         project_directory = os.getcwd()
         if args.ca_base_name is None:
             args.ca_base_name = os.path.basename(project_directory)
 
-        return init(sys.stdout, sys.stderr, project_directory, args.ca_base_name, args.ca_hierarchy_depth)
+        return init(sys.stdout, sys.stderr, project_directory, args.ca_base_name, args.ca_hierarchy_depth, args.key_specification,
+                    args.storage_backend, args.jobs)
 
     subparser.set_defaults(func=init_wrapper)
 
@@ -113,11 +230,25 @@ def setup_server_subcommand_parser(parser, subparsers):
     subparser.add_argument('dns_name', nargs='*', help='Additional DNS names to include in subject alternative name.')
     subparser.add_argument('--csr', '-c', type=str, default=None, help='''Do not generate server private key locally, and use the passed-in \
     certificate signing request (CSR) instead. Use dash (-) to read from standard input. Only the public key is taken from the CSR.''')
+    subparser.add_argument('--key-specification', '-k', type=key_specification, default='rsa:2048',
+                           help=KEY_SPECIFICATION_HELP + ' Default is rsa:2048.')
 
     def server_wrapper(args):
         project_directory = os.getcwd()
 
-        return server(sys.stdout, sys.stderr, project_directory, args.entity_name, args.dns_name, args.csr)
+        # Standard input is not available to the daemon.
+        if args.csr != '-':
+            status_code = forward_command(sys.stdout, sys.stderr, project_directory, 'server', {
+                'entity_name': args.entity_name,
+                'extra_dns_names': args.dns_name,
+                'custom_csr_path': absolute_path(args.csr),
+                'key_specification': args.key_specification,
+            })
+
+            if status_code is not None:
+                return status_code
+
+        return server(sys.stdout, sys.stderr, project_directory, args.entity_name, args.dns_name, args.csr, args.key_specification)
 
     subparser.set_defaults(func=server_wrapper)
 
@@ -130,11 +261,24 @@ def setup_client_subcommand_parser(parser, subparsers):
     subparser.add_argument('entity_name', help='Name of the client entity.')
     subparser.add_argument('--csr', '-c', type=str, default=None, help='''Do not generate client private key locally, and use the passed-in \
     certificate signing request (CSR) instead. Use dash (-) to read from standard input. Only the public key is taken from the CSR.''')
+    subparser.add_argument('--key-specification', '-k', type=key_specification, default='rsa:2048',
+                           help=KEY_SPECIFICATION_HELP + ' Default is rsa:2048.')
 
     def client_wrapper(args):
         project_directory = os.getcwd()
 
-        return client(sys.stdout, sys.stderr, project_directory, args.entity_name, args.csr)
+        # Standard input is not available to the daemon.
+        if args.csr != '-':
+            status_code = forward_command(sys.stdout, sys.stderr, project_directory, 'client', {
+                'entity_name': args.entity_name,
+                'custom_csr_path': absolute_path(args.csr),
+                'key_specification': args.key_specification,
+            })
+
+            if status_code is not None:
+                return status_code
+
+        return client(sys.stdout, sys.stderr, project_directory, args.entity_name, args.csr, args.key_specification)
 
     subparser.set_defaults(func=client_wrapper)
 
@@ -143,9 +287,14 @@ def setup_client_subcommand_parser(parser, subparsers):
 
 @subcommand_parser
 def setup_renew_subcommand_parser(parser, subparsers):
-    subparser = subparsers.add_parser('renew', description='Renews existing certificates.')
-    subparser.add_argument('entity_type', help='Type of entity to renew.', choices=['server', 'client'])
-    subparser.add_argument('entity_name', help='Name of the entity')
+    subparser = subparsers.add_parser('renew', description='''Renews existing certificates. Certificates can be renewed either one \
+    at a time, or in bulk using the --all, --name-glob, or --expiring-within options.''')
+    subparser.add_argument('entity_type', help='''Type of entity to renew. In bulk mode, limits renewal to entities of passed-in type.''',
+                           choices=['server', 'client'], nargs='?')
+    subparser.add_argument('entity_name', help='Name of the entity. Not used in bulk mode.', nargs='?')
+
+    # Allow options to be placed between optional positional arguments.
+    subparser.intermixed = True
 
     def csv_list(csv):
         """
@@ -171,10 +320,61 @@ def setup_renew_subcommand_parser(parser, subparsers):
     existing certificate, and use the passed-in certificate signing request (CSR) instead. Use dash (-) to read from standard input. \
     If private key exists, it will be removed. Mutually exclusive with the --new-private-key option. Only the public key is taken from the CSR.''')
 
+    subparser.add_argument('--key-specification', '-k', type=key_specification, default=None,
+                           help=KEY_SPECIFICATION_HELP + ''' Valid only together with the --new-private-key option. \
+    Default is to use same key specification as the existing certificate.''')
+
+    bulk_group = subparser.add_argument_group('bulk renewal', '''Options for renewing multiple certificates at once. Certificates are \
+    renewed with their existing public keys, naming, and extensions. Criteria can be combined, and apply to both server and client certificates \
+    unless entity type is passed-in.''')
+    bulk_group.add_argument('--all', '-a', action='store_true', help='Renew all issued certificates.')
+    bulk_group.add_argument('--name-glob', '-g', type=str, default=None, help='''Renew certificates for entities with names matching \
+    the passed-in shell-style wildcard pattern.''')
+    bulk_group.add_argument('--expiring-within', '-e', type=int, default=None, metavar='DAYS',
+                            help='Renew certificates that expire within passed-in number of days.')
+    bulk_group.add_argument('--jobs', '-j', type=int, default=None, help='''Number of worker processes to use for renewing \
+    certificates. Default is to use one worker process per available CPU.''')
+
     def renew_wrapper(args):
         project_directory = os.getcwd()
 
-        return renew(sys.stdout, sys.stderr, project_directory, args.entity_type, args.entity_name, args.new_private_key, args.csr, args.dns_names)
+        if args.all or args.name_glob is not None or args.expiring_within is not None:
+            if args.entity_name is not None:
+                subparser.error("argument entity_name: cannot be used together with bulk renewal options")
+
+            if args.new_private_key or args.csr is not None or args.dns_names is not None or args.key_specification is not None:
+                subparser.error("bulk renewal options cannot be used together with --new-private-key, --csr, --update-dns-names, "
+                                "or --key-specification options")
+
+            entity_types = [args.entity_type] if args.entity_type else ['server', 'client']
+
+            return renew_bulk(sys.stdout, sys.stderr, project_directory, entity_types, args.name_glob, args.expiring_within, args.jobs)
+
+        if args.entity_type is None or args.entity_name is None:
+            subparser.error("the following arguments are required: entity_type, entity_name")
+
+        if args.jobs is not None:
+            subparser.error("argument --jobs/-j: can be used only together with bulk renewal options")
+
+        if args.key_specification is not None and not args.new_private_key:
+            subparser.error("argument --key-specification/-k: can be used only together with the --new-private-key option")
+
+        # Standard input is not available to the daemon.
+        if args.csr != '-':
+            status_code = forward_command(sys.stdout, sys.stderr, project_directory, 'renew', {
+                'entity_type': args.entity_type,
+                'entity_name': args.entity_name,
+                'generate_new_private_key': args.new_private_key,
+                'custom_csr_path': absolute_path(args.csr),
+                'dns_names': args.dns_names,
+                'key_specification': args.key_specification,
+            })
+
+            if status_code is not None:
+                return status_code
+
+        return renew(sys.stdout, sys.stderr, project_directory, args.entity_type, args.entity_name, args.new_private_key, args.csr, args.dns_names,
+                     args.key_specification)
 
     subparser.set_defaults(func=renew_wrapper)
 
@@ -185,11 +385,22 @@ def setup_renew_subcommand_parser(parser, subparsers):
 def setup_status_subcommand_parser(parser, subparsers):
 
     subparser = subparsers.add_parser(name="status", description="Shows status information about issued certificates.")
+    subparser.add_argument('--rebuild-index', '-r', action='store_true', help='''Rebuild the status index by re-reading all issued \
+    certificates. Normally only certificates that have changed since the last run are read.''')
+    subparser.add_argument('--format', '-f', dest='output_format', choices=STATUS_OUTPUT_FORMATS, default='text',
+                           help='''Output format. Machine-readable formats (json, jsonl, csv) contain one record per CA level, \
+    server, and client entity. Default is %(default)s.''')
 
     def status_wrapper(args):
         project_directory = os.getcwd()
 
-        status(sys.stdout, sys.stderr, project_directory)
+        status_code = forward_command(sys.stdout, sys.stderr, project_directory, 'status', {
+            'rebuild_index': args.rebuild_index,
+            'output_format': args.output_format,
+        })
+
+        if status_code is None:
+            status(sys.stdout, sys.stderr, project_directory, args.rebuild_index, args.output_format)
 
         return ExitCode.SUCCESS
 
@@ -198,6 +409,195 @@ def setup_status_subcommand_parser(parser, subparsers):
     return subparser
 
 
+@subcommand_parser
+def setup_metrics_subcommand_parser(parser, subparsers):
+
+    subparser = subparsers.add_parser(name="metrics", description='''Exports Prometheus metrics about certificate expiry, and number of \
+    issued, expired, and not yet valid certificates.''')
+    subparser.add_argument('--textfile', '-o', default=None, help='''Write metrics to specified file instead of standard output. File \
+    is replaced atomically, which makes it suitable for the textfile collector of Prometheus node exporter.''')
+    subparser.add_argument('--rebuild-index', '-r', action='store_true', help='''Rebuild the status index by re-reading all issued \
+    certificates. Normally only certificates that have changed since the last run are read.''')
+
+    def metrics_wrapper(args):
+        project_directory = os.getcwd()
+
+        return metrics(sys.stdout, sys.stderr, project_directory, absolute_path(args.textfile), args.rebuild_index)
+
+    subparser.set_defaults(func=metrics_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_export_files_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('export-files', description='''Writes-out CA hierarchy and artefacts of all issued certificates \
+    as PEM files, using the same layout as the files storage backend. Useful for projects that use the SQLite storage backend.''')
+    subparser.add_argument('output_directory', nargs='?', default=None, help='''Directory where files should be written-out. Default \
+    is the .gimmecert directory of the project.''')
+
+    def export_files_wrapper(args):
+        project_directory = os.getcwd()
+
+        return export_files(sys.stdout, sys.stderr, project_directory, absolute_path(args.output_directory))
+
+    subparser.set_defaults(func=export_files_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_pool_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('pool', description='''Manages pool of pre-generated private keys. Pooled keys are used \
+    instead of generating new ones when issuing or renewing certificates. Shows number of available keys if invoked without a command.''')
+
+    pool_subparsers = subparser.add_subparsers()
+
+    fill_subparser = pool_subparsers.add_parser('fill', description='Pre-generates private keys and adds them to the pool.')
+    fill_subparser.add_argument('count', type=int, help='Number of private keys to add to the pool.')
+    fill_subparser.add_argument('--key-specification', '-k', type=key_specification, default='rsa:2048',
+                                help=KEY_SPECIFICATION_HELP + ' Default is rsa:2048.')
+
+    def pool_status_wrapper(args):
+        project_directory = os.getcwd()
+
+        return pool_status(sys.stdout, sys.stderr, project_directory)
+
+    def pool_fill_wrapper(args):
+        project_directory = os.getcwd()
+
+        return pool_fill(sys.stdout, sys.stderr, project_directory, args.count, args.key_specification)
+
+    subparser.set_defaults(func=pool_status_wrapper)
+    fill_subparser.set_defaults(func=pool_fill_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_batch_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('batch', description='''Issues server and client certificates for all entities listed in a \
+    manifest. Manifest can be provided in JSON (.json), CSV (.csv), or YAML (.yaml, .yml) format.''')
+    subparser.add_argument('manifest', help='''Path to manifest. Manifest lists entities, where each entity has a type (server or client), \
+    name, optional additional DNS names (dns_names), and optional path to CSR (csr).''')
+    subparser.add_argument('--jobs', '-j', type=int, default=None, help='''Number of worker processes to use for private key generation \
+    and certificate signing. Default is to use number of available CPUs.''')
+    subparser.add_argument('--key-specification', '-k', type=key_specification, default='rsa:2048',
+                           help=KEY_SPECIFICATION_HELP + ''' Applies to entities that do not specify key specification in the manifest. \
+    Default is rsa:2048.''')
+
+    def batch_wrapper(args):
+        project_directory = os.getcwd()
+
+        return batch(sys.stdout, sys.stderr, project_directory, args.manifest, args.jobs, args.key_specification)
+
+    subparser.set_defaults(func=batch_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_sign_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('sign', description='''Issues server or client certificates for multiple CSRs. Entity names \
+    are taken from common names in CSR subjects, falling back to CSR file names. Only the public key and common name are used from CSRs.''')
+    subparser.add_argument('--type', '-t', dest='entity_type', required=True, choices=['server', 'client'],
+                           help='''Type of certificates to issue.''')
+    subparser.add_argument('--jobs', '-j', type=int, default=None, help='''Number of worker processes to use for verifying CSR \
+    signatures. Default is to use number of available CPUs.''')
+    subparser.add_argument('csr_source', help='''Directory with CSR files (ending in .csr.pem or .csr), file with one or more \
+    concatenated CSRs, or "-" to read one or more concatenated CSRs from standard input.''')
+
+    def sign_wrapper(args):
+        project_directory = os.getcwd()
+        csr_source = args.csr_source if args.csr_source == '-' else absolute_path(args.csr_source)
+
+        return sign(sys.stdout, sys.stderr, project_directory, args.entity_type, csr_source, args.jobs)
+
+    subparser.set_defaults(func=sign_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_watch_spool_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('watch-spool', description='''Watches spool directory for CSR files (ending in .csr.pem), \
+    and issues server or client certificates for them as they arrive. Entity names are determined in the same way as for the sign \
+    command. Processed CSRs are moved into the .gimmecert directory, next to issued certificates, while CSRs that could not be \
+    processed are moved into the rejected sub-directory of the spool directory. Stop watching with Ctrl-C or by sending the TERM \
+    signal.''')
+    subparser.add_argument('--type', '-t', dest='entity_type', required=True, choices=['server', 'client'],
+                           help='''Type of certificates to issue.''')
+    subparser.add_argument('--debounce', '-d', type=float, default=0.2, help='''Number of seconds without new CSR files after which \
+    the accumulated CSR files get processed as a single batch. Default is 0.2.''')
+    subparser.add_argument('--poll-interval', '-i', type=float, default=1.0, help='''Number of seconds between consecutive checks \
+    of spool directory when inotify is not available. Default is 1.0.''')
+    subparser.add_argument('--poll', '-p', action='store_true', help='''Always use polling instead of inotify. Useful for network file \
+    systems, where inotify does not report changes made by other hosts.''')
+    subparser.add_argument('spool_directory', help='''Spool directory to watch for CSR files.''')
+
+    def watch_spool_wrapper(args):
+        project_directory = os.getcwd()
+
+        # Make sure the watcher stops cleanly when terminated.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        return watch_spool(sys.stdout, sys.stderr, project_directory, absolute_path(args.spool_directory), args.entity_type,
+                           args.debounce, args.poll_interval, not args.poll)
+
+    subparser.set_defaults(func=watch_spool_wrapper)
+
+    return subparser
+
+
+@subcommand_parser
+def setup_serve_subcommand_parser(parser, subparsers):
+    subparser = subparsers.add_parser('serve', description='''Runs daemon that keeps the CA hierarchy and pre-generated private keys \
+    in memory. While the daemon is running, server, client, renew, and status commands are forwarded to it automatically. Stop the daemon \
+    with Ctrl-C or by sending it the TERM signal.''')
+    subparser.add_argument('--socket', '-s', type=str, default=None, help='''Path to Unix socket where the daemon should listen for \
+    requests. Default is .gimmecert/daemon.sock. When using a non-default path, set the GIMMECERT_SOCKET environment variable to the same \
+    path for commands to be forwarded to the daemon.''')
+    subparser.add_argument('--key-pool-size', '-n', type=int, default=10, help='''Number of private keys to keep pre-generated in memory \
+    for each key specification. Default is 10.''')
+
+    def serve_wrapper(args):
+        project_directory = os.getcwd()
+
+        # Make sure the daemon cleans-up after itself when terminated.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        return serve(sys.stdout, sys.stderr, project_directory, absolute_path(args.socket), args.key_pool_size)
+
+    subparser.set_defaults(func=serve_wrapper)
+
+    return subparser
+
+
+def forward_command(stdout, stderr, project_directory, command, arguments):
+    """
+    Forwards command to the daemon serving the project. See
+    gimmecert.daemon.forward_command for details. Daemon module is
+    imported only once a command that can be forwarded is run.
+    """
+
+    import gimmecert.daemon
+
+    with gimmecert.timings.phase('daemon.forward'):
+        return gimmecert.daemon.forward_command(stdout, stderr, project_directory, command, arguments)
+
+
+def absolute_path(path):
+    """
+    Small helper that converts passed-in path into absolute path,
+    leaving None as is.
+    """
+
+    if path is None:
+        return None
+
+    return os.path.abspath(path)
+
+
 def get_parser():
     """
     Sets-up and returns a CLI argument parser.
@@ -205,7 +605,7 @@ def get_parser():
     :returns: argparse.ArgumentParser -- argument parser for CLI.
     """
 
-    parser = argparse.ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser = ArgumentParser(description=DESCRIPTION, formatter_class=argparse.RawDescriptionHelpFormatter)
 
     def usage_wrapper(args):
         return usage(sys.stdout, sys.stderr, parser)
@@ -217,9 +617,43 @@ def get_parser():
     for setup_subcommad_parser in get_subcommand_parser_setup_functions():
         setup_subcommad_parser(parser, subparsers)
 
+    add_instrumentation_arguments(parser)
+
     return parser
 
 
+def add_instrumentation_arguments(parser, suppress_defaults=False):
+    """
+    Adds options for instrumenting command execution to the passed-in
+    parser, and (recursively) to all of its subcommand parsers. This
+    allows the options to be passed-in both before and after the
+    subcommand name.
+
+    :param parser: Parser to add the options to.
+    :type parser: argparse.ArgumentParser
+
+    :param suppress_defaults: Specify if default values and help should be suppressed. Used for subcommand parsers, so they do not
+        override values parsed by the parent parser. Options are documented only once, in the top-level parser help.
+    :type suppress_defaults: bool
+    """
+
+    if suppress_defaults:
+        parser.add_argument('--timings', action='store_true', default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+        parser.add_argument('--profile', metavar='PATH', default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    else:
+        parser.add_argument('--timings', action='store_true', default=False,
+                            help='''Report breakdown of wall time spent in each phase of command execution (such as ca.load, \
+    key.generate, certificate.sign, or storage.write) to standard error. Can be passed-in before or after the command name.''')
+        parser.add_argument('--profile', metavar='PATH', default=None,
+                            help='''Profile the command using cProfile, and write profiling data to passed-in path. Data can be \
+    inspected using the pstats module (python -m pstats PATH). Can be passed-in before or after the command name.''')
+
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            for subparser in action.choices.values():
+                add_instrumentation_arguments(subparser, suppress_defaults=True)
+
+
 def main():
     """
     This function is a CLI entry point for the tool. It is a thin
@@ -230,12 +664,38 @@ def main():
     callback function as a default parameter for attribute
     'func'. This attribute is then invoked by the main function,
     passing-in all the parsed arguments while at it.
+
+    Command execution can be instrumented by passing-in the --timings
+    and --profile options (see add_instrumentation_arguments).
     """
 
+    started = time.perf_counter()
+
     parser = get_parser()
     args = parser.parse_args()
 
-    status_code = args.func(args)
+    recorder = None
+    profiler = None
+
+    if args.timings:
+        recorder = gimmecert.timings.start_recording(started)
+        recorder.add('cli.parse', time.perf_counter() - started)
+
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        status_code = args.func(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+        if recorder is not None:
+            gimmecert.timings.stop_recording()
+            recorder.report(sys.stderr)
 
     if status_code != ExitCode.SUCCESS:
         exit(status_code)
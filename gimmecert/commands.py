@@ -18,14 +18,21 @@
 # Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import collections
 import os
 import datetime
 import sys
+import time
 
-import gimmecert.crypto
-import gimmecert.storage
+import gimmecert.locking
+import gimmecert.project
 import gimmecert.utils
 
+# Modules that depend on cryptography (crypto, parallel, and storage),
+# as well as the daemon and spool modules, are imported within functions
+# that use them, in order to keep the commands that do not need them
+# (like help) fast.
+
 
 class ExitCode:
     """
@@ -37,6 +44,39 @@ class ExitCode:
     ERROR_NOT_INITIALISED = 11
     ERROR_CERTIFICATE_ALREADY_ISSUED = 12
     ERROR_UNKNOWN_ENTITY = 13
+    ERROR_INVALID_MANIFEST = 14
+    ERROR_BATCH_FAILED = 15
+    ERROR_DAEMON_ALREADY_RUNNING = 16
+    ERROR_DAEMON_SOCKET = 17
+    ERROR_SIGNING_FAILED = 18
+    ERROR_METRICS_WRITE_FAILED = 19
+    ERROR_DAEMON_REQUEST_FAILED = 20
+
+
+#: Names of storage backends that can be used when initialising the
+#: project (see gimmecert.storage.STORAGE_BACKENDS). Kept here in order
+#: to avoid importing the storage module when setting-up the CLI.
+STORAGE_BACKEND_NAMES = ('files', 'sqlite')
+
+#: File name suffixes of CSR files that get picked-up when signing CSRs
+#: from a directory.
+CSR_FILE_SUFFIXES = ('.csr.pem', '.csr')
+
+#: Output formats supported by the status command.
+STATUS_OUTPUT_FORMATS = ('text', 'json', 'jsonl', 'csv')
+
+#: Fields of status records, in order in which they are written-out in
+#: machine-readable status output formats.
+STATUS_RECORD_FIELDS = ('type', 'name', 'subject', 'validity', 'validity_status', 'dns_names', 'private_key', 'csr', 'certificate')
+
+#: Metrics exported by the metrics command, mapped to their help
+#: strings. All metrics are gauges.
+METRICS = collections.OrderedDict([
+    ('gimmecert_certificate_expiry_seconds', "Seconds until certificate expires. Negative for expired certificates."),
+    ('gimmecert_certificates', "Number of certificates by type."),
+    ('gimmecert_certificates_expired', "Number of expired certificates by type."),
+    ('gimmecert_certificates_not_valid_yet', "Number of certificates by type that are not valid yet."),
+])
 
 
 class InvalidCommandInvocation(Exception):
@@ -46,7 +86,52 @@ class InvalidCommandInvocation(Exception):
     pass
 
 
-def init(stdout, stderr, project_directory, ca_base_name, ca_hierarchy_depth):
+def get_private_key(project_directory, key_specification):
+    """
+    Obtains a private key for issuing an end entity certificate. Key
+    is taken from the project key pool if available, and generated
+    otherwise.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param key_specification: Key specification for the private key. See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Private key.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+    """
+
+    return gimmecert.project.Project(project_directory).get_private_key(key_specification)
+
+
+def read_custom_csr(stderr, custom_csr_path):
+    """
+    Reads custom CSR passed-in to one of the issuance commands.
+
+    :param stderr: Output stream where the prompt for CSR should be written-out when reading from standard input.
+    :type stderr: io.IOBase
+
+    :param custom_csr_path: Path to custom CSR, ``-`` to read CSR from standard input, or None or "" if no custom CSR was passed-in.
+    :type custom_csr_path: str or None
+
+    :returns: CSR, or None if no custom CSR was passed-in.
+    :rtype: cryptography.x509.CertificateSigningRequest or None
+    """
+
+    import gimmecert.storage
+
+    if custom_csr_path == "-":
+        csr_pem = gimmecert.utils.read_input(sys.stdin, stderr, "Please enter the CSR")
+        return gimmecert.utils.csr_from_pem(csr_pem)
+    elif custom_csr_path:
+        return gimmecert.storage.read_csr(custom_csr_path)
+
+    return None
+
+
+def init(stdout, stderr, project_directory, ca_base_name, ca_hierarchy_depth, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION,
+         storage_backend='files', jobs=None):
     """
     Initialises the necessary directory and CA hierarchies for use in
     the specified directory.
@@ -66,36 +151,25 @@ def init(stdout, stderr, project_directory, ca_base_name, ca_hierarchy_depth):
     :param ca_hierarchy_depth: Length/depths of CA hierarchy that should be initialised. E.g. total number of CAs in chain.
     :type ca_hierarchy_depth: int
 
+    :param key_specification: Key specification to use for generating CA private keys. See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :param storage_backend: Name of storage backend to use for storing artefacts, one of STORAGE_BACKEND_NAMES.
+    :type storage_backend: str
+
+    :param jobs: Maximum number of worker processes to use for generating CA private keys. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
     :returns: Status code, one from gimmecert.commands.ExitCode.
     :rtype: int
     """
 
-    # Set-up various paths.
-    base_directory = os.path.join(project_directory, '.gimmecert')
-    ca_directory = os.path.join(base_directory, 'ca')
-
-    if os.path.exists(base_directory):
+    try:
+        gimmecert.project.Project(project_directory).initialise(ca_base_name, ca_hierarchy_depth, key_specification, storage_backend, jobs)
+    except gimmecert.project.AlreadyInitialisedError:
         print("CA hierarchy has already been initialised.", file=stderr)
         return ExitCode.ERROR_ALREADY_INITIALISED
 
-    # Initialise the directory.
-    gimmecert.storage.initialise_storage(project_directory)
-
-    # Generate the CA hierarchy.
-    ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy(ca_base_name, ca_hierarchy_depth)
-
-    # Output the CA private keys and certificates.
-    for level, (private_key, certificate) in enumerate(ca_hierarchy, 1):
-        private_key_path = os.path.join(ca_directory, 'level%d.key.pem' % level)
-        certificate_path = os.path.join(ca_directory, 'level%d.cert.pem' % level)
-        gimmecert.storage.write_private_key(private_key, private_key_path)
-        gimmecert.storage.write_certificate(certificate, certificate_path)
-
-    # Output the certificate chain.
-    full_chain = [certificate for _, certificate in ca_hierarchy]
-    full_chain_path = os.path.join(ca_directory, 'chain-full.cert.pem')
-    gimmecert.storage.write_certificate_chain(full_chain, full_chain_path)
-
     print("CA hierarchy initialised. Generated artefacts:", file=stdout)
     for level in range(1, ca_hierarchy_depth+1):
         print("    CA Level %d private key: .gimmecert/ca/level%d.key.pem" % (level, level), file=stdout)
@@ -103,10 +177,15 @@ def init(stdout, stderr, project_directory, ca_base_name, ca_hierarchy_depth):
 
     print("    Full certificate chain: .gimmecert/ca/chain-full.cert.pem", file=stdout)
 
+    if storage_backend != 'files':
+        print("", file=stdout)
+        print("Artefacts are stored in %s storage backend. Run the gimmecert export-files command to write them out as files." % storage_backend,
+              file=stdout)
+
     return ExitCode.SUCCESS
 
 
-def server(stdout, stderr, project_directory, entity_name, extra_dns_names, custom_csr_path):
+def server(stdout, stderr, project_directory, entity_name, extra_dns_names, custom_csr_path, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
     """
     Issues a server certificate using the CA hierarchy initialised
     within the specified directory.
@@ -136,59 +215,39 @@ def server(stdout, stderr, project_directory, entity_name, extra_dns_names, cust
     :param custom_csr_path: Path to custom certificate signing request to use for issuing client certificate. Set to None or "" to generate private key.
     :type custom_csr_path: str or None
 
+    :param key_specification: Key specification to use when generating private key. Ignored if custom CSR is passed-in.
+        See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
     :returns: Status code, one from gimmecert.commands.ExitCode.
     :rtype: int
     """
 
-    # Set-up some paths for outputting artefacts.
-    private_key_path = os.path.join(project_directory, '.gimmecert', 'server', '%s.key.pem' % entity_name)
-    certificate_path = os.path.join(project_directory, '.gimmecert', 'server', '%s.cert.pem' % entity_name)
-    csr_path = os.path.join(project_directory, '.gimmecert', 'server', '%s.csr.pem' % entity_name)
+    project = gimmecert.project.Project(project_directory)
+    already_issued_message = "Refusing to overwrite existing data. Certificate has already been issued for server %s." % entity_name
 
     # Ensure hierarchy is initialised.
-    if not gimmecert.storage.is_initialised(project_directory):
+    if not project.is_initialised():
         print("CA hierarchy must be initialised prior to issuing server certificates. Run the gimmecert init command first.", file=stderr)
         return ExitCode.ERROR_NOT_INITIALISED
 
-    # Ensure artefacts do not exist already.
-    if os.path.exists(private_key_path) or os.path.exists(certificate_path) or os.path.exists(csr_path):
-        print("Refusing to overwrite existing data. Certificate has already been issued for server %s." % entity_name, file=stderr)
+    # Avoid prompting for the CSR if certificate cannot be issued anyway.
+    if project.storage.entity_exists('server', entity_name):
+        print(already_issued_message, file=stderr)
         return ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
 
-    # Grab the private key or CSR, and extract public key.
-    if custom_csr_path == "-":
-        csr_pem = gimmecert.utils.read_input(sys.stdin, stderr, "Please enter the CSR")
-        csr = gimmecert.utils.csr_from_pem(csr_pem)
-        public_key = csr.public_key()
-        private_key = None
-    elif custom_csr_path:
-        csr = gimmecert.storage.read_csr(custom_csr_path)
-        public_key = csr.public_key()
-        private_key = None
-    else:
-        private_key = gimmecert.crypto.generate_private_key()
-        public_key = private_key.public_key()
-        csr = None
-
-    # Grab the issuing CA private key and certificate.
-    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(os.path.join(project_directory, '.gimmecert', 'ca'))
-    issuer_private_key, issuer_certificate = ca_hierarchy[-1]
-
-    # Issue the certificate.
-    certificate = gimmecert.crypto.issue_server_certificate(entity_name, public_key, issuer_private_key, issuer_certificate, extra_dns_names)
-
-    # Output CSR or private key depending on what has been passed-in.
-    if csr:
-        gimmecert.storage.write_csr(csr, csr_path)
-    else:
-        gimmecert.storage.write_private_key(private_key, private_key_path)
+    csr = read_custom_csr(stderr, custom_csr_path)
 
-    gimmecert.storage.write_certificate(certificate, certificate_path)
+    try:
+        entity = project.issue_server(entity_name, extra_dns_names, csr, key_specification)
+    except gimmecert.project.CertificateAlreadyIssuedError:
+        print(already_issued_message, file=stderr)
+        return ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
 
     # Show user information about generated artefacts.
     print("Server certificate issued.", file=stdout)
 
-    if csr:
+    if entity.csr:
         print("Server CSR: .gimmecert/server/%s.csr.pem" % entity_name, file=stdout)
     else:
         print("Server private key: .gimmecert/server/%s.key.pem" % entity_name, file=stdout)
@@ -242,7 +301,7 @@ def usage(stdout, stderr, parser):
     return ExitCode.SUCCESS
 
 
-def client(stdout, stderr, project_directory, entity_name, custom_csr_path):
+def client(stdout, stderr, project_directory, entity_name, custom_csr_path, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
     """
     Issues a client certificate using the CA hierarchy initialised
     within the specified directory.
@@ -269,57 +328,39 @@ def client(stdout, stderr, project_directory, entity_name, custom_csr_path):
     :param custom_csr_path: Path to custom certificate signing request to use for issuing client certificate. Set to None or "" to generate private key.
     :type custom_csr_path: str or None
 
+    :param key_specification: Key specification to use when generating private key. Ignored if custom CSR is passed-in.
+        See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
     :returns: Status code, one from gimmecert.commands.ExitCode.
     :rtype: int
     """
 
-    # Set-up paths where we will output artefacts.
-    private_key_path = os.path.join(project_directory, '.gimmecert', 'client', '%s.key.pem' % entity_name)
-    certificate_path = os.path.join(project_directory, '.gimmecert', 'client', '%s.cert.pem' % entity_name)
-    csr_path = os.path.join(project_directory, '.gimmecert', 'client', '%s.csr.pem' % entity_name)
+    project = gimmecert.project.Project(project_directory)
+    already_issued_message = "Refusing to overwrite existing data. Certificate has already been issued for client %s." % entity_name
 
     # Ensure hierarchy is initialised.
-    if not gimmecert.storage.is_initialised(project_directory):
+    if not project.is_initialised():
         print("CA hierarchy must be initialised prior to issuing client certificates. Run the gimmecert init command first.", file=stderr)
         return ExitCode.ERROR_NOT_INITIALISED
 
-    # Ensure artefacts do not exist already.
-    if os.path.exists(private_key_path) or os.path.exists(certificate_path) or os.path.exists(csr_path):
-        print("Refusing to overwrite existing data. Certificate has already been issued for client %s." % entity_name, file=stderr)
+    # Avoid prompting for the CSR if certificate cannot be issued anyway.
+    if project.storage.entity_exists('client', entity_name):
+        print(already_issued_message, file=stderr)
         return ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
 
-    # Grab the issuing CA private key and certificate.
-    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(os.path.join(project_directory, '.gimmecert', 'ca'))
-    issuer_private_key, issuer_certificate = ca_hierarchy[-1]
-
-    # Either read public key from CSR, or generate a new private key.
-    if custom_csr_path == "-":
-        csr_pem = gimmecert.utils.read_input(sys.stdin, stderr, "Please enter the CSR")
-        csr = gimmecert.utils.csr_from_pem(csr_pem)
-        public_key = csr.public_key()
-    elif custom_csr_path:
-        csr = gimmecert.storage.read_csr(custom_csr_path)
-        public_key = csr.public_key()
-    else:
-        private_key = gimmecert.crypto.generate_private_key()
-        public_key = private_key.public_key()
+    csr = read_custom_csr(stderr, custom_csr_path)
 
-    # Issue certificate using the passed-in information and
-    # appropriate public key.
-    certificate = gimmecert.crypto.issue_client_certificate(entity_name, public_key, issuer_private_key, issuer_certificate)
-
-    # Output CSR or private key depending on what was provided.
-    if custom_csr_path:
-        gimmecert.storage.write_csr(csr, csr_path)
-    else:
-        gimmecert.storage.write_private_key(private_key, private_key_path)
-
-    gimmecert.storage.write_certificate(certificate, certificate_path)
+    try:
+        entity = project.issue_client(entity_name, csr, key_specification)
+    except gimmecert.project.CertificateAlreadyIssuedError:
+        print(already_issued_message, file=stderr)
+        return ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
 
     # Show user information about generated artefacts.
     print("Client certificate issued.", file=stdout)
 
-    if custom_csr_path:
+    if entity.csr:
         print("Client CSR: .gimmecert/client/%s.csr.pem" % entity_name, file=stdout)
     else:
         print("Client private key: .gimmecert/client/%s.key.pem" % entity_name, file=stdout)
@@ -329,7 +370,7 @@ def client(stdout, stderr, project_directory, entity_name, custom_csr_path):
     return ExitCode.SUCCESS
 
 
-def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_new_private_key, custom_csr_path, dns_names):
+def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_new_private_key, custom_csr_path, dns_names, key_specification=None):
     """
     Renews existing certificate, while optionally generating a new
     private key in the process. Naming and extensions are preserved.
@@ -359,6 +400,10 @@ def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_
         set the value to empty list. To keep the existing DNS names, set the value to None. Valid only for server certificates.
     :type dns_names: list[str] or None
 
+    :param key_specification: Key specification to use when generating new private key. Set to None (default) to use same key
+        specification as the existing certificate. Valid only when generating new private key.
+    :type key_specification: (str, int or str or None) or None
+
     :returns: Status code, one from gimmecert.commands.ExitCode.
     :rtype: int
     """
@@ -370,69 +415,38 @@ def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_
     if dns_names is not None and entity_type != "server":
         raise InvalidCommandInvocation("Updating DNS subject alternative names can be done only for server certificates.")
 
-    # Set-up paths to possible artefacts.
-    private_key_path = os.path.join(project_directory, '.gimmecert', entity_type, '%s.key.pem' % entity_name)
-    csr_path = os.path.join(project_directory, '.gimmecert', entity_type, '%s.csr.pem' % entity_name)
-    certificate_path = os.path.join(project_directory, '.gimmecert', entity_type, '%s.cert.pem' % entity_name)
+    if key_specification is not None and not generate_new_private_key:
+        raise InvalidCommandInvocation("Key specification can be passed-in only when generating new private key.")
+
+    project = gimmecert.project.Project(project_directory)
+    unknown_entity_message = "Cannot renew certificate. No existing certificate found for %s %s." % (entity_type, entity_name)
 
     # Ensure the hierarchy has been previously initialised.
-    if not gimmecert.storage.is_initialised(project_directory):
+    if not project.is_initialised():
         print("No CA hierarchy has been initialised yet. Run the gimmecert init command and issue some certificates first.", file=stderr)
 
         return ExitCode.ERROR_NOT_INITIALISED
 
-    # Ensure certificate has already been issued.
-    if not os.path.exists(certificate_path):
-        print("Cannot renew certificate. No existing certificate found for %s %s." % (entity_type, entity_name), file=stderr)
+    # Ensure certificate has already been issued (before prompting for
+    # the CSR).
+    if not project.storage.entity_exists(entity_type, entity_name):
+        print(unknown_entity_message, file=stderr)
 
         return ExitCode.ERROR_UNKNOWN_ENTITY
 
-    # Grab the signing CA private key and certificate.
-    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(os.path.join(project_directory, '.gimmecert', 'ca'))
-    issuer_private_key, issuer_certificate = ca_hierarchy[-1]
-
-    # Information will be extracted from the old certificate.
-    old_certificate = gimmecert.storage.read_certificate(certificate_path)
-
-    # Generate new private key and use its public key for new
-    # certificate. Otherwise just reuse existing public key in
-    # certificate.
-    if generate_new_private_key:
-        private_key = gimmecert.crypto.generate_private_key()
-        gimmecert.storage.write_private_key(private_key, private_key_path)
-        public_key = private_key.public_key()
-    elif custom_csr_path == '-':
-        csr_pem = gimmecert.utils.read_input(sys.stdin, stderr, "Please enter the CSR")
-        csr = gimmecert.utils.csr_from_pem(csr_pem)
-        gimmecert.storage.write_csr(csr, csr_path)
-        public_key = csr.public_key()
-    elif custom_csr_path:
-        csr = gimmecert.storage.read_csr(custom_csr_path)
-        gimmecert.storage.write_csr(csr, csr_path)
-        public_key = csr.public_key()
-    else:
-        public_key = old_certificate.public_key()
+    old_key_or_csr = project.storage.get_key_or_csr(entity_type, entity_name)
+    csr = None if generate_new_private_key else read_custom_csr(stderr, custom_csr_path)
 
-    # Issue and write out the new certificate.
-    if entity_type == 'server' and dns_names is not None:
-        certificate = gimmecert.crypto.issue_server_certificate(entity_name, public_key, issuer_private_key, issuer_certificate, dns_names)
-    else:
-        certificate = gimmecert.crypto.renew_certificate(old_certificate, public_key, issuer_private_key, issuer_certificate)
-    gimmecert.storage.write_certificate(certificate, certificate_path)
+    try:
+        entity = project.renew(entity_type, entity_name, generate_new_private_key, csr, dns_names, key_specification)
+    except gimmecert.project.UnknownEntityError:
+        print(unknown_entity_message, file=stderr)
 
-    # Replace private key with CSR.
-    if custom_csr_path and os.path.exists(private_key_path):
-        os.remove(private_key_path)
-        private_key_replaced_with_csr = True
-    else:
-        private_key_replaced_with_csr = False
+        return ExitCode.ERROR_UNKNOWN_ENTITY
 
-    # Replace CSR with private key.
-    if generate_new_private_key and os.path.exists(csr_path):
-        os.remove(csr_path)
-        csr_replaced_with_private_key = True
-    else:
-        csr_replaced_with_private_key = False
+    private_key_replaced_with_csr = entity.csr is not None and old_key_or_csr == 'key'
+    csr_replaced_with_private_key = entity.private_key is not None and old_key_or_csr == 'csr'
+    key_or_csr = 'csr' if entity.csr_path else 'key' if entity.private_key_path else None
 
     # Type of artefacts reported depending on whether the private key
     # or CSR are present.
@@ -451,13 +465,13 @@ def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_
         print("CSR used for issuance of previous certificate has been removed, and a private key has been generated in its place.", file=stdout)
 
     # Output information about private key or CSR path.
-    if os.path.exists(csr_path):
+    if key_or_csr == 'csr':
         print("{entity_type_titled} CSR: .gimmecert/{entity_type}/{entity_name}.csr.pem"
               .format(entity_type_titled=entity_type.title(),
                       entity_type=entity_type,
                       entity_name=entity_name),
               file=stdout)
-    elif os.path.exists(private_key_path):
+    elif key_or_csr == 'key':
         print("{entity_type_titled} private key: .gimmecert/{entity_type}/{entity_name}.key.pem"
               .format(entity_type_titled=entity_type.title(),
                       entity_type=entity_type,
@@ -474,11 +488,132 @@ def renew(stdout, stderr, project_directory, entity_type, entity_name, generate_
     return ExitCode.SUCCESS
 
 
-def status(stdout, stderr, project_directory):
+def renew_bulk(stdout, stderr, project_directory, entity_types=('server', 'client'), name_glob=None, expiring_within=None, jobs=None):
+    """
+    Renews all issued certificates matching the passed-in selection
+    criteria. Certificates are renewed using their existing public keys
+    (and naming and extensions), and spread across a pool of worker
+    processes.
+
+    Entities are selected using the status index (see
+    gimmecert.storage.FilesystemBackend.select_entities), so artefacts
+    of entities that do not match the criteria are never read. The
+    issuing CA is read only once, irrespective of the number of renewed
+    certificates.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the artefacts are stored.
+    :type project_directory: str
+
+    :param entity_types: Types of entities to renew certificates for. Supported values are ``server`` and ``client``.
+    :type entity_types: collections.abc.Iterable[str]
+
+    :param name_glob: Shell-style wildcard pattern that entity names must match. Set to None (default) to match all names.
+    :type name_glob: str or None
+
+    :param expiring_within: Renew only certificates that expire within passed-in number of days. Set to None (default) to
+        renew certificates irrespective of their expiry.
+    :type expiring_within: int or None
+
+    :param jobs: Maximum number of worker processes to use. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.parallel
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("No CA hierarchy has been initialised yet. Run the gimmecert init command and issue some certificates first.", file=stderr)
+
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    # Selected entities are locked as a whole, since bulk renewal can
+    # cover any number of entities.
+    with gimmecert.locking.project_lock(project_directory, exclusive=True):
+        storage = gimmecert.storage.get_storage_backend(project_directory)
+
+        if expiring_within is not None:
+            expiring_before = datetime.datetime.utcnow() + datetime.timedelta(days=expiring_within)
+        else:
+            expiring_before = None
+
+        selected = storage.select_entities(entity_types, name_glob, expiring_before)
+
+        if not selected:
+            print("No certificates matched the selection criteria.", file=stdout)
+
+            return ExitCode.SUCCESS
+
+        # Grab the signing CA private key and certificate.
+        ca_hierarchy = storage.read_ca_hierarchy()
+        issuer_private_key, issuer_certificate = ca_hierarchy[-1]
+        issuer_private_key_der = gimmecert.parallel.private_key_to_der(issuer_private_key)
+        issuer_certificate_der = gimmecert.parallel.certificate_to_der(issuer_certificate)
+
+        tasks = [(gimmecert.parallel.certificate_to_der(storage.read_certificate(entity_type, entity_name)), issuer_private_key_der, issuer_certificate_der)
+                 for entity_type, entity_name in selected]
+
+        results = gimmecert.parallel.run_tasks(gimmecert.parallel.renew_certificate_task, tasks, jobs)
+
+        # All certificates are replaced within a single transaction.
+        renewed_certificates = [(entity_type, entity_name, gimmecert.parallel.certificate_from_der(certificate_der), None, None)
+                                for (entity_type, entity_name), certificate_der in zip(selected, results)]
+        storage.write_entities(renewed_certificates)
+
+        for entity_type, entity_name in selected:
+            print("Renewed certificate for %s %s." % (entity_type, entity_name), file=stdout)
+
+        print("", file=stdout)
+        print("Renewed %d certificates." % len(renewed_certificates), file=stdout)
+
+        return ExitCode.SUCCESS
+
+
+def get_status_records(project_directory, rebuild_index=False):
+    """
+    Produces status records for CA hierarchy and issued certificates
+    in project directory. Records are produced one by one (see
+    gimmecert.project.Project.inventory for details).
+
+    Project directory must be initialised.
+
+    :param project_directory: Path to project directory under which the artefacts are looked-up.
+    :type project_directory: str
+
+    :param rebuild_index: Specify if status index should be rebuilt from scratch.
+    :type rebuild_index: bool
+
+    :returns: Generator producing status records.
+    :rtype: collections.abc.Iterator[dict]
+    """
+
+    return gimmecert.project.Project(project_directory).inventory(rebuild_index)
+
+
+def status(stdout, stderr, project_directory, rebuild_index=False, output_format='text'):
     """
     Displays information about initialised hierarchy and issued
     certificates in project directory.
 
+    Information about issued certificates is taken from the status
+    index, which is brought up-to-date before being displayed (see
+    gimmecert.storage.refresh_index). With SQLite storage backend,
+    information is instead read from indexed database columns.
+
+    In addition to human-readable text output, information can be
+    output in machine-readable formats (see STATUS_OUTPUT_FORMATS). In
+    machine-readable formats, one record is written-out per CA level,
+    server, and client entity (see get_status_records), as soon as it
+    is produced.
+
     :param stdout: Output stream where the informative messages should be written-out.
     :type stdout: io.IOBase
 
@@ -488,16 +623,29 @@ def status(stdout, stderr, project_directory):
     :param project_directory: Path to project directory under which the artefacts are looked-up.
     :type project_directory: str
 
+    :param rebuild_index: Specify if status index should be rebuilt from scratch.
+    :type rebuild_index: bool
+
+    :param output_format: Output format to use, one of STATUS_OUTPUT_FORMATS.
+    :type output_format: str
+
     :returns: Status code, one from gimmecert.commands.ExitCode.
     :rtype: int
     """
 
-    now = datetime.datetime.now()
+    import gimmecert.storage
 
     if not gimmecert.storage.is_initialised(project_directory):
-        print("CA hierarchy has not been initialised in current directory.", file=stdout)
+        # Keep machine-readable output clean.
+        print("CA hierarchy has not been initialised in current directory.", file=stdout if output_format == 'text' else stderr)
         return ExitCode.ERROR_NOT_INITIALISED
 
+    records = get_status_records(project_directory, rebuild_index)
+
+    if output_format != 'text':
+        gimmecert.utils.write_records(records, stdout, output_format, STATUS_RECORD_FIELDS)
+        return ExitCode.SUCCESS
+
     def get_section_title(title):
         """
         Small helper function that produces section title surrounded by
@@ -506,116 +654,1082 @@ def status(stdout, stderr, project_directory):
 
         return "%s\n%s\n%s" % ("-" * len(title), title, "-" * len(title))
 
-    print(get_section_title("CA hierarchy"), file=stdout)
+    validity_status_labels = {
+        'valid': "",
+        'expired': " [EXPIRED]",
+        'not valid yet': " [NOT VALID YET]",
+    }
+
+    ca_records = []
+    entity_records = {'server': [], 'client': []}
 
-    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(os.path.join(project_directory, '.gimmecert', 'ca'))
+    for record in records:
+        if record['type'] == 'ca':
+            ca_records.append(record)
+        else:
+            entity_records[record['type']].append(record)
+
+    print(get_section_title("CA hierarchy"), file=stdout)
 
-    for i, (_, certificate) in enumerate(ca_hierarchy, 1):
+    for i, record in enumerate(ca_records, 1):
         # Separator.
         print("", file=stdout)
 
-        if i == len(ca_hierarchy):
-            print(gimmecert.utils.dn_to_str(certificate.subject) + " [END ENTITY ISSUING CA]", file=stdout)
-        else:
-            print(gimmecert.utils.dn_to_str(certificate.subject), file=stdout)
-
-        if certificate.not_valid_before > now:
-            validity_status = " [NOT VALID YET]"
-        elif certificate.not_valid_after < now:
-            validity_status = " [EXPIRED]"
+        if i == len(ca_records):
+            print(record['subject'] + " [END ENTITY ISSUING CA]", file=stdout)
         else:
-            validity_status = ""
+            print(record['subject'], file=stdout)
 
-        print("    Validity: %s%s" % (gimmecert.utils.date_range_to_str(certificate.not_valid_before,
-                                                                        certificate.not_valid_after),
-                                      validity_status), file=stdout)
-        print("    Certificate: .gimmecert/ca/level%d.cert.pem" % i, file=stdout)
+        print("    Validity: %s%s" % (record['validity'], validity_status_labels[record['validity_status']]), file=stdout)
+        print("    Certificate: %s" % record['certificate'], file=stdout)
 
     # Separator.
     print("", file=stdout)
 
     print("Full certificate chain: .gimmecert/ca/chain-full.cert.pem", file=stdout)
 
-    # Section separator.
-    print("\n", file=stdout)
+    for entity_type, title in (('server', "Server certificates"), ('client', "Client certificates")):
 
-    print(get_section_title("Server certificates"), file=stdout)
+        # Section separator.
+        print("\n", file=stdout)
 
-    certificate_files = sorted([c for c in os.listdir(os.path.join(project_directory, '.gimmecert', 'server')) if c.endswith('.cert.pem')])
+        print(get_section_title(title), file=stdout)
 
-    if certificate_files:
-        for certificate_file in certificate_files:
-            certificate = gimmecert.storage.read_certificate(os.path.join(project_directory, '.gimmecert', 'server', certificate_file))
-            private_key_path = os.path.join(project_directory, '.gimmecert', 'server', certificate_file.replace('.cert.pem', '.key.pem'))
-            csr_path = os.path.join(project_directory, '.gimmecert', 'server', certificate_file.replace('.cert.pem', '.csr.pem'))
+        if not entity_records[entity_type]:
+            # Separator.
+            print("", file=stdout)
+            print("No %s certificates have been issued." % entity_type, file=stdout)
 
+        for record in entity_records[entity_type]:
             # Separator.
             print("", file=stdout)
 
-            if certificate.not_valid_before > now:
-                validity_status = " [NOT VALID YET]"
-            elif certificate.not_valid_after < now:
-                validity_status = " [EXPIRED]"
-            else:
-                validity_status = ""
-
-            print(gimmecert.utils.dn_to_str(certificate.subject), file=stdout)
-            print("    Validity: %s%s" % (gimmecert.utils.date_range_to_str(certificate.not_valid_before,
-                                                                            certificate.not_valid_after),
-                                          validity_status), file=stdout)
-            print("    DNS: %s" % ", ".join(gimmecert.utils.get_dns_names(certificate)), file=stdout)
-
-            if os.path.exists(private_key_path):
-                print("    Private key: .gimmecert/server/%s" % certificate_file.replace('.cert.pem', '.key.pem'), file=stdout)
-            elif os.path.exists(csr_path):
-                print("    CSR: .gimmecert/server/%s" % certificate_file.replace('.cert.pem', '.csr.pem'), file=stdout)
-
-            print("    Certificate: .gimmecert/server/%s" % certificate_file, file=stdout)
-    else:
-        # Separator.
-        print("", file=stdout)
-        print("No server certificates have been issued.", file=stdout)
+            print(record['subject'], file=stdout)
+            print("    Validity: %s%s" % (record['validity'], validity_status_labels[record['validity_status']]), file=stdout)
 
-    # Section separator.
-    print("\n", file=stdout)
+            if entity_type == 'server':
+                print("    DNS: %s" % ", ".join(record['dns_names']), file=stdout)
 
-    print(get_section_title("Client certificates"), file=stdout)
+            if record['private_key']:
+                print("    Private key: %s" % record['private_key'], file=stdout)
+            elif record['csr']:
+                print("    CSR: %s" % record['csr'], file=stdout)
 
-    certificate_files = sorted([c for c in os.listdir(os.path.join(project_directory, '.gimmecert', 'client')) if c.endswith('.cert.pem')])
+            print("    Certificate: %s" % record['certificate'], file=stdout)
+
+    # Separator. Helps separate terminal prompt from final line of output.
+    print("", file=stdout)
 
-    if certificate_files:
-        for certificate_file in certificate_files:
-            certificate = gimmecert.storage.read_certificate(os.path.join(project_directory, '.gimmecert', 'client', certificate_file))
-            private_key_path = os.path.join(project_directory, '.gimmecert', 'client', certificate_file.replace('.cert.pem', '.key.pem'))
-            csr_path = os.path.join(project_directory, '.gimmecert', 'client', certificate_file.replace('.cert.pem', '.csr.pem'))
+    return ExitCode.SUCCESS
 
-            # Separator.
-            print("", file=stdout)
 
-            if certificate.not_valid_before > now:
-                validity_status = " [NOT VALID YET]"
-            elif certificate.not_valid_after < now:
-                validity_status = " [EXPIRED]"
-            else:
-                validity_status = ""
+def get_metrics(project_directory, rebuild_index=False):
+    """
+    Produces Prometheus metrics describing the CA hierarchy and issued
+    certificates in project directory (see METRICS). Every sample is
+    labelled with the project directory, type (``ca``, ``server``, or
+    ``client``), and, for per-certificate metrics, name of CA level or
+    entity.
 
-            print(gimmecert.utils.dn_to_str(certificate.subject), file=stdout)
-            print("    Validity: %s%s" % (gimmecert.utils.date_range_to_str(certificate.not_valid_before,
-                                                                            certificate.not_valid_after),
-                                          validity_status), file=stdout)
+    Information about issued certificates is taken from the status
+    index, which means that only certificates changed since the last
+    run get re-read (see gimmecert.storage.refresh_index).
 
-            if os.path.exists(private_key_path):
-                print("    Private key: .gimmecert/client/%s" % certificate_file.replace('.cert.pem', '.key.pem'), file=stdout)
-            elif os.path.exists(csr_path):
-                print("    CSR: .gimmecert/client/%s" % certificate_file.replace('.cert.pem', '.csr.pem'), file=stdout)
+    Project directory must be initialised.
 
-            print("    Certificate: .gimmecert/client/%s" % certificate_file, file=stdout)
-    else:
-        # Separator.
-        print("", file=stdout)
-        print("No client certificates have been issued.", file=stdout)
+    :param project_directory: Path to project directory under which the artefacts are looked-up.
+    :type project_directory: str
 
-    # Separator. Helps separate terminal prompt from final line of output.
-    print("", file=stdout)
+    :param rebuild_index: Specify if status index should be rebuilt from scratch.
+    :type rebuild_index: bool
+
+    :returns: Metrics in Prometheus text exposition format.
+    :rtype: str
+    """
+
+    import gimmecert.storage
+
+    # Certificate validity is stored as naive datetime in UTC.
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    project_label = ('project', os.path.abspath(project_directory))
+
+    with gimmecert.locking.project_lock(project_directory):
+        storage = gimmecert.storage.get_storage_backend(project_directory)
+
+        index = storage.get_index(rebuild_index)
+
+        ca_certificates = storage.read_ca_hierarchy().certificates
+
+    validity_ranges = [('ca', 'level%d' % i, certificate.not_valid_before, certificate.not_valid_after)
+                       for i, certificate in enumerate(ca_certificates, 1)]
+
+    for entity_type in ('server', 'client'):
+        for entity_name in sorted(index[entity_type]):
+            entry = index[entity_type][entity_name]
+            validity_ranges.append((entity_type, entity_name, entry['not_before'], entry['not_after']))
+
+    samples = {name: [] for name in METRICS}
+
+    for certificate_type, name, not_before, not_after in validity_ranges:
+        labels = [project_label, ('type', certificate_type), ('name', name)]
+        samples['gimmecert_certificate_expiry_seconds'].append((labels, (not_after - now).total_seconds()))
+
+    for certificate_type in ('ca', 'server', 'client'):
+        labels = [project_label, ('type', certificate_type)]
+        type_ranges = [validity_range for validity_range in validity_ranges if validity_range[0] == certificate_type]
+
+        samples['gimmecert_certificates'].append((labels, len(type_ranges)))
+        samples['gimmecert_certificates_expired'].append((labels, sum(1 for _, _, _, not_after in type_ranges if not_after < now)))
+        samples['gimmecert_certificates_not_valid_yet'].append((labels, sum(1 for _, _, not_before, _ in type_ranges if not_before > now)))
+
+    lines = []
+
+    for metric_name, metric_help in METRICS.items():
+        lines.append("# HELP %s %s" % (metric_name, metric_help))
+        lines.append("# TYPE %s gauge" % metric_name)
+        lines.extend(gimmecert.utils.format_metric_sample(metric_name, labels, value) for labels, value in samples[metric_name])
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics(stdout, stderr, project_directory, textfile=None, rebuild_index=False):
+    """
+    Exports Prometheus metrics about the CA hierarchy and issued
+    certificates (see get_metrics).
+
+    Metrics are written-out either to standard output, or into a text
+    file that can be picked-up by the textfile collector of Prometheus
+    node exporter. The text file is replaced atomically, so the
+    collector never reads partially written metrics.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the artefacts are looked-up.
+    :type project_directory: str
+
+    :param textfile: Path to text file where the metrics should be written-out. If None, metrics are written-out to stdout.
+    :type textfile: str or None
+
+    :param rebuild_index: Specify if status index should be rebuilt from scratch.
+    :type rebuild_index: bool
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy has not been initialised in current directory.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    content = get_metrics(project_directory, rebuild_index)
+
+    if textfile is None:
+        stdout.write(content)
+        return ExitCode.SUCCESS
+
+    # Textfile collector only picks-up files with .prom suffix, so the
+    # temporary file is ignored until it gets renamed.
+    temporary_path = gimmecert.storage.get_temporary_path(textfile)
+
+    try:
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(content)
+        os.replace(temporary_path, textfile)
+    except OSError as e:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        print("Failed to write metrics to %s: %s" % (textfile, e), file=stderr)
+        return ExitCode.ERROR_METRICS_WRITE_FAILED
+
+    print("Metrics written to %s." % textfile, file=stdout)
+
+    return ExitCode.SUCCESS
+
+
+def export_files(stdout, stderr, project_directory, output_directory=None):
+    """
+    Writes-out CA hierarchy and artefacts of all issued certificates as
+    PEM files, using the same layout as the files storage backend
+    (``ca``, ``server``, and ``client`` sub-directories). Primarily
+    meant for projects using SQLite storage backend.
+
+    Existing files are overwritten. Stale private key or CSR of an
+    entity is removed if the entity now has a CSR or private key
+    instead.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the artefacts are stored.
+    :type project_directory: str
+
+    :param output_directory: Directory where files should be written-out. Set to None (default) to write them out into the
+        .gimmecert directory of the project.
+    :type output_directory: str or None
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to exporting artefacts. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    with gimmecert.locking.project_lock(project_directory):
+        storage = gimmecert.storage.get_storage_backend(project_directory)
+
+        if output_directory is None:
+            if isinstance(storage, gimmecert.storage.FilesystemBackend):
+                print("Artefacts are already stored as files within the .gimmecert directory.", file=stdout)
+                return ExitCode.SUCCESS
+
+            output_directory = os.path.join(project_directory, '.gimmecert')
+
+        for sub_directory in ('ca', 'server', 'client'):
+            os.makedirs(os.path.join(output_directory, sub_directory), exist_ok=True)
+
+        ca_hierarchy = storage.read_ca_hierarchy()
+        exported_counts = {'server': 0, 'client': 0}
+        obsolete_paths = []
+
+        with gimmecert.storage.ArtefactWriter() as writer:
+            for level, (private_key, certificate) in enumerate(ca_hierarchy, 1):
+                gimmecert.storage.write_private_key(private_key, os.path.join(output_directory, 'ca', 'level%d.key.pem' % level), writer)
+                gimmecert.storage.write_certificate(certificate, os.path.join(output_directory, 'ca', 'level%d.cert.pem' % level), writer)
+
+            gimmecert.storage.write_certificate_chain(ca_hierarchy.certificates, os.path.join(output_directory, 'ca', 'chain-full.cert.pem'), writer)
+
+            for entity_type, entity_name, certificate, private_key, csr in storage.read_entities():
+                base_path = os.path.join(output_directory, entity_type, entity_name)
+
+                if private_key is not None:
+                    gimmecert.storage.write_private_key(private_key, base_path + '.key.pem', writer)
+                    obsolete_paths.append(base_path + '.csr.pem')
+
+                if csr is not None:
+                    gimmecert.storage.write_csr(csr, base_path + '.csr.pem', writer)
+                    obsolete_paths.append(base_path + '.key.pem')
+
+                gimmecert.storage.write_certificate(certificate, base_path + '.cert.pem', writer)
+                exported_counts[entity_type] += 1
+
+        for path in obsolete_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+        print("Exported artefacts to %s:" % output_directory, file=stdout)
+        print("    CA hierarchy levels: %d" % len(ca_hierarchy), file=stdout)
+        print("    Server certificates: %d" % exported_counts['server'], file=stdout)
+        print("    Client certificates: %d" % exported_counts['client'], file=stdout)
+
+        return ExitCode.SUCCESS
+
+
+def pool_fill(stdout, stderr, project_directory, count, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+    """
+    Pre-generates private keys and stores them in the project key
+    pool. Pooled keys are used (in place of generating new ones) when
+    issuing server and client certificates, or when renewing
+    certificates with a new private key.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the key pool is maintained.
+    :type project_directory: str
+
+    :param count: Number of private keys to add to the pool.
+    :type count: int
+
+    :param key_specification: Key specification to use for generating private keys. See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.crypto
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to filling the key pool. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    with gimmecert.storage.ArtefactWriter() as writer:
+        for _ in range(count):
+            private_key = gimmecert.crypto.generate_private_key(key_specification)
+            gimmecert.storage.add_pooled_private_key(project_directory, private_key, key_specification, writer)
+
+    print("Added %d %s private keys to the key pool." % (count, gimmecert.utils.key_specification_to_str(key_specification)), file=stdout)
+    print("Private keys available in key pool: %d" % gimmecert.storage.count_pooled_private_keys(project_directory), file=stdout)
+
+    return ExitCode.SUCCESS
+
+
+def pool_status(stdout, stderr, project_directory):
+    """
+    Displays number of private keys available in the project key pool.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the key pool is maintained.
+    :type project_directory: str
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.crypto
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy has not been initialised in current directory.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    print("Private keys available in key pool: %d" % gimmecert.storage.count_pooled_private_keys(project_directory), file=stdout)
+
+    for key_specification in gimmecert.crypto.get_supported_key_specifications():
+        key_count = gimmecert.storage.count_pooled_private_keys(project_directory, key_specification)
+        if key_count:
+            print("    %s: %d" % (gimmecert.utils.key_specification_to_str(key_specification), key_count), file=stdout)
+
+    return ExitCode.SUCCESS
+
+
+def batch(stdout, stderr, project_directory, manifest_path, jobs=None, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+    """
+    Issues server and client certificates for all entities listed in
+    the passed-in manifest. The CA hierarchy is read only once, and
+    then used for issuing all certificates.
+
+    Private key generation and certificate signing are spread across
+    multiple worker processes. Artefacts are written-out by the
+    invoking process once all certificates have been issued, in the
+    order in which entities are listed in the manifest. Resulting
+    artefacts are identical in layout to those produced by sequential
+    issuance.
+
+    Failure to issue a certificate for a single entity (e.g. if
+    certificate has already been issued, or if CSR cannot be read)
+    does not prevent issuance for the remaining entities. All failures
+    are listed at the end of the report.
+
+    See gimmecert.storage.read_manifest for description of supported
+    manifest formats.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the CA artifacats etc will be looked-up.
+    :type project_directory: str
+
+    :param manifest_path: Path to manifest listing the entities for which certificates should be issued.
+    :type manifest_path: str
+
+    :param jobs: Number of worker processes to use for key generation and signing. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
+    :param key_specification: Key specification to use when generating private keys for entities that do not specify one in the manifest.
+        See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.crypto
+    import gimmecert.parallel
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to issuing certificates. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    try:
+        entities = gimmecert.storage.read_manifest(manifest_path)
+    except gimmecert.storage.InvalidManifest as e:
+        print(str(e), file=stderr)
+        return ExitCode.ERROR_INVALID_MANIFEST
+
+    # Manifest entities are locked as a whole, since manifest can
+    # list any number of entities.
+    with gimmecert.locking.project_lock(project_directory, exclusive=True):
+        storage = gimmecert.storage.get_storage_backend(project_directory)
+
+        # Grab the issuing CA private key and certificate.
+        ca_hierarchy = storage.read_ca_hierarchy()
+        issuer_private_key, issuer_certificate = ca_hierarchy[-1]
+        issuer_private_key_der = gimmecert.parallel.private_key_to_der(issuer_private_key)
+        issuer_certificate_der = gimmecert.parallel.certificate_to_der(issuer_certificate)
+
+        # Determine what needs to be issued, and gather the necessary
+        # inputs. Private keys are taken from the key pool or the
+        # installed private key provider where possible, and generated
+        # by worker processes otherwise.
+        failures = {}
+        csrs = {}
+        private_keys = {}
+        pooled_private_keys = {}
+        tasks = []
+        issued = []
+        seen = set()
+
+        # Private keys taken from the pool are put back if issuance
+        # fails, so they do not get lost.
+        try:
+            for index, entity in enumerate(entities):
+                entity_type, entity_name, csr_path = entity['type'], entity['name'], entity['csr']
+                entity_key_specification = entity['key_specification'] or key_specification
+
+                if (entity_type, entity_name) in seen or storage.entity_exists(entity_type, entity_name):
+                    failures[index] = "Certificate has already been issued."
+                    continue
+
+                seen.add((entity_type, entity_name))
+
+                if csr_path:
+                    try:
+                        csrs[index] = gimmecert.storage.read_csr(csr_path)
+                    except (OSError, ValueError) as e:
+                        failures[index] = "Failed to read CSR %s: %s" % (csr_path, e)
+                        continue
+                    public_key_der = gimmecert.parallel.public_key_to_der(csrs[index].public_key())
+                else:
+                    private_key = gimmecert.storage.take_pooled_private_key(project_directory, entity_key_specification)
+                    if private_key is not None:
+                        pooled_private_keys[index] = private_key
+                    else:
+                        private_key = gimmecert.crypto.take_provided_private_key(entity_key_specification)
+
+                    if private_key is not None:
+                        private_keys[index] = private_key
+                        public_key_der = gimmecert.parallel.public_key_to_der(private_key.public_key())
+                    else:
+                        public_key_der = None
+
+                issued.append(index)
+                tasks.append((entity_type, entity_name, entity['dns_names'], public_key_der, entity_key_specification,
+                              issuer_private_key_der, issuer_certificate_der))
+
+            results = dict(zip(issued, gimmecert.parallel.run_tasks(gimmecert.parallel.issue_certificate_task, tasks, jobs)))
+
+            # Output artefacts and report on progress in manifest order.
+            issued_certificates = []
+
+            for index, entity in enumerate(entities):
+                entity_type, entity_name = entity['type'], entity['name']
+
+                if index in failures:
+                    print("Failed to issue certificate for %s %s." % (entity_type, entity_name), file=stdout)
+                    continue
+
+                private_key_der, certificate_der = results[index]
+
+                if index in csrs:
+                    private_key = None
+                else:
+                    private_key = private_keys.get(index) or gimmecert.parallel.private_key_from_der(private_key_der)
+
+                certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+                issued_certificates.append((entity_type, entity_name, certificate, private_key, csrs.get(index)))
+
+                print("Issued %s certificate for %s." % (entity_type, entity_name), file=stdout)
+
+                if index in csrs:
+                    print("    CSR: .gimmecert/%s/%s.csr.pem" % (entity_type, entity_name), file=stdout)
+                else:
+                    print("    Private key: .gimmecert/%s/%s.key.pem" % (entity_type, entity_name), file=stdout)
+
+                print("    Certificate: .gimmecert/%s/%s.cert.pem" % (entity_type, entity_name), file=stdout)
+
+            # All artefacts are written-out within a single transaction.
+            storage.write_entities(issued_certificates)
+        except BaseException:
+            with gimmecert.storage.ArtefactWriter() as writer:
+                for index, private_key in pooled_private_keys.items():
+                    gimmecert.storage.add_pooled_private_key(project_directory, private_key,
+                                                             entities[index]['key_specification'] or key_specification, writer)
+            raise
+
+        print("", file=stdout)
+        print("Processed %d entities, issued %d certificates, %d failures." % (len(entities), len(issued), len(failures)), file=stdout)
+
+        if failures:
+            print("Failed to issue certificates for the following entities:", file=stderr)
+            for index in sorted(failures):
+                print("    %s %s: %s" % (entities[index]['type'], entities[index]['name'], failures[index]), file=stderr)
+
+            return ExitCode.ERROR_BATCH_FAILED
+
+        return ExitCode.SUCCESS
+
+
+def read_csr_source(stderr, csr_source):
+    """
+    Reads CSRs to sign from the passed-in source.
+
+    Source can be:
+
+    - ``-``, in which case one or more concatenated CSRs are read from
+      standard input.
+    - Path to directory, in which case a single CSR is read from each
+      file with one of the CSR_FILE_SUFFIXES suffixes (in name order).
+      File name (without suffix) is used as fallback entity name.
+    - Path to file with one or more concatenated CSRs. If the file
+      contains a single CSR, file name (without suffix) is used as
+      fallback entity name.
+
+    Each CSR is described by a dictionary with keys ``source`` (short
+    description of CSR origin), ``fallback_name`` (fallback entity
+    name, or None), ``csr`` (CSR object, or None if CSR could not be
+    read), and ``error`` (error message if CSR could not be read, or
+    None).
+
+    :param stderr: Output stream where the prompt for CSRs should be written-out when reading from standard input.
+    :type stderr: io.IOBase
+
+    :param csr_source: Source to read the CSRs from.
+    :type csr_source: str
+
+    :returns: List of CSR descriptions.
+    :rtype: list[dict]
+
+    :raises OSError: If source cannot be read.
+    :raises ValueError: If standard input or passed-in file contains no valid CSRs.
+    """
+
+    import gimmecert.storage
+
+    def strip_suffix(file_name):
+        """
+        Small helper function for removing CSR suffix from file name.
+        """
+
+        for suffix in CSR_FILE_SUFFIXES:
+            if file_name.endswith(suffix):
+                return file_name[:-len(suffix)]
+
+        return file_name
+
+    if csr_source == '-':
+        csrs_pem = gimmecert.utils.read_input(sys.stdin, stderr, "Please enter the CSRs")
+        csrs = gimmecert.utils.csrs_from_pem(csrs_pem)
+
+        return [{'source': 'stdin #%d' % i, 'fallback_name': None, 'csr': csr, 'error': None} for i, csr in enumerate(csrs, 1)]
+
+    if not os.path.isdir(csr_source):
+        csrs = gimmecert.storage.read_csrs(csr_source)
+        fallback_name = strip_suffix(os.path.basename(csr_source)) if len(csrs) == 1 else None
+        source = os.path.basename(csr_source)
+
+        return [{'source': source if len(csrs) == 1 else '%s #%d' % (source, i), 'fallback_name': fallback_name, 'csr': csr, 'error': None}
+                for i, csr in enumerate(csrs, 1)]
+
+    csr_descriptions = []
+
+    for file_name in sorted(os.listdir(csr_source)):
+        if not file_name.endswith(CSR_FILE_SUFFIXES):
+            continue
+
+        description = {'source': file_name, 'fallback_name': strip_suffix(file_name), 'csr': None, 'error': None}
+
+        try:
+            description['csr'] = gimmecert.storage.read_csr(os.path.join(csr_source, file_name))
+        except (OSError, ValueError) as e:
+            description['error'] = "Failed to read CSR: %s" % e
+
+        csr_descriptions.append(description)
+
+    return csr_descriptions
+
+
+def verify_csr_signatures(csr_descriptions, jobs=None):
+    """
+    Verifies signatures of CSRs described by the passed-in CSR
+    descriptions (see read_csr_source) across a pool of worker
+    processes. Descriptions of CSRs with invalid signatures are updated
+    with an error message.
+
+    :param csr_descriptions: List of CSR descriptions.
+    :type csr_descriptions: list[dict]
+
+    :param jobs: Number of worker processes to use. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+    """
+
+    import gimmecert.parallel
+
+    readable = [description for description in csr_descriptions if description['csr'] is not None]
+    signature_checks = gimmecert.parallel.run_tasks(gimmecert.parallel.verify_csr_task,
+                                                    [(gimmecert.parallel.csr_to_der(description['csr']), ) for description in readable],
+                                                    jobs)
+
+    for description, is_signature_valid in zip(readable, signature_checks):
+        if not is_signature_valid:
+            description['error'] = "Invalid CSR signature."
+
+
+def issue_csr_certificates(storage, entity_type, csr_descriptions, issuer_private_key, issuer_certificate):
+    """
+    Issues certificates for CSRs described by the passed-in CSR
+    descriptions (see read_csr_source), skipping descriptions that
+    already have an error set. Issued certificates and CSRs are
+    written-out within a single transaction.
+
+    Descriptions are updated with entity name (key ``name``), and with
+    an error message if certificate could not be issued. Caller is
+    expected to hold the project lock.
+
+    :param storage: Storage backend for the project.
+    :type storage: gimmecert.storage.FilesystemBackend or gimmecert.storage.SQLiteBackend
+
+    :param entity_type: Type of entities to issue certificates for, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param csr_descriptions: List of CSR descriptions.
+    :type csr_descriptions: list[dict]
+
+    :param issuer_private_key: Private key of the issuing CA.
+    :type issuer_private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
+
+    :param issuer_certificate: Certificate of the issuing CA.
+    :type issuer_certificate: cryptography.x509.Certificate
+
+    :returns: List of issued entities, as passed to storage backend write_entities method.
+    :rtype: list[tuple]
+    """
+
+    import gimmecert.crypto
+
+    if entity_type == 'server':
+        issue_certificate = gimmecert.crypto.issue_server_certificate
+    else:
+        issue_certificate = gimmecert.crypto.issue_client_certificate
+
+    issued_certificates = []
+    seen = set()
+
+    for description in csr_descriptions:
+        if description['error']:
+            continue
+
+        csr = description['csr']
+        entity_name = description['name'] = gimmecert.project.get_csr_entity_name(csr, description['fallback_name'])
+
+        if entity_name is None:
+            description['error'] = "Unable to determine entity name."
+        elif entity_name in seen or storage.entity_exists(entity_type, entity_name):
+            description['error'] = "Certificate has already been issued."
+        else:
+            seen.add(entity_name)
+            certificate = issue_certificate(entity_name, csr.public_key(), issuer_private_key, issuer_certificate)
+            issued_certificates.append((entity_type, entity_name, certificate, None, csr))
+
+    # All artefacts are written-out within a single transaction.
+    storage.write_entities(issued_certificates)
+
+    return issued_certificates
+
+
+def sign(stdout, stderr, project_directory, entity_type, csr_source, jobs=None):
+    """
+    Issues server or client certificates for multiple CSRs, read from
+    a directory, a file, or standard input (see read_csr_source).
+
+    Entity names are taken from common names in CSR subjects, falling
+    back to CSR file names (see
+    gimmecert.project.get_csr_entity_name). Only the public key and
+    common name are used from the CSR - no other naming information or
+    extensions are taken from it.
+
+    The issuing CA is read only once. CSR signatures are verified
+    across a pool of worker processes, while the (cheap) signing is
+    done by the invoking process. Artefacts for all issued
+    certificates are written-out within a single transaction.
+
+    Failure to issue a certificate for a single CSR (e.g. if
+    certificate has already been issued for the entity, or if CSR
+    signature is invalid) does not prevent issuance for the remaining
+    CSRs. Summary table with outcome for each CSR is written-out at
+    the end.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the CA artifacats etc will be looked-up.
+    :type project_directory: str
+
+    :param entity_type: Type of entities to issue certificates for, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param csr_source: Path to directory or file with CSRs, or ``-`` to read CSRs from standard input.
+    :type csr_source: str
+
+    :param jobs: Number of worker processes to use for verifying CSR signatures. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to signing CSRs. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    try:
+        csr_descriptions = read_csr_source(stderr, csr_source)
+    except (OSError, ValueError) as e:
+        print("Failed to read CSRs from %s: %s" % (csr_source, e), file=stderr)
+        return ExitCode.ERROR_SIGNING_FAILED
+
+    if not csr_descriptions:
+        print("No CSRs found in %s." % csr_source, file=stdout)
+        return ExitCode.SUCCESS
+
+    verify_csr_signatures(csr_descriptions, jobs)
+
+    # CSRs can be for any number of entities, so project is locked as a
+    # whole.
+    with gimmecert.locking.project_lock(project_directory, exclusive=True):
+        storage = gimmecert.storage.get_storage_backend(project_directory)
+
+        # Grab the issuing CA private key and certificate.
+        ca_hierarchy = storage.read_ca_hierarchy()
+        issuer_private_key, issuer_certificate = ca_hierarchy[-1]
+
+        issued_certificates = issue_csr_certificates(storage, entity_type, csr_descriptions, issuer_private_key, issuer_certificate)
+
+    # Output summary table.
+    rows = [("Source", "Name", "Result")]
+
+    for description in csr_descriptions:
+        if description['error']:
+            result = "Failed: %s" % description['error']
+        else:
+            result = "Issued: .gimmecert/%s/%s.cert.pem" % (entity_type, description['name'])
+
+        rows.append((description['source'], description.get('name') or "-", result))
+
+    widths = [max(len(row[column]) for row in rows) for column in range(2)]
+
+    for i, row in enumerate(rows):
+        print("%s  %s  %s" % (row[0].ljust(widths[0]), row[1].ljust(widths[1]), row[2]), file=stdout)
+
+        if i == 0:
+            print("%s  %s  %s" % ("-" * widths[0], "-" * widths[1], "-" * len(row[2])), file=stdout)
+
+    failure_count = len(csr_descriptions) - len(issued_certificates)
+
+    print("", file=stdout)
+    print("Processed %d CSRs, issued %d %s certificates, %d failures." % (len(csr_descriptions), len(issued_certificates), entity_type, failure_count),
+          file=stdout)
+
+    if failure_count:
+        return ExitCode.ERROR_SIGNING_FAILED
+
+    return ExitCode.SUCCESS
+
+
+def serve(stdout, stderr, project_directory, socket_path, key_pool_size):
+    """
+    Runs daemon that processes server, client, renew, and status
+    requests for the project, until interrupted via keyboard interrupt
+    (or termination signal).
+
+    Daemon keeps the CA hierarchy and a pool of pre-generated private
+    keys in memory, avoiding process start-up and CA loading costs for
+    each command. Artefacts are written to project directory in the
+    same way as when commands are run directly.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory served by the daemon.
+    :type project_directory: str
+
+    :param socket_path: Path to Unix socket where the daemon should listen for requests. Set to None to use default socket path.
+    :type socket_path: str or None
+
+    :param key_pool_size: Number of private keys to keep pre-generated in memory for each requested key specification.
+    :type key_pool_size: int
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.crypto
+    import gimmecert.daemon
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to starting the daemon. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    if socket_path is None:
+        socket_path = gimmecert.daemon.get_socket_path(project_directory)
+
+    if gimmecert.daemon.is_running(socket_path):
+        print("Daemon is already running on socket %s." % socket_path, file=stderr)
+        return ExitCode.ERROR_DAEMON_ALREADY_RUNNING
+
+    # Clean-up socket left behind by daemon that did not exit cleanly.
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    try:
+        daemon = gimmecert.daemon.Daemon(socket_path, project_directory)
+    except OSError as e:
+        print("Failed to listen on socket %s: %s" % (socket_path, e), file=stderr)
+        return ExitCode.ERROR_DAEMON_SOCKET
+
+    # Warm-up the in-process CA hierarchy cache, loading only the
+    # issuing CA private key.
+    ca_hierarchy = gimmecert.storage.get_storage_backend(project_directory).read_ca_hierarchy()
+    ca_hierarchy.certificates
+    ca_hierarchy[-1]
+
+    key_pool = gimmecert.daemon.WarmKeyPool(key_pool_size)
+    previous_private_key_provider = gimmecert.crypto.set_private_key_provider(key_pool.take)
+    key_pool.start()
+
+    print("Serving requests on socket %s." % socket_path, file=stdout)
+    stdout.flush()
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        os.remove(socket_path)
+        key_pool.stop()
+        gimmecert.crypto.set_private_key_provider(previous_private_key_provider)
+
+    print("Daemon stopped.", file=stdout)
+
+    return ExitCode.SUCCESS
+
+
+def process_spool(stdout, stderr, project_directory, spool_directory, entity_type, storage, issuer_private_key, issuer_certificate,
+                  settle_time=0):
+    """
+    Issues certificates for all CSR files currently present in the
+    spool directory (see watch_spool). Successfully processed CSR files
+    are removed from the spool directory (CSRs are stored alongside
+    issued certificates), while CSR files that could not be processed
+    are moved into the rejected sub-directory.
+
+    CSR files that cannot be read, but have been modified within the
+    settle time, are assumed to still be in the process of being
+    written, and are left in place to be picked-up later on.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the CA artifacats etc will be looked-up.
+    :type project_directory: str
+
+    :param spool_directory: Path to spool directory.
+    :type spool_directory: str
+
+    :param entity_type: Type of entities to issue certificates for, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param storage: Storage backend for the project.
+    :type storage: gimmecert.storage.FilesystemBackend or gimmecert.storage.SQLiteBackend
+
+    :param issuer_private_key: Private key of the issuing CA.
+    :type issuer_private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
+
+    :param issuer_certificate: Certificate of the issuing CA.
+    :type issuer_certificate: cryptography.x509.Certificate
+
+    :param settle_time: Number of seconds since last modification after which unreadable CSR files get rejected.
+    :type settle_time: float
+
+    :returns: Tuple consisting out of number of issued certificates, number of rejected CSR files, and number of CSR files left in place.
+    :rtype: (int, int, int)
+    """
+
+    import gimmecert.spool
+    import gimmecert.storage
+
+    csr_descriptions = []
+    deferred = 0
+
+    for file_name in gimmecert.spool.list_csr_files(spool_directory):
+        csr_path = os.path.join(spool_directory, file_name)
+        description = {'source': file_name, 'fallback_name': file_name[:-len(gimmecert.spool.SPOOL_CSR_SUFFIX)], 'csr': None, 'error': None}
+
+        try:
+            description['csr'] = gimmecert.storage.read_csr(csr_path)
+        except (OSError, ValueError) as e:
+            try:
+                if time.time() - os.stat(csr_path).st_mtime < settle_time:
+                    deferred += 1
+                    continue
+            except FileNotFoundError:
+                continue
+
+            description['error'] = "Failed to read CSR: %s" % e
+
+        csr_descriptions.append(description)
+
+    if not csr_descriptions:
+        return 0, 0, deferred
+
+    # Process start-up cost of worker pool outweighs the gains for
+    # small batches, so signatures are verified in-process.
+    verify_csr_signatures(csr_descriptions, jobs=1)
+
+    with gimmecert.locking.project_lock(project_directory, exclusive=True):
+        issued_certificates = issue_csr_certificates(storage, entity_type, csr_descriptions, issuer_private_key, issuer_certificate)
+
+    for description in csr_descriptions:
+        if description['error']:
+            gimmecert.spool.reject_csr_file(spool_directory, description['source'])
+            print("Rejected %s: %s" % (description['source'], description['error']), file=stderr)
+        else:
+            os.remove(os.path.join(spool_directory, description['source']))
+            print("Issued %s certificate for %s: .gimmecert/%s/%s.cert.pem" % (entity_type, description['source'], entity_type, description['name']),
+                  file=stdout)
+
+    stdout.flush()
+    stderr.flush()
+
+    return len(issued_certificates), len(csr_descriptions) - len(issued_certificates), deferred
+
+
+def watch_spool(stdout, stderr, project_directory, spool_directory, entity_type, debounce=0.2, poll_interval=1.0, use_inotify=True):
+    """
+    Watches spool directory for CSR files (ending in .csr.pem), and
+    issues server or client certificates for them as they arrive, until
+    interrupted via keyboard interrupt (or termination signal).
+
+    Entity names are determined in the same way as for the sign
+    command (see gimmecert.project.get_csr_entity_name). Once
+    certificate has been issued, CSR is moved from the spool directory
+    into project storage, next to the issued certificate. CSR files that could not
+    be processed are moved into the ``rejected`` sub-directory of the
+    spool directory.
+
+    Directory is watched using inotify where available, falling back to
+    periodic polling otherwise. CSR files arriving in quick succession
+    are grouped into batches (debouncing), with artefacts for each
+    batch written-out within a single transaction. CA hierarchy is read
+    only once, on start-up.
+
+    :param stdout: Output stream where the informative messages should be written-out.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the error messages should be written-out.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory under which the CA artifacats etc will be looked-up.
+    :type project_directory: str
+
+    :param spool_directory: Path to spool directory.
+    :type spool_directory: str
+
+    :param entity_type: Type of entities to issue certificates for, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param debounce: Number of seconds without new CSR files after which the batch gets processed.
+    :type debounce: float
+
+    :param poll_interval: Number of seconds between consecutive directory listings when inotify is not available.
+    :type poll_interval: float
+
+    :param use_inotify: Specify if inotify should be used when available.
+    :type use_inotify: bool
+
+    :returns: Status code, one from gimmecert.commands.ExitCode.
+    :rtype: int
+    """
+
+    import gimmecert.spool
+    import gimmecert.storage
+
+    if not gimmecert.storage.is_initialised(project_directory):
+        print("CA hierarchy must be initialised prior to watching the spool directory. Run the gimmecert init command first.", file=stderr)
+        return ExitCode.ERROR_NOT_INITIALISED
+
+    try:
+        watcher = gimmecert.spool.get_watcher(spool_directory, poll_interval, use_inotify)
+    except OSError as e:
+        print("Failed to watch spool directory %s: %s" % (spool_directory, e), file=stderr)
+        return ExitCode.ERROR_SIGNING_FAILED
+
+    storage = gimmecert.storage.get_storage_backend(project_directory)
+
+    # CA hierarchy is read only once, and kept in memory for the
+    # lifetime of the watcher.
+    with gimmecert.locking.project_lock(project_directory):
+        issuer_private_key, issuer_certificate = storage.read_ca_hierarchy()[-1]
+
+    print("Watching spool directory %s for %s CSRs (using %s)." % (spool_directory, entity_type, watcher.name), file=stdout)
+    stdout.flush()
+
+    issued_total, rejected_total = 0, 0
+
+    # Partially written files are given some extra time before being
+    # rejected.
+    settle_time = max(debounce, poll_interval) * 2
+
+    try:
+        while True:
+            with gimmecert.spool.deferred_interrupts():
+                issued, rejected, deferred = process_spool(stdout, stderr, project_directory, spool_directory, entity_type, storage,
+                                                           issuer_private_key, issuer_certificate, settle_time)
+                issued_total += issued
+                rejected_total += rejected
+
+            # Make sure CSR files left in place get revisited even if
+            # nothing else happens in the spool directory.
+            timeout = settle_time if deferred else None
+
+            gimmecert.spool.wait_for_batch(watcher, debounce, gimmecert.spool.MAX_BATCH_DELAY, timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+    print("Stopped watching spool directory. Issued %d %s certificates, rejected %d CSRs." % (issued_total, entity_type, rejected_total), file=stdout)
 
     return ExitCode.SUCCESS
@@ -20,31 +20,219 @@
 
 import datetime
 
+import cryptography.hazmat.backends
+import cryptography.hazmat.primitives.asymmetric.ec
+import cryptography.hazmat.primitives.asymmetric.ed25519
 import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.hazmat.primitives.hashes
 import cryptography.x509
 from dateutil.relativedelta import relativedelta
 
+import gimmecert.parallel
+import gimmecert.timings
+import gimmecert.utils
 
-def generate_private_key():
+
+#: Key specification used when none has been explicitly requested.
+DEFAULT_KEY_SPECIFICATION = gimmecert.utils.DEFAULT_KEY_SPECIFICATION
+
+#: Supported RSA key sizes.
+RSA_KEY_SIZES = (2048, 3072, 4096)
+
+#: Key algorithms for which multiple private keys get generated in
+#: worker processes. Generating other keys is cheaper than starting
+#: the worker processes.
+PARALLEL_KEY_ALGORITHMS = ('rsa',)
+
+#: Supported elliptic curves, mapped to their implementations.
+ELLIPTIC_CURVES = {
+    'secp256r1': cryptography.hazmat.primitives.asymmetric.ec.SECP256R1,
+    'secp384r1': cryptography.hazmat.primitives.asymmetric.ec.SECP384R1,
+}
+
+
+# Callable consulted for pre-generated private keys before generating
+# new ones. See set_private_key_provider.
+_private_key_provider = None
+
+
+def set_private_key_provider(provider):
     """
-    Generates a 2048-bit RSA private key.
+    Installs private key provider. Provider is consulted by
+    generate_private_key prior to generating a new private key. This
+    makes it possible to serve private keys generated ahead of time
+    (for example from an in-memory pool).
+
+    Provider is invoked with key specification as its only argument,
+    and should return either a matching private key, or None if it
+    cannot provide one.
 
-    :returns: RSA private key.
-    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+    :param provider: Private key provider to install. Set to None to remove the currently installed provider.
+    :type provider: callable or None
+
+    :returns: Previously installed private key provider.
+    :rtype: callable or None
     """
 
-    rsa_public_exponent = 65537
-    key_size = 2048
+    global _private_key_provider
+
+    previous_provider = _private_key_provider
+    _private_key_provider = provider
+
+    return previous_provider
+
+
+def take_provided_private_key(key_specification):
+    """
+    Takes private key matching the passed-in key specification from
+    the installed private key provider (see set_private_key_provider).
+
+    :param key_specification: Key specification describing the private key.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Private key, or None if no provider is installed or if provider cannot provide a matching private key.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey or
+        None
+    """
+
+    if _private_key_provider is None:
+        return None
+
+    return _private_key_provider(key_specification)
 
-    private_key = cryptography.hazmat.primitives.asymmetric.rsa.generate_private_key(
-        public_exponent=rsa_public_exponent,
-        key_size=key_size,
-        backend=cryptography.hazmat.backends.default_backend()
-    )
+
+@gimmecert.timings.timed('key.generate')
+def generate_private_key(key_specification=DEFAULT_KEY_SPECIFICATION, use_provider=True):
+    """
+    Generates a private key according to passed-in key specification.
+    By default a 2048-bit RSA private key is generated.
+
+    If a private key provider has been installed (see
+    set_private_key_provider), private key is taken from it instead
+    whenever possible.
+
+    Key specification is a tuple of algorithm and its parameters. The
+    following key specifications are supported:
+
+    - ``('rsa', KEY_SIZE)``, where ``KEY_SIZE`` is one of the sizes listed in RSA_KEY_SIZES.
+    - ``('ecdsa', CURVE)``, where ``CURVE`` is one of the curve names listed in ELLIPTIC_CURVES.
+    - ``('ed25519', None)``.
+
+    :param key_specification: Key specification describing the key that should be generated.
+    :type key_specification: (str, int or str or None)
+
+    :param use_provider: Specify if installed private key provider should be consulted. Set to False to always generate a new key.
+    :type use_provider: bool
+
+    :returns: Private key.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
+
+    :raises ValueError: If key specification is not supported.
+    """
+
+    if use_provider:
+        private_key = take_provided_private_key(key_specification)
+
+        if private_key is not None:
+            return private_key
+
+    algorithm, parameters = key_specification
+
+    if algorithm == 'rsa' and parameters in RSA_KEY_SIZES:
+        rsa_public_exponent = 65537
+
+        private_key = cryptography.hazmat.primitives.asymmetric.rsa.generate_private_key(
+            public_exponent=rsa_public_exponent,
+            key_size=parameters,
+            backend=cryptography.hazmat.backends.default_backend()
+        )
+    elif algorithm == 'ecdsa' and parameters in ELLIPTIC_CURVES:
+        private_key = cryptography.hazmat.primitives.asymmetric.ec.generate_private_key(
+            curve=ELLIPTIC_CURVES[parameters](),
+            backend=cryptography.hazmat.backends.default_backend()
+        )
+    elif algorithm == 'ed25519' and parameters is None:
+        private_key = cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError("Unsupported key specification: %s" % (key_specification,))
 
     return private_key
 
 
+def get_supported_key_specifications():
+    """
+    Returns list of all supported key specifications.
+
+    :returns: List of supported key specifications.
+    :rtype: list[(str, int or str or None)]
+    """
+
+    return ([('rsa', key_size) for key_size in RSA_KEY_SIZES] +
+            [('ecdsa', curve) for curve in sorted(ELLIPTIC_CURVES)] +
+            [('ed25519', None)])
+
+
+def key_specification_from_public_key(public_key):
+    """
+    Derives key specification from the passed-in public key. Resulting
+    key specification can be used for generating a private key of the
+    same type.
+
+    :param public_key: Public key to derive the key specification from.
+    :type public_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePublicKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PublicKey
+
+    :returns: Key specification.
+    :rtype: (str, int or str or None)
+
+    :raises ValueError: If public key is not of a supported type.
+    """
+
+    if isinstance(public_key, cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey) and public_key.key_size in RSA_KEY_SIZES:
+        return ('rsa', public_key.key_size)
+
+    if isinstance(public_key, cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePublicKey) and public_key.curve.name in ELLIPTIC_CURVES:
+        return ('ecdsa', public_key.curve.name)
+
+    if isinstance(public_key, cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PublicKey):
+        return ('ed25519', None)
+
+    raise ValueError("Unsupported public key: %s" % public_key)
+
+
+def get_signature_hash_algorithm(private_key):
+    """
+    Returns hash algorithm to use when signing data with the
+    passed-in private key.
+
+    SHA-384 is used with keys on the secp384r1 curve, and SHA-256 for
+    all other RSA and ECDSA keys. Ed25519 signatures do not use a
+    separate hash algorithm.
+
+    :param private_key: Private key that will be used for signing.
+    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
+
+    :returns: Hash algorithm, or None for Ed25519 keys.
+    :rtype: cryptography.hazmat.primitives.hashes.HashAlgorithm or None
+    """
+
+    if isinstance(private_key, cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey):
+        return None
+
+    if (isinstance(private_key, cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey) and
+            private_key.curve.name == 'secp384r1'):
+        return cryptography.hazmat.primitives.hashes.SHA384()
+
+    return cryptography.hazmat.primitives.hashes.SHA256()
+
+
 def get_dn(name):
     """
     Generates a DN (distinguished name) using the passed-in name. The
@@ -84,6 +272,7 @@ def get_validity_range():
     return not_before, not_after
 
 
+@gimmecert.timings.timed('certificate.sign')
 def issue_certificate(issuer_dn, subject_dn, signing_key, public_key, not_before, not_after, extensions=None):
     """
     Issues a certificate using the passed-in data.
@@ -129,14 +318,64 @@ def issue_certificate(issuer_dn, subject_dn, signing_key, public_key, not_before
 
     certificate = builder.sign(
         private_key=signing_key,
-        algorithm=cryptography.hazmat.primitives.hashes.SHA256(),
+        algorithm=get_signature_hash_algorithm(signing_key),
         backend=cryptography.hazmat.backends.default_backend()
     )
 
     return certificate
 
 
-def generate_ca_hierarchy(base_name, depth):
+def generate_private_keys(count, key_specification=DEFAULT_KEY_SPECIFICATION, jobs=None):
+    """
+    Generates multiple private keys according to passed-in key
+    specification.
+
+    Private keys are taken from the installed private key provider (see
+    set_private_key_provider) whenever possible. Remaining private keys
+    are generated concurrently in worker processes if their algorithm
+    is listed in PARALLEL_KEY_ALGORITHMS (see
+    gimmecert.parallel.run_tasks), and within the current process
+    otherwise.
+
+    :param count: Number of private keys to generate.
+    :type count: int
+
+    :param key_specification: Key specification describing the keys that should be generated. See generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :param jobs: Maximum number of worker processes to use. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
+    :returns: List of private keys.
+    :rtype: list[cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey]
+
+    :raises ValueError: If key specification is not supported.
+    """
+
+    private_keys = []
+
+    while len(private_keys) < count:
+        private_key = take_provided_private_key(key_specification)
+
+        if private_key is None:
+            break
+
+        private_keys.append(private_key)
+
+    remaining = count - len(private_keys)
+
+    if key_specification[0] in PARALLEL_KEY_ALGORITHMS and remaining > 1:
+        private_keys_der = gimmecert.parallel.run_tasks(gimmecert.parallel.generate_private_key_task, [(key_specification,)] * remaining, jobs)
+        private_keys.extend(gimmecert.parallel.private_key_from_der(private_key_der) for private_key_der in private_keys_der)
+    else:
+        private_keys.extend(generate_private_key(key_specification, use_provider=False) for _ in range(remaining))
+
+    return private_keys
+
+
+def generate_ca_hierarchy(base_name, depth, key_specification=DEFAULT_KEY_SPECIFICATION, jobs=None):
     """
     Generates CA hierarchy with specified depth, using the provided
     naming as basis for the DNs.
@@ -144,6 +383,16 @@ def generate_ca_hierarchy(base_name, depth):
     :param base_name: Base name for constructing the CA DNs. Resulting DNs are of format 'BASE Level N'.
     :type base_name: str
 
+    :param depth: Depth of CA hierarchy to generate.
+    :type depth: int
+
+    :param key_specification: Key specification to use for generating CA private keys. See generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :param jobs: Maximum number of worker processes to use for generating CA private keys (see generate_private_keys). Set to None
+        (default) to use number of available CPUs.
+    :type jobs: int or None
+
     :returns: List of CA private key and certificate pairs, starting with the level 1 (root) CA, and ending with the leaf CA.
     :rtype: list[(cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey, cryptography.x509.Certificate)]
     """
@@ -156,14 +405,17 @@ def generate_ca_hierarchy(base_name, depth):
         (cryptography.x509.BasicConstraints(ca=True, path_length=None), True)
     ]
 
+    # Private keys are generated up-front, since generating them takes
+    # a lot more time than signing the certificates.
+    private_keys = generate_private_keys(depth, key_specification, jobs)
+
     # We have not issued yet any certificate.
     issuer_dn = None
     issuer_private_key = None
 
-    for level in range(1, depth+1):
+    for level, private_key in enumerate(private_keys, 1):
         # Generate info for the new CA.
         dn = get_dn("%s Level %d CA" % (base_name, level))
-        private_key = generate_private_key()
 
         # First certificate issued needs to be self-signed.
         issuer_dn = issuer_dn or dn
@@ -214,6 +466,9 @@ def issue_server_certificate(name, public_key, issuer_private_key, issuer_certif
     if extra_dns_names is not None:
         dns_names.extend(extra_dns_names)
 
+    # Key encipherment is applicable only to RSA keys.
+    key_encipherment = isinstance(public_key, cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey)
+
     dn = get_dn(name)
     not_before, not_after = get_validity_range()
     extensions = [
@@ -221,7 +476,7 @@ def issue_server_certificate(name, public_key, issuer_private_key, issuer_certif
         (
             cryptography.x509.KeyUsage(
                 digital_signature=True,
-                key_encipherment=True,
+                key_encipherment=key_encipherment,
                 content_commitment=False,
                 data_encipherment=False,
                 key_agreement=False,
@@ -273,6 +528,9 @@ def issue_client_certificate(name, public_key, issuer_private_key, issuer_certif
     :rtype: cryptography.x509.Certificate
     """
 
+    # Key encipherment is applicable only to RSA keys.
+    key_encipherment = isinstance(public_key, cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey)
+
     dn = get_dn(name)
     not_before, not_after = get_validity_range()
     extensions = [
@@ -280,7 +538,7 @@ def issue_client_certificate(name, public_key, issuer_private_key, issuer_certif
         (
             cryptography.x509.KeyUsage(
                 digital_signature=True,
-                key_encipherment=True,
+                key_encipherment=key_encipherment,
                 content_commitment=False,
                 data_encipherment=False,
                 key_agreement=False,
@@ -368,7 +626,7 @@ def generate_csr(name, private_key):
 
     csr = builder.sign(
         private_key,
-        cryptography.hazmat.primitives.hashes.SHA256(),
+        get_signature_hash_algorithm(private_key),
         cryptography.hazmat.backends.default_backend()
     )
 
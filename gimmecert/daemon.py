@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import gimmecert.commands
+import gimmecert.utils
+
+# Crypto module is imported within functions that use it, since
+# forwarding commands to the daemon does not require it.
+
+
+#: Name of daemon socket file within the .gimmecert directory.
+DEFAULT_SOCKET_NAME = 'daemon.sock'
+
+#: Environment variable that can be used for overriding the daemon socket path.
+SOCKET_PATH_ENVIRONMENT_VARIABLE = 'GIMMECERT_SOCKET'
+
+#: Commands that can be run via daemon, mapped to names of arguments
+#: they accept (in addition to stdout, stderr, and project directory).
+COMMANDS = {
+    'server': ('entity_name', 'extra_dns_names', 'custom_csr_path', 'key_specification'),
+    'client': ('entity_name', 'custom_csr_path', 'key_specification'),
+    'renew': ('entity_type', 'entity_name', 'generate_new_private_key', 'custom_csr_path', 'dns_names', 'key_specification'),
+    'status': ('rebuild_index', 'output_format'),
+}
+
+
+def get_socket_path(project_directory):
+    """
+    Returns path to daemon socket for the project. Path can be
+    overridden via environment variable (see
+    SOCKET_PATH_ENVIRONMENT_VARIABLE).
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :returns: Path to daemon socket.
+    :rtype: str
+    """
+
+    return os.environ.get(SOCKET_PATH_ENVIRONMENT_VARIABLE) or os.path.join(project_directory, '.gimmecert', DEFAULT_SOCKET_NAME)
+
+
+def is_running(socket_path):
+    """
+    Checks if daemon is accepting connections on the passed-in socket.
+
+    :param socket_path: Path to daemon socket.
+    :type socket_path: str
+
+    :returns: True if daemon is running, False otherwise.
+    :rtype: bool
+    """
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(socket_path)
+    except OSError:
+        return False
+
+    return True
+
+
+def forward_command(stdout, stderr, project_directory, command, arguments):
+    """
+    Forwards command to the daemon serving the project, if one is
+    running. Output produced by the command is written to passed-in
+    output streams.
+
+    Daemon not running (connection to the socket cannot be
+    established), or serving a different project, is not treated as an
+    error. Caller is expected to run the command locally instead in
+    such cases. Any other failure after the connection has been
+    established is reported via passed-in error stream, since the
+    daemon might have already (partially) run the command.
+
+    :param stdout: Output stream where the command output should be written.
+    :type stdout: io.IOBase
+
+    :param stderr: Output stream where the command errors should be written.
+    :type stderr: io.IOBase
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param command: Name of command to run. Must be one of the names listed in COMMANDS.
+    :type command: str
+
+    :param arguments: Command arguments, mapping argument names to their values. Paths must be absolute.
+    :type arguments: dict
+
+    :returns: Status code, one from gimmecert.commands.ExitCode, or None if daemon is not running or serves a different project.
+    :rtype: int or None
+    """
+
+    socket_path = get_socket_path(project_directory)
+
+    if not os.path.exists(socket_path):
+        return None
+
+    request = {
+        'project_directory': os.path.abspath(project_directory),
+        'command': command,
+        'arguments': arguments,
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            return None
+
+        try:
+            connection.sendall(json.dumps(request).encode() + b'\n')
+
+            with connection.makefile('rb') as response_file:
+                response = json.loads(response_file.readline().decode())
+        except (OSError, ValueError) as e:
+            print("Failed to run command %s via daemon on socket %s: %s" % (command, socket_path, e), file=stderr)
+            return gimmecert.commands.ExitCode.ERROR_DAEMON_REQUEST_FAILED
+
+    # Daemon rejects requests for other projects before running
+    # anything.
+    if response.get('project_mismatch'):
+        return None
+
+    if 'error' in response:
+        print("Failed to run command %s via daemon on socket %s: %s" % (command, socket_path, response['error']), file=stderr)
+        return gimmecert.commands.ExitCode.ERROR_DAEMON_REQUEST_FAILED
+
+    stdout.write(response['stdout'])
+    stderr.write(response['stderr'])
+
+    return response['exit_code']
+
+
+class WarmKeyPool:
+    """
+    In-memory pool of pre-generated private keys. Pool is kept full by
+    a background thread, which generates private keys for every key
+    specification that has been requested from the pool so far.
+
+    Pool can be used as a private key provider (see
+    gimmecert.crypto.set_private_key_provider) by installing its take
+    method.
+    """
+
+    def __init__(self, size, key_specifications=(gimmecert.utils.DEFAULT_KEY_SPECIFICATION,)):
+        """
+        Initialises the pool. Background thread is not started until
+        the start method is invoked.
+
+        :param size: Number of private keys to keep in the pool for each key specification.
+        :type size: int
+
+        :param key_specifications: Key specifications to keep in the pool from the very start.
+        :type key_specifications: list[(str, int or str or None)]
+        """
+
+        self.size = size
+        self._keys = collections.OrderedDict((tuple(key_specification), collections.deque()) for key_specification in key_specifications)
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._fill, name="gimmecert-warm-key-pool", daemon=True)
+
+    def start(self):
+        """
+        Starts background thread that fills the pool.
+        """
+
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops background thread that fills the pool, waiting for it to
+        finish.
+        """
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def count(self, key_specification):
+        """
+        Returns number of private keys available in the pool for the
+        passed-in key specification.
+
+        :param key_specification: Key specification to count the keys for.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Number of available private keys.
+        :rtype: int
+        """
+
+        with self._condition:
+            return len(self._keys.get(tuple(key_specification), ()))
+
+    def take(self, key_specification):
+        """
+        Takes private key matching the key specification from the
+        pool. Pool will be refilled with private keys of the same key
+        specification from now on.
+
+        :param key_specification: Key specification for the private key.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Private key, or None if no matching key is available in the pool.
+        :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+            cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+            cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey or
+            None
+        """
+
+        import gimmecert.crypto
+
+        key_specification = tuple(key_specification)
+
+        if key_specification not in gimmecert.crypto.get_supported_key_specifications():
+            return None
+
+        with self._condition:
+            keys = self._keys.setdefault(key_specification, collections.deque())
+            private_key = keys.popleft() if keys else None
+            self._condition.notify_all()
+
+        return private_key
+
+    def _get_key_specification_to_fill(self):
+        """
+        Returns first key specification for which the pool is not
+        full. Must be called while holding the condition lock.
+        """
+
+        for key_specification, keys in self._keys.items():
+            if len(keys) < self.size:
+                return key_specification
+
+        return None
+
+    def _fill(self):
+        """
+        Keeps the pool filled until the pool is stopped. Runs in
+        background thread.
+        """
+
+        import gimmecert.crypto
+
+        while True:
+            with self._condition:
+                while not self._stopped and self._get_key_specification_to_fill() is None:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                key_specification = self._get_key_specification_to_fill()
+
+            private_key = gimmecert.crypto.generate_private_key(key_specification, use_provider=False)
+
+            with self._condition:
+                self._keys[key_specification].append(private_key)
+                self._condition.notify_all()
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a single daemon request. Both the request and response
+    are newline-terminated JSON documents.
+    """
+
+    def handle(self):
+        request_data = self.rfile.readline()
+
+        # Connection closed without sending a request (for example when
+        # checking if daemon is running).
+        if not request_data:
+            return
+
+        response = self.server.process_request_data(request_data)
+
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """
+    Daemon that runs commands for a single project on request. Requests
+    are processed one at a time, in the order in which they arrive.
+
+    Request is a JSON object with the following keys:
+
+    - ``project_directory``, absolute path to project directory. Must match the project served by daemon.
+    - ``command``, name of command to run (see COMMANDS).
+    - ``arguments``, object mapping argument names to values.
+
+    Response is a JSON object with keys ``exit_code``, ``stdout``, and
+    ``stderr``, holding the command exit code and output. If the
+    request could not be processed, response instead contains an
+    ``error`` key with error description. If the request is for a
+    project not served by the daemon, response additionally contains
+    the ``project_mismatch`` key set to true.
+    """
+
+    def __init__(self, socket_path, project_directory):
+        """
+        Initialises the daemon, binding it to passed-in socket path.
+
+        :param socket_path: Path to socket where the daemon should listen for requests.
+        :type socket_path: str
+
+        :param project_directory: Path to project directory served by the daemon.
+        :type project_directory: str
+        """
+
+        self.project_directory = os.path.abspath(project_directory)
+
+        super().__init__(socket_path, DaemonRequestHandler)
+
+    def server_bind(self):
+        """
+        Binds the daemon to its socket, making the socket accessible
+        to the owner only. Any user that can connect to the socket can
+        issue certificates using the project CA hierarchy.
+        """
+
+        # Socket is created with permissions set by umask, so restrict
+        # them already during creation in order to avoid a window
+        # during which other users could connect.
+        previous_umask = os.umask(0o177)
+
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous_umask)
+
+        os.chmod(self.server_address, 0o600)
+
+    def process_request_data(self, request_data):
+        """
+        Processes a single request, running the requested command.
+
+        :param request_data: JSON-encoded request.
+        :type request_data: bytes
+
+        :returns: Response to send back to the client.
+        :rtype: dict
+        """
+
+        try:
+            request = json.loads(request_data.decode())
+            project_directory = request['project_directory']
+            command = request['command']
+            arguments = dict(request['arguments'])
+        except (ValueError, KeyError, TypeError) as e:
+            return {'error': "Invalid request: %s" % e}
+
+        if project_directory != self.project_directory:
+            return {'error': "Daemon serves a different project directory: %s" % self.project_directory, 'project_mismatch': True}
+
+        if command not in COMMANDS:
+            return {'error': "Unsupported command: %s" % command}
+
+        if sorted(arguments) != sorted(COMMANDS[command]):
+            return {'error': "Invalid arguments for command %s: %s" % (command, ", ".join(sorted(arguments)))}
+
+        # JSON has no notion of tuples.
+        if arguments.get('key_specification') is not None:
+            arguments['key_specification'] = tuple(arguments['key_specification'])
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+
+        try:
+            exit_code = getattr(gimmecert.commands, command)(stdout, stderr, self.project_directory, **arguments)
+        except Exception as e:
+            return {'error': "Failed to run command %s: %s" % (command, e)}
+
+        return {'exit_code': exit_code, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import contextlib
+import fcntl
+import os
+
+import gimmecert.timings
+
+
+#: Name of directory within the .gimmecert directory that holds lock files.
+LOCK_DIRECTORY_NAME = 'locks'
+
+#: Name of lock file used for serialising status index updates.
+INDEX_LOCK_NAME = 'index'
+
+
+@contextlib.contextmanager
+def _flock(path, exclusive, flags=os.O_RDONLY):
+    """
+    Acquires advisory lock on the passed-in path for duration of the
+    context, blocking until the lock becomes available. Lock is
+    released once the underlying file descriptor gets closed.
+
+    :param path: Path to file or directory to lock.
+    :type path: str
+
+    :param exclusive: Specify if exclusive lock should be acquired. Otherwise a shared lock is acquired.
+    :type exclusive: bool
+
+    :param flags: Flags to use when opening the path.
+    :type flags: int
+    """
+
+    fd = os.open(path, flags, 0o644)
+
+    try:
+        with gimmecert.timings.phase('lock.wait'):
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+        yield
+    finally:
+        os.close(fd)
+
+
+def get_lock_path(project_directory, lock_name):
+    """
+    Returns path to named lock file within the project. Lock files are
+    never removed, since removing them would race with processes
+    waiting on the lock.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param lock_name: Name of the lock.
+    :type lock_name: str
+
+    :returns: Path to lock file.
+    :rtype: str
+    """
+
+    return os.path.join(project_directory, '.gimmecert', LOCK_DIRECTORY_NAME, '%s.lock' % lock_name)
+
+
+def project_lock(project_directory, exclusive=False):
+    """
+    Acquires project-wide lock for duration of the context.
+
+    Lock is taken on the project directory itself, since it must be
+    usable before the .gimmecert directory has been created. Commands
+    that only read the project, or that modify a single entity, should
+    acquire the shared lock. Commands that operate on the project as a
+    whole (like initialisation) should acquire the exclusive lock.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param exclusive: Specify if exclusive lock should be acquired.
+    :type exclusive: bool
+    """
+
+    return _flock(project_directory, exclusive)
+
+
+def named_lock(project_directory, lock_name):
+    """
+    Acquires exclusive named lock within the project for duration of
+    the context. Project must be initialised.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param lock_name: Name of the lock.
+    :type lock_name: str
+    """
+
+    lock_path = get_lock_path(project_directory, lock_name)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+
+    return _flock(lock_path, True, os.O_RDWR | os.O_CREAT)
+
+
+def entity_lock(project_directory, entity_type, entity_name):
+    """
+    Acquires exclusive lock for a single entity for duration of the
+    context. Commands that issue or renew certificate for the entity
+    should hold this lock (in addition to shared project lock) from the
+    moment they check for entity existence until the artefacts have been
+    written-out.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param entity_type: Type of entity, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param entity_name: Name of entity.
+    :type entity_name: str
+    """
+
+    return named_lock(project_directory, '%s-%s' % (entity_type, entity_name))
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import concurrent.futures
+import functools
+import os
+
+import cryptography.hazmat.backends
+import cryptography.hazmat.primitives.serialization
+import cryptography.x509
+
+import gimmecert.crypto
+import gimmecert.timings
+
+
+def get_default_jobs():
+    """
+    Returns default number of worker processes to use for parallel
+    processing. This equals the number of available CPUs.
+
+    :returns: Default number of worker processes.
+    :rtype: int
+    """
+
+    return os.cpu_count() or 1
+
+
+def run_tasks(function, tasks, jobs=None):
+    """
+    Runs the passed-in function for each of the passed-in tasks,
+    spreading the work across a pool of worker processes.
+
+    Results are returned in the same order as the tasks, irrespective
+    of the order in which the worker processes finish them. If only a
+    single job is requested (or there is at most one task to process),
+    tasks are processed within the current process instead.
+
+    Since the tasks and results are passed between processes, both the
+    function and task arguments must be picklable. Functions within
+    this module operate on DER-encoded data for this reason.
+
+    :param function: Function to invoke for each task. Must be a module-level function.
+    :type function: callable
+
+    :param tasks: List of tasks, where each task is a tuple of positional arguments to pass to the function.
+    :type tasks: list[tuple]
+
+    :param jobs: Maximum number of worker processes to use. Set to None (default) to use number of available CPUs.
+    :type jobs: int or None
+
+    :returns: List of results, one for each task, in the same order as the tasks.
+    :rtype: list
+    """
+
+    if jobs is None:
+        jobs = get_default_jobs()
+
+    if jobs <= 1 or len(tasks) <= 1:
+        return [function(*task) for task in tasks]
+
+    jobs = min(jobs, len(tasks))
+
+    with gimmecert.timings.phase('parallel.tasks'), concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Hand out tasks in chunks to reduce inter-process
+        # communication overhead for large batches.
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        results = list(executor.map(function, *zip(*tasks), chunksize=chunksize))
+
+    return results
+
+
+def private_key_to_der(private_key):
+    """
+    Converts private key object into DER-encoded (PKCS#8, unencrypted)
+    representation suitable for passing between processes.
+
+    :param private_key: Private key to convert.
+    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+
+    :returns: DER-encoded private key.
+    :rtype: bytes
+    """
+
+    return private_key.private_bytes(
+        encoding=cryptography.hazmat.primitives.serialization.Encoding.DER,
+        format=cryptography.hazmat.primitives.serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=cryptography.hazmat.primitives.serialization.NoEncryption()
+    )
+
+
+def private_key_from_der(private_key_der):
+    """
+    Converts DER-encoded private key into private key object.
+
+    :param private_key_der: DER-encoded private key.
+    :type private_key_der: bytes
+
+    :returns: Private key object.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+    """
+
+    return cryptography.hazmat.primitives.serialization.load_der_private_key(
+        private_key_der,
+        None,  # no password
+        cryptography.hazmat.backends.default_backend()
+    )
+
+
+def public_key_to_der(public_key):
+    """
+    Converts public key object into DER-encoded (SubjectPublicKeyInfo)
+    representation suitable for passing between processes.
+
+    :param public_key: Public key to convert.
+    :type public_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey
+
+    :returns: DER-encoded public key.
+    :rtype: bytes
+    """
+
+    return public_key.public_bytes(
+        encoding=cryptography.hazmat.primitives.serialization.Encoding.DER,
+        format=cryptography.hazmat.primitives.serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+def public_key_from_der(public_key_der):
+    """
+    Converts DER-encoded public key into public key object.
+
+    :param public_key_der: DER-encoded public key.
+    :type public_key_der: bytes
+
+    :returns: Public key object.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey
+    """
+
+    return cryptography.hazmat.primitives.serialization.load_der_public_key(
+        public_key_der,
+        cryptography.hazmat.backends.default_backend()
+    )
+
+
+def certificate_to_der(certificate):
+    """
+    Converts certificate object into DER-encoded representation
+    suitable for passing between processes.
+
+    :param certificate: Certificate to convert.
+    :type certificate: cryptography.x509.Certificate
+
+    :returns: DER-encoded certificate.
+    :rtype: bytes
+    """
+
+    return certificate.public_bytes(encoding=cryptography.hazmat.primitives.serialization.Encoding.DER)
+
+
+def certificate_from_der(certificate_der):
+    """
+    Converts DER-encoded certificate into certificate object.
+
+    :param certificate_der: DER-encoded certificate.
+    :type certificate_der: bytes
+
+    :returns: Certificate object.
+    :rtype: cryptography.x509.Certificate
+    """
+
+    return cryptography.x509.load_der_x509_certificate(certificate_der, cryptography.hazmat.backends.default_backend())
+
+
+def csr_to_der(csr):
+    """
+    Converts CSR object into DER-encoded representation suitable for
+    passing between processes.
+
+    :param csr: CSR to convert.
+    :type csr: cryptography.x509.CertificateSigningRequest
+
+    :returns: DER-encoded CSR.
+    :rtype: bytes
+    """
+
+    return csr.public_bytes(encoding=cryptography.hazmat.primitives.serialization.Encoding.DER)
+
+
+def csr_from_der(csr_der):
+    """
+    Converts DER-encoded CSR into CSR object.
+
+    :param csr_der: DER-encoded CSR.
+    :type csr_der: bytes
+
+    :returns: CSR object.
+    :rtype: cryptography.x509.CertificateSigningRequest
+    """
+
+    return cryptography.x509.load_der_x509_csr(csr_der, cryptography.hazmat.backends.default_backend())
+
+
+@functools.lru_cache(maxsize=4)
+def _load_issuer(issuer_private_key_der, issuer_certificate_der):
+    """
+    Loads issuer private key and certificate from their DER-encoded
+    representation. Results are cached in order to avoid re-parsing
+    the issuer for every task processed by the same worker process.
+    """
+
+    return private_key_from_der(issuer_private_key_der), certificate_from_der(issuer_certificate_der)
+
+
+def generate_private_key_task(key_specification):
+    """
+    Generates a private key.
+
+    Function is meant to be used with run_tasks. Private key provider
+    is not consulted, since it is expected to be consulted by the
+    caller prior to distributing the tasks.
+
+    :param key_specification: Key specification for the private key. See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :returns: DER-encoded private key.
+    :rtype: bytes
+    """
+
+    return private_key_to_der(gimmecert.crypto.generate_private_key(key_specification, use_provider=False))
+
+
+def issue_certificate_task(entity_type, entity_name, extra_dns_names, public_key_der, key_specification, issuer_private_key_der, issuer_certificate_der):
+    """
+    Issues a server or client certificate, generating a private key
+    for the entity if no public key has been passed-in.
+
+    Function is meant to be used with run_tasks. All inputs and outputs
+    are DER-encoded in order to make them picklable. Private key
+    provider is not consulted, since it is expected to be consulted by
+    the caller prior to distributing the tasks.
+
+    :param entity_type: Type of entity, either ``server`` or ``client``.
+    :type entity_type: str
+
+    :param entity_name: Name of the entity.
+    :type entity_name: str
+
+    :param extra_dns_names: Additional DNS names to include in subject alternative name. Used only for server entities.
+    :type extra_dns_names: list[str] or None
+
+    :param public_key_der: DER-encoded public key of the entity. Set to None to generate a new private key.
+    :type public_key_der: bytes or None
+
+    :param key_specification: Key specification to use when generating a new private key. See gimmecert.crypto.generate_private_key for details.
+    :type key_specification: (str, int or str or None)
+
+    :param issuer_private_key_der: DER-encoded private key of the issuer.
+    :type issuer_private_key_der: bytes
+
+    :param issuer_certificate_der: DER-encoded certificate of the issuer.
+    :type issuer_certificate_der: bytes
+
+    :returns: (private_key_der, certificate_der) -- DER-encoded generated private key (None if public key was passed-in), and DER-encoded certificate.
+    :rtype: (bytes or None, bytes)
+    """
+
+    issuer_private_key, issuer_certificate = _load_issuer(issuer_private_key_der, issuer_certificate_der)
+
+    if public_key_der is None:
+        private_key = gimmecert.crypto.generate_private_key(key_specification, use_provider=False)
+        public_key = private_key.public_key()
+        private_key_der = private_key_to_der(private_key)
+    else:
+        public_key = public_key_from_der(public_key_der)
+        private_key_der = None
+
+    if entity_type == 'server':
+        certificate = gimmecert.crypto.issue_server_certificate(entity_name, public_key, issuer_private_key, issuer_certificate, extra_dns_names)
+    else:
+        certificate = gimmecert.crypto.issue_client_certificate(entity_name, public_key, issuer_private_key, issuer_certificate)
+
+    return private_key_der, certificate_to_der(certificate)
+
+
+def renew_certificate_task(certificate_der, issuer_private_key_der, issuer_certificate_der, public_key_der=None):
+    """
+    Renews a previously issued certificate, preserving its naming and
+    extensions, and (unless a new public key is passed-in) its public
+    key.
+
+    Function is meant to be used with run_tasks. The existing and
+    renewed certificates are passed DER-encoded in order to make them
+    picklable.
+
+    :param certificate_der: DER-encoded previously issued certificate.
+    :type certificate_der: bytes
+
+    :param issuer_private_key_der: DER-encoded private key of the issuer.
+    :type issuer_private_key_der: bytes
+
+    :param issuer_certificate_der: DER-encoded certificate of the issuer.
+    :type issuer_certificate_der: bytes
+
+    :param public_key_der: DER-encoded public key to use in renewed certificate. Set to None (default) to keep the existing public key.
+    :type public_key_der: bytes or None
+
+    :returns: DER-encoded renewed certificate.
+    :rtype: bytes
+    """
+
+    issuer_private_key, issuer_certificate = _load_issuer(issuer_private_key_der, issuer_certificate_der)
+    old_certificate = certificate_from_der(certificate_der)
+    public_key = old_certificate.public_key() if public_key_der is None else public_key_from_der(public_key_der)
+
+    certificate = gimmecert.crypto.renew_certificate(old_certificate, public_key, issuer_private_key, issuer_certificate)
+
+    return certificate_to_der(certificate)
+
+
+def verify_csr_task(csr_der):
+    """
+    Verifies signature of a CSR, ensuring that the CSR has been signed
+    by the private key matching the public key it contains.
+
+    Function is meant to be used with run_tasks.
+
+    :param csr_der: DER-encoded CSR.
+    :type csr_der: bytes
+
+    :returns: True if CSR signature is valid, False otherwise.
+    :rtype: bool
+    """
+
+    return csr_from_der(csr_der).is_signature_valid
@@ -0,0 +1,632 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+import datetime
+import os
+
+import gimmecert.locking
+import gimmecert.utils
+
+# Modules that depend on cryptography (crypto and storage) are imported
+# within methods that use them, since this module gets imported by the
+# CLI (via gimmecert.commands).
+
+
+#: Artefacts of a single entity, as returned by Project methods that
+#: issue certificates. Private key and CSR are set only if they have
+#: been stored during the operation. Paths are absolute, and point to
+#: artefacts stored within the .gimmecert directory (with storage
+#: backends other than ``files`` they exist only once the export-files
+#: command has been run). Private key and CSR paths are set to None if
+#: the entity has no stored private key or CSR.
+Entity = collections.namedtuple('Entity', ['entity_type', 'entity_name', 'certificate', 'private_key', 'csr',
+                                           'certificate_path', 'private_key_path', 'csr_path'])
+
+
+class ProjectError(Exception):
+    """
+    Base class for exceptions thrown by Project methods.
+    """
+    pass
+
+
+class NotInitialisedError(ProjectError):
+    """
+    Exception thrown if project directory has not been initialised.
+    """
+    pass
+
+
+class AlreadyInitialisedError(ProjectError):
+    """
+    Exception thrown when initialising an already initialised project
+    directory.
+    """
+    pass
+
+
+class CertificateAlreadyIssuedError(ProjectError):
+    """
+    Exception thrown when issuing a certificate for an entity that
+    already has one.
+    """
+    pass
+
+
+class UnknownEntityError(ProjectError):
+    """
+    Exception thrown when renewing certificate of an entity that has
+    no certificate.
+    """
+    pass
+
+
+class InvalidCSRError(ProjectError):
+    """
+    Exception thrown when signing a CSR that cannot be used for
+    issuing a certificate.
+    """
+    pass
+
+
+def get_csr_entity_name(csr, fallback_name):
+    """
+    Determines name of entity for which the passed-in CSR should be
+    signed. Common name from CSR subject is preferred, with fallback
+    name used for CSRs without a common name.
+
+    Names that cannot be safely used as part of artefact file names are
+    rejected.
+
+    :param csr: CSR to determine the entity name for.
+    :type csr: cryptography.x509.CertificateSigningRequest
+
+    :param fallback_name: Name to use if CSR subject has no common name. Set to None to not use any fallback.
+    :type fallback_name: str or None
+
+    :returns: Entity name, or None if no usable name could be determined.
+    :rtype: str or None
+    """
+
+    entity_name = gimmecert.utils.get_common_name(csr.subject) or fallback_name
+
+    if not entity_name or entity_name in ('.', '..') or '/' in entity_name or os.sep in entity_name:
+        return None
+
+    return entity_name
+
+
+def make_entity(project_directory, entity_type, entity_name, certificate, private_key, csr, key_or_csr):
+    """
+    Creates Entity describing artefacts of an entity, deriving artefact
+    paths from the project directory.
+
+    :param project_directory: Absolute path to project directory.
+    :type project_directory: str
+
+    :param entity_type: Type of entity, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param entity_name: Name of entity.
+    :type entity_name: str
+
+    :param certificate: Certificate of entity.
+    :type certificate: cryptography.x509.Certificate
+
+    :param private_key: Private key of entity, or None.
+    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None
+
+    :param csr: CSR of entity, or None.
+    :type csr: cryptography.x509.CertificateSigningRequest or None
+
+    :param key_or_csr: ``key`` if private key is stored for entity, ``csr`` if CSR is stored, None if neither.
+    :type key_or_csr: str or None
+
+    :returns: Entity.
+    :rtype: Entity
+    """
+
+    base_path = os.path.join(project_directory, '.gimmecert', entity_type, entity_name)
+
+    return Entity(entity_type, entity_name, certificate, private_key, csr,
+                  base_path + '.cert.pem',
+                  base_path + '.key.pem' if key_or_csr == 'key' else None,
+                  base_path + '.csr.pem' if key_or_csr == 'csr' else None)
+
+
+def validate_renew_arguments(entity_type, generate_new_private_key, csr, dns_names, key_specification):
+    """
+    Validates combination of arguments passed-in for renewing a
+    certificate. See Project.renew for description of arguments.
+
+    :raises ValueError: If conflicting arguments are passed-in.
+    """
+
+    if generate_new_private_key and csr is not None:
+        raise ValueError("Only one of the following two parameters should be specified: generate_new_private_key, csr.")
+
+    if dns_names is not None and entity_type != "server":
+        raise ValueError("Updating DNS subject alternative names can be done only for server certificates.")
+
+    if key_specification is not None and not generate_new_private_key:
+        raise ValueError("Key specification can be passed-in only when generating new private key.")
+
+
+class Project:
+    """
+    In-process interface to a single Gimmecert project.
+
+    Storage backend and CA hierarchy are loaded once (on first use),
+    and kept for the lifetime of the object, which makes it possible
+    to issue any number of certificates without reloading the
+    project. Methods return the resulting artefacts instead of
+    outputting any information, and report errors by throwing
+    exceptions derived from ProjectError.
+
+    Project locks (see gimmecert.locking) are honoured in the same way
+    as by the CLI commands, so project can be safely used while CLI
+    commands are running against it.
+    """
+
+    def __init__(self, project_directory):
+        """
+        Initialises the project interface. Project directory is not
+        accessed until the first method invocation.
+
+        :param project_directory: Path to project directory.
+        :type project_directory: str
+        """
+
+        self.project_directory = os.path.abspath(project_directory)
+        self._storage = None
+        self._ca_hierarchy = None
+
+    def is_initialised(self):
+        """
+        Checks if project directory has been initialised.
+
+        :returns: True if project has been initialised, False otherwise.
+        :rtype: bool
+        """
+
+        import gimmecert.storage
+
+        return gimmecert.storage.is_initialised(self.project_directory)
+
+    @property
+    def storage(self):
+        """
+        Storage backend used by the project.
+
+        :raises NotInitialisedError: If project has not been initialised.
+        """
+
+        import gimmecert.storage
+
+        if self._storage is None:
+            if not self.is_initialised():
+                raise NotInitialisedError("CA hierarchy has not been initialised in %s." % self.project_directory)
+
+            self._storage = gimmecert.storage.get_storage_backend(self.project_directory)
+
+        return self._storage
+
+    @property
+    def ca_hierarchy(self):
+        """
+        CA hierarchy of the project (see
+        gimmecert.storage.CAHierarchy). Private keys and certificates
+        are loaded on first access.
+
+        :raises NotInitialisedError: If project has not been initialised.
+        """
+
+        if self._ca_hierarchy is None:
+            self._ca_hierarchy = self.storage.read_ca_hierarchy()
+
+        return self._ca_hierarchy
+
+    def initialise(self, ca_base_name, ca_hierarchy_depth, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION, storage_backend='files',
+                   jobs=None):
+        """
+        Initialises the project directory, generating the CA hierarchy.
+
+        :param ca_base_name: Base name to use for constructing CA subject DNs.
+        :type ca_base_name: str
+
+        :param ca_hierarchy_depth: Length/depths of CA hierarchy that should be initialised. E.g. total number of CAs in chain.
+        :type ca_hierarchy_depth: int
+
+        :param key_specification: Key specification to use for generating CA private keys. See gimmecert.crypto.generate_private_key for details.
+        :type key_specification: (str, int or str or None)
+
+        :param storage_backend: Name of storage backend to use for storing artefacts, see gimmecert.storage.STORAGE_BACKENDS.
+        :type storage_backend: str
+
+        :param jobs: Maximum number of worker processes to use for generating CA private keys. Set to None (default) to use number of available CPUs.
+        :type jobs: int or None
+
+        :returns: Generated CA hierarchy, starting with the level 1 CA and moving down the chain to leaf CA.
+        :rtype: list[(cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey, cryptography.x509.Certificate)]
+
+        :raises AlreadyInitialisedError: If project has already been initialised.
+        """
+
+        import gimmecert.crypto
+        import gimmecert.storage
+
+        # Prevent concurrent initialisation, and keep other commands
+        # waiting until initialisation has been completed.
+        with gimmecert.locking.project_lock(self.project_directory, exclusive=True):
+            if os.path.exists(os.path.join(self.project_directory, '.gimmecert')):
+                raise AlreadyInitialisedError("CA hierarchy has already been initialised in %s." % self.project_directory)
+
+            storage = gimmecert.storage.STORAGE_BACKENDS[storage_backend](self.project_directory)
+            storage.initialise()
+
+            ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy(ca_base_name, ca_hierarchy_depth, key_specification, jobs)
+            storage.write_ca_hierarchy(ca_hierarchy)
+
+        self._storage = storage
+
+        return ca_hierarchy
+
+    def get_private_key(self, key_specification):
+        """
+        Obtains a private key for issuing an end entity certificate. Key
+        is taken from the project key pool if available, and generated
+        otherwise.
+
+        :param key_specification: Key specification for the private key. See gimmecert.crypto.generate_private_key for details.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Private key.
+        :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+        """
+
+        private_key, _ = self._take_private_key(key_specification)
+
+        return private_key
+
+    def _take_private_key(self, key_specification):
+        """
+        Obtains a private key in the same way as get_private_key,
+        returning the private key, and whether it has been taken from
+        the project key pool.
+        """
+
+        import gimmecert.crypto
+        import gimmecert.storage
+
+        private_key = gimmecert.storage.take_pooled_private_key(self.project_directory, key_specification)
+
+        if private_key is not None:
+            return private_key, True
+
+        return gimmecert.crypto.generate_private_key(key_specification), False
+
+    def _return_private_key(self, private_key, key_specification):
+        """
+        Puts private key taken from the project key pool back into the
+        pool, so it does not get lost if issuance fails.
+        """
+
+        import gimmecert.storage
+
+        gimmecert.storage.add_pooled_private_key(self.project_directory, private_key, key_specification)
+
+    def _issue(self, entity_type, entity_name, csr, key_specification, issue_certificate):
+        """
+        Issues certificate for a new entity, using the passed-in
+        function for issuing the certificate (invoked with entity name,
+        public key, and issuing CA private key and certificate).
+        """
+
+        storage = self.storage
+
+        with gimmecert.locking.project_lock(self.project_directory), gimmecert.locking.entity_lock(self.project_directory, entity_type, entity_name):
+            if storage.entity_exists(entity_type, entity_name):
+                raise CertificateAlreadyIssuedError("Certificate has already been issued for %s %s." % (entity_type, entity_name))
+
+            # Only the public key is used from the CSR.
+            if csr is not None:
+                private_key, pooled = None, False
+                public_key = csr.public_key()
+            else:
+                private_key, pooled = self._take_private_key(key_specification)
+                public_key = private_key.public_key()
+
+            try:
+                issuer_private_key, issuer_certificate = self.ca_hierarchy[-1]
+                certificate = issue_certificate(entity_name, public_key, issuer_private_key, issuer_certificate)
+
+                storage.write_entities([(entity_type, entity_name, certificate, private_key, csr)])
+            except BaseException:
+                if pooled:
+                    self._return_private_key(private_key, key_specification)
+                raise
+
+        return make_entity(self.project_directory, entity_type, entity_name, certificate, private_key, csr, 'csr' if csr is not None else 'key')
+
+    def issue_server(self, entity_name, extra_dns_names=None, csr=None, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+        """
+        Issues a server certificate.
+
+        If CSR is not passed-in, a private key will be generated and
+        stored. Otherwise the CSR is stored instead. Only the public key
+        is used from the CSR - no naming information is taken from it.
+
+        :param entity_name: Name of the server entity. Name will be used in subject DN and DNS subject alternative name.
+        :type entity_name: str
+
+        :param extra_dns_names: List of additional DNS names to include in the subject alternative name.
+        :type extra_dns_names: list[str] or None
+
+        :param csr: CSR to issue the certificate for. Set to None (default) to generate private key.
+        :type csr: cryptography.x509.CertificateSigningRequest or None
+
+        :param key_specification: Key specification to use when generating private key. Ignored if CSR is passed-in.
+            See gimmecert.crypto.generate_private_key for details.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Issued entity.
+        :rtype: Entity
+
+        :raises NotInitialisedError: If project has not been initialised.
+        :raises CertificateAlreadyIssuedError: If certificate has already been issued for the server.
+        """
+
+        import gimmecert.crypto
+
+        def issue_certificate(entity_name, public_key, issuer_private_key, issuer_certificate):
+            return gimmecert.crypto.issue_server_certificate(entity_name, public_key, issuer_private_key, issuer_certificate, extra_dns_names)
+
+        return self._issue('server', entity_name, csr, key_specification, issue_certificate)
+
+    def issue_client(self, entity_name, csr=None, key_specification=gimmecert.utils.DEFAULT_KEY_SPECIFICATION):
+        """
+        Issues a client certificate.
+
+        If CSR is not passed-in, a private key will be generated and
+        stored. Otherwise the CSR is stored instead. Only the public key
+        is used from the CSR - no naming information is taken from it.
+
+        :param entity_name: Name of the client entity. Name will be used in subject DN.
+        :type entity_name: str
+
+        :param csr: CSR to issue the certificate for. Set to None (default) to generate private key.
+        :type csr: cryptography.x509.CertificateSigningRequest or None
+
+        :param key_specification: Key specification to use when generating private key. Ignored if CSR is passed-in.
+            See gimmecert.crypto.generate_private_key for details.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Issued entity.
+        :rtype: Entity
+
+        :raises NotInitialisedError: If project has not been initialised.
+        :raises CertificateAlreadyIssuedError: If certificate has already been issued for the client.
+        """
+
+        import gimmecert.crypto
+
+        return self._issue('client', entity_name, csr, key_specification, gimmecert.crypto.issue_client_certificate)
+
+    def renew(self, entity_type, entity_name, generate_new_private_key=False, csr=None, dns_names=None, key_specification=None):
+        """
+        Renews existing certificate, while optionally generating a new
+        private key (or switching to a new CSR) in the process. Naming
+        and extensions are preserved.
+
+        :param entity_type: Type of entity, ``server`` or ``client``.
+        :type entity_type: str
+
+        :param entity_name: Name of entity. Name should refer to entity for which a certificate has already been issued.
+        :type entity_name: str
+
+        :param generate_new_private_key: Specify if a new private key should be generated. Cannot be used together with csr.
+        :type generate_new_private_key: bool
+
+        :param csr: CSR to use for the new certificate, replacing the stored private key or CSR. Cannot be used together with
+            generate_new_private_key.
+        :type csr: cryptography.x509.CertificateSigningRequest or None
+
+        :param dns_names: List of additional DNS names to use as replacement when renewing a server certificate. To remove additional DNS names,
+            set the value to empty list. To keep the existing DNS names, set the value to None. Valid only for server certificates.
+        :type dns_names: list[str] or None
+
+        :param key_specification: Key specification to use when generating new private key. Set to None (default) to use same key
+            specification as the existing certificate. Valid only when generating new private key.
+        :type key_specification: (str, int or str or None) or None
+
+        :returns: Renewed entity. Private key and CSR are set only if new private key has been generated or CSR has been passed-in.
+        :rtype: Entity
+
+        :raises ValueError: If conflicting arguments are passed-in.
+        :raises NotInitialisedError: If project has not been initialised.
+        :raises UnknownEntityError: If no certificate has been issued for the entity.
+        """
+
+        import gimmecert.crypto
+
+        validate_renew_arguments(entity_type, generate_new_private_key, csr, dns_names, key_specification)
+
+        storage = self.storage
+
+        with gimmecert.locking.project_lock(self.project_directory), gimmecert.locking.entity_lock(self.project_directory, entity_type, entity_name):
+            # Information will be extracted from the old certificate.
+            old_certificate = storage.read_certificate(entity_type, entity_name)
+
+            if old_certificate is None:
+                raise UnknownEntityError("No existing certificate found for %s %s." % (entity_type, entity_name))
+
+            old_key_or_csr = storage.get_key_or_csr(entity_type, entity_name)
+
+            # Generate new private key and use its public key for new
+            # certificate. Otherwise just reuse existing public key in
+            # certificate.
+            private_key, pooled = None, False
+
+            if generate_new_private_key:
+                if key_specification is None:
+                    key_specification = gimmecert.crypto.key_specification_from_public_key(old_certificate.public_key())
+                private_key, pooled = self._take_private_key(key_specification)
+                public_key = private_key.public_key()
+            elif csr is not None:
+                public_key = csr.public_key()
+            else:
+                public_key = old_certificate.public_key()
+
+            try:
+                issuer_private_key, issuer_certificate = self.ca_hierarchy[-1]
+
+                if entity_type == 'server' and dns_names is not None:
+                    certificate = gimmecert.crypto.issue_server_certificate(entity_name, public_key, issuer_private_key, issuer_certificate, dns_names)
+                else:
+                    certificate = gimmecert.crypto.renew_certificate(old_certificate, public_key, issuer_private_key, issuer_certificate)
+
+                # Storing private key removes the CSR, and vice versa.
+                storage.write_entities([(entity_type, entity_name, certificate, private_key, csr)])
+            except BaseException:
+                if pooled:
+                    self._return_private_key(private_key, key_specification)
+                raise
+
+        key_or_csr = 'csr' if csr is not None else 'key' if private_key is not None else old_key_or_csr
+
+        return make_entity(self.project_directory, entity_type, entity_name, certificate, private_key, csr, key_or_csr)
+
+    def sign_csr(self, entity_type, csr, fallback_name=None):
+        """
+        Issues server or client certificate for the passed-in CSR. Unlike
+        with issue_server and issue_client methods, entity name is taken
+        from common name in CSR subject (see get_csr_entity_name). Only
+        the public key and common name are used from the CSR.
+
+        :param entity_type: Type of entity to issue certificate for, ``server`` or ``client``.
+        :type entity_type: str
+
+        :param csr: CSR to sign.
+        :type csr: cryptography.x509.CertificateSigningRequest
+
+        :param fallback_name: Entity name to use if CSR subject has no common name.
+        :type fallback_name: str or None
+
+        :returns: Issued entity.
+        :rtype: Entity
+
+        :raises InvalidCSRError: If CSR signature is invalid, or if no entity name could be determined.
+        :raises NotInitialisedError: If project has not been initialised.
+        :raises CertificateAlreadyIssuedError: If certificate has already been issued for the entity.
+        """
+
+        if not csr.is_signature_valid:
+            raise InvalidCSRError("Invalid CSR signature.")
+
+        entity_name = get_csr_entity_name(csr, fallback_name)
+
+        if entity_name is None:
+            raise InvalidCSRError("Unable to determine entity name.")
+
+        if entity_type == 'server':
+            return self.issue_server(entity_name, csr=csr)
+
+        return self.issue_client(entity_name, csr=csr)
+
+    def inventory(self, rebuild_index=False):
+        """
+        Produces inventory records for CA hierarchy and issued
+        certificates. Records are produced one by one, starting with CA
+        hierarchy (in hierarchy order), followed by server and client
+        certificates (ordered by name).
+
+        Each record is a dictionary with the following keys:
+
+        - ``type``, one of ``ca``, ``server``, or ``client``.
+        - ``name``, name of CA level (``level1``, ``level2`` etc) or entity.
+        - ``subject``, subject DN of certificate.
+        - ``validity``, validity range of certificate.
+        - ``validity_status``, one of ``valid``, ``expired``, or ``not valid yet``.
+        - ``dns_names``, list of DNS subject alternative names (empty for CAs and clients).
+        - ``private_key``, path to private key (relative to project directory), or None.
+        - ``csr``, path to CSR (relative to project directory), or None.
+        - ``certificate``, path to certificate (relative to project directory).
+
+        Information about issued certificates is taken from the status
+        index (see gimmecert.storage.refresh_index), so no certificates
+        or CA private keys are parsed.
+
+        :param rebuild_index: Specify if status index should be rebuilt from scratch.
+        :type rebuild_index: bool
+
+        :returns: Generator producing inventory records.
+        :rtype: collections.abc.Iterator[dict]
+
+        :raises NotInitialisedError: If project has not been initialised.
+        """
+
+        now = datetime.datetime.now()
+
+        def get_validity_status(not_before, not_after):
+            """
+            Small helper function for determining validity status of a
+            certificate.
+            """
+
+            if not_before > now:
+                return "not valid yet"
+            elif not_after < now:
+                return "expired"
+
+            return "valid"
+
+        with gimmecert.locking.project_lock(self.project_directory):
+            index = self.storage.get_index(rebuild_index)
+
+            for i, certificate in enumerate(self.ca_hierarchy.certificates, 1):
+                yield {
+                    'type': 'ca',
+                    'name': 'level%d' % i,
+                    'subject': gimmecert.utils.dn_to_str(certificate.subject),
+                    'validity': gimmecert.utils.date_range_to_str(certificate.not_valid_before, certificate.not_valid_after),
+                    'validity_status': get_validity_status(certificate.not_valid_before, certificate.not_valid_after),
+                    'dns_names': [],
+                    'private_key': '.gimmecert/ca/level%d.key.pem' % i,
+                    'csr': None,
+                    'certificate': '.gimmecert/ca/level%d.cert.pem' % i,
+                }
+
+            for entity_type in ('server', 'client'):
+                # Keep ordering consistent with certificate file names.
+                for entity_name in sorted(index[entity_type], key=lambda name: name + '.cert.pem'):
+                    entry = index[entity_type][entity_name]
+
+                    yield {
+                        'type': entity_type,
+                        'name': entity_name,
+                        'subject': entry['subject'],
+                        'validity': gimmecert.utils.date_range_to_str(entry['not_before'], entry['not_after']),
+                        'validity_status': get_validity_status(entry['not_before'], entry['not_after']),
+                        'dns_names': entry['dns_names'],
+                        'private_key': '.gimmecert/%s/%s.key.pem' % (entity_type, entity_name) if entry['key_or_csr'] == 'key' else None,
+                        'csr': '.gimmecert/%s/%s.csr.pem' % (entity_type, entity_name) if entry['key_or_csr'] == 'csr' else None,
+                        'certificate': '.gimmecert/%s/%s.cert.pem' % (entity_type, entity_name),
+                    }
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import pytest
+
+import gimmecert.locking
+import gimmecert.project
+import gimmecert.utils
+
+# Storage module is imported within functions that use it, in order to
+# avoid importing cryptography when loading the plugin.
+
+
+#: Version of the cache layout. Changing the version invalidates
+#: existing caches.
+CACHE_VERSION = 1
+
+#: Base name used for constructing CA subject DNs.
+CA_BASE_NAME = 'Gimmecert pytest'
+
+#: Minimum remaining validity of cached certificates. CAs expiring
+#: sooner are re-initialised, while end entity certificates are
+#: renewed.
+MINIMUM_VALIDITY = datetime.timedelta(days=1)
+
+
+def pytest_addoption(parser):
+    """
+    Registers ini options for configuring the plugin. Plugin is
+    registered via the ``pytest11`` entry point.
+    """
+
+    parser.addini('gimmecert_cache_dir',
+                  "Directory for caching Gimmecert projects across test sessions. Defaults to the gimmecert directory within pytest cache.")
+    parser.addini('gimmecert_key_specification',
+                  "Key specification for CA and end entity private keys, for example rsa:2048, ecdsa:secp256r1, or ed25519.",
+                  default=gimmecert.utils.key_specification_to_str(gimmecert.utils.DEFAULT_KEY_SPECIFICATION))
+    parser.addini('gimmecert_ca_hierarchy_depth', "Depth of CA hierarchy.", default='1')
+
+
+def get_cache_directory(config, tmpdir_factory):
+    """
+    Returns directory where Gimmecert projects should be cached. Falls
+    back to temporary directory (valid for single test session) if
+    pytest cache is not available.
+
+    :param config: Pytest configuration.
+    :type config: _pytest.config.Config
+
+    :param tmpdir_factory: Pytest temporary directory factory.
+    :type tmpdir_factory: _pytest.tmpdir.TempdirFactory
+
+    :returns: Path to cache directory.
+    :rtype: str
+    """
+
+    cache_directory = config.getini('gimmecert_cache_dir')
+
+    if cache_directory:
+        return os.path.join(str(config.rootdir), os.path.expanduser(cache_directory))
+
+    if getattr(config, 'cache', None) is not None:
+        return config.cache.makedir('gimmecert').strpath
+
+    return tmpdir_factory.mktemp('gimmecert').strpath
+
+
+def get_project_directory(cache_directory, ca_hierarchy_depth, key_specification):
+    """
+    Returns path to directory of cached project with passed-in CA
+    hierarchy parameters.
+
+    :param cache_directory: Path to cache directory.
+    :type cache_directory: str
+
+    :param ca_hierarchy_depth: Depth of CA hierarchy.
+    :type ca_hierarchy_depth: int
+
+    :param key_specification: Key specification for CA and end entity private keys.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Path to project directory.
+    :rtype: str
+    """
+
+    cache_key = json.dumps([CACHE_VERSION, CA_BASE_NAME, ca_hierarchy_depth, list(key_specification)])
+
+    return os.path.join(cache_directory, 'project-%s' % hashlib.sha256(cache_key.encode()).hexdigest()[:16])
+
+
+def is_expiring(certificate):
+    """
+    Checks if certificate expires within MINIMUM_VALIDITY.
+
+    :param certificate: Certificate to check.
+    :type certificate: cryptography.x509.Certificate
+
+    :returns: True if certificate is expiring, False otherwise.
+    :rtype: bool
+    """
+
+    return certificate.not_valid_after < datetime.datetime.utcnow() + MINIMUM_VALIDITY
+
+
+def open_project(project_directory, ca_hierarchy_depth, key_specification):
+    """
+    Opens cached project, initialising it if it does not exist or if
+    any of its CAs is expiring.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param ca_hierarchy_depth: Depth of CA hierarchy.
+    :type ca_hierarchy_depth: int
+
+    :param key_specification: Key specification for CA private keys.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Project.
+    :rtype: gimmecert.project.Project
+    """
+
+    os.makedirs(project_directory, exist_ok=True)
+
+    # Parallel test sessions (for example pytest-xdist workers) can
+    # share the cache.
+    with gimmecert.locking.project_lock(project_directory, exclusive=True):
+        project = gimmecert.project.Project(project_directory)
+
+        if project.is_initialised() and any(is_expiring(certificate) for certificate in project.ca_hierarchy.certificates):
+            shutil.rmtree(os.path.join(project_directory, '.gimmecert'))
+
+    project = gimmecert.project.Project(project_directory)
+
+    try:
+        project.initialise(CA_BASE_NAME, ca_hierarchy_depth, key_specification)
+    except gimmecert.project.AlreadyInitialisedError:
+        pass
+
+    return project
+
+
+def get_entity(project, entity_type, entity_name, dns_names, key_specification):
+    """
+    Returns artefacts of an entity from the passed-in project. Stored
+    artefacts are reused as long as the certificate is not expiring,
+    and (for servers) has matching DNS names. Otherwise certificate is
+    renewed, keeping the existing private key. Certificate is issued
+    only if entity does not exist yet.
+
+    :param project: Project to get the entity from.
+    :type project: gimmecert.project.Project
+
+    :param entity_type: Type of entity, ``server`` or ``client``.
+    :type entity_type: str
+
+    :param entity_name: Name of entity.
+    :type entity_name: str
+
+    :param dns_names: Additional DNS names for server certificate. Ignored for clients.
+    :type dns_names: list[str]
+
+    :param key_specification: Key specification to use when generating private key.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Entity, with private key and certificate always set.
+    :rtype: gimmecert.project.Entity
+    """
+
+    import gimmecert.storage
+
+    try:
+        if entity_type == 'server':
+            return project.issue_server(entity_name, dns_names, key_specification=key_specification)
+
+        return project.issue_client(entity_name, key_specification=key_specification)
+    except gimmecert.project.CertificateAlreadyIssuedError:
+        pass
+
+    certificate = project.storage.read_certificate(entity_type, entity_name)
+
+    if entity_type == 'server' and gimmecert.utils.get_dns_names(certificate)[1:] != dns_names:
+        certificate = project.renew(entity_type, entity_name, dns_names=dns_names).certificate
+    elif is_expiring(certificate):
+        certificate = project.renew(entity_type, entity_name).certificate
+
+    entity = gimmecert.project.make_entity(project.project_directory, entity_type, entity_name, certificate, None, None, 'key')
+
+    return entity._replace(private_key=gimmecert.storage.read_private_key(entity.private_key_path))
+
+
+@pytest.fixture(scope='session')
+def gimmecert_project(request, tmpdir_factory):
+    """
+    Gimmecert project (gimmecert.project.Project) with initialised CA
+    hierarchy, kept in persistent cache directory.
+
+    CA hierarchy depth and key specification can be configured via
+    the ``gimmecert_ca_hierarchy_depth`` and
+    ``gimmecert_key_specification`` ini options.
+    """
+
+    config = request.config
+    ca_hierarchy_depth = int(config.getini('gimmecert_ca_hierarchy_depth'))
+    key_specification = gimmecert.utils.key_specification(config.getini('gimmecert_key_specification'))
+
+    project_directory = get_project_directory(get_cache_directory(config, tmpdir_factory), ca_hierarchy_depth, key_specification)
+
+    return open_project(project_directory, ca_hierarchy_depth, key_specification)
+
+
+def make_entity_factory(request, project, entity_type):
+    """
+    Returns function for obtaining entities of passed-in type from the
+    project. Entities are memoised for the duration of test session.
+    """
+
+    key_specification = gimmecert.utils.key_specification(request.config.getini('gimmecert_key_specification'))
+    entities = {}
+
+    def get(entity_name, dns_names):
+        if entity_name not in entities:
+            entities[entity_name] = get_entity(project, entity_type, entity_name, dns_names, key_specification)
+        elif entity_type == 'server' and gimmecert.utils.get_dns_names(entities[entity_name].certificate)[1:] != dns_names:
+            raise ValueError("Server certificate for %s has already been requested with different DNS names." % entity_name)
+
+        return entities[entity_name]
+
+    return get
+
+
+@pytest.fixture(scope='session')
+def gimmecert_server_cert(request, gimmecert_project):
+    """
+    Factory for server certificates, invoked as
+    ``gimmecert_server_cert(name, dns=None)``. Returns
+    gimmecert.project.Entity with private key, certificate, and paths
+    to them. Within a single test session, a server name can be used
+    only with the same set of additional DNS names.
+    """
+
+    get = make_entity_factory(request, gimmecert_project, 'server')
+
+    def gimmecert_server_cert(name, dns=None):
+        return get(name, list(dns or []))
+
+    return gimmecert_server_cert
+
+
+@pytest.fixture(scope='session')
+def gimmecert_client_cert(request, gimmecert_project):
+    """
+    Factory for client certificates, invoked as
+    ``gimmecert_client_cert(name)``. Returns gimmecert.project.Entity
+    with private key, certificate, and paths to them.
+    """
+
+    get = make_entity_factory(request, gimmecert_project, 'client')
+
+    def gimmecert_client_cert(name):
+        return get(name, [])
+
+    return gimmecert_client_cert
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import contextlib
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import threading
+import time
+
+
+#: Suffix of CSR files picked-up from spool directory.
+SPOOL_CSR_SUFFIX = '.csr.pem'
+
+#: Name of sub-directory within spool directory where rejected CSR files are moved.
+REJECTED_DIRECTORY_NAME = 'rejected'
+
+#: Maximum number of seconds to keep waiting for a batch of CSR files to complete.
+MAX_BATCH_DELAY = 2.0
+
+#: Inotify event signalling that a file opened for writing was closed.
+IN_CLOSE_WRITE = 0x00000008
+
+#: Inotify event signalling that a file was moved into watched directory.
+IN_MOVED_TO = 0x00000080
+
+#: Flag for creating non-blocking inotify file descriptor.
+IN_NONBLOCK = os.O_NONBLOCK
+
+#: Flag for creating inotify file descriptor with close-on-exec set.
+IN_CLOEXEC = 0o2000000
+
+
+class InotifyWatcher:
+    """
+    Watches directory for newly written files using Linux inotify
+    API. Only files that have been completely written (closed after
+    writing, or moved into the directory) are reported.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, directory):
+        """
+        Starts watching the passed-in directory.
+
+        :param directory: Path to directory to watch.
+        :type directory: str
+
+        :raises OSError: If inotify is not available, or if directory cannot be watched.
+        """
+
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("Inotify is not supported on this platform.")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "Failed to initialise inotify.")
+
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "Failed to watch directory %s." % directory)
+
+    def wait(self, timeout=None):
+        """
+        Waits for files to be written into the directory.
+
+        :param timeout: Maximum number of seconds to wait. Set to None (default) to wait indefinitely.
+        :type timeout: float or None
+
+        :returns: True if files have been written since last call, False if timeout was reached.
+        :rtype: bool
+        """
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return False
+
+        # Details about individual events are not needed, since the
+        # whole directory gets scanned anyway.
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+        return True
+
+    def close(self):
+        """
+        Stops watching the directory.
+        """
+
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Watches directory for changes by periodically listing its
+    content. Used as fallback where inotify is not available.
+    """
+
+    name = 'polling'
+
+    def __init__(self, directory, interval):
+        """
+        Starts watching the passed-in directory.
+
+        :param directory: Path to directory to watch.
+        :type directory: str
+
+        :param interval: Number of seconds between consecutive directory listings.
+        :type interval: float
+        """
+
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self._get_snapshot()
+
+    def _get_snapshot(self):
+        """
+        Returns names, sizes, and modification times of CSR files
+        currently present in the directory.
+        """
+
+        snapshot = set()
+
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(SPOOL_CSR_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, file_name))
+                snapshot.add((file_name, stat.st_size, stat.st_mtime_ns))
+
+        return snapshot
+
+    def wait(self, timeout=None):
+        """
+        Waits for CSR files in the directory to change.
+
+        :param timeout: Maximum number of seconds to wait. Set to None (default) to wait indefinitely.
+        :type timeout: float or None
+
+        :returns: True if CSR files have changed since last call, False if timeout was reached.
+        :rtype: bool
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            delay = self.interval if deadline is None else min(self.interval, max(0, deadline - time.monotonic()))
+            time.sleep(delay)
+
+            snapshot = self._get_snapshot()
+
+            if snapshot != self.snapshot:
+                self.snapshot = snapshot
+                return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        """
+        Stops watching the directory.
+        """
+
+        pass
+
+
+def get_watcher(directory, poll_interval, use_inotify=True):
+    """
+    Returns watcher for the passed-in directory. Inotify is used where
+    available, with polling used as fallback.
+
+    :param directory: Path to directory to watch.
+    :type directory: str
+
+    :param poll_interval: Number of seconds between consecutive directory listings when polling.
+    :type poll_interval: float
+
+    :param use_inotify: Specify if inotify should be used if available.
+    :type use_inotify: bool
+
+    :returns: Directory watcher.
+    :rtype: InotifyWatcher or PollingWatcher
+    """
+
+    if use_inotify:
+        try:
+            return InotifyWatcher(directory)
+        except OSError:
+            pass
+
+    return PollingWatcher(directory, poll_interval)
+
+
+def wait_for_batch(watcher, debounce, max_delay, timeout=None):
+    """
+    Waits for changes in the watched directory, and then keeps waiting
+    until no further changes happen for debounce period (or until
+    maximum delay has been reached). This groups files written in
+    quick succession into a single batch.
+
+    :param watcher: Directory watcher.
+    :type watcher: InotifyWatcher or PollingWatcher
+
+    :param debounce: Number of seconds without changes after which the batch is considered complete.
+    :type debounce: float
+
+    :param max_delay: Maximum number of seconds to wait for the batch to complete after the first change.
+    :type max_delay: float
+
+    :param timeout: Maximum number of seconds to wait for the first change. Set to None (default) to wait indefinitely.
+    :type timeout: float or None
+    """
+
+    if not watcher.wait(timeout):
+        return
+
+    deadline = time.monotonic() + max_delay
+
+    while time.monotonic() < deadline and watcher.wait(min(debounce, max(0, deadline - time.monotonic()))):
+        pass
+
+
+@contextlib.contextmanager
+def deferred_interrupts():
+    """
+    Context manager that defers keyboard interrupts and termination
+    signals received within its block until the block has been
+    completed, at which point KeyboardInterrupt is raised. This
+    prevents batch of CSRs from being left half-processed (for example
+    with certificates issued, but CSR files still in spool directory).
+
+    Signals can only be deferred when running in the main thread - in
+    other threads the context manager does nothing.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    received = []
+
+    def defer(signum, frame):
+        received.append(signum)
+
+    previous_handlers = {signum: signal.signal(signum, defer) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+    try:
+        yield
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
+    if received:
+        raise KeyboardInterrupt()
+
+
+def list_csr_files(directory):
+    """
+    Lists CSR files in the spool directory, in name order.
+
+    :param directory: Path to spool directory.
+    :type directory: str
+
+    :returns: List of CSR file names.
+    :rtype: list[str]
+    """
+
+    return sorted(f for f in os.listdir(directory) if f.endswith(SPOOL_CSR_SUFFIX) and os.path.isfile(os.path.join(directory, f)))
+
+
+def reject_csr_file(directory, file_name):
+    """
+    Moves CSR file into sub-directory for rejected CSRs, so it does not
+    get picked-up again. Rejected file with the same name is replaced.
+
+    :param directory: Path to spool directory.
+    :type directory: str
+
+    :param file_name: Name of CSR file to reject.
+    :type file_name: str
+
+    :returns: Path to rejected CSR file.
+    :rtype: str
+    """
+
+    rejected_directory = os.path.join(directory, REJECTED_DIRECTORY_NAME)
+    os.makedirs(rejected_directory, exist_ok=True)
+
+    rejected_path = os.path.join(rejected_directory, file_name)
+    os.replace(os.path.join(directory, file_name), rejected_path)
+
+    return rejected_path
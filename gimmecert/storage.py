@@ -19,14 +19,254 @@
 #
 
 
+import collections.abc
+import contextlib
+import csv
+import datetime
+import fnmatch
+import functools
+import json
 import os
+import sqlite3
+import struct
+import threading
+import uuid
 
-import cryptography.x509
+import cryptography.hazmat.backends
+import cryptography.hazmat.primitives.asymmetric.ed25519
 import cryptography.hazmat.primitives.serialization
+import cryptography.x509
 
+import gimmecert.locking
+import gimmecert.parallel
+import gimmecert.timings
 import gimmecert.utils
 
 
+#: Name of file within the CA directory used for caching the parsed CA certificates.
+CA_HIERARCHY_CACHE_FILENAME = 'hierarchy.cache'
+
+#: Header identifying the CA hierarchy cache file format.
+CA_HIERARCHY_CACHE_MAGIC = b'gimmecert-ca-hierarchy-cache-v3\n'
+
+
+#: Version of status index format. Indexes with different version are discarded.
+INDEX_VERSION = 1
+
+#: Format used for storing dates within status index.
+INDEX_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+#: Name of database file within the .gimmecert directory used by SQLite storage backend.
+SQLITE_DATABASE_FILENAME = 'storage.sqlite'
+
+#: Number of seconds to wait for other processes to release lock on SQLite database.
+SQLITE_TIMEOUT = 60
+
+#: Schema of SQLite storage backend database.
+SQLITE_SCHEMA = """
+CREATE TABLE ca (
+    level INTEGER PRIMARY KEY,
+    private_key BLOB NOT NULL,
+    certificate BLOB NOT NULL
+);
+
+CREATE TABLE entity (
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    dns_names TEXT NOT NULL,
+    not_before TEXT NOT NULL,
+    not_after TEXT NOT NULL,
+    serial TEXT NOT NULL,
+    certificate BLOB NOT NULL,
+    private_key BLOB,
+    csr BLOB,
+    PRIMARY KEY (type, name)
+);
+
+CREATE INDEX entity_name ON entity (name);
+CREATE INDEX entity_not_after ON entity (not_after);
+CREATE INDEX entity_serial ON entity (serial);
+"""
+
+#: SQL expression for determining if entity has private key or CSR stored in SQLite storage backend database.
+SQLITE_KEY_OR_CSR_EXPRESSION = "CASE WHEN private_key IS NOT NULL THEN 'key' WHEN csr IS NOT NULL THEN 'csr' END"
+
+
+# In-process memo of CA hierarchies. Maps absolute CA directory (or
+# SQLite database) path to (fingerprint, ca_hierarchy) pairs.
+_ca_hierarchy_memo = {}
+
+
+class InvalidManifest(Exception):
+    """
+    Exception thrown if batch issuance manifest cannot be read or has
+    invalid content.
+    """
+    pass
+
+
+def get_temporary_path(path):
+    """
+    Returns unique path for temporary file holding content destined
+    for the passed-in path. Temporary file is placed next to the
+    destination, so it can be atomically renamed into place. Path is
+    unique across both processes and threads.
+
+    :param path: Destination path.
+    :type path: str
+
+    :returns: Path to temporary file.
+    :rtype: str
+    """
+
+    return "%s.%s.tmp" % (path, uuid.uuid4().hex)
+
+
+class ArtefactWriter:
+    """
+    Transactional writer for artefacts stored within the project
+    directory.
+
+    Content passed to the writer is written-out into temporary files
+    placed next to destination paths. Once the transaction is
+    committed, temporary files are flushed to disk as a group, renamed
+    into place, and each affected directory is flushed to disk once.
+    Readers therefore never get to see partially written artefacts,
+    and writing out a large number of artefacts incurs a single
+    directory sync per directory.
+
+    If the transaction is aborted, temporary files are removed and
+    destination paths are left untouched.
+
+    Writer can be used as a context manager, in which case the
+    transaction is committed on exit, or aborted if an exception has
+    been raised.
+    """
+
+    def __init__(self, durable=True):
+        """
+        Initialises the writer.
+
+        :param durable: Whether to flush written files and their directories to disk when committing.
+        :type durable: bool
+        """
+
+        self.durable = durable
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def write(self, path, content):
+        """
+        Writes content destined for the passed-in path into a temporary
+        file. Destination path is not modified until the transaction is
+        committed. Writing to same path multiple times within a
+        transaction replaces previously written content.
+
+        :param path: Destination path.
+        :type path: str
+
+        :param content: Content to write.
+        :type content: bytes
+        """
+
+        temporary_path = self._pending.get(path) or get_temporary_path(path)
+
+        # Register the temporary file up-front, so it gets cleaned-up
+        # on abort even if writing fails half-way through.
+        self._pending[path] = temporary_path
+
+        with open(temporary_path, 'wb') as temporary_file:
+            temporary_file.write(content)
+
+    @gimmecert.timings.timed('storage.write')
+    def commit(self):
+        """
+        Commits the transaction, moving all written files into place.
+
+        If moving of files fails, remaining temporary files are
+        removed.
+        """
+
+        pending, self._pending = self._pending, {}
+        directories = set()
+
+        try:
+            if self.durable:
+                for temporary_path in pending.values():
+                    _fsync_path(temporary_path)
+
+            for path, temporary_path in list(pending.items()):
+                os.replace(temporary_path, path)
+                del pending[path]
+                directories.add(os.path.dirname(os.path.abspath(path)))
+
+            if self.durable:
+                for directory in sorted(directories):
+                    _fsync_path(directory)
+        finally:
+            self._pending = pending
+            self.abort()
+
+    def abort(self):
+        """
+        Aborts the transaction, removing all temporary files.
+        """
+
+        pending, self._pending = self._pending, {}
+
+        for temporary_path in pending.values():
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+
+def _fsync_path(path):
+    """
+    Flushes file or directory designated by path to disk.
+
+    :param path: Path to file or directory.
+    :type path: str
+    """
+
+    descriptor = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _write_artefact(path, content, writer):
+    """
+    Writes artefact content using passed-in writer. If no writer has
+    been passed-in, content is written atomically on its own.
+
+    :param path: Destination path.
+    :type path: str
+
+    :param content: Content to write.
+    :type content: bytes
+
+    :param writer: Writer to use, or None to write the artefact immediately.
+    :type writer: ArtefactWriter or None
+    """
+
+    if writer is None:
+        with ArtefactWriter() as writer:
+            writer.write(path, content)
+    else:
+        writer.write(path, content)
+
+
 def initialise_storage(project_directory):
     """
     Initialises certificate storage in the given project directory.
@@ -48,31 +288,42 @@ def initialise_storage(project_directory):
     os.mkdir(os.path.join(project_directory, '.gimmecert', 'client'))
 
 
-def write_private_key(private_key, path):
+def write_private_key(private_key, path, writer=None):
     """
     Writes the passed-in private key to designated path in
-    OpenSSL-style PEM format.
+    OpenSSL-style PEM format. Ed25519 private keys are written in
+    PKCS#8 PEM format instead.
 
     The private key is written without any encryption.
 
     :param private_key: Private key that should be written.
-    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
 
     :param path: File path where the key should be written.
     :type path: str
+
+    :param writer: Writer to use for the write, allowing it to be grouped with other writes. If None, file is written atomically on its own.
+    :type writer: ArtefactWriter or None
     """
 
+    # Ed25519 keys can be serialised only in PKCS#8 format.
+    if isinstance(private_key, cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey):
+        private_key_format = cryptography.hazmat.primitives.serialization.PrivateFormat.PKCS8
+    else:
+        private_key_format = cryptography.hazmat.primitives.serialization.PrivateFormat.TraditionalOpenSSL
+
     private_key_pem = private_key.private_bytes(
         encoding=cryptography.hazmat.primitives.serialization.Encoding.PEM,
-        format=cryptography.hazmat.primitives.serialization.PrivateFormat.TraditionalOpenSSL,
+        format=private_key_format,
         encryption_algorithm=cryptography.hazmat.primitives.serialization.NoEncryption()
     )
 
-    with open(path, 'wb') as key_file:
-        key_file.write(private_key_pem)
+    _write_artefact(path, private_key_pem, writer)
 
 
-def write_certificate(certificate, path):
+def write_certificate(certificate, path, writer=None):
     """
     Writes the passed-in certificate to designated path in
     OpenSSL-style PEM format.
@@ -82,15 +333,17 @@ def write_certificate(certificate, path):
 
     :param path: File path where the certificate should be written.
     :type path: str
+
+    :param writer: Writer to use for the write, allowing it to be grouped with other writes. If None, file is written atomically on its own.
+    :type writer: ArtefactWriter or None
     """
 
     certificate_pem = certificate.public_bytes(encoding=cryptography.hazmat.primitives.serialization.Encoding.PEM)
 
-    with open(path, 'wb') as certificate_file:
-        certificate_file.write(certificate_pem)
+    _write_artefact(path, certificate_pem, writer)
 
 
-def write_certificate_chain(certificate_chain, path):
+def write_certificate_chain(certificate_chain, path, writer=None):
     """
     Writes the passed-in certificate chain to designated path in
     OpenSSL-style PEM format. Certificates are separated with
@@ -101,14 +354,16 @@ def write_certificate_chain(certificate_chain, path):
 
     :param path: File path where the chain should be written.
     :type path: str
+
+    :param writer: Writer to use for the write, allowing it to be grouped with other writes. If None, file is written atomically on its own.
+    :type writer: ArtefactWriter or None
     """
 
     chain_pem = "\n".join(
         [gimmecert.utils.certificate_to_pem(certificate) for certificate in certificate_chain]
     )
 
-    with open(path, 'w') as certificate_chain_file:
-        certificate_chain_file.write(chain_pem)
+    _write_artefact(path, chain_pem.encode(), writer)
 
 
 def is_initialised(project_directory):
@@ -126,43 +381,312 @@ def is_initialised(project_directory):
     return False
 
 
+class CAHierarchy(collections.abc.Sequence):
+    """
+    CA hierarchy, behaving as a read-only sequence of CA private
+    key/certificate pairs, starting with the level 1 CA and moving down
+    the chain to leaf CA.
+
+    Private keys and certificates are loaded on first access, and kept
+    for subsequent accesses. Accessing a single CA level (for example
+    the issuing CA via ``ca_hierarchy[-1]``) loads only the private key
+    of that level, while accessing the certificates (see certificates
+    property) does not load any private keys at all.
+    """
+
+    def __init__(self, private_key_loaders, certificate_loaders):
+        """
+        Initialises the CA hierarchy.
+
+        :param private_key_loaders: Functions (invoked without arguments) that load private key of each CA level, in hierarchy order.
+        :type private_key_loaders: list[callable]
+
+        :param certificate_loaders: Functions (invoked without arguments) that load certificate of each CA level, in hierarchy order.
+        :type certificate_loaders: list[callable]
+        """
+
+        self._loaders = {'private_key': list(private_key_loaders), 'certificate': list(certificate_loaders)}
+        self._loaded = {'private_key': [None] * len(certificate_loaders), 'certificate': [None] * len(certificate_loaders)}
+        self._lock = threading.Lock()
+
+    def _get(self, artefact, index):
+        """
+        Returns artefact of the CA level with the passed-in index,
+        loading it if necessary.
+        """
+
+        # Normalises negative indices, and raises IndexError for invalid ones.
+        index = range(len(self))[index]
+
+        with self._lock:
+            if self._loaded[artefact][index] is None:
+                with gimmecert.timings.phase('ca.load'):
+                    self._loaded[artefact][index] = self._loaders[artefact][index]()
+
+            return self._loaded[artefact][index]
+
+    def get_private_key(self, index):
+        """
+        Returns private key of a CA level.
+
+        :param index: Index of CA level within the hierarchy (0 for level 1 CA, -1 for leaf CA).
+        :type index: int
+
+        :returns: CA private key.
+        :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+
+        :raises IndexError: If CA level does not exist.
+        """
+
+        return self._get('private_key', index)
+
+    def get_certificate(self, index):
+        """
+        Returns certificate of a CA level.
+
+        :param index: Index of CA level within the hierarchy (0 for level 1 CA, -1 for leaf CA).
+        :type index: int
+
+        :returns: CA certificate.
+        :rtype: cryptography.x509.Certificate
+
+        :raises IndexError: If CA level does not exist.
+        """
+
+        return self._get('certificate', index)
+
+    @property
+    def certificates(self):
+        """
+        List of CA certificates, starting with the level 1 CA and moving
+        down the chain to leaf CA.
+        """
+
+        return [self.get_certificate(index) for index in range(len(self))]
+
+    def __len__(self):
+        return len(self._loaders['certificate'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        return self.get_private_key(index), self.get_certificate(index)
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+
+        return list(self) == list(other)
+
+
+def get_ca_hierarchy_fingerprint(ca_directory):
+    """
+    Calculates fingerprint of the CA hierarchy stored within the
+    directory. The fingerprint changes whenever any of the CA private
+    key or certificate files gets replaced or modified.
+
+    Fingerprint is made-up out of modification time, size, and inode
+    of each CA private key and certificate file, in hierarchy
+    order. Directory is listed only once, without probing for
+    individual files.
+
+    :param ca_directory: Path to directory containing the CA artifacts (private keys and certificates).
+    :type ca_directory: str
+
+    :returns: Fingerprint of CA hierarchy, with one (private key file fingerprint, certificate file fingerprint) pair per CA level.
+        Empty tuple if directory does not exist.
+    :rtype: tuple[((int, int, int), (int, int, int))]
+    """
+
+    files = {}
+
+    try:
+        for file_name in os.listdir(ca_directory):
+            if file_name.startswith('level') and file_name.endswith('.pem'):
+                stat = os.stat(os.path.join(ca_directory, file_name))
+                files[file_name] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except FileNotFoundError:
+        return ()
+
+    fingerprint = []
+
+    level = 1
+    while "level%d.key.pem" % level in files and "level%d.cert.pem" % level in files:
+        fingerprint.append((files["level%d.key.pem" % level], files["level%d.cert.pem" % level]))
+        level = level + 1
+
+    return tuple(fingerprint)
+
+
+@gimmecert.timings.timed('ca.load')
 def read_ca_hierarchy(ca_directory):
     """
-    Reads an entirye CA hierarchy from the directory, and returns the
-    CA private key/certificate pairs in hierarchy order.
+    Reads an entirye CA hierarchy from the directory. Private keys and
+    certificates are loaded on first access (see CAHierarchy).
 
     Only private key and certificate files that conform to naming
     pattern 'levelN.key.pem' and 'levelN.cert.pem' will be read.
 
+    Loaded private keys and certificates are cached in-process.
+    Certificates are additionally cached on-disk (in DER format) in
+    order to avoid repeated PEM parsing, while private keys are always
+    read from their PEM files. Caches are invalidated whenever any of
+    the CA files changes (see get_ca_hierarchy_fingerprint).
+
     :param ca_directory: Path to directory containing the CA artifacts (private keys and certificates).
     :type ca_directory: str
 
-    :returns: List of private key/certificate pairs, starting with the level 1 CA and moving down the chain to leaf CA.
-    :rtype: list[(cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey, cryptography.x509.Certificate)]
+    :returns: CA hierarchy, starting with the level 1 CA and moving down the chain to leaf CA.
+    :rtype: CAHierarchy
     """
 
-    ca_hierarchy = []
+    ca_directory = os.path.abspath(ca_directory)
+    fingerprint = get_ca_hierarchy_fingerprint(ca_directory)
 
-    level = 1
-    while os.path.exists(os.path.join(ca_directory, "level%d.key.pem" % level)) and os.path.exists(os.path.join(ca_directory, "level%d.cert.pem" % level)):
-        private_key = read_private_key(os.path.join(ca_directory, 'level%d.key.pem' % level))
-        certificate = read_certificate(os.path.join(ca_directory, 'level%d.cert.pem' % level))
-        ca_hierarchy.append((private_key, certificate))
-        level = level + 1
+    memo = _ca_hierarchy_memo.get(ca_directory)
+    if memo is not None and memo[0] == fingerprint:
+        return memo[1]
+
+    levels = range(1, len(fingerprint) + 1)
+    cache_path = os.path.join(ca_directory, CA_HIERARCHY_CACHE_FILENAME)
+    cached_certificates = [read_ca_hierarchy_cache(cache_path, fingerprint)]
+
+    def get_private_key_loader(level):
+        """
+        Small helper function for producing function that loads a CA
+        private key from its PEM file.
+        """
+
+        return lambda: read_private_key(os.path.join(ca_directory, 'level%d.key.pem' % level))
+
+    def get_certificate_loader(level):
+        """
+        Small helper function for producing function that loads a CA
+        certificate, preferring the on-disk cache over the PEM
+        file. Since certificates are cheap to parse, all of them get
+        read and cached at once if the cache is unusable.
+        """
+
+        def load():
+            if cached_certificates[0] is not None:
+                try:
+                    return gimmecert.parallel.certificate_from_der(cached_certificates[0][level - 1])
+                except ValueError:
+                    pass
+
+            certificates = [read_certificate(os.path.join(ca_directory, 'level%d.cert.pem' % i)) for i in levels]
+            cached_certificates[0] = [gimmecert.parallel.certificate_to_der(certificate) for certificate in certificates]
+            write_ca_hierarchy_cache(cache_path, fingerprint, cached_certificates[0])
+
+            return certificates[level - 1]
+
+        return load
+
+    ca_hierarchy = CAHierarchy([get_private_key_loader(level) for level in levels], [get_certificate_loader(level) for level in levels])
+
+    _ca_hierarchy_memo[ca_directory] = (fingerprint, ca_hierarchy)
 
     return ca_hierarchy
 
 
+def read_ca_hierarchy_cache(cache_path, fingerprint):
+    """
+    Reads DER-encoded CA certificates from the cache file. Cache is
+    used only if it has been created for CA hierarchy with matching
+    fingerprint. Certificates are not parsed.
+
+    :param cache_path: Path to CA hierarchy cache file.
+    :type cache_path: str
+
+    :param fingerprint: Fingerprint of the current CA hierarchy, as returned by get_ca_hierarchy_fingerprint.
+    :type fingerprint: tuple
+
+    :returns: List of DER-encoded certificates, or None if cache is missing, stale, or unreadable.
+    :rtype: list[bytes] or None
+    """
+
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            content = cache_file.read()
+    except OSError:
+        return None
+
+    header = CA_HIERARCHY_CACHE_MAGIC + json.dumps(fingerprint).encode() + b'\n'
+
+    if not content.startswith(header):
+        return None
+
+    certificates_der = []
+    offset = len(header)
+
+    try:
+        for _ in fingerprint:
+            certificate_length, = struct.unpack_from('>I', content, offset)
+            offset += 4
+
+            if offset + certificate_length > len(content):
+                return None
+
+            certificates_der.append(content[offset:offset + certificate_length])
+            offset += certificate_length
+    except struct.error:
+        return None
+
+    return certificates_der
+
+
+def write_ca_hierarchy_cache(cache_path, fingerprint, certificates_der):
+    """
+    Writes DER-encoded CA certificates to the cache file. Cache file is
+    replaced atomically. Failure to write the cache (for example due to
+    read-only project directory) is silently ignored.
+
+    Private keys are never cached, in order to avoid storing additional
+    copies of them.
+
+    :param cache_path: Path to CA hierarchy cache file.
+    :type cache_path: str
+
+    :param fingerprint: Fingerprint of the CA hierarchy, as returned by get_ca_hierarchy_fingerprint.
+    :type fingerprint: tuple
+
+    :param certificates_der: List of DER-encoded certificates, starting with the level 1 CA and moving down the chain to leaf CA.
+    :type certificates_der: list[bytes]
+    """
+
+    chunks = [CA_HIERARCHY_CACHE_MAGIC, json.dumps(fingerprint).encode(), b'\n']
+
+    for certificate_der in certificates_der:
+        chunks.extend([struct.pack('>I', len(certificate_der)), certificate_der])
+
+    temporary_path = get_temporary_path(cache_path)
+
+    try:
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(b''.join(chunks))
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
 def read_private_key(private_key_path):
     """
-    Reads RSA private key from the designated path. The key should be
-    provided in OpenSSL-style PEM format, unencrypted.
+    Reads private key from the designated path. The key should be
+    provided in OpenSSL-style or PKCS#8 PEM format, unencrypted. RSA,
+    ECDSA, and Ed25519 private keys are supported.
 
     :param private_key_path: Path to private key to read.
     :type private_key_path: str
 
     :returns: Private key object read from the specified file.
-    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+        cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey
     """
 
     with open(private_key_path, 'rb') as private_key_file:
@@ -196,7 +720,7 @@ def read_certificate(certificate_path):
     return certificate
 
 
-def write_csr(csr, path):
+def write_csr(csr, path, writer=None):
     """
     Writes the passed-in certificate signing request to designated
     path in OpenSSL-style PEM format.
@@ -206,14 +730,17 @@ def write_csr(csr, path):
 
     :param path: File path where the CSR should be written.
     :type path: str
+
+    :param writer: Writer to use for the write, allowing it to be grouped with other writes. If None, file is written atomically on its own.
+    :type writer: ArtefactWriter or None
     """
 
     csr_pem = csr.public_bytes(encoding=cryptography.hazmat.primitives.serialization.Encoding.PEM)
 
-    with open(path, 'wb') as csr_file:
-        csr_file.write(csr_pem)
+    _write_artefact(path, csr_pem, writer)
 
 
+@gimmecert.timings.timed('csr.read')
 def read_csr(csr_path):
     """
     Reads X.509 certificate signing request from the designated file
@@ -234,3 +761,1118 @@ def read_csr(csr_path):
         )
 
     return csr
+
+
+@gimmecert.timings.timed('csr.read')
+def read_csrs(csr_path):
+    """
+    Reads one or more X.509 certificate signing requests from the
+    designated file path. CSRs are expected to be provided in
+    OpenSSL-style PEM format, concatenated one after another.
+
+    :param csr_path: Path to file with CSRs.
+    :type csr_path: str
+
+    :returns: List of CSR objects read from the specified file, in the same order as they appear in the file.
+    :rtype: list[cryptography.x509.CertificateSigningRequest]
+
+    :raises ValueError: If file contains no CSRs, or if any of the CSRs is invalid.
+    """
+
+    with open(csr_path, 'r') as csr_file:
+        return gimmecert.utils.csrs_from_pem(csr_file.read())
+
+
+def get_key_pool_directory(project_directory):
+    """
+    Returns path to directory holding the pre-generated private keys
+    for the passed-in project directory.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :returns: Path to key pool directory.
+    :rtype: str
+    """
+
+    return os.path.join(project_directory, '.gimmecert', 'pool')
+
+
+def get_pooled_private_key_prefix(key_specification):
+    """
+    Returns file name prefix used for pooled private keys of the
+    passed-in key specification.
+
+    :param key_specification: Key specification tuple, consisting out of algorithm and its parameters.
+    :type key_specification: (str, int or str or None)
+
+    :returns: File name prefix, for example ``rsa-2048.`` or ``ed25519.``.
+    :rtype: str
+    """
+
+    return "%s." % gimmecert.utils.key_specification_to_str(key_specification).replace(':', '-')
+
+
+def add_pooled_private_key(project_directory, private_key, key_specification, writer=None):
+    """
+    Adds the passed-in private key to project key pool, making it
+    available for later issuance.
+
+    The key is written-out atomically (see ArtefactWriter), ensuring
+    that other processes never get to see a partially written private
+    key. Key pool directory is created if it does not exist.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param private_key: Private key that should be added to the pool.
+    :type private_key: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey
+
+    :param key_specification: Key specification matching the private key.
+    :type key_specification: (str, int or str or None)
+
+    :param writer: Writer to use for writing the key, allowing it to be grouped with other writes. If None, key is written on its own.
+    :type writer: ArtefactWriter or None
+    """
+
+    pool_directory = get_key_pool_directory(project_directory)
+    os.makedirs(pool_directory, exist_ok=True)
+
+    name = "%s%s" % (get_pooled_private_key_prefix(key_specification), uuid.uuid4().hex)
+
+    write_private_key(private_key, os.path.join(pool_directory, '%s.key.pem' % name), writer)
+
+
+def count_pooled_private_keys(project_directory, key_specification=None):
+    """
+    Counts the number of private keys currently available in the
+    project key pool.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param key_specification: Key specification to count the keys for. Set to None (default) to count all keys.
+    :type key_specification: (str, int or str or None) or None
+
+    :returns: Number of available private keys.
+    :rtype: int
+    """
+
+    pool_directory = get_key_pool_directory(project_directory)
+
+    if not os.path.isdir(pool_directory):
+        return 0
+
+    prefix = get_pooled_private_key_prefix(key_specification) if key_specification else ''
+
+    return len([f for f in os.listdir(pool_directory) if f.startswith(prefix) and f.endswith('.key.pem')])
+
+
+@gimmecert.timings.timed('key.pool')
+def take_pooled_private_key(project_directory, key_specification):
+    """
+    Takes a single private key matching the passed-in key
+    specification from the project key pool, removing it from the
+    pool in the process.
+
+    Keys are claimed by renaming them, which guarantees that each
+    pooled key is handed out only once, even if multiple processes
+    are taking keys from the pool at the same time.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param key_specification: Key specification of the private key to take.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Private key taken from the pool, or None if the pool has no matching keys.
+    :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None
+    """
+
+    pool_directory = get_key_pool_directory(project_directory)
+
+    if not os.path.isdir(pool_directory):
+        return None
+
+    prefix = get_pooled_private_key_prefix(key_specification)
+
+    for key_file in sorted(f for f in os.listdir(pool_directory) if f.startswith(prefix) and f.endswith('.key.pem')):
+        key_path = os.path.join(pool_directory, key_file)
+        claimed_path = "%s.claimed-%d" % (key_path, os.getpid())
+
+        try:
+            os.rename(key_path, claimed_path)
+        except FileNotFoundError:
+            # Someone else has claimed the key in the meantime.
+            continue
+
+        private_key = read_private_key(claimed_path)
+        os.remove(claimed_path)
+
+        return private_key
+
+    return None
+
+
+def read_manifest(manifest_path):
+    """
+    Reads batch issuance manifest from the designated path. Manifest
+    format is determined based on file extension. Supported formats
+    are JSON (``.json``), CSV (``.csv``), and YAML (``.yaml`` or
+    ``.yml``). Reading YAML manifests requires the PyYAML package to
+    be installed.
+
+    JSON and YAML manifests should contain a list of entities, where
+    each entity is a mapping with the following keys:
+
+    - ``type`` (mandatory), either ``server`` or ``client``.
+    - ``name`` (mandatory), name of the entity.
+    - ``dns_names`` (optional), list of additional DNS names. Valid only
+      for server entities.
+    - ``csr`` (optional), path to CSR to use for issuance instead of
+      generating a private key.
+    - ``key_specification`` (optional), key specification to use when
+      generating a private key, for example ``rsa:2048`` or
+      ``ecdsa:secp256r1``.
+
+    CSV manifests should contain a header row with the same column
+    names. Multiple additional DNS names are separated by whitespace.
+
+    Relative CSR paths are interpreted relative to the directory
+    containing the manifest.
+
+    :param manifest_path: Path to manifest file.
+    :type manifest_path: str
+
+    :returns: List of entities to issue, with each entity described using a dictionary with keys type, name, dns_names, csr, and
+        key_specification (parsed key specification tuple, or None if not specified).
+    :rtype: list[dict]
+
+    :raises InvalidManifest: If manifest cannot be read or parsed, or if it contains invalid entries.
+    """
+
+    extension = os.path.splitext(manifest_path)[1].lower()
+
+    try:
+        with open(manifest_path, 'r', newline='') as manifest_file:
+            if extension == '.json':
+                entries = json.load(manifest_file)
+            elif extension == '.csv':
+                entries = list(csv.DictReader(manifest_file))
+                for entry in entries:
+                    entry['dns_names'] = (entry.get('dns_names') or '').split()
+            elif extension in ('.yaml', '.yml'):
+                try:
+                    import yaml
+                except ImportError:
+                    raise InvalidManifest("Reading YAML manifests requires the PyYAML package to be installed.")
+                entries = yaml.safe_load(manifest_file)
+            else:
+                raise InvalidManifest("Unsupported manifest format: %s. Supported formats are JSON, CSV, and YAML." % manifest_path)
+    except (OSError, ValueError) as e:
+        raise InvalidManifest("Failed to read manifest %s: %s" % (manifest_path, e))
+    except InvalidManifest:
+        raise
+    except Exception as e:
+        # Parsing errors raised by PyYAML.
+        raise InvalidManifest("Failed to read manifest %s: %s" % (manifest_path, e))
+
+    if not isinstance(entries, list):
+        raise InvalidManifest("Manifest must contain a list of entities.")
+
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+    entities = []
+
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise InvalidManifest("Manifest entry %d is not a mapping." % number)
+
+        entity_type = entry.get('type')
+        entity_name = entry.get('name')
+        dns_names = entry.get('dns_names') or []
+        csr_path = entry.get('csr') or None
+        key_specification = entry.get('key_specification') or None
+
+        if entity_type not in ('server', 'client'):
+            raise InvalidManifest("Manifest entry %d has invalid type: %s. Type must be one of: server, client." % (number, entity_type))
+
+        if not entity_name:
+            raise InvalidManifest("Manifest entry %d is missing the entity name." % number)
+
+        if not isinstance(dns_names, list):
+            raise InvalidManifest("Manifest entry %d must list additional DNS names as a list." % number)
+
+        if dns_names and entity_type != 'server':
+            raise InvalidManifest("Manifest entry %d specifies additional DNS names, which are valid only for server entities." % number)
+
+        if csr_path:
+            csr_path = os.path.join(manifest_directory, csr_path)
+
+        if key_specification:
+            try:
+                key_specification = gimmecert.utils.key_specification(str(key_specification))
+            except ValueError:
+                raise InvalidManifest("Manifest entry %d has invalid key specification: %s." % (number, key_specification))
+
+        entities.append({
+            'type': entity_type,
+            'name': str(entity_name),
+            'dns_names': [str(dns_name) for dns_name in dns_names],
+            'csr': csr_path,
+            'key_specification': key_specification,
+        })
+
+    return entities
+
+
+def get_index_path(project_directory):
+    """
+    Returns path to status index of the project.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :returns: Path to status index.
+    :rtype: str
+    """
+
+    return os.path.join(project_directory, '.gimmecert', 'index.json')
+
+
+def get_index_entry(certificate, fingerprint, key_or_csr):
+    """
+    Produces status index entry for the passed-in certificate.
+
+    :param certificate: Certificate to produce the entry for.
+    :type certificate: cryptography.x509.Certificate
+
+    :param fingerprint: Fingerprint of certificate file, consisting out of its modification time, size, and inode.
+    :type fingerprint: (int, int, int)
+
+    :param key_or_csr: Specifies if entity has private key (``key``) or CSR (``csr``) stored alongside the certificate. None if neither.
+    :type key_or_csr: str or None
+
+    :returns: Status index entry, with keys subject, dns_names, not_before, not_after, serial, key_or_csr, and fingerprint.
+    :rtype: dict
+    """
+
+    return {
+        'subject': gimmecert.utils.dn_to_str(certificate.subject),
+        'dns_names': gimmecert.utils.get_dns_names(certificate),
+        'not_before': certificate.not_valid_before,
+        'not_after': certificate.not_valid_after,
+        'serial': certificate.serial_number,
+        'key_or_csr': key_or_csr,
+        'fingerprint': list(fingerprint),
+    }
+
+
+def read_index(project_directory):
+    """
+    Reads status index of the project. Index maps entity type
+    (``server`` or ``client``) to mapping between entity names and their
+    index entries (see get_index_entry).
+
+    Missing, unreadable, or outdated index is treated as empty.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :returns: Status index.
+    :rtype: dict[str, dict[str, dict]]
+    """
+
+    index = {'server': {}, 'client': {}}
+
+    try:
+        with open(get_index_path(project_directory), 'r') as index_file:
+            content = json.load(index_file)
+
+        if content['version'] != INDEX_VERSION:
+            return index
+
+        for entity_type in index:
+            for entity_name, entry in content[entity_type].items():
+                entry['not_before'] = datetime.datetime.strptime(entry['not_before'], INDEX_DATETIME_FORMAT)
+                entry['not_after'] = datetime.datetime.strptime(entry['not_after'], INDEX_DATETIME_FORMAT)
+                index[entity_type][entity_name] = entry
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return {'server': {}, 'client': {}}
+
+    return index
+
+
+def write_index(project_directory, index):
+    """
+    Writes status index of the project. Index file is replaced
+    atomically. Failure to write the index is silently ignored, since
+    the index can always be rebuilt from issued certificates.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param index: Status index, as returned by read_index.
+    :type index: dict[str, dict[str, dict]]
+    """
+
+    content = {'version': INDEX_VERSION}
+
+    for entity_type, entries in index.items():
+        content[entity_type] = {}
+
+        for entity_name, entry in entries.items():
+            entry = dict(entry)
+            entry['not_before'] = entry['not_before'].strftime(INDEX_DATETIME_FORMAT)
+            entry['not_after'] = entry['not_after'].strftime(INDEX_DATETIME_FORMAT)
+            content[entity_type][entity_name] = entry
+
+    index_path = get_index_path(project_directory)
+    temporary_path = get_temporary_path(index_path)
+
+    try:
+        with open(temporary_path, 'w') as index_file:
+            json.dump(content, index_file, sort_keys=True)
+        os.replace(temporary_path, index_path)
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+@gimmecert.timings.timed('index.update')
+def update_index(project_directory, entities):
+    """
+    Updates status index with information about newly issued or
+    renewed certificates.
+
+    Updates are serialised between processes using the index lock (see
+    gimmecert.locking.INDEX_LOCK_NAME), so concurrently issued
+    certificates do not get dropped from the index.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param entities: List of entities to update, where each entity is described by its type, name, and issued certificate.
+    :type entities: list[(str, str, cryptography.x509.Certificate)]
+    """
+
+    with gimmecert.locking.named_lock(project_directory, gimmecert.locking.INDEX_LOCK_NAME):
+        index = read_index(project_directory)
+
+        for entity_type, entity_name, certificate in entities:
+            base_path = os.path.join(project_directory, '.gimmecert', entity_type, entity_name)
+            stat = os.stat(base_path + '.cert.pem')
+
+            # Freshly issued certificate is always accompanied by either private key or CSR.
+            key_or_csr = 'key' if os.path.exists(base_path + '.key.pem') else 'csr'
+
+            index[entity_type][entity_name] = get_index_entry(certificate, (stat.st_mtime_ns, stat.st_size, stat.st_ino), key_or_csr)
+
+        write_index(project_directory, index)
+
+
+@gimmecert.timings.timed('index.read')
+def refresh_index(project_directory, rebuild=False):
+    """
+    Brings status index up-to-date with certificates issued within the
+    project, and returns it.
+
+    Each entity directory is listed only once. Certificates are
+    re-parsed only if they are not present in the index, or if their
+    fingerprint (modification time, size, and inode) has changed.
+    Entries for removed certificates are dropped from the index.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :param rebuild: Specify if index should be rebuilt from scratch, re-parsing all certificates.
+    :type rebuild: bool
+
+    :returns: Status index, as returned by read_index.
+    :rtype: dict[str, dict[str, dict]]
+    """
+
+    if rebuild:
+        index = {'server': {}, 'client': {}}
+    else:
+        index = read_index(project_directory)
+
+    changed = rebuild
+
+    for entity_type in ('server', 'client'):
+        entity_directory = os.path.join(project_directory, '.gimmecert', entity_type)
+        file_names = set()
+        fingerprints = {}
+
+        for file_name in os.listdir(entity_directory):
+            file_names.add(file_name)
+
+            if file_name.endswith('.cert.pem'):
+                stat = os.stat(os.path.join(entity_directory, file_name))
+                fingerprints[file_name[:-len('.cert.pem')]] = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+        old_entries = index[entity_type]
+        new_entries = {}
+
+        for entity_name, fingerprint in fingerprints.items():
+            if entity_name + '.key.pem' in file_names:
+                key_or_csr = 'key'
+            elif entity_name + '.csr.pem' in file_names:
+                key_or_csr = 'csr'
+            else:
+                key_or_csr = None
+
+            entry = old_entries.get(entity_name)
+
+            if entry is None or entry['fingerprint'] != fingerprint:
+                certificate = read_certificate(os.path.join(entity_directory, entity_name + '.cert.pem'))
+                entry = get_index_entry(certificate, fingerprint, key_or_csr)
+            elif entry['key_or_csr'] != key_or_csr:
+                entry = dict(entry, key_or_csr=key_or_csr)
+
+            new_entries[entity_name] = entry
+
+        if new_entries != old_entries:
+            changed = True
+
+        index[entity_type] = new_entries
+
+    if changed:
+        write_index(project_directory, index)
+
+    return index
+
+
+class FilesystemBackend:
+    """
+    Storage backend that keeps every artefact in a separate PEM file
+    within the .gimmecert directory of the project. This is the
+    default storage backend.
+
+    Storage backends provide access to the CA hierarchy and to
+    artefacts of issued certificates (private keys, CSRs, and
+    certificates), referring to entities by their type (``server`` or
+    ``client``) and name. All storage backends implement the same
+    interface as this class.
+    """
+
+    #: Name of storage backend, as used when initialising the project.
+    name = 'files'
+
+    def __init__(self, project_directory):
+        """
+        Initialises the storage backend.
+
+        :param project_directory: Path to project directory.
+        :type project_directory: str
+        """
+
+        self.project_directory = project_directory
+        self.base_directory = os.path.join(project_directory, '.gimmecert')
+
+    def _get_path(self, entity_type, entity_name, artefact):
+        """
+        Returns path to artefact (``key``, ``csr``, or ``cert``) of the
+        passed-in entity.
+        """
+
+        return os.path.join(self.base_directory, entity_type, '%s.%s.pem' % (entity_name, artefact))
+
+    def initialise(self):
+        """
+        Initialises the storage in project directory.
+        """
+
+        initialise_storage(self.project_directory)
+
+    @gimmecert.timings.timed('ca.load')
+    def read_ca_hierarchy(self):
+        """
+        Reads the CA hierarchy. Private keys and certificates are loaded
+        on first access.
+
+        :returns: CA hierarchy, starting with the level 1 CA and moving down the chain to leaf CA.
+        :rtype: CAHierarchy
+        """
+
+        return read_ca_hierarchy(os.path.join(self.base_directory, 'ca'))
+
+    @gimmecert.timings.timed('storage.write')
+    def write_ca_hierarchy(self, ca_hierarchy):
+        """
+        Writes the CA hierarchy, including the full certificate chain.
+
+        :param ca_hierarchy: List of private key/certificate pairs, starting with the level 1 CA and moving down the chain to leaf CA.
+        :type ca_hierarchy: list[(cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey, cryptography.x509.Certificate)]
+        """
+
+        ca_directory = os.path.join(self.base_directory, 'ca')
+
+        with ArtefactWriter() as writer:
+            for level, (private_key, certificate) in enumerate(ca_hierarchy, 1):
+                write_private_key(private_key, os.path.join(ca_directory, 'level%d.key.pem' % level), writer)
+                write_certificate(certificate, os.path.join(ca_directory, 'level%d.cert.pem' % level), writer)
+
+            full_chain = [certificate for _, certificate in ca_hierarchy]
+            write_certificate_chain(full_chain, os.path.join(ca_directory, 'chain-full.cert.pem'), writer)
+
+    def entity_exists(self, entity_type, entity_name):
+        """
+        Checks if any artefacts have been stored for the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: True if entity has any stored artefacts, False otherwise.
+        :rtype: bool
+        """
+
+        return any(os.path.exists(self._get_path(entity_type, entity_name, artefact)) for artefact in ('key', 'csr', 'cert'))
+
+    def get_key_or_csr(self, entity_type, entity_name):
+        """
+        Checks whether private key or CSR is stored for the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: ``key`` if private key is stored, ``csr`` if CSR is stored, None if neither.
+        :rtype: str or None
+        """
+
+        if os.path.exists(self._get_path(entity_type, entity_name, 'key')):
+            return 'key'
+        elif os.path.exists(self._get_path(entity_type, entity_name, 'csr')):
+            return 'csr'
+
+        return None
+
+    @gimmecert.timings.timed('storage.read')
+    def read_certificate(self, entity_type, entity_name):
+        """
+        Reads certificate of the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: Certificate, or None if no certificate has been issued for the entity.
+        :rtype: cryptography.x509.Certificate or None
+        """
+
+        path = self._get_path(entity_type, entity_name, 'cert')
+
+        return read_certificate(path) if os.path.exists(path) else None
+
+    def read_entities(self):
+        """
+        Reads artefacts of all entities with issued certificates.
+        Entities are produced one by one, ordered by type (servers
+        first), and then by name.
+
+        :returns: Generator producing entities, each described by its type, name, certificate, private key, and CSR.
+        :rtype: collections.abc.Iterator[(str, str, cryptography.x509.Certificate,
+            cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None, cryptography.x509.CertificateSigningRequest or None)]
+        """
+
+        index = self.get_index()
+
+        for entity_type in ('server', 'client'):
+            for entity_name in sorted(index[entity_type], key=lambda name: name + '.cert.pem'):
+                key_or_csr = index[entity_type][entity_name]['key_or_csr']
+
+                with gimmecert.timings.phase('storage.read'):
+                    entity = (
+                        entity_type,
+                        entity_name,
+                        read_certificate(self._get_path(entity_type, entity_name, 'cert')),
+                        read_private_key(self._get_path(entity_type, entity_name, 'key')) if key_or_csr == 'key' else None,
+                        read_csr(self._get_path(entity_type, entity_name, 'csr')) if key_or_csr == 'csr' else None,
+                    )
+
+                yield entity
+
+    @gimmecert.timings.timed('storage.write')
+    def write_entities(self, entities):
+        """
+        Writes artefacts of the passed-in entities within a single
+        transaction, and updates the status index.
+
+        Each entity is described by its type, name, certificate,
+        private key, and CSR. Storing a private key removes previously
+        stored CSR, and vice versa. If neither is passed-in, previously
+        stored private key or CSR is kept.
+
+        :param entities: List of entities to write.
+        :type entities: list[(str, str, cryptography.x509.Certificate, cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None,
+            cryptography.x509.CertificateSigningRequest or None)]
+        """
+
+        obsolete_paths = []
+
+        with ArtefactWriter() as writer:
+            for entity_type, entity_name, certificate, private_key, csr in entities:
+                if private_key is not None:
+                    write_private_key(private_key, self._get_path(entity_type, entity_name, 'key'), writer)
+                    obsolete_paths.append(self._get_path(entity_type, entity_name, 'csr'))
+
+                if csr is not None:
+                    write_csr(csr, self._get_path(entity_type, entity_name, 'csr'), writer)
+                    obsolete_paths.append(self._get_path(entity_type, entity_name, 'key'))
+
+                write_certificate(certificate, self._get_path(entity_type, entity_name, 'cert'), writer)
+
+        for path in obsolete_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+        update_index(self.project_directory, [(entity_type, entity_name, certificate) for entity_type, entity_name, certificate, _, _ in entities])
+
+    @gimmecert.timings.timed('index.read')
+    def get_index(self, rebuild=False):
+        """
+        Returns status index, describing all issued certificates. See
+        read_index for description of its structure.
+
+        :param rebuild: Specify if index should be rebuilt from scratch.
+        :type rebuild: bool
+
+        :returns: Status index.
+        :rtype: dict[str, dict[str, dict]]
+        """
+
+        return refresh_index(self.project_directory, rebuild)
+
+    def select_entities(self, entity_types, name_glob=None, expiring_before=None):
+        """
+        Selects entities with issued certificates matching the passed-in
+        criteria. Entities are ordered by type (servers first), and then
+        by name.
+
+        :param entity_types: Types of entities to select.
+        :type entity_types: collections.abc.Iterable[str]
+
+        :param name_glob: Shell-style wildcard pattern that entity names must match. Set to None to match all names.
+        :type name_glob: str or None
+
+        :param expiring_before: Select only entities with certificates expiring before passed-in date. Set to None to ignore expiry.
+        :type expiring_before: datetime.datetime or None
+
+        :returns: List of selected entities, each described by its type and name.
+        :rtype: list[(str, str)]
+        """
+
+        index = self.get_index()
+        selected = []
+
+        for entity_type in ('server', 'client'):
+            if entity_type not in entity_types:
+                continue
+
+            for entity_name in sorted(index[entity_type], key=lambda name: name + '.cert.pem'):
+                if name_glob is not None and not fnmatch.fnmatchcase(entity_name, name_glob):
+                    continue
+
+                if expiring_before is not None and index[entity_type][entity_name]['not_after'] > expiring_before:
+                    continue
+
+                selected.append((entity_type, entity_name))
+
+        return selected
+
+
+class SQLiteBackend:
+    """
+    Storage backend that keeps all artefacts in a single SQLite
+    database within the .gimmecert directory of the project (see
+    SQLITE_DATABASE_FILENAME). Artefacts are stored DER-encoded, with
+    certificate information needed for status reporting and entity
+    selection kept in indexed columns.
+
+    Implements the same interface as FilesystemBackend. The status
+    index is not used, since the database itself serves the same
+    purpose.
+    """
+
+    #: Name of storage backend, as used when initialising the project.
+    name = 'sqlite'
+
+    def __init__(self, project_directory):
+        """
+        Initialises the storage backend.
+
+        :param project_directory: Path to project directory.
+        :type project_directory: str
+        """
+
+        self.project_directory = project_directory
+        self.database_path = os.path.abspath(os.path.join(project_directory, '.gimmecert', SQLITE_DATABASE_FILENAME))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Opens connection to the database. All statements executed via
+        the connection are run within a single transaction, which is
+        committed on exit (or rolled back on error).
+        """
+
+        connection = sqlite3.connect(self.database_path, timeout=SQLITE_TIMEOUT)
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def initialise(self):
+        """
+        Initialises the storage in project directory.
+        """
+
+        os.mkdir(os.path.join(self.project_directory, '.gimmecert'))
+
+        with self._connect() as connection:
+            connection.executescript(SQLITE_SCHEMA)
+
+    @gimmecert.timings.timed('ca.load')
+    def read_ca_hierarchy(self):
+        """
+        Reads the CA hierarchy. Private keys and certificates are loaded
+        on first access, and private keys are read from the database
+        only at that point. Loaded CA hierarchy is cached in-process.
+
+        :returns: CA hierarchy, starting with the level 1 CA and moving down the chain to leaf CA.
+        :rtype: CAHierarchy
+        """
+
+        with self._connect() as connection:
+            certificates_der = tuple(row[0] for row in connection.execute("SELECT certificate FROM ca ORDER BY level"))
+
+        memo = _ca_hierarchy_memo.get(self.database_path)
+        if memo is not None and memo[0] == certificates_der:
+            return memo[1]
+
+        def get_private_key_loader(level):
+            """
+            Small helper function for producing function that loads CA
+            private key from the database.
+            """
+
+            def load():
+                with self._connect() as connection:
+                    private_key_der, = connection.execute("SELECT private_key FROM ca WHERE level = ?", (level,)).fetchone()
+
+                return gimmecert.parallel.private_key_from_der(private_key_der)
+
+            return load
+
+        ca_hierarchy = CAHierarchy(
+            [get_private_key_loader(level) for level in range(1, len(certificates_der) + 1)],
+            [functools.partial(gimmecert.parallel.certificate_from_der, certificate_der) for certificate_der in certificates_der],
+        )
+
+        _ca_hierarchy_memo[self.database_path] = (certificates_der, ca_hierarchy)
+
+        return ca_hierarchy
+
+    @gimmecert.timings.timed('storage.write')
+    def write_ca_hierarchy(self, ca_hierarchy):
+        """
+        Writes the CA hierarchy.
+
+        :param ca_hierarchy: List of private key/certificate pairs, starting with the level 1 CA and moving down the chain to leaf CA.
+        :type ca_hierarchy: list[(cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey, cryptography.x509.Certificate)]
+        """
+
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT INTO ca (level, private_key, certificate) VALUES (?, ?, ?)",
+                [(level, gimmecert.parallel.private_key_to_der(private_key), gimmecert.parallel.certificate_to_der(certificate))
+                 for level, (private_key, certificate) in enumerate(ca_hierarchy, 1)]
+            )
+
+    def _read_column(self, entity_type, entity_name, column):
+        """
+        Reads value of a single column for the passed-in entity.
+
+        :returns: Column value, or None if entity does not exist.
+        """
+
+        with self._connect() as connection:
+            row = connection.execute("SELECT %s FROM entity WHERE type = ? AND name = ?" % column, (entity_type, entity_name)).fetchone()
+
+        return row[0] if row else None
+
+    def entity_exists(self, entity_type, entity_name):
+        """
+        Checks if any artefacts have been stored for the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: True if entity has any stored artefacts, False otherwise.
+        :rtype: bool
+        """
+
+        return self._read_column(entity_type, entity_name, '1') is not None
+
+    def get_key_or_csr(self, entity_type, entity_name):
+        """
+        Checks whether private key or CSR is stored for the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: ``key`` if private key is stored, ``csr`` if CSR is stored, None if neither.
+        :rtype: str or None
+        """
+
+        return self._read_column(entity_type, entity_name, SQLITE_KEY_OR_CSR_EXPRESSION)
+
+    @gimmecert.timings.timed('storage.read')
+    def read_certificate(self, entity_type, entity_name):
+        """
+        Reads certificate of the passed-in entity.
+
+        :param entity_type: Type of entity.
+        :type entity_type: str
+
+        :param entity_name: Name of entity.
+        :type entity_name: str
+
+        :returns: Certificate, or None if no certificate has been issued for the entity.
+        :rtype: cryptography.x509.Certificate or None
+        """
+
+        certificate_der = self._read_column(entity_type, entity_name, 'certificate')
+
+        return gimmecert.parallel.certificate_from_der(certificate_der) if certificate_der else None
+
+    def read_entities(self):
+        """
+        Reads artefacts of all entities with issued certificates.
+        Entities are produced one by one, ordered by type (servers
+        first), and then by name.
+
+        :returns: Generator producing entities, each described by its type, name, certificate, private key, and CSR.
+        :rtype: collections.abc.Iterator[(str, str, cryptography.x509.Certificate,
+            cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None, cryptography.x509.CertificateSigningRequest or None)]
+        """
+
+        for entity_type in ('server', 'client'):
+            with gimmecert.timings.phase('storage.read'), self._connect() as connection:
+                rows = connection.execute("SELECT name, certificate, private_key, csr FROM entity WHERE type = ?", (entity_type,)).fetchall()
+
+            for entity_name, certificate_der, private_key_der, csr_der in sorted(rows, key=lambda row: row[0] + '.cert.pem'):
+                with gimmecert.timings.phase('storage.read'):
+                    entity = (
+                        entity_type,
+                        entity_name,
+                        gimmecert.parallel.certificate_from_der(certificate_der),
+                        gimmecert.parallel.private_key_from_der(private_key_der) if private_key_der else None,
+                        cryptography.x509.load_der_x509_csr(csr_der, cryptography.hazmat.backends.default_backend()) if csr_der else None,
+                    )
+
+                yield entity
+
+    @gimmecert.timings.timed('storage.write')
+    def write_entities(self, entities):
+        """
+        Writes artefacts of the passed-in entities within a single
+        transaction.
+
+        Each entity is described by its type, name, certificate,
+        private key, and CSR. Storing a private key removes previously
+        stored CSR, and vice versa. If neither is passed-in, previously
+        stored private key or CSR is kept.
+
+        :param entities: List of entities to write.
+        :type entities: list[(str, str, cryptography.x509.Certificate, cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or None,
+            cryptography.x509.CertificateSigningRequest or None)]
+        """
+
+        rows = []
+
+        for entity_type, entity_name, certificate, private_key, csr in entities:
+            subject, dns_names, not_before, not_after, serial = _get_certificate_columns(certificate)
+            rows.append({
+                'subject': subject,
+                'dns_names': dns_names,
+                'not_before': not_before,
+                'not_after': not_after,
+                'serial': serial,
+                'type': entity_type,
+                'name': entity_name,
+                'certificate': gimmecert.parallel.certificate_to_der(certificate),
+                'private_key': gimmecert.parallel.private_key_to_der(private_key) if private_key is not None else None,
+                'csr': csr.public_bytes(cryptography.hazmat.primitives.serialization.Encoding.DER) if csr is not None else None,
+            })
+
+        # Upsert is implemented as update followed by insert (instead of
+        # INSERT ... ON CONFLICT) in order to support SQLite versions
+        # older than 3.24. Both run within the same transaction.
+        with self._connect() as connection:
+            for row in rows:
+                cursor = connection.execute(
+                    """UPDATE entity SET
+                        subject = :subject,
+                        dns_names = :dns_names,
+                        not_before = :not_before,
+                        not_after = :not_after,
+                        serial = :serial,
+                        certificate = :certificate,
+                        private_key = CASE WHEN :csr IS NULL THEN coalesce(:private_key, private_key) END,
+                        csr = CASE WHEN :private_key IS NULL THEN coalesce(:csr, csr) END
+                    WHERE type = :type AND name = :name""",
+                    row
+                )
+
+                if cursor.rowcount == 0:
+                    connection.execute(
+                        """INSERT INTO entity (subject, dns_names, not_before, not_after, serial, type, name, certificate, private_key, csr)
+                        VALUES (:subject, :dns_names, :not_before, :not_after, :serial, :type, :name, :certificate, :private_key, :csr)""",
+                        row
+                    )
+
+    @gimmecert.timings.timed('index.read')
+    def get_index(self, rebuild=False):
+        """
+        Returns status index, describing all issued certificates. See
+        read_index for description of its structure.
+
+        :param rebuild: Specify if certificate information kept in indexed columns should be re-extracted from stored certificates.
+        :type rebuild: bool
+
+        :returns: Status index.
+        :rtype: dict[str, dict[str, dict]]
+        """
+
+        index = {'server': {}, 'client': {}}
+
+        with self._connect() as connection:
+            if rebuild:
+                connection.executemany(
+                    "UPDATE entity SET subject = ?, dns_names = ?, not_before = ?, not_after = ?, serial = ? WHERE type = ? AND name = ?",
+                    [_get_certificate_columns(gimmecert.parallel.certificate_from_der(certificate_der)) + (entity_type, entity_name)
+                     for entity_type, entity_name, certificate_der in connection.execute("SELECT type, name, certificate FROM entity")]
+                )
+
+            rows = connection.execute(
+                "SELECT type, name, subject, dns_names, not_before, not_after, serial, %s FROM entity" % SQLITE_KEY_OR_CSR_EXPRESSION
+            ).fetchall()
+
+        for entity_type, entity_name, subject, dns_names, not_before, not_after, serial, key_or_csr in rows:
+            index[entity_type][entity_name] = {
+                'subject': subject,
+                'dns_names': json.loads(dns_names),
+                'not_before': datetime.datetime.strptime(not_before, INDEX_DATETIME_FORMAT),
+                'not_after': datetime.datetime.strptime(not_after, INDEX_DATETIME_FORMAT),
+                'serial': int(serial, 16),
+                'key_or_csr': key_or_csr,
+            }
+
+        return index
+
+    def select_entities(self, entity_types, name_glob=None, expiring_before=None):
+        """
+        Selects entities with issued certificates matching the passed-in
+        criteria. Entities are ordered by type (servers first), and then
+        by name. Type and expiry criteria are evaluated by the database
+        using indexed columns.
+
+        :param entity_types: Types of entities to select.
+        :type entity_types: collections.abc.Iterable[str]
+
+        :param name_glob: Shell-style wildcard pattern that entity names must match. Set to None to match all names.
+        :type name_glob: str or None
+
+        :param expiring_before: Select only entities with certificates expiring before passed-in date. Set to None to ignore expiry.
+        :type expiring_before: datetime.datetime or None
+
+        :returns: List of selected entities, each described by its type and name.
+        :rtype: list[(str, str)]
+        """
+
+        query = "SELECT type, name FROM entity WHERE type = ?"
+        parameters = ()
+
+        if expiring_before is not None:
+            query += " AND not_after <= ?"
+            parameters = (expiring_before.strftime(INDEX_DATETIME_FORMAT),)
+
+        selected = []
+
+        with self._connect() as connection:
+            for entity_type in ('server', 'client'):
+                if entity_type not in entity_types:
+                    continue
+
+                # Shell-style patterns differ slightly from SQLite GLOB
+                # patterns, so names are matched here instead.
+                names = [name for _, name in connection.execute(query, (entity_type,) + parameters)
+                         if name_glob is None or fnmatch.fnmatchcase(name, name_glob)]
+
+                selected.extend((entity_type, name) for name in sorted(names, key=lambda name: name + '.cert.pem'))
+
+        return selected
+
+
+def _get_certificate_columns(certificate):
+    """
+    Extracts certificate information kept in indexed columns by
+    SQLiteBackend.
+
+    :param certificate: Certificate to extract the information from.
+    :type certificate: cryptography.x509.Certificate
+
+    :returns: Subject, DNS names (JSON-encoded), start and end of validity, and serial number (hex-encoded).
+    :rtype: (str, str, str, str, str)
+    """
+
+    return (
+        gimmecert.utils.dn_to_str(certificate.subject),
+        json.dumps(gimmecert.utils.get_dns_names(certificate)),
+        certificate.not_valid_before.strftime(INDEX_DATETIME_FORMAT),
+        certificate.not_valid_after.strftime(INDEX_DATETIME_FORMAT),
+        # Serial numbers are up to 160 bits long, and do not fit into SQLite integers.
+        '%040x' % certificate.serial_number,
+    )
+
+
+#: Storage backends, mapped by their names.
+STORAGE_BACKENDS = {
+    FilesystemBackend.name: FilesystemBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def get_storage_backend(project_directory):
+    """
+    Returns storage backend used by the project. Projects initialised
+    with SQLite storage backend are recognised by presence of the
+    SQLite database file.
+
+    :param project_directory: Path to project directory.
+    :type project_directory: str
+
+    :returns: Storage backend.
+    :rtype: FilesystemBackend or SQLiteBackend
+    """
+
+    if os.path.exists(os.path.join(project_directory, '.gimmecert', SQLITE_DATABASE_FILENAME)):
+        return SQLiteBackend(project_directory)
+
+    return FilesystemBackend(project_directory)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import collections
+import contextlib
+import functools
+import threading
+import time
+
+
+#: Phases that command execution is broken down into when reporting
+#: timings, in reporting order. Phase names are stable, and can be
+#: relied upon when tracking timings over time.
+PHASES = collections.OrderedDict([
+    ('cli.parse', "Parsing of command line arguments."),
+    ('daemon.forward', "Forwarding of command to the daemon, including command execution by the daemon."),
+    ('lock.wait', "Waiting to acquire project locks."),
+    ('input.read', "Reading user input from standard input."),
+    ('ca.load', "Loading of CA hierarchy."),
+    ('key.pool', "Taking pre-generated private keys from the pool."),
+    ('key.generate', "Generation of private keys."),
+    ('csr.read', "Reading and parsing of CSRs."),
+    ('certificate.sign', "Signing of certificates."),
+    ('parallel.tasks', "Waiting for tasks run by worker processes."),
+    ('storage.read', "Reading and parsing of issued certificates and other artefacts."),
+    ('storage.write', "Writing of artefacts."),
+    ('index.read', "Refreshing and reading of status index."),
+    ('index.update', "Updating of status index after issuance."),
+])
+
+#: Name of pseudo-phase covering time not spent in any of the phases.
+OTHER_PHASE = 'other'
+
+#: Name of pseudo-phase covering the whole command.
+TOTAL_PHASE = 'total'
+
+
+class TimingsRecorder:
+    """
+    Records wall time spent in each phase (see PHASES). Time spent in a
+    phase is exclusive of time spent in phases nested within it, so
+    recorded times add up to the total time. Phases nested within a
+    phase of the same name are merged with it.
+
+    Only phases entered from the thread that created the recorder are
+    recorded, since work done by background threads overlaps with the
+    main thread.
+    """
+
+    def __init__(self, start=None):
+        """
+        Initialises the recorder.
+
+        :param start: Start time (as returned by time.perf_counter). Set to None (default) to use current time.
+        :type start: float or None
+        """
+
+        self.start = time.perf_counter() if start is None else start
+        self.thread_id = threading.get_ident()
+        self.durations = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self._stack = []
+
+    def enter(self, name):
+        """
+        Enters the named phase.
+
+        :param name: Phase name, one of the names from PHASES.
+        :type name: str
+
+        :returns: True if the phase has been entered, False if it is not recorded (see class documentation).
+        :rtype: bool
+        """
+
+        if threading.get_ident() != self.thread_id or any(entry[0] == name for entry in self._stack):
+            return False
+
+        now = time.perf_counter()
+
+        if self._stack:
+            parent_name, parent_started = self._stack[-1]
+            self.durations[parent_name] += now - parent_started
+
+        self._stack.append((name, now))
+        self.counts[name] += 1
+
+        return True
+
+    def exit(self):
+        """
+        Exits the most recently entered phase.
+        """
+
+        now = time.perf_counter()
+
+        name, started = self._stack.pop()
+        self.durations[name] += now - started
+
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def add(self, name, duration):
+        """
+        Records time spent in the phase outside of the recorder.
+
+        :param name: Phase name, one of the names from PHASES.
+        :type name: str
+
+        :param duration: Time spent in the phase, in seconds.
+        :type duration: float
+        """
+
+        self.durations[name] += duration
+        self.counts[name] += 1
+
+    def report(self, stream):
+        """
+        Writes-out timings breakdown, listing only the phases that have
+        been entered.
+
+        :param stream: Output stream where the breakdown should be written-out.
+        :type stream: io.IOBase
+        """
+
+        total = time.perf_counter() - self.start
+        other = max(0.0, total - sum(self.durations.values()))
+
+        print("Timings (wall time):", file=stream)
+
+        for name in PHASES:
+            if name in self.durations:
+                print("  %-18s %10.2f ms %6d calls" % (name, self.durations[name] * 1000, self.counts[name]), file=stream)
+
+        print("  %-18s %10.2f ms" % (OTHER_PHASE, other * 1000), file=stream)
+        print("  %-18s %10.2f ms" % (TOTAL_PHASE, total * 1000), file=stream)
+
+
+#: Recorder in use, if timings are being recorded.
+_recorder = None
+
+
+def start_recording(start=None):
+    """
+    Starts recording timings.
+
+    :param start: Start time (as returned by time.perf_counter). Set to None (default) to use current time.
+    :type start: float or None
+
+    :returns: Recorder used for recording the timings.
+    :rtype: TimingsRecorder
+    """
+
+    global _recorder
+
+    _recorder = TimingsRecorder(start)
+
+    return _recorder
+
+
+def stop_recording():
+    """
+    Stops recording timings.
+
+    :returns: Recorder that was used for recording the timings, or None if timings were not being recorded.
+    :rtype: TimingsRecorder or None
+    """
+
+    global _recorder
+
+    recorder, _recorder = _recorder, None
+
+    return recorder
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Context manager that records time spent within its block as time
+    spent in the named phase. Does nothing if timings are not being
+    recorded.
+
+    :param name: Phase name, one of the names from PHASES.
+    :type name: str
+    """
+
+    recorder = _recorder
+
+    if recorder is None or not recorder.enter(name):
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        recorder.exit()
+
+
+def timed(name):
+    """
+    Decorator that records time spent in the decorated function as time
+    spent in the named phase. Adds negligible overhead if timings are
+    not being recorded.
+
+    :param name: Phase name, one of the names from PHASES.
+    :type name: str
+
+    :returns: Decorator.
+    :rtype: callable
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+
+            if recorder is None or not recorder.enter(name):
+                return func(*args, **kwargs)
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.exit()
+
+        return wrapper
+
+    return decorator
@@ -19,7 +19,23 @@
 #
 
 
-import cryptography.hazmat
+import csv
+import json
+import re
+
+import gimmecert.timings
+
+# Cryptography is imported within functions that use it, since this
+# module is imported when setting-up the CLI.
+
+
+#: Key specification used when none has been explicitly requested. See
+#: gimmecert.crypto.generate_private_key for details.
+DEFAULT_KEY_SPECIFICATION = ('rsa', 2048)
+
+#: Regular expression matching a single CSR in OpenSSL-style PEM format
+#: (including the legacy NEW CERTIFICATE REQUEST label).
+CSR_PEM_PATTERN = re.compile(r'-----BEGIN ((?:NEW )?)CERTIFICATE REQUEST-----.*?-----END \1CERTIFICATE REQUEST-----', re.DOTALL)
 
 
 class UnsupportedField(Exception):
@@ -41,6 +57,8 @@ def certificate_to_pem(certificate):
     :rtype: str
     """
 
+    import cryptography.hazmat.primitives.serialization
+
     certificate_pem = certificate.public_bytes(encoding=cryptography.hazmat.primitives.serialization.Encoding.PEM)
 
     return certificate_pem.decode()
@@ -62,6 +80,8 @@ def dn_to_str(dn):
     :rtype: str
     """
 
+    import cryptography.x509
+
     fields = []
 
     for field in dn:
@@ -73,6 +93,25 @@ def dn_to_str(dn):
     return ",".join(fields)
 
 
+def get_common_name(dn):
+    """
+    Retrieves common name from the passed-in DN. If DN contains
+    multiple common names, the last one is returned.
+
+    :param dn: DN to retrieve common name from.
+    :type dn: cryptography.x509.Name
+
+    :returns: Common name, or None if DN does not contain one.
+    :rtype: str or None
+    """
+
+    import cryptography.x509
+
+    common_names = dn.get_attributes_for_oid(cryptography.x509.oid.NameOID.COMMON_NAME)
+
+    return common_names[-1].value if common_names else None
+
+
 def date_range_to_str(start, end):
     """
     Converts the provided validity range (with starting and end date),
@@ -104,6 +143,8 @@ def get_dns_names(certificate):
     :rtype: list[str]
     """
 
+    import cryptography.x509
+
     try:
         subject_alternative_name = certificate.extensions.get_extension_for_class(cryptography.x509.SubjectAlternativeName).value
         dns_names = subject_alternative_name.get_values_for_type(cryptography.x509.DNSName)
@@ -113,6 +154,7 @@ def get_dns_names(certificate):
     return dns_names
 
 
+@gimmecert.timings.timed('input.read')
 def read_input(input_stream, prompt_stream, prompt):
     """
     Reads input from the passed-in input stream until Ctrl-D sequence
@@ -129,18 +171,18 @@ def read_input(input_stream, prompt_stream, prompt):
 
     :param prompt: Prompt message to show to the user.
     :type prompt: str
+
+    :returns: User input.
+    :rtype: str
     """
 
     print("%s (finish with Ctrl-D on an empty line):\n" % prompt, file=prompt_stream)
 
-    user_input = ""
-
-    c = input_stream.read(1)
-    while c != '':
-        user_input += c
-        c = input_stream.read(1)
-
-    return user_input
+    # Input is read line by line (relying on stream buffering), and
+    # joined only once at the end. Fixed-size reads cannot be used,
+    # since text streams keep reading until the requested size is
+    # reached, swallowing the Ctrl-D sent from a terminal.
+    return "".join(iter(input_stream.readline, ''))
 
 
 def csr_from_pem(csr_pem):
@@ -155,9 +197,179 @@ def csr_from_pem(csr_pem):
     :rtype: cryptography.x509.CertificateSigningRequest
     """
 
+    import cryptography.hazmat.backends
+    import cryptography.x509
+
     csr = cryptography.x509.load_pem_x509_csr(
         bytes(csr_pem, encoding='utf8'),
         cryptography.hazmat.backends.default_backend()
     )
 
     return csr
+
+
+def csrs_from_pem(csrs_pem):
+    """
+    Converts passed-in CSRs in OpenSSL-style PEM format into CSR
+    objects. Useful for processing multiple concatenated CSRs read
+    from a single stream or file. Any content outside of PEM blocks is
+    ignored.
+
+    :param csrs_pem: One or more CSRs in OpenSSL-style PEM format.
+    :type csrs_pem: str
+
+    :returns: List of CSR objects, in the same order as they appear in the input.
+    :rtype: list[cryptography.x509.CertificateSigningRequest]
+
+    :raises ValueError: If input contains no CSRs, or if any of the CSRs is invalid.
+    """
+
+    csrs = [csr_from_pem(match.group(0)) for match in CSR_PEM_PATTERN.finditer(csrs_pem)]
+
+    if not csrs:
+        raise ValueError("No CSR in PEM format found in input.")
+
+    return csrs
+
+
+def key_specification(specification):
+    """
+    Parses key specification string into a key specification tuple
+    usable with gimmecert.crypto.generate_private_key. Suitable for
+    use as argument type with argparse.
+
+    Supported key specification strings are:
+
+    - ``rsa:KEY_SIZE``, where ``KEY_SIZE`` is one of 2048, 3072, or 4096.
+    - ``ecdsa:CURVE``, where ``CURVE`` is one of secp256r1 or secp384r1.
+    - ``ed25519``.
+
+    :param specification: Key specification string.
+    :type specification: str
+
+    :returns: Key specification tuple, consisting out of algorithm and its parameters.
+    :rtype: (str, int or str or None)
+
+    :raises ValueError: If passed-in specification is not supported.
+    """
+
+    algorithm, _, parameters = specification.lower().partition(':')
+
+    if algorithm == 'rsa' and parameters in ('2048', '3072', '4096'):
+        return ('rsa', int(parameters))
+
+    if algorithm == 'ecdsa' and parameters in ('secp256r1', 'secp384r1'):
+        return ('ecdsa', parameters)
+
+    if algorithm == 'ed25519' and parameters == '':
+        return ('ed25519', None)
+
+    raise ValueError("Unsupported key specification: %s" % specification)
+
+
+def key_specification_to_str(key_specification):
+    """
+    Converts key specification tuple into its string representation,
+    as accepted by the key_specification function.
+
+    :param key_specification: Key specification tuple, consisting out of algorithm and its parameters.
+    :type key_specification: (str, int or str or None)
+
+    :returns: Key specification string, for example ``rsa:2048`` or ``ed25519``.
+    :rtype: str
+    """
+
+    algorithm, parameters = key_specification
+
+    if parameters is None:
+        return algorithm
+
+    return "%s:%s" % (algorithm, parameters)
+
+
+def write_records(records, output_stream, output_format, fields):
+    """
+    Writes-out records in one of the machine-readable formats. Records
+    are written-out one by one, as they are produced, without being
+    collected in memory first.
+
+    Supported output formats are:
+
+    - ``json``, single JSON array of objects.
+    - ``jsonl``, one JSON object per line.
+    - ``csv``, CSV with header line. List values are joined using comma,
+      and None values are written-out as empty strings.
+
+    :param records: Records to write-out. Each record must contain all of the passed-in fields.
+    :type records: collections.abc.Iterable[dict]
+
+    :param output_stream: Output stream where the records should be written-out.
+    :type output_stream: io.IOBase
+
+    :param output_format: Output format to use, one of json, jsonl, or csv.
+    :type output_format: str
+
+    :param fields: Record fields to write-out, in order in which they should appear in the output.
+    :type fields: list[str]
+
+    :raises ValueError: If passed-in output format is not supported.
+    """
+
+    if output_format == 'json':
+        separator = "[\n"
+        for record in records:
+            output_stream.write(separator + json.dumps({field: record[field] for field in fields}))
+            separator = ",\n"
+        output_stream.write("[]\n" if separator == "[\n" else "\n]\n")
+
+    elif output_format == 'jsonl':
+        for record in records:
+            output_stream.write(json.dumps({field: record[field] for field in fields}) + "\n")
+
+    elif output_format == 'csv':
+        writer = csv.writer(output_stream, lineterminator="\n")
+        writer.writerow(fields)
+        for record in records:
+            row = []
+            for field in fields:
+                value = record[field]
+                if value is None:
+                    value = ""
+                elif isinstance(value, list):
+                    value = ",".join(value)
+                row.append(value)
+            writer.writerow(row)
+
+    else:
+        raise ValueError("Unsupported output format: %s" % output_format)
+
+
+def format_metric_sample(name, labels, value):
+    """
+    Formats a single metric sample using Prometheus text exposition
+    format. Label values are escaped as required by the format.
+
+    :param name: Metric name.
+    :type name: str
+
+    :param labels: Labels of the sample, in order in which they should be written-out.
+    :type labels: list[(str, str)]
+
+    :param value: Sample value.
+    :type value: int or float
+
+    :returns: Metric sample line (without trailing newline).
+    :rtype: str
+    """
+
+    def escape(label_value):
+        """
+        Small helper function for escaping label values.
+        """
+
+        return label_value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    if labels:
+        name = "%s{%s}" % (name, ",".join('%s="%s"' % (label, escape(label_value)) for label, label_value in labels))
+
+    return "%s %s" % (name, repr(value) if isinstance(value, float) else value)
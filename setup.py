@@ -24,10 +24,10 @@ from setuptools import setup, find_packages
 
 README = open(os.path.join(os.path.dirname(__file__), 'README.rst')).read()
 
-python_requirements = ">=3.4,<3.8"
+python_requirements = ">=3.5,<3.8"
 
 install_requirements = [
-    'cryptography>=2.4,<2.5',
+    'cryptography>=2.8,<2.9',
     'python-dateutil>=2.7,<2.8',
 ]
 
@@ -39,13 +39,17 @@ test_lint_requirements = [
     'flake8>=3.6,<3.7',
 ]
 
+yaml_requirements = [
+    'PyYAML>=3.13,<3.14',
+]
+
 test_requirements = [
     'freezegun>=0.3,<0.4',
     'pytest>=4.0,<4.1',
     'pytest-cov>=2.6,<2.7',
     'tox>=3.5,<3.6',
     'pexpect>=4.6,<4.7',
-]
+] + yaml_requirements
 
 release_requirements = [
     'twine',
@@ -62,6 +66,7 @@ extras_requirements = {
     'doc': doc_requirements,
     'test': test_requirements,
     'testlint': test_lint_requirements,
+    'yaml': yaml_requirements,
 }
 
 # allow setup.py to be run from any path
@@ -85,6 +90,7 @@ setup(
     extras_require=extras_requirements,
     entry_points={
         'console_scripts': ['gimmecert=gimmecert.cli:main'],
+        'pytest11': ['gimmecert=gimmecert.pytest_plugin'],
     },
     classifiers=[
         'Development Status :: 1 - Planning',
@@ -93,7 +99,6 @@ setup(
         'Intended Audience :: System Administrators',
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
@@ -21,14 +21,126 @@
 
 import collections
 import io
+import os
 
 import gimmecert
+import gimmecert.commands
 import gimmecert.crypto
 import gimmecert.storage
 
 import pytest
 
 
+#: Environment variable that can be used for disabling the private key
+#: cache (by setting it to 0), making every test generate fresh keys.
+KEY_CACHE_ENVIRONMENT_VARIABLE = 'GIMMECERT_TEST_KEY_CACHE'
+
+
+class PrivateKeyCache:
+    """
+    Private key provider (see gimmecert.crypto.set_private_key_provider)
+    that hands out cached private keys, generating new ones only when
+    the cache runs out.
+
+    Cache is shared between all tests in a session. Within a single
+    test, every private key is handed out at most once, so tests can
+    still rely on distinct entities getting distinct keys. The reset
+    method should be called before each test to make the keys
+    available again.
+
+    Cached keys are served only within the process that created the
+    cache. Worker processes forked while running parallel tasks would
+    otherwise hand out the same keys as their siblings.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._keys = {}
+        self._taken = collections.Counter()
+
+    def reset(self):
+        """
+        Makes all cached private keys available again.
+        """
+
+        self._taken.clear()
+
+    def take(self, key_specification):
+        """
+        Takes private key matching the key specification from the
+        cache, generating a new one if all matching keys have already
+        been handed out since the last reset.
+
+        :param key_specification: Key specification for the private key.
+        :type key_specification: (str, int or str or None)
+
+        :returns: Private key, or None if called from a process other than the one that created the cache.
+        :rtype: cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey or
+            cryptography.hazmat.primitives.asymmetric.ec.EllipticCurvePrivateKey or
+            cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey or
+            None
+        """
+
+        if os.getpid() != self._pid:
+            return None
+
+        key_specification = tuple(key_specification)
+        keys = self._keys.setdefault(key_specification, [])
+        position = self._taken[key_specification]
+
+        if position == len(keys):
+            keys.append(gimmecert.crypto.generate_private_key(key_specification, use_provider=False))
+
+        self._taken[key_specification] += 1
+
+        return keys[position]
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'no_key_cache: generate fresh private keys instead of taking them from the session-wide cache')
+
+
+@pytest.fixture(scope='session')
+def session_private_key_cache():
+    """
+    Fixture that provides the private key cache shared by all tests in
+    a session.
+
+    :returns: Private key cache.
+    :rtype: PrivateKeyCache
+    """
+
+    return PrivateKeyCache()
+
+
+@pytest.fixture(autouse=True)
+def private_key_cache(request, session_private_key_cache):
+    """
+    Fixture that installs session-wide private key cache as private key
+    provider for the duration of each test. Generating private keys
+    (RSA ones in particular) takes up most of the time otherwise.
+
+    Cache is not installed for tests marked with ``no_key_cache``, or
+    if it has been disabled via environment variable (see
+    KEY_CACHE_ENVIRONMENT_VARIABLE).
+
+    :returns: Private key cache, or None if cache is not in use.
+    :rtype: PrivateKeyCache or None
+    """
+
+    if request.node.get_closest_marker('no_key_cache') or os.environ.get(KEY_CACHE_ENVIRONMENT_VARIABLE) == '0':
+        yield None
+        return
+
+    session_private_key_cache.reset()
+    previous_provider = gimmecert.crypto.set_private_key_provider(session_private_key_cache.take)
+
+    try:
+        yield session_private_key_cache
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+
 @pytest.fixture
 def key_with_csr(tmpdir):
     """
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import concurrent.futures
+import io
+import os
+import threading
+import time
+
+import cryptography.x509
+
+import gimmecert.aio
+import gimmecert.commands
+import gimmecert.crypto
+import gimmecert.parallel
+import gimmecert.project
+import gimmecert.storage
+import gimmecert.utils
+
+import pytest
+from unittest import mock
+
+
+#: Encoding and format arguments for comparing public keys of any type.
+PUBLIC_KEY_DER = (cryptography.hazmat.primitives.serialization.Encoding.DER,
+                  cryptography.hazmat.primitives.serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def run(coroutine):
+    """
+    Runs the passed-in coroutine in a new event loop, returning its
+    result.
+    """
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@pytest.fixture
+def executor():
+    """
+    Fixture that provides thread pool executor for running CPU-bound
+    work, shutting it down at the end of test.
+    """
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+    yield executor
+
+    executor.shutdown()
+
+
+@pytest.fixture
+def project(tmpdir, executor):
+    """
+    Fixture that initialises a project with a two-level CA hierarchy
+    within tmpdir, and provides AsyncProject instance for it that uses
+    thread pool executor.
+    """
+
+    gimmecert.project.Project(tmpdir.strpath).initialise('My Project', 2, ('ed25519', None))
+
+    return gimmecert.aio.AsyncProject(tmpdir.strpath, executor)
+
+
+def test_async_project_uses_absolute_project_directory(tmpdir):
+    with tmpdir.as_cwd():
+        project = gimmecert.aio.AsyncProject('.')
+
+    assert project.project_directory == tmpdir.strpath
+    assert project.concurrency == gimmecert.parallel.get_default_jobs()
+
+
+def test_issue_server_issues_certificate(project):
+
+    entity = run(project.issue_server('myserver', ['service.example.com'], key_specification=('ed25519', None)))
+
+    issuer_certificate = gimmecert.project.Project(project.project_directory).ca_hierarchy.certificates[-1]
+
+    assert entity.entity_type == 'server'
+    assert entity.entity_name == 'myserver'
+    assert entity.certificate.issuer == issuer_certificate.subject
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service.example.com']
+    assert entity.private_key.public_key().public_bytes(*PUBLIC_KEY_DER) == entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert entity.csr is None
+    assert entity.certificate_path == os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.cert.pem')
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+    assert os.path.exists(entity.private_key_path)
+
+
+def test_issue_client_with_csr_stores_csr(project):
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = run(project.issue_client('myclient', csr=csr))
+
+    assert entity.entity_type == 'client'
+    assert entity.private_key is None
+    assert entity.private_key_path is None
+    assert entity.csr == csr
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == csr.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert os.path.exists(entity.csr_path)
+
+
+def test_cpu_bound_work_runs_in_executor(project):
+    original_issue_certificate_task = gimmecert.parallel.issue_certificate_task
+    threads = []
+
+    def issue_certificate_task(*args):
+        threads.append(threading.current_thread())
+        return original_issue_certificate_task(*args)
+
+    with mock.patch('gimmecert.parallel.issue_certificate_task', issue_certificate_task):
+        run(project.issue_client('myclient', key_specification=('ed25519', None)))
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
+
+
+def test_issue_runs_independent_operations_concurrently(project):
+    names = ['myclient%d' % i for i in range(6)]
+
+    async def issue_all():
+        return await asyncio.gather(*[project.issue_client(name, key_specification=('ed25519', None)) for name in names])
+
+    entities = run(issue_all())
+
+    assert [entity.entity_name for entity in entities] == names
+    assert all(gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate for entity in entities)
+
+
+def test_issue_limits_number_of_operations_in_progress(tmpdir, executor):
+    gimmecert.project.Project(tmpdir.strpath).initialise('My Project', 1, ('ed25519', None))
+    project = gimmecert.aio.AsyncProject(tmpdir.strpath, executor, concurrency=2)
+    original_issue_certificate_task = gimmecert.parallel.issue_certificate_task
+    lock = threading.Lock()
+    in_progress = [0]
+    peak = [0]
+
+    def issue_certificate_task(*args):
+        with lock:
+            in_progress[0] += 1
+            peak[0] = max(peak[0], in_progress[0])
+
+        time.sleep(0.05)
+
+        with lock:
+            in_progress[0] -= 1
+
+        return original_issue_certificate_task(*args)
+
+    async def issue_all():
+        return await asyncio.gather(*[project.issue_client('myclient%d' % i, key_specification=('ed25519', None)) for i in range(6)])
+
+    with mock.patch('gimmecert.parallel.issue_certificate_task', issue_certificate_task):
+        run(issue_all())
+
+    assert peak[0] == 2
+
+
+def test_issue_loads_issuer_only_once(project):
+
+    async def issue_all():
+        await project.issue_server('myserver', key_specification=('ed25519', None))
+        await project.issue_client('myclient', key_specification=('ed25519', None))
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy', wraps=gimmecert.storage.read_ca_hierarchy) as mock_read_ca_hierarchy:
+        run(issue_all())
+
+    assert mock_read_ca_hierarchy.call_count == 1
+
+
+def test_issue_uses_pooled_private_key(project):
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    with mock.patch('gimmecert.parallel.generate_private_key_task') as mock_generate_private_key_task:
+        entity = run(project.issue_client('myclient', key_specification=('ed25519', None)))
+
+    assert mock_generate_private_key_task.called is False
+    assert entity.private_key is not None
+
+
+def test_issue_returns_pooled_private_key_to_pool_if_certificate_is_issued_concurrently(project):
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+    run(project.issue_client('myclient', key_specification=('ed25519', None)))
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    # Issuance passes the initial check.
+    with mock.patch.object(project, '_entity_exists', return_value=False):
+        with pytest.raises(gimmecert.project.CertificateAlreadyIssuedError):
+            run(project.issue_client('myclient', key_specification=('ed25519', None)))
+
+    assert gimmecert.storage.count_pooled_private_keys(project.project_directory, ('ed25519', None)) == 1
+
+
+def test_renew_returns_pooled_private_key_to_pool_if_signing_fails(project):
+    run(project.issue_client('myclient', key_specification=('ed25519', None)))
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    with mock.patch('gimmecert.parallel.renew_certificate_task', side_effect=RuntimeError("Signing failed")):
+        with pytest.raises(RuntimeError):
+            run(project.renew('client', 'myclient', generate_new_private_key=True))
+
+    assert gimmecert.storage.count_pooled_private_keys(project.project_directory, ('ed25519', None)) == 1
+
+
+def test_issue_raises_exception_if_certificate_already_issued(project):
+    run(project.issue_server('myserver', key_specification=('ed25519', None)))
+
+    with pytest.raises(gimmecert.project.CertificateAlreadyIssuedError) as e_info:
+        run(project.issue_server('myserver', key_specification=('ed25519', None)))
+
+    assert str(e_info.value) == "Certificate has already been issued for server myserver."
+
+
+def test_issue_of_same_entity_concurrently_stores_single_certificate(project):
+
+    async def issue_twice():
+        return await asyncio.gather(project.issue_client('myclient', key_specification=('ed25519', None)),
+                                    project.issue_client('myclient', key_specification=('ed25519', None)),
+                                    return_exceptions=True)
+
+    # Both issuances pass the initial check.
+    with mock.patch.object(project, '_entity_exists', return_value=False):
+        results = run(issue_twice())
+
+    entities = [result for result in results if isinstance(result, gimmecert.project.Entity)]
+    errors = [result for result in results if isinstance(result, gimmecert.project.CertificateAlreadyIssuedError)]
+
+    assert len(entities) == 1
+    assert len(errors) == 1
+    assert str(errors[0]) == "Certificate has already been issued for client myclient."
+    assert gimmecert.storage.read_certificate(entities[0].certificate_path) == entities[0].certificate
+
+
+@pytest.mark.parametrize("operation", [
+    lambda project: project.issue_server('myserver'),
+    lambda project: project.issue_client('myclient'),
+    lambda project: project.renew('server', 'myserver'),
+])
+def test_operations_raise_exception_if_project_is_not_initialised(tmpdir, executor, operation):
+    project = gimmecert.aio.AsyncProject(tmpdir.strpath, executor)
+
+    with pytest.raises(gimmecert.project.NotInitialisedError) as e_info:
+        run(operation(project))
+
+    assert str(e_info.value) == "CA hierarchy has not been initialised in %s." % tmpdir.strpath
+
+
+def test_renew_keeps_private_key(project):
+    issued = run(project.issue_server('myserver', key_specification=('ed25519', None)))
+
+    entity = run(project.renew('server', 'myserver'))
+
+    assert entity.private_key is None
+    assert entity.csr is None
+    assert entity.private_key_path == issued.private_key_path
+    assert entity.certificate != issued.certificate
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == issued.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+
+def test_renew_generates_new_private_key(project):
+    issued = run(project.issue_client('myclient', key_specification=('ecdsa', 'secp256r1')))
+
+    entity = run(project.renew('client', 'myclient', generate_new_private_key=True))
+
+    assert entity.private_key is not None
+    assert entity.private_key.public_key().public_bytes(*PUBLIC_KEY_DER) == entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) != issued.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert gimmecert.crypto.key_specification_from_public_key(entity.certificate.public_key()) == ('ecdsa', 'secp256r1')
+
+
+def test_renew_generates_new_private_key_with_passed_in_key_specification(project):
+    run(project.issue_client('myclient', key_specification=('ecdsa', 'secp256r1')))
+
+    entity = run(project.renew('client', 'myclient', generate_new_private_key=True, key_specification=('ed25519', None)))
+
+    assert gimmecert.crypto.key_specification_from_public_key(entity.certificate.public_key()) == ('ed25519', None)
+
+
+def test_renew_replaces_private_key_with_csr(project):
+    run(project.issue_server('myserver', key_specification=('ed25519', None)))
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = run(project.renew('server', 'myserver', csr=csr))
+
+    assert entity.csr == csr
+    assert entity.private_key_path is None
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == csr.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert entity.csr_path == os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.csr.pem')
+    assert not os.path.exists(os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.key.pem'))
+
+
+def test_renew_updates_dns_names(project):
+    issued = run(project.issue_server('myserver', ['service1.example.com'], key_specification=('ed25519', None)))
+
+    entity = run(project.renew('server', 'myserver', dns_names=['service2.example.com']))
+
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service2.example.com']
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == issued.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+
+
+def test_renew_raises_exception_for_unknown_entity(project):
+
+    with pytest.raises(gimmecert.project.UnknownEntityError) as e_info:
+        run(project.renew('client', 'myclient'))
+
+    assert str(e_info.value) == "No existing certificate found for client myclient."
+
+
+def test_renew_raises_exception_if_entity_is_removed_during_renewal(project):
+    run(project.issue_client('myclient', key_specification=('ed25519', None)))
+
+    with mock.patch.object(gimmecert.storage.FilesystemBackend, 'entity_exists', return_value=False):
+        with pytest.raises(gimmecert.project.UnknownEntityError) as e_info:
+            run(project.renew('client', 'myclient'))
+
+    assert str(e_info.value) == "No existing certificate found for client myclient."
+
+
+def test_renew_raises_exception_for_conflicting_arguments(project):
+
+    with pytest.raises(ValueError) as e_info:
+        run(project.renew('client', 'myclient', dns_names=['service.example.com']))
+
+    assert str(e_info.value) == "Updating DNS subject alternative names can be done only for server certificates."
+
+
+def test_sign_csr_uses_common_name_from_csr(project):
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = run(project.sign_csr('server', csr, 'fallback'))
+
+    assert entity.entity_type == 'server'
+    assert entity.entity_name == 'mycustom'
+    assert entity.csr == csr
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['mycustom']
+
+
+def test_sign_csr_uses_fallback_name(project):
+    csr = gimmecert.crypto.generate_csr(cryptography.x509.Name([]), gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = run(project.sign_csr('client', csr, 'fallback'))
+
+    assert entity.entity_type == 'client'
+    assert entity.entity_name == 'fallback'
+
+
+def test_sign_csr_raises_exception_if_entity_name_cannot_be_determined(project):
+    csr = gimmecert.crypto.generate_csr(cryptography.x509.Name([]), gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    with pytest.raises(gimmecert.project.InvalidCSRError) as e_info:
+        run(project.sign_csr('client', csr))
+
+    assert str(e_info.value) == "Unable to determine entity name."
+
+
+def test_sign_csr_raises_exception_if_csr_signature_is_invalid(project):
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    with mock.patch('gimmecert.parallel.verify_csr_task', return_value=False):
+        with pytest.raises(gimmecert.project.InvalidCSRError) as e_info:
+            run(project.sign_csr('client', csr))
+
+    assert str(e_info.value) == "Invalid CSR signature."
+
+
+def test_default_executor_is_process_pool_shut_down_on_close(tmpdir):
+    gimmecert.project.Project(tmpdir.strpath).initialise('My Project', 1, ('ed25519', None))
+
+    async def issue():
+        async with gimmecert.aio.AsyncProject(tmpdir.strpath) as project:
+            entity = await project.issue_client('myclient', key_specification=('ed25519', None))
+            executor = project.executor
+
+        return entity, executor, project
+
+    entity, executor, project = run(issue())
+
+    assert isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+    assert project._executor is None
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+    with pytest.raises(RuntimeError):
+        executor.submit(gimmecert.parallel.get_default_jobs)
+
+
+def test_close_does_not_shut_down_passed_in_executor(project, executor):
+
+    run(project.close())
+
+    assert executor.submit(gimmecert.parallel.get_default_jobs).result() == gimmecert.parallel.get_default_jobs()
+
+
+def test_close_without_executor_use_does_nothing(tmpdir):
+    project = gimmecert.aio.AsyncProject(tmpdir.strpath)
+
+    run(project.close())
+
+    assert project._executor is None
+
+
+def test_project_can_be_used_from_multiple_event_loops(project):
+
+    run(project.issue_server('myserver', key_specification=('ed25519', None)))
+    entity = run(project.issue_client('myclient', key_specification=('ed25519', None)))
+
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
@@ -20,15 +20,26 @@
 
 
 import argparse
+import pstats
+import signal
+import subprocess
 import sys
 
 import gimmecert.cli
+import gimmecert.commands
 import gimmecert.decorators
+import gimmecert.timings
 
 import pytest
 from unittest import mock
 
 
+#: Modules that should not get imported unless a command actually needs
+#: them. These are the expensive ones to import.
+HEAVY_MODULES = ['cryptography', 'cryptography.x509', 'dateutil', 'gimmecert.crypto', 'gimmecert.daemon', 'gimmecert.parallel', 'gimmecert.spool',
+                 'gimmecert.storage']
+
+
 def test_get_parser_returns_parser():
     parser = gimmecert.cli.get_parser()
 
@@ -41,6 +52,8 @@ def test_main_invokes_get_parser(mock_get_parser, tmpdir):
     # outside of test directory.
     tmpdir.chdir()
 
+    mock_get_parser.return_value.parse_args.return_value = mock.Mock(timings=False, profile=None)
+
     # Ignore system exit. Dirty hack to avoid mocking the default
     # function. We care only about whether the get_parser is invoked.
     try:
@@ -58,6 +71,7 @@ def test_main_invokes_argument_parsing(mock_get_parser, tmpdir):
     tmpdir.chdir()
 
     mock_parser = mock.Mock()
+    mock_parser.parse_args.return_value = mock.Mock(timings=False, profile=None)
     mock_get_parser.return_value = mock_parser
 
     # Ignore system exit. Dirty hack to avoid mocking the default
@@ -99,7 +113,7 @@ def test_main_invokes_parser_function(mock_get_parser, tmpdir):
     tmpdir.chdir()
 
     mock_parser = mock.Mock()
-    mock_args = mock.Mock()
+    mock_args = mock.Mock(timings=False, profile=None)
 
     # Avoid throws of SystemExit exception.
     mock_args.func.return_value = gimmecert.commands.ExitCode.SUCCESS
@@ -185,7 +199,13 @@ def test_setup_subcommand_parser_sets_function_callback(setup_subcommand_parser)
         gimmecert.cli.setup_server_subcommand_parser,
         gimmecert.cli.setup_client_subcommand_parser,
         gimmecert.cli.setup_renew_subcommand_parser,
-        gimmecert.cli.setup_status_subcommand_parser
+        gimmecert.cli.setup_status_subcommand_parser,
+        gimmecert.cli.setup_metrics_subcommand_parser,
+        gimmecert.cli.setup_pool_subcommand_parser,
+        gimmecert.cli.setup_batch_subcommand_parser,
+        gimmecert.cli.setup_sign_subcommand_parser,
+        gimmecert.cli.setup_watch_spool_subcommand_parser,
+        gimmecert.cli.setup_serve_subcommand_parser,
     ]
 )
 def test_setup_subcommand_parser_registered(setup_subcommand_parser):
@@ -224,6 +244,10 @@ VALID_CLI_INVOCATIONS = [
     ("gimmecert.cli.init", ["gimmecert", "init", "--ca-hierarchy-depth", "3"]),
     ("gimmecert.cli.init", ["gimmecert", "init", "-d", "3"]),
 
+    # init, key specification long and short option
+    ("gimmecert.cli.init", ["gimmecert", "init", "--key-specification", "ecdsa:secp256r1"]),
+    ("gimmecert.cli.init", ["gimmecert", "init", "-k", "ed25519"]),
+
     # server, no options
     ("gimmecert.cli.server", ["gimmecert", "server", "myserver"]),
 
@@ -238,6 +262,10 @@ VALID_CLI_INVOCATIONS = [
     ("gimmecert.cli.server", ["gimmecert", "server", "--csr", "myserver.csr.pem", "myserver"]),
     ("gimmecert.cli.server", ["gimmecert", "server", "-c", "myserver.csr.pem", "myserver"]),
 
+    # server, key specification long and short option
+    ("gimmecert.cli.server", ["gimmecert", "server", "--key-specification", "rsa:4096", "myserver"]),
+    ("gimmecert.cli.server", ["gimmecert", "server", "-k", "ecdsa:secp384r1", "myserver"]),
+
     # client, no options
     ("gimmecert.cli.client", ["gimmecert", "client", "myclient"]),
 
@@ -245,6 +273,10 @@ VALID_CLI_INVOCATIONS = [
     ("gimmecert.cli.client", ["gimmecert", "client", "--csr", "myclient.csr.pem", "myclient"]),
     ("gimmecert.cli.client", ["gimmecert", "client", "-c", "myclient.csr.pem", "myclient"]),
 
+    # client, key specification long and short option
+    ("gimmecert.cli.client", ["gimmecert", "client", "--key-specification", "rsa:3072", "myclient"]),
+    ("gimmecert.cli.client", ["gimmecert", "client", "-k", "ed25519", "myclient"]),
+
     # renew, no options
     ("gimmecert.cli.renew", ["gimmecert", "renew", "server", "myserver"]),
     ("gimmecert.cli.renew", ["gimmecert", "renew", "client", "myclient"]),
@@ -267,8 +299,85 @@ VALID_CLI_INVOCATIONS = [
     ("gimmecert.cli.renew", ["gimmecert", "renew", "-c", "myserver.csr.pem", "server", "myserver"]),
     ("gimmecert.cli.renew", ["gimmecert", "renew", "-c", "myclient.csr.pem", "client", "myclient"]),
 
+    # renew, key specification long and short option
+    ("gimmecert.cli.renew", ["gimmecert", "renew", "--new-private-key", "--key-specification", "ed25519", "server", "myserver"]),
+    ("gimmecert.cli.renew", ["gimmecert", "renew", "-p", "-k", "ecdsa:secp256r1", "client", "myclient"]),
+
+    # renew, bulk options long and short form
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "--all"]),
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "-a", "server"]),
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "--name-glob", "my*", "--jobs", "2"]),
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "-g", "my*", "-j", "2", "client"]),
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "--expiring-within", "30"]),
+    ("gimmecert.cli.renew_bulk", ["gimmecert", "renew", "-e", "30", "server"]),
+
     # status, no options
     ("gimmecert.cli.status", ["gimmecert", "status"]),
+
+    # status, rebuild index long and short option
+    ("gimmecert.cli.status", ["gimmecert", "status", "--rebuild-index"]),
+    ("gimmecert.cli.status", ["gimmecert", "status", "-r"]),
+
+    # status, format long and short option
+    ("gimmecert.cli.status", ["gimmecert", "status", "--format", "json"]),
+    ("gimmecert.cli.status", ["gimmecert", "status", "-f", "csv"]),
+
+    # metrics, no options
+    ("gimmecert.cli.metrics", ["gimmecert", "metrics"]),
+
+    # metrics, textfile and rebuild index long and short options
+    ("gimmecert.cli.metrics", ["gimmecert", "metrics", "--textfile", "gimmecert.prom", "--rebuild-index"]),
+    ("gimmecert.cli.metrics", ["gimmecert", "metrics", "-o", "gimmecert.prom", "-r"]),
+
+    # export-files, with and without output directory
+    ("gimmecert.cli.export_files", ["gimmecert", "export-files"]),
+    ("gimmecert.cli.export_files", ["gimmecert", "export-files", "exported"]),
+
+    # pool, no command
+    ("gimmecert.cli.pool_status", ["gimmecert", "pool"]),
+
+    # pool, fill command
+    ("gimmecert.cli.pool_fill", ["gimmecert", "pool", "fill", "10"]),
+    ("gimmecert.cli.pool_fill", ["gimmecert", "pool", "fill", "--key-specification", "ed25519", "10"]),
+    ("gimmecert.cli.pool_fill", ["gimmecert", "pool", "fill", "-k", "ed25519", "10"]),
+
+    # batch, no options
+    ("gimmecert.cli.batch", ["gimmecert", "batch", "manifest.json"]),
+
+    # batch, jobs long and short option
+    ("gimmecert.cli.batch", ["gimmecert", "batch", "--jobs", "4", "manifest.json"]),
+    ("gimmecert.cli.batch", ["gimmecert", "batch", "-j", "4", "manifest.json"]),
+
+    # batch, key specification long and short option
+    ("gimmecert.cli.batch", ["gimmecert", "batch", "--key-specification", "rsa:4096", "manifest.json"]),
+    ("gimmecert.cli.batch", ["gimmecert", "batch", "-k", "rsa:4096", "manifest.json"]),
+
+    # sign, type long and short option
+    ("gimmecert.cli.sign", ["gimmecert", "sign", "--type", "server", "spool"]),
+    ("gimmecert.cli.sign", ["gimmecert", "sign", "-t", "client", "spool"]),
+
+    # sign, reading from standard input
+    ("gimmecert.cli.sign", ["gimmecert", "sign", "--type", "server", "-"]),
+
+    # sign, jobs long and short option
+    ("gimmecert.cli.sign", ["gimmecert", "sign", "--type", "server", "--jobs", "4", "spool"]),
+    ("gimmecert.cli.sign", ["gimmecert", "sign", "--type", "server", "-j", "4", "spool"]),
+
+    # watch-spool, type long and short option
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "spool"]),
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "-t", "client", "spool"]),
+
+    # watch-spool, debounce long and short option
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "--debounce", "0.5", "spool"]),
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "-d", "0.5", "spool"]),
+
+    # watch-spool, poll interval long and short option
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "--poll-interval", "5", "spool"]),
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "-i", "5", "spool"]),
+
+    # watch-spool, poll long and short option
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "--poll", "spool"]),
+    ("gimmecert.cli.watch_spool", ["gimmecert", "watch-spool", "--type", "server", "-p", "spool"]),
 ]
 
 
@@ -299,7 +408,8 @@ def test_parser_commands_and_options_are_available(tmpdir, command_function, cli
         gimmecert.cli.main()  # Should not raise
 
 
-@pytest.mark.parametrize("command", ["help", "init", "server", "client", "renew", "status"])
+@pytest.mark.parametrize("command", ["help", "init", "server", "client", "renew", "status", "metrics", "export-files", "pool", "batch", "sign", "watch-spool",
+                                     "serve"])
 @pytest.mark.parametrize("help_option", ["--help", "-h"])
 def test_command_exists_and_accepts_help_flag(tmpdir, command, help_option):
     """
@@ -337,7 +447,7 @@ def test_init_command_invoked_with_correct_parameters_no_options(mock_init, tmpd
 
     gimmecert.cli.main()
 
-    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.basename, default_depth)
+    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.basename, default_depth, ('rsa', 2048), 'files', None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'init', '-b', 'My Project'])
@@ -353,7 +463,90 @@ def test_init_command_invoked_with_correct_parameters_with_options(mock_init, tm
 
     gimmecert.cli.main()
 
-    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'My Project', default_depth)
+    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'My Project', default_depth, ('rsa', 2048), 'files', None)
+
+
+@pytest.mark.parametrize("storage_backend_option", ["--storage-backend", "-s"])
+def test_init_command_invoked_with_correct_parameters_with_storage_backend(tmpdir, storage_backend_option):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', ['gimmecert', 'init', storage_backend_option, 'sqlite']), mock.patch('gimmecert.cli.init') as mock_init:
+        mock_init.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.basename, 1, ('rsa', 2048), 'sqlite', None)
+
+
+@pytest.mark.parametrize("jobs_option", ["--jobs", "-j"])
+def test_init_command_invoked_with_correct_parameters_with_jobs(tmpdir, jobs_option):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', ['gimmecert', 'init', '-d', '4', jobs_option, '2']), mock.patch('gimmecert.cli.init') as mock_init:
+        mock_init.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_init.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.basename, 4, ('rsa', 2048), 'files', 2)
+
+
+@mock.patch('sys.argv', ['gimmecert', 'init', '--storage-backend', 'unsupported'])
+@mock.patch('gimmecert.cli.init')
+def test_init_command_fails_with_unsupported_storage_backend(mock_init, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert mock_init.called is False
+    assert e_info.value.code != 0
+
+
+@pytest.mark.parametrize("cli_invocation, expected_textfile, expected_rebuild_index", [
+    (["gimmecert", "metrics"], None, False),
+    (["gimmecert", "metrics", "--textfile", "gimmecert.prom"], "CWD/gimmecert.prom", False),
+    (["gimmecert", "metrics", "-o", "/var/lib/gimmecert.prom", "-r"], "/var/lib/gimmecert.prom", True),
+])
+def test_metrics_command_invoked_with_correct_parameters(tmpdir, cli_invocation, expected_textfile, expected_rebuild_index):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    if expected_textfile is not None:
+        expected_textfile = expected_textfile.replace('CWD', tmpdir.strpath)
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.metrics') as mock_metrics:
+        mock_metrics.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_metrics.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, expected_textfile, expected_rebuild_index)
+
+
+@pytest.mark.parametrize("cli_invocation, expected_output_directory", [
+    (["gimmecert", "export-files"], None),
+    (["gimmecert", "export-files", "exported"], "CWD/exported"),
+])
+def test_export_files_command_invoked_with_correct_parameters(tmpdir, cli_invocation, expected_output_directory):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    if expected_output_directory is not None:
+        expected_output_directory = expected_output_directory.replace('CWD', tmpdir.strpath)
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.export_files') as mock_export_files:
+        mock_export_files.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_export_files.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, expected_output_directory)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'server'])
@@ -379,7 +572,7 @@ def test_server_command_invoked_with_correct_parameters_without_extra_dns_names(
 
     gimmecert.cli.main()
 
-    mock_server.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myserver', [], None)
+    mock_server.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myserver', [], None, ('rsa', 2048))
 
 
 @mock.patch('sys.argv', ['gimmecert', 'server', 'myserver', 'service.local', 'service.example.com'])
@@ -393,7 +586,7 @@ def test_server_command_invoked_with_correct_parameters_with_extra_dns_names(moc
 
     gimmecert.cli.main()
 
-    mock_server.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myserver', ['service.local', 'service.example.com'], None)
+    mock_server.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myserver', ['service.local', 'service.example.com'], None, ('rsa', 2048))
 
 
 @mock.patch('sys.argv', ['gimmecert', 'help'])
@@ -497,7 +690,7 @@ def test_client_command_invoked_with_correct_parameters(mock_client, tmpdir):
 
     gimmecert.cli.main()
 
-    mock_client.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myclient', None)
+    mock_client.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myclient', None, ('rsa', 2048))
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew'])
@@ -523,7 +716,7 @@ def test_renew_command_invoked_with_correct_parameters_for_server(mock_renew, tm
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, None, None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, None, None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', 'client', 'myclient'])
@@ -537,7 +730,7 @@ def test_renew_command_invoked_with_correct_parameters_for_client(mock_renew, tm
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', False, None, None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', False, None, None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', '--new-private-key', 'server', 'myserver'])
@@ -551,7 +744,7 @@ def test_renew_command_invoked_with_correct_parameters_for_server_with_new_priva
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', True, None, None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', True, None, None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', '--new-private-key', 'client', 'myclient'])
@@ -565,7 +758,7 @@ def test_renew_command_invoked_with_correct_parameters_for_client_with_new_priva
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', True, None, None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', True, None, None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', '--csr', 'mycustom.csr.pem', 'server', 'myserver'])
@@ -579,7 +772,7 @@ def test_renew_command_invoked_with_correct_parameters_for_server_with_csr_optio
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, 'mycustom.csr.pem', None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, 'mycustom.csr.pem', None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', '--csr', 'mycustom.csr.pem', 'client', 'myclient'])
@@ -593,7 +786,7 @@ def test_renew_command_invoked_with_correct_parameters_for_client_with_csr_optio
 
     gimmecert.cli.main()
 
-    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', False, 'mycustom.csr.pem', None)
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', False, 'mycustom.csr.pem', None, None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', '--update-dns-names', 'myservice1.example.com,myservice2.example.com', 'server', 'myserver'])
@@ -609,7 +802,7 @@ def test_renew_command_invoked_with_correct_parameters_for_client_with_update_dn
 
     mock_renew.assert_called_once_with(sys.stdout, sys.stderr,
                                        tmpdir.strpath,
-                                       'server', 'myserver', False, None, ['myservice1.example.com', 'myservice2.example.com'])
+                                       'server', 'myserver', False, None, ['myservice1.example.com', 'myservice2.example.com'], None)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'status'])
@@ -623,7 +816,34 @@ def test_status_command_invoked_with_correct_parameters(mock_status, tmpdir):
 
     gimmecert.cli.main()
 
-    mock_status.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath)
+    mock_status.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, False, 'text')
+
+
+@mock.patch('sys.argv', ['gimmecert', 'status', '--rebuild-index'])
+@mock.patch('gimmecert.cli.status')
+def test_status_command_invoked_with_correct_parameters_with_rebuild_index(mock_status, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_status.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_status.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, True, 'text')
+
+
+@pytest.mark.parametrize("output_format", ["text", "json", "jsonl", "csv"])
+def test_status_command_invoked_with_correct_parameters_with_format(tmpdir, output_format):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', ['gimmecert', 'status', '--format', output_format]), \
+            mock.patch('gimmecert.cli.status', return_value=gimmecert.commands.ExitCode.SUCCESS) as mock_status:
+        gimmecert.cli.main()
+
+    mock_status.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, False, output_format)
 
 
 @mock.patch('sys.argv', ['gimmecert', 'renew', 'server', '--new-private-key', '--csr', 'myserver.csr.pem', 'myserver'])
@@ -652,3 +872,601 @@ def test_renew_command_fails_if_both_new_private_key_and_csr_options_are_specifi
 
     assert mock_renew.called is False
     assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'pool'])
+@mock.patch('gimmecert.cli.pool_status')
+def test_pool_command_invoked_with_correct_parameters(mock_pool_status, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_pool_status.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_pool_status.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath)
+
+
+@mock.patch('sys.argv', ['gimmecert', 'pool', 'fill', '5'])
+@mock.patch('gimmecert.cli.pool_fill')
+def test_pool_fill_command_invoked_with_correct_parameters(mock_pool_fill, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_pool_fill.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_pool_fill.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 5, ('rsa', 2048))
+
+
+@mock.patch('sys.argv', ['gimmecert', 'pool', 'fill'])
+def test_pool_fill_command_fails_without_arguments(tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'batch', 'manifest.yaml'])
+@mock.patch('gimmecert.cli.batch')
+def test_batch_command_invoked_with_correct_parameters(mock_batch, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_batch.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_batch.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'manifest.yaml', None, ('rsa', 2048))
+
+
+@mock.patch('sys.argv', ['gimmecert', 'batch'])
+def test_batch_command_fails_without_arguments(tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'batch', '--jobs', '8', 'manifest.json'])
+@mock.patch('gimmecert.cli.batch')
+def test_batch_command_invoked_with_correct_parameters_with_jobs(mock_batch, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_batch.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_batch.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'manifest.json', 8, ('rsa', 2048))
+
+
+@pytest.mark.parametrize("cli_invocation, expected_arguments", [
+    (["gimmecert", "sign", "--type", "server", "spool"], ('server', 'CWD/spool', None)),
+    (["gimmecert", "sign", "--type", "client", "--jobs", "8", "/tmp/csrs.pem"], ('client', '/tmp/csrs.pem', 8)),
+    (["gimmecert", "sign", "--type", "client", "-"], ('client', '-', None)),
+])
+def test_sign_command_invoked_with_correct_parameters(tmpdir, cli_invocation, expected_arguments):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    entity_type, csr_source, jobs = expected_arguments
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.sign') as mock_sign:
+        mock_sign.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_sign.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, entity_type, csr_source.replace('CWD', tmpdir.strpath), jobs)
+
+
+@pytest.mark.parametrize("cli_invocation", [
+    ["gimmecert", "sign", "spool"],
+    ["gimmecert", "sign", "--type", "server"],
+    ["gimmecert", "sign", "--type", "ca", "spool"],
+])
+def test_sign_command_fails_with_invalid_arguments(tmpdir, cli_invocation):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.sign') as mock_sign:
+        with pytest.raises(SystemExit) as e_info:
+            gimmecert.cli.main()
+
+    assert mock_sign.called is False
+    assert e_info.value.code != 0
+
+
+@pytest.mark.parametrize("cli_invocation, expected_arguments", [
+    (["gimmecert", "watch-spool", "--type", "server", "spool"], ('server', 0.2, 1.0, True)),
+    (["gimmecert", "watch-spool", "-t", "client", "-d", "1", "-i", "10", "-p", "spool"], ('client', 1.0, 10.0, False)),
+])
+@mock.patch('signal.signal')
+def test_watch_spool_command_invoked_with_correct_parameters(mock_signal, tmpdir, cli_invocation, expected_arguments):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    entity_type, debounce, poll_interval, use_inotify = expected_arguments
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.watch_spool') as mock_watch_spool:
+        mock_watch_spool.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+        gimmecert.cli.main()
+
+    mock_watch_spool.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.join('spool').strpath, entity_type,
+                                             debounce, poll_interval, use_inotify)
+    mock_signal.assert_called_once_with(signal.SIGTERM, signal.default_int_handler)
+
+
+@pytest.mark.parametrize("cli_invocation", [
+    ["gimmecert", "watch-spool", "spool"],
+    ["gimmecert", "watch-spool", "--type", "server"],
+    ["gimmecert", "watch-spool", "--type", "ca", "spool"],
+    ["gimmecert", "watch-spool", "--type", "server", "--debounce", "soon", "spool"],
+])
+def test_watch_spool_command_fails_with_invalid_arguments(tmpdir, cli_invocation):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), mock.patch('gimmecert.cli.watch_spool') as mock_watch_spool:
+        with pytest.raises(SystemExit) as e_info:
+            gimmecert.cli.main()
+
+    assert mock_watch_spool.called is False
+    assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'server', '--key-specification', 'ecdsa:secp384r1', 'myserver'])
+@mock.patch('gimmecert.cli.server')
+def test_server_command_invoked_with_correct_parameters_with_key_specification(mock_server, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_server.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_server.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'myserver', [], None, ('ecdsa', 'secp384r1'))
+
+
+@mock.patch('sys.argv', ['gimmecert', 'renew', '--new-private-key', '--key-specification', 'ed25519', 'client', 'myclient'])
+@mock.patch('gimmecert.cli.renew')
+def test_renew_command_invoked_with_correct_parameters_with_key_specification(mock_renew, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_renew.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'client', 'myclient', True, None, None, ('ed25519', None))
+
+
+@mock.patch('sys.argv', ['gimmecert', 'renew', '--key-specification', 'ed25519', 'server', 'myserver'])
+@mock.patch('gimmecert.cli.renew')
+def test_renew_command_fails_if_key_specification_is_passed_in_without_new_private_key_option(mock_renew, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert mock_renew.called is False
+    assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'init', '--key-specification', 'rsa:1024'])
+@mock.patch('gimmecert.cli.init')
+def test_init_command_fails_with_unsupported_key_specification(mock_init, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert mock_init.called is False
+    assert e_info.value.code != 0
+
+
+@mock.patch('sys.argv', ['gimmecert', 'serve'])
+@mock.patch('gimmecert.cli.serve')
+@mock.patch('signal.signal')
+def test_serve_command_invoked_with_correct_parameters(mock_signal, mock_serve, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_serve.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_serve.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, None, 10)
+    mock_signal.assert_called_once_with(signal.SIGTERM, signal.default_int_handler)
+
+
+@mock.patch('sys.argv', ['gimmecert', 'serve', '--socket', 'my.sock', '--key-pool-size', '3'])
+@mock.patch('gimmecert.cli.serve')
+@mock.patch('signal.signal')
+def test_serve_command_invoked_with_correct_parameters_with_options(mock_signal, mock_serve, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_serve.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_serve.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, tmpdir.join('my.sock').strpath, 3)
+
+
+@pytest.mark.parametrize("cli_invocation, command_function, command, arguments", [
+    (["gimmecert", "server", "myserver", "myserver.local"], "gimmecert.cli.server", "server",
+     {'entity_name': 'myserver', 'extra_dns_names': ['myserver.local'], 'custom_csr_path': None, 'key_specification': ('rsa', 2048)}),
+    (["gimmecert", "server", "--csr", "myserver.csr.pem", "myserver"], "gimmecert.cli.server", "server",
+     {'entity_name': 'myserver', 'extra_dns_names': [], 'custom_csr_path': 'CWD/myserver.csr.pem', 'key_specification': ('rsa', 2048)}),
+    (["gimmecert", "client", "-k", "ed25519", "myclient"], "gimmecert.cli.client", "client",
+     {'entity_name': 'myclient', 'custom_csr_path': None, 'key_specification': ('ed25519', None)}),
+    (["gimmecert", "renew", "-u", "myserver.local", "server", "myserver"], "gimmecert.cli.renew", "renew",
+     {'entity_type': 'server', 'entity_name': 'myserver', 'generate_new_private_key': False, 'custom_csr_path': None,
+      'dns_names': ['myserver.local'], 'key_specification': None}),
+    (["gimmecert", "status"], "gimmecert.cli.status", "status", {'rebuild_index': False, 'output_format': 'text'}),
+    (["gimmecert", "status", "-r"], "gimmecert.cli.status", "status", {'rebuild_index': True, 'output_format': 'text'}),
+    (["gimmecert", "status", "-f", "jsonl"], "gimmecert.cli.status", "status", {'rebuild_index': False, 'output_format': 'jsonl'}),
+])
+def test_commands_are_forwarded_to_daemon(tmpdir, cli_invocation, command_function, command, arguments):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    if arguments.get('custom_csr_path'):
+        arguments['custom_csr_path'] = arguments['custom_csr_path'].replace('CWD', tmpdir.strpath)
+
+    with mock.patch('sys.argv', cli_invocation), \
+            mock.patch(command_function) as mock_command_function, \
+            mock.patch('gimmecert.cli.forward_command', return_value=gimmecert.commands.ExitCode.SUCCESS) as mock_forward_command:
+        gimmecert.cli.main()
+
+    mock_forward_command.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, command, arguments)
+    assert mock_command_function.called is False
+
+
+@mock.patch('sys.argv', ['gimmecert', 'server', 'myserver'])
+@mock.patch('gimmecert.cli.server')
+@mock.patch('gimmecert.cli.forward_command')
+def test_server_command_exits_with_daemon_exit_code(mock_forward_command, mock_server, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_forward_command.return_value = gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
+
+    with pytest.raises(SystemExit) as e_info:
+        gimmecert.cli.main()
+
+    assert e_info.value.code == gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
+    assert mock_server.called is False
+
+
+@pytest.mark.parametrize("cli_invocation, command_function", [
+    (["gimmecert", "server", "--csr", "-", "myserver"], "gimmecert.cli.server"),
+    (["gimmecert", "client", "--csr", "-", "myclient"], "gimmecert.cli.client"),
+    (["gimmecert", "renew", "--csr", "-", "client", "myclient"], "gimmecert.cli.renew"),
+])
+def test_commands_reading_csr_from_standard_input_are_not_forwarded_to_daemon(tmpdir, cli_invocation, command_function):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), \
+            mock.patch(command_function, return_value=gimmecert.commands.ExitCode.SUCCESS) as mock_command_function, \
+            mock.patch('gimmecert.cli.forward_command') as mock_forward_command:
+        gimmecert.cli.main()
+
+    assert mock_forward_command.called is False
+    assert mock_command_function.called is True
+
+
+@pytest.mark.parametrize("cli_invocation, command_function", [
+    (["gimmecert", "server", "myserver"], "gimmecert.cli.server"),
+    (["gimmecert", "client", "myclient"], "gimmecert.cli.client"),
+    (["gimmecert", "renew", "client", "myclient"], "gimmecert.cli.renew"),
+    (["gimmecert", "status"], "gimmecert.cli.status"),
+])
+def test_commands_are_run_locally_if_daemon_is_not_available(tmpdir, cli_invocation, command_function):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), \
+            mock.patch(command_function, return_value=gimmecert.commands.ExitCode.SUCCESS) as mock_command_function, \
+            mock.patch('gimmecert.cli.forward_command', return_value=None) as mock_forward_command:
+        gimmecert.cli.main()
+
+    assert mock_forward_command.called is True
+    assert mock_command_function.called is True
+
+
+@pytest.mark.parametrize("cli_invocation, expected_arguments", [
+    (["gimmecert", "renew", "--all"], (['server', 'client'], None, None, None)),
+    (["gimmecert", "renew", "--all", "client"], (['client'], None, None, None)),
+    (["gimmecert", "renew", "--name-glob", "web*", "server"], (['server'], 'web*', None, None)),
+    (["gimmecert", "renew", "--expiring-within", "30", "--name-glob", "web*", "--jobs", "4"], (['server', 'client'], 'web*', 30, 4)),
+])
+def test_renew_command_invokes_bulk_renewal_with_correct_parameters(tmpdir, cli_invocation, expected_arguments):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), \
+            mock.patch('gimmecert.cli.renew') as mock_renew, \
+            mock.patch('gimmecert.cli.renew_bulk', return_value=gimmecert.commands.ExitCode.SUCCESS) as mock_renew_bulk:
+        gimmecert.cli.main()
+
+    mock_renew_bulk.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, *expected_arguments)
+    assert mock_renew.called is False
+
+
+@pytest.mark.parametrize("cli_invocation", [
+    ["gimmecert", "renew"],
+    ["gimmecert", "renew", "server"],
+    ["gimmecert", "renew", "--jobs", "2", "server", "myserver"],
+    ["gimmecert", "renew", "--all", "server", "myserver"],
+    ["gimmecert", "renew", "--all", "--new-private-key"],
+    ["gimmecert", "renew", "--all", "--csr", "myserver.csr.pem"],
+    ["gimmecert", "renew", "--all", "--update-dns-names", "myserver.local", "server"],
+    ["gimmecert", "renew", "--expiring-within", "abc"],
+])
+def test_renew_command_fails_for_invalid_combination_of_arguments(tmpdir, cli_invocation):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', cli_invocation), \
+            mock.patch('gimmecert.cli.renew') as mock_renew, \
+            mock.patch('gimmecert.cli.renew_bulk') as mock_renew_bulk:
+        with pytest.raises(SystemExit) as e_info:
+            gimmecert.cli.main()
+
+    assert e_info.value.code != 0
+    assert mock_renew.called is False
+    assert mock_renew_bulk.called is False
+
+
+@pytest.mark.parametrize("intermixed, expected_name", [
+    (True, 'myname'),
+    (False, None),
+])
+def test_argument_parser_allows_intermixing_options_and_optional_positional_arguments_if_enabled(intermixed, expected_name):
+    parser = gimmecert.cli.ArgumentParser()
+    parser.add_argument('type', nargs='?')
+    parser.add_argument('name', nargs='?')
+    parser.add_argument('--option')
+    parser.intermixed = intermixed
+
+    args, extras = parser.parse_known_args(['mytype', '--option', 'myvalue', 'myname'])
+
+    assert args.type == 'mytype'
+    assert args.option == 'myvalue'
+    assert args.name == expected_name
+
+
+def test_argument_parser_allows_intermixing_without_parse_known_intermixed_args(monkeypatch):
+    # Python versions prior to 3.7 do not provide intermixed parsing.
+    monkeypatch.delattr(argparse.ArgumentParser, 'parse_known_intermixed_args', raising=False)
+
+    parser = gimmecert.cli.ArgumentParser()
+    parser.add_argument('type', nargs='?')
+    parser.add_argument('name', nargs='?')
+    parser.add_argument('--option')
+    parser.add_argument('--flag', action='store_true')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--first', action='store_true')
+    group.add_argument('--second', action='store_true')
+    parser.intermixed = True
+    actions = list(parser._actions)
+
+    args, extras = parser.parse_known_args(['mytype', '--option', 'myvalue', '--second', 'myname', '--unknown', 'extra'])
+
+    assert args.type == 'mytype'
+    assert args.name == 'myname'
+    assert args.option == 'myvalue'
+    assert args.flag is False
+    assert args.second is True
+    assert extras == ['--unknown', 'extra']
+    assert group.required is True
+    assert parser._actions == actions
+
+
+@mock.patch('sys.argv', ['gimmecert', 'renew', 'server', '--update-dns-names', 'myservice.example.com', 'myserver'])
+@mock.patch('gimmecert.cli.renew')
+def test_renew_command_accepts_options_between_positional_arguments_without_parse_known_intermixed_args(mock_renew, tmpdir, monkeypatch):
+    monkeypatch.delattr(argparse.ArgumentParser, 'parse_known_intermixed_args', raising=False)
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_renew.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, None, ['myservice.example.com'], None)
+
+
+@mock.patch('sys.argv', ['gimmecert', 'renew', 'server', '--update-dns-names', 'myservice.example.com', 'myserver'])
+@mock.patch('gimmecert.cli.renew')
+def test_renew_command_accepts_options_between_positional_arguments(mock_renew, tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    mock_renew.return_value = gimmecert.commands.ExitCode.SUCCESS
+
+    gimmecert.cli.main()
+
+    mock_renew.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'server', 'myserver', False, None, ['myservice.example.com'], None)
+
+
+def test_forward_command_delegates_to_daemon_module(tmpdir):
+
+    with mock.patch('gimmecert.daemon.forward_command', return_value=None) as mock_forward_command:
+        status_code = gimmecert.cli.forward_command(sys.stdout, sys.stderr, tmpdir.strpath, 'status', {})
+
+    assert status_code is None
+    mock_forward_command.assert_called_once_with(sys.stdout, sys.stderr, tmpdir.strpath, 'status', {})
+
+
+@pytest.mark.parametrize("cli_invocation", [
+    ["gimmecert"],
+    ["gimmecert", "help"],
+    ["gimmecert", "server", "--key-specification", "invalid", "myserver"],
+])
+def test_cli_does_not_import_heavy_modules_unless_needed(tmpdir, cli_invocation):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    script = """
+import sys
+import gimmecert.cli
+sys.argv = %r
+try:
+    gimmecert.cli.main()
+except SystemExit:
+    pass
+print(",".join(sorted(name for name in sys.modules if name in %r)))
+""" % (cli_invocation, HEAVY_MODULES)
+
+    output = subprocess.check_output([sys.executable, "-c", script], stderr=subprocess.DEVNULL, universal_newlines=True)
+
+    assert output.splitlines()[-1] == ""
+
+
+def test_cli_import_does_not_import_heavy_modules():
+    script = """
+import sys
+import gimmecert.cli
+print(",".join(sorted(name for name in sys.modules if name in %r)))
+""" % HEAVY_MODULES
+
+    output = subprocess.check_output([sys.executable, "-c", script], universal_newlines=True)
+
+    assert output.splitlines()[-1] == ""
+
+
+def test_instrumentation_options_are_disabled_by_default():
+    parser = gimmecert.cli.get_parser()
+
+    args = parser.parse_args(['status'])
+
+    assert args.timings is False
+    assert args.profile is None
+
+
+@pytest.mark.parametrize("arguments, expected_timings, expected_profile", [
+    (["--timings", "status"], True, None),
+    (["status", "--timings"], True, None),
+    (["pool", "fill", "--timings", "2"], True, None),
+    (["--profile", "out.prof", "server", "myserver"], False, "out.prof"),
+    (["server", "--profile", "out.prof", "myserver"], False, "out.prof"),
+    (["--timings", "renew", "--profile", "out.prof", "server", "myserver"], True, "out.prof"),
+])
+def test_instrumentation_options_are_accepted_before_and_after_subcommand(arguments, expected_timings, expected_profile):
+    parser = gimmecert.cli.get_parser()
+
+    args = parser.parse_args(arguments)
+
+    assert args.timings is expected_timings
+    assert args.profile == expected_profile
+
+
+def test_main_does_not_instrument_command_by_default(tmpdir, capsys):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    def status_side_effect(*args, **kwargs):
+        assert gimmecert.timings._recorder is None
+        return gimmecert.commands.ExitCode.SUCCESS
+
+    with mock.patch('sys.argv', ['gimmecert', 'status']), mock.patch('gimmecert.cli.status', side_effect=status_side_effect):
+        gimmecert.cli.main()
+
+    assert "Timings" not in capsys.readouterr().err
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize("exit_code", [gimmecert.commands.ExitCode.SUCCESS, gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED])
+def test_main_reports_timings_to_standard_error(tmpdir, capsys, exit_code):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    def export_files_side_effect(*args, **kwargs):
+        with gimmecert.timings.phase('ca.load'):
+            pass
+
+        return exit_code
+
+    with mock.patch('sys.argv', ['gimmecert', 'export-files', '--timings']), \
+            mock.patch('gimmecert.cli.export_files', side_effect=export_files_side_effect):
+        try:
+            gimmecert.cli.main()
+        except SystemExit as e:
+            assert e.code == exit_code
+
+    stderr = capsys.readouterr().err
+    phases = [line.split()[0] for line in stderr.splitlines()[1:]]
+
+    assert stderr.startswith("Timings (wall time):\n")
+    assert phases == ['cli.parse', 'ca.load', 'other', 'total']
+    assert gimmecert.timings._recorder is None
+
+
+def test_main_reports_timings_if_command_raises_exception(tmpdir, capsys):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    with mock.patch('sys.argv', ['gimmecert', '--timings', 'status']), mock.patch('gimmecert.cli.status', side_effect=OSError("Disk failure.")):
+        with pytest.raises(OSError):
+            gimmecert.cli.main()
+
+    assert "Timings (wall time):" in capsys.readouterr().err
+    assert gimmecert.timings._recorder is None
+
+
+def test_main_writes_profiling_data(tmpdir):
+    # This should ensure we don't accidentally create artifacts
+    # outside of test directory.
+    tmpdir.chdir()
+
+    def profiled_status(*args, **kwargs):
+        return gimmecert.commands.ExitCode.SUCCESS
+
+    with mock.patch('sys.argv', ['gimmecert', '--profile', 'out.prof', 'status']), mock.patch('gimmecert.cli.status', side_effect=profiled_status):
+        gimmecert.cli.main()
+
+    stats = pstats.Stats(tmpdir.join('out.prof').strpath)
+
+    assert any(function_name == 'profiled_status' for _, _, function_name in stats.stats)
@@ -19,13 +19,29 @@
 #
 
 import argparse
+import csv
+import datetime
+import fcntl
 import io
+import json
 import os
+import shutil
+import signal
 import sys
+import tempfile
+import threading
+import time
 
 import cryptography.x509
 
 import gimmecert.commands
+import gimmecert.crypto
+import gimmecert.locking
+import gimmecert.parallel
+import gimmecert.project
+import gimmecert.spool
+import gimmecert.storage
+import gimmecert.utils
 
 import pytest
 from unittest import mock
@@ -466,6 +482,32 @@ def test_client_errors_out_if_certificate_already_issued(tmpdir):
     assert tmpdir.join('.gimmecert', 'client', 'myclient.cert.pem').read() == certificate
 
 
+def test_client_errors_out_if_certificate_gets_issued_concurrently(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch('gimmecert.project.Project.issue_client', side_effect=gimmecert.project.CertificateAlreadyIssuedError("Already issued.")):
+        status_code = gimmecert.commands.client(stdout_stream, stderr_stream, tmpdir.strpath, 'myclient', None)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
+    assert stderr_stream.getvalue() == "Refusing to overwrite existing data. Certificate has already been issued for client myclient.\n"
+    assert stdout_stream.getvalue() == ""
+
+
+def test_renew_errors_out_if_entity_gets_removed_concurrently(sample_project_directory):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch('gimmecert.project.Project.renew', side_effect=gimmecert.project.UnknownEntityError("Unknown entity.")):
+        status_code = gimmecert.commands.renew(stdout_stream, stderr_stream, sample_project_directory.strpath, 'server', 'server-with-privkey-1',
+                                               False, None, None)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_UNKNOWN_ENTITY
+    assert stderr_stream.getvalue() == "Cannot renew certificate. No existing certificate found for server server-with-privkey-1.\n"
+    assert stdout_stream.getvalue() == ""
+
+
 def test_renew_returns_status_code(tmpdir):
     tmpdir.chdir()
 
@@ -1561,3 +1603,1713 @@ def test_renew_client_reads_csr_from_stdin(mock_read_input, sample_project_direc
     assert stored_csr_public_numbers == custom_csr_public_numbers
     assert certificate_public_numbers == custom_csr_public_numbers
     assert certificate.subject != key_with_csr.csr.subject
+
+
+def test_get_private_key_takes_key_from_pool(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+    pooled_private_key = gimmecert.crypto.generate_private_key()
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, pooled_private_key, ('rsa', 2048))
+
+    private_key = gimmecert.commands.get_private_key(tmpdir.strpath, ('rsa', 2048))
+
+    assert private_key.public_key().public_numbers() == pooled_private_key.public_key().public_numbers()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+
+
+@mock.patch('gimmecert.crypto.generate_private_key')
+def test_get_private_key_generates_key_if_pool_is_empty(mock_generate_private_key, tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+
+    private_key = gimmecert.commands.get_private_key(tmpdir.strpath, ('rsa', 2048))
+
+    mock_generate_private_key.assert_called_once_with(('rsa', 2048))
+    assert private_key == mock_generate_private_key.return_value
+
+
+def test_pool_fill_reports_error_if_directory_is_not_initialised(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.pool_fill(stdout_stream, stderr_stream, tmpdir.strpath, 2)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert "must be initialised" in stderr_stream.getvalue()
+    assert stdout_stream.getvalue() == ""
+
+
+def test_pool_fill_adds_keys_to_pool_and_reports_count(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.pool_fill(stdout_stream, stderr_stream, tmpdir.strpath, 2)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stderr_stream.getvalue() == ""
+    assert "Added 2 rsa:2048 private keys to the key pool." in stdout_stream.getvalue()
+    assert "Private keys available in key pool: 2" in stdout_stream.getvalue()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 2
+
+
+def test_pool_status_reports_number_of_available_keys(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), tmpdir.strpath, 1)
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.pool_status(stdout_stream, stderr_stream, tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == "Private keys available in key pool: 1\n    rsa:2048: 1\n"
+    assert stderr_stream.getvalue() == ""
+
+
+def test_pool_status_reports_error_if_directory_is_not_initialised(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.pool_status(stdout_stream, stderr_stream, tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+
+
+@pytest.mark.parametrize("entity_type", ["server", "client"])
+def test_issuance_uses_pooled_private_key(tmpdir, entity_type):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    pooled_private_key = gimmecert.crypto.generate_private_key()
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, pooled_private_key, ('rsa', 2048))
+
+    if entity_type == "server":
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', None, None)
+    else:
+        gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', None)
+
+    private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', entity_type, 'myentity.key.pem').strpath)
+    certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', entity_type, 'myentity.cert.pem').strpath)
+
+    assert private_key.public_key().public_numbers() == pooled_private_key.public_key().public_numbers()
+    assert certificate.public_key().public_numbers() == pooled_private_key.public_key().public_numbers()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+
+
+def test_renew_with_new_private_key_uses_pooled_private_key(sample_project_directory):
+    pooled_private_key = gimmecert.crypto.generate_private_key()
+    gimmecert.storage.add_pooled_private_key(sample_project_directory.strpath, pooled_private_key, ('rsa', 2048))
+
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), sample_project_directory.strpath, 'server', 'server-with-privkey-1', True, None, None)
+
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'server', 'server-with-privkey-1.cert.pem').strpath)
+
+    assert certificate.public_key().public_numbers() == pooled_private_key.public_key().public_numbers()
+    assert gimmecert.storage.count_pooled_private_keys(sample_project_directory.strpath) == 0
+
+
+def test_batch_reports_error_if_directory_is_not_initialised(tmpdir):
+    manifest = tmpdir.join('manifest.json')
+    manifest.write('[{"type": "server", "name": "myserver"}]')
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.batch(stdout_stream, stderr_stream, tmpdir.strpath, manifest.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert "must be initialised" in stderr_stream.getvalue()
+    assert stdout_stream.getvalue() == ""
+
+
+def test_batch_reports_error_if_manifest_is_invalid(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write('[{"type": "ca", "name": "myca"}]')
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.batch(stdout_stream, stderr_stream, tmpdir.strpath, manifest.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_INVALID_MANIFEST
+    assert "invalid type" in stderr_stream.getvalue()
+    assert stdout_stream.getvalue() == ""
+
+
+def test_batch_issues_certificates_for_all_entities(tmpdir, key_with_csr):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1", "dns_names": ["myserver1.local"]},
+        {"type": "server", "name": "myserver2", "csr": "custom_csr/mycustom.csr.pem"},
+        {"type": "client", "name": "myclient1"}
+    ]""")
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy', wraps=gimmecert.storage.read_ca_hierarchy) as mock_read_ca_hierarchy:
+        status_code = gimmecert.commands.batch(stdout_stream, stderr_stream, tmpdir.strpath, manifest.strpath)
+
+    stdout = stdout_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stderr_stream.getvalue() == ""
+    assert mock_read_ca_hierarchy.call_count == 1
+
+    assert "Issued server certificate for myserver1." in stdout
+    assert ".gimmecert/server/myserver1.key.pem" in stdout
+    assert ".gimmecert/server/myserver2.csr.pem" in stdout
+    assert ".gimmecert/client/myclient1.cert.pem" in stdout
+    assert "Processed 3 entities, issued 3 certificates, 0 failures." in stdout
+
+    issuer_certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'ca', 'level2.cert.pem').strpath)
+    server1_certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'server', 'myserver1.cert.pem').strpath)
+    server2_certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'server', 'myserver2.cert.pem').strpath)
+    client1_certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'client', 'myclient1.cert.pem').strpath)
+    server1_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'server', 'myserver1.key.pem').strpath)
+
+    assert gimmecert.utils.get_dns_names(server1_certificate) == ['myserver1', 'myserver1.local']
+    assert server1_certificate.issuer == issuer_certificate.subject
+    assert server1_certificate.public_key().public_numbers() == server1_private_key.public_key().public_numbers()
+    assert server2_certificate.public_key().public_numbers() == key_with_csr.csr.public_key().public_numbers()
+    assert tmpdir.join('.gimmecert', 'server', 'myserver2.csr.pem').read() == key_with_csr.csr_pem
+    assert client1_certificate.subject == gimmecert.crypto.get_dn('myclient1')
+    assert tmpdir.join('.gimmecert', 'client', 'myclient1.key.pem').check(file=1)
+
+
+def test_batch_reports_failures_and_continues_processing(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver1', None, None)
+    existing_certificate = tmpdir.join('.gimmecert', 'server', 'myserver1.cert.pem').read()
+
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1"},
+        {"type": "client", "name": "myclient1", "csr": "missing.csr.pem"},
+        {"type": "client", "name": "myclient2"}
+    ]""")
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.batch(stdout_stream, stderr_stream, tmpdir.strpath, manifest.strpath)
+
+    stdout = stdout_stream.getvalue()
+    stderr = stderr_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_BATCH_FAILED
+    assert "Failed to issue certificate for server myserver1." in stdout
+    assert "Failed to issue certificate for client myclient1." in stdout
+    assert "Issued client certificate for myclient2." in stdout
+    assert "Processed 3 entities, issued 1 certificates, 2 failures." in stdout
+    assert "server myserver1: Certificate has already been issued." in stderr
+    assert "client myclient1: Failed to read CSR" in stderr
+
+    assert tmpdir.join('.gimmecert', 'server', 'myserver1.cert.pem').read() == existing_certificate
+    assert not tmpdir.join('.gimmecert', 'client', 'myclient1.cert.pem').check()
+    assert tmpdir.join('.gimmecert', 'client', 'myclient2.cert.pem').check(file=1)
+
+
+def test_batch_issues_certificates_using_multiple_worker_processes(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), tmpdir.strpath, 1)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1"},
+        {"type": "server", "name": "myserver2"},
+        {"type": "client", "name": "myclient1"},
+        {"type": "client", "name": "myclient1"}
+    ]""")
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.batch(stdout_stream, stderr_stream, tmpdir.strpath, manifest.strpath, 2)
+
+    stdout_lines = stdout_stream.getvalue().splitlines()
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_BATCH_FAILED
+    assert "client myclient1: Certificate has already been issued." in stderr_stream.getvalue()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+
+    # Report is produced in manifest order.
+    assert stdout_lines.index("Issued server certificate for myserver1.") < stdout_lines.index("Issued server certificate for myserver2.")
+    assert stdout_lines.index("Issued server certificate for myserver2.") < stdout_lines.index("Issued client certificate for myclient1.")
+    assert stdout_lines.index("Issued client certificate for myclient1.") < stdout_lines.index("Failed to issue certificate for client myclient1.")
+
+    for entity_type, entity_name in [('server', 'myserver1'), ('server', 'myserver2'), ('client', 'myclient1')]:
+        private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', entity_type, '%s.key.pem' % entity_name).strpath)
+        certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', entity_type, '%s.cert.pem' % entity_name).strpath)
+
+        assert certificate.public_key().public_numbers() == private_key.public_key().public_numbers()
+        assert certificate.subject == gimmecert.crypto.get_dn(entity_name)
+
+
+@pytest.mark.parametrize("key_specification", gimmecert.crypto.get_supported_key_specifications())
+def test_init_generates_ca_hierarchy_with_passed_in_key_specification(tmpdir, key_specification):
+
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2, key_specification)
+
+    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(tmpdir.join('.gimmecert', 'ca').strpath)
+
+    for private_key, certificate in ca_hierarchy:
+        assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == key_specification
+        assert gimmecert.crypto.key_specification_from_public_key(certificate.public_key()) == key_specification
+
+
+@pytest.mark.parametrize("entity_type", ["server", "client"])
+@pytest.mark.parametrize("key_specification", [('rsa', 3072), ('ecdsa', 'secp384r1'), ('ed25519', None)])
+def test_issuance_generates_private_key_with_passed_in_key_specification(tmpdir, entity_type, key_specification):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+
+    if entity_type == "server":
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', None, None, key_specification)
+    else:
+        gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', None, key_specification)
+
+    private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', entity_type, 'myentity.key.pem').strpath)
+    certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', entity_type, 'myentity.cert.pem').strpath)
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == key_specification
+    assert gimmecert.crypto.key_specification_from_public_key(certificate.public_key()) == key_specification
+
+
+def test_renew_raises_exception_if_key_specification_is_passed_in_without_new_private_key(sample_project_directory):
+
+    with pytest.raises(gimmecert.commands.InvalidCommandInvocation) as e_info:
+        gimmecert.commands.renew(io.StringIO(), io.StringIO(), sample_project_directory.strpath,
+                                 'server', 'server-with-privkey-1',
+                                 False, None, None, ('rsa', 4096))
+
+    assert str(e_info.value) == "Key specification can be passed-in only when generating new private key."
+
+
+def test_renew_with_new_private_key_keeps_existing_key_specification(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', None, None, ('ecdsa', 'secp256r1'))
+    old_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').strpath)
+
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', 'myserver', True, None, None)
+
+    new_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').strpath)
+
+    assert gimmecert.crypto.key_specification_from_public_key(new_private_key.public_key()) == ('ecdsa', 'secp256r1')
+    assert new_private_key.public_key().public_numbers() != old_private_key.public_key().public_numbers()
+
+
+def test_renew_with_new_private_key_uses_passed_in_key_specification(sample_project_directory):
+
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), sample_project_directory.strpath,
+                             'client', 'client-with-privkey-1',
+                             True, None, None, ('ed25519', None))
+
+    private_key = gimmecert.storage.read_private_key(sample_project_directory.join('.gimmecert', 'client', 'client-with-privkey-1.key.pem').strpath)
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'client', 'client-with-privkey-1.cert.pem').strpath)
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
+    assert gimmecert.crypto.key_specification_from_public_key(certificate.public_key()) == ('ed25519', None)
+
+
+def test_pool_fill_generates_private_keys_with_passed_in_key_specification(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    stdout_stream = io.StringIO()
+
+    gimmecert.commands.pool_fill(stdout_stream, io.StringIO(), tmpdir.strpath, 2, ('ecdsa', 'secp256r1'))
+
+    assert "Added 2 ecdsa:secp256r1 private keys to the key pool." in stdout_stream.getvalue()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath, ('ecdsa', 'secp256r1')) == 2
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath, ('rsa', 2048)) == 0
+
+
+def test_batch_generates_private_keys_according_to_key_specifications(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver", "key_specification": "ed25519"},
+        {"type": "client", "name": "myclient"}
+    ]""")
+
+    status_code = gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath, 1, ('ecdsa', 'secp256r1'))
+
+    server_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'server', 'myserver.key.pem').strpath)
+    client_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'client', 'myclient.key.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert gimmecert.crypto.key_specification_from_public_key(server_private_key.public_key()) == ('ed25519', None)
+    assert gimmecert.crypto.key_specification_from_public_key(client_private_key.public_key()) == ('ecdsa', 'secp256r1')
+
+
+@pytest.fixture
+def short_socket_path():
+    """
+    Helper fixture that provides short path for daemon socket (Unix
+    socket paths are limited in length).
+    """
+
+    socket_directory = tempfile.mkdtemp(prefix='gimmecert-')
+
+    yield os.path.join(socket_directory, 'daemon.sock')
+
+    shutil.rmtree(socket_directory)
+
+
+def test_serve_reports_error_if_directory_is_not_initialised(tmpdir, short_socket_path):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.serve(stdout_stream, stderr_stream, tmpdir.strpath, short_socket_path, 1)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert "must be initialised" in stderr_stream.getvalue()
+    assert stdout_stream.getvalue() == ""
+
+
+def test_serve_reports_error_if_daemon_is_already_running(tmpdir, short_socket_path):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    stderr_stream = io.StringIO()
+
+    with mock.patch('gimmecert.daemon.is_running', return_value=True):
+        status_code = gimmecert.commands.serve(io.StringIO(), stderr_stream, tmpdir.strpath, short_socket_path, 1)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_DAEMON_ALREADY_RUNNING
+    assert stderr_stream.getvalue() == "Daemon is already running on socket %s.\n" % short_socket_path
+
+
+def test_serve_reports_error_if_socket_cannot_be_created(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    socket_path = tmpdir.join('nonexistent', 'daemon.sock').strpath
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.serve(io.StringIO(), stderr_stream, tmpdir.strpath, socket_path, 1)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_DAEMON_SOCKET
+    assert stderr_stream.getvalue().startswith("Failed to listen on socket %s:" % socket_path)
+
+
+@pytest.mark.no_key_cache
+def test_serve_runs_daemon_until_interrupted(tmpdir, short_socket_path):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    def serve_forever(daemon):
+        # Daemon should be fully set-up by now.
+        assert os.path.exists(short_socket_path)
+        assert daemon.project_directory == tmpdir.strpath
+        assert gimmecert.crypto._private_key_provider is not None
+        raise KeyboardInterrupt()
+
+    with mock.patch('gimmecert.daemon.Daemon.serve_forever', autospec=True, side_effect=serve_forever) as mock_serve_forever:
+        status_code = gimmecert.commands.serve(stdout_stream, stderr_stream, tmpdir.strpath, short_socket_path, 1)
+
+    assert mock_serve_forever.called
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == "Serving requests on socket %s.\nDaemon stopped.\n" % short_socket_path
+    assert stderr_stream.getvalue() == ""
+    assert not os.path.exists(short_socket_path)
+    assert gimmecert.crypto._private_key_provider is None
+
+
+def test_serve_uses_default_socket_path(tmpdir, short_socket_path):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    stdout_stream = io.StringIO()
+
+    with mock.patch.dict('os.environ', {'GIMMECERT_SOCKET': short_socket_path}):
+        with mock.patch('gimmecert.daemon.Daemon.serve_forever', side_effect=KeyboardInterrupt()):
+            status_code = gimmecert.commands.serve(stdout_stream, io.StringIO(), tmpdir.strpath, None, 1)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Serving requests on socket %s." % short_socket_path in stdout_stream.getvalue()
+
+
+def test_serve_removes_stale_socket(tmpdir, short_socket_path):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+
+    with open(short_socket_path, 'w'):
+        pass
+
+    with mock.patch('gimmecert.daemon.Daemon.serve_forever', side_effect=KeyboardInterrupt()):
+        status_code = gimmecert.commands.serve(io.StringIO(), io.StringIO(), tmpdir.strpath, short_socket_path, 1)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert not os.path.exists(short_socket_path)
+
+
+def test_status_does_not_read_unchanged_certificates(sample_project_directory):
+    expected_stdout_stream = io.StringIO()
+    gimmecert.commands.status(expected_stdout_stream, io.StringIO(), sample_project_directory.strpath)
+
+    stdout_stream = io.StringIO()
+
+    with mock.patch('gimmecert.storage.read_certificate', wraps=gimmecert.storage.read_certificate) as mock_read_certificate:
+        status_code = gimmecert.commands.status(stdout_stream, io.StringIO(), sample_project_directory.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == expected_stdout_stream.getvalue()
+    assert mock_read_certificate.called is False
+
+
+def test_status_does_not_load_ca_private_keys(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 2)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True), \
+            mock.patch('gimmecert.storage.read_private_key', wraps=gimmecert.storage.read_private_key) as mock_read_private_key:
+        status_code = gimmecert.commands.status(io.StringIO(), io.StringIO(), tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert mock_read_private_key.called is False
+
+
+def test_server_loads_only_issuing_ca_private_key(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 3)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True), \
+            mock.patch('gimmecert.storage.read_private_key', wraps=gimmecert.storage.read_private_key) as mock_read_private_key:
+        status_code = gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', None, None)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    mock_read_private_key.assert_called_once_with(tmpdir.join('.gimmecert', 'ca', 'level3.key.pem').strpath)
+
+
+def test_status_rebuilds_index_if_requested(sample_project_directory):
+    sample_project_directory.join('.gimmecert', 'index.json').write('{"version": 1, "server": {}, "client": {}}')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.status(stdout_stream, io.StringIO(), sample_project_directory.strpath, True)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "CN=server-with-privkey-1" in stdout_stream.getvalue()
+    assert "CN=client-with-csr-2" in stdout_stream.getvalue()
+
+
+def test_metrics_reports_uninitialised_directory(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.metrics(stdout_stream, stderr_stream, tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue() == "CA hierarchy has not been initialised in current directory.\n"
+
+
+def test_metrics_outputs_metrics_in_prometheus_format(tmpdir):
+    with freeze_time('2018-01-01 00:15:00'):
+        gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2)
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver1', None, None)
+        gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myclient1', None)
+
+    with freeze_time('2018-06-01 00:15:00'):
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver2', None, None)
+
+    stdout_stream = io.StringIO()
+
+    with freeze_time('2018-03-01 00:15:00'):
+        status_code = gimmecert.commands.metrics(stdout_stream, io.StringIO(), tmpdir.strpath)
+
+    project = tmpdir.strpath
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue().split("\n") == [
+        '# HELP gimmecert_certificate_expiry_seconds Seconds until certificate expires. Negative for expired certificates.',
+        '# TYPE gimmecert_certificate_expiry_seconds gauge',
+        'gimmecert_certificate_expiry_seconds{project="%s",type="ca",name="level1"} 26438400.0' % project,
+        'gimmecert_certificate_expiry_seconds{project="%s",type="ca",name="level2"} 26438400.0' % project,
+        'gimmecert_certificate_expiry_seconds{project="%s",type="server",name="myserver1"} 26438400.0' % project,
+        'gimmecert_certificate_expiry_seconds{project="%s",type="server",name="myserver2"} 26438400.0' % project,
+        'gimmecert_certificate_expiry_seconds{project="%s",type="client",name="myclient1"} 26438400.0' % project,
+        '# HELP gimmecert_certificates Number of certificates by type.',
+        '# TYPE gimmecert_certificates gauge',
+        'gimmecert_certificates{project="%s",type="ca"} 2' % project,
+        'gimmecert_certificates{project="%s",type="server"} 2' % project,
+        'gimmecert_certificates{project="%s",type="client"} 1' % project,
+        '# HELP gimmecert_certificates_expired Number of expired certificates by type.',
+        '# TYPE gimmecert_certificates_expired gauge',
+        'gimmecert_certificates_expired{project="%s",type="ca"} 0' % project,
+        'gimmecert_certificates_expired{project="%s",type="server"} 0' % project,
+        'gimmecert_certificates_expired{project="%s",type="client"} 0' % project,
+        '# HELP gimmecert_certificates_not_valid_yet Number of certificates by type that are not valid yet.',
+        '# TYPE gimmecert_certificates_not_valid_yet gauge',
+        'gimmecert_certificates_not_valid_yet{project="%s",type="ca"} 0' % project,
+        'gimmecert_certificates_not_valid_yet{project="%s",type="server"} 1' % project,
+        'gimmecert_certificates_not_valid_yet{project="%s",type="client"} 0' % project,
+        '',
+    ]
+
+
+def test_metrics_reports_expired_certificates(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    with freeze_time(datetime.datetime.utcnow() + datetime.timedelta(days=400)):
+        gimmecert.commands.metrics(stdout_stream, io.StringIO(), sample_project_directory.strpath)
+
+    metrics = stdout_stream.getvalue()
+
+    assert 'gimmecert_certificates_expired{project="%s",type="ca"} 1\n' % sample_project_directory.strpath in metrics
+    assert 'gimmecert_certificates_expired{project="%s",type="server"} 4\n' % sample_project_directory.strpath in metrics
+    assert 'gimmecert_certificates_expired{project="%s",type="client"} 4\n' % sample_project_directory.strpath in metrics
+    assert 'type="server",name="server-with-csr-1"} -' in metrics
+
+
+def test_metrics_does_not_read_unchanged_certificates(sample_project_directory):
+    gimmecert.commands.metrics(io.StringIO(), io.StringIO(), sample_project_directory.strpath)
+
+    with mock.patch('gimmecert.storage.read_certificate', wraps=gimmecert.storage.read_certificate) as mock_read_certificate:
+        status_code = gimmecert.commands.metrics(io.StringIO(), io.StringIO(), sample_project_directory.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert mock_read_certificate.called is False
+
+
+def test_metrics_rereads_changed_certificates_only(sample_project_directory):
+    gimmecert.commands.metrics(io.StringIO(), io.StringIO(), sample_project_directory.strpath)
+    certificate_path = sample_project_directory.join('.gimmecert', 'server', 'server-with-privkey-1.cert.pem').strpath
+    os.utime(certificate_path, ns=(0, 0))
+
+    with mock.patch('gimmecert.storage.read_certificate', wraps=gimmecert.storage.read_certificate) as mock_read_certificate:
+        gimmecert.commands.metrics(io.StringIO(), io.StringIO(), sample_project_directory.strpath)
+
+    mock_read_certificate.assert_called_once_with(certificate_path)
+
+
+def test_metrics_rebuilds_index_if_requested(sample_project_directory):
+    sample_project_directory.join('.gimmecert', 'index.json').write('{"version": 1, "server": {}, "client": {}}')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.metrics(stdout_stream, io.StringIO(), sample_project_directory.strpath, rebuild_index=True)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert 'gimmecert_certificates{project="%s",type="server"} 4\n' % sample_project_directory.strpath in stdout_stream.getvalue()
+
+
+def test_metrics_supports_sqlite_storage_backend(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, storage_backend='sqlite')
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', None, None)
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.metrics(stdout_stream, io.StringIO(), tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert 'gimmecert_certificates{project="%s",type="server"} 1\n' % tmpdir.strpath in stdout_stream.getvalue()
+    assert 'type="server",name="myserver"}' in stdout_stream.getvalue()
+
+
+def test_metrics_writes_metrics_to_textfile(sample_project_directory, tmpdir):
+    textfile = tmpdir.join('gimmecert.prom')
+    expected_stdout_stream = io.StringIO()
+    stdout_stream = io.StringIO()
+
+    with freeze_time('2018-03-01 00:15:00'):
+        gimmecert.commands.metrics(expected_stdout_stream, io.StringIO(), sample_project_directory.strpath)
+        status_code = gimmecert.commands.metrics(stdout_stream, io.StringIO(), sample_project_directory.strpath, textfile.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == "Metrics written to %s.\n" % textfile.strpath
+    assert textfile.read() == expected_stdout_stream.getvalue()
+    assert [path.basename for path in tmpdir.listdir(lambda path: path.basename.endswith('.tmp'))] == []
+
+
+def test_metrics_replaces_textfile_atomically(sample_project_directory, tmpdir):
+    textfile = tmpdir.join('gimmecert.prom')
+    textfile.write('stale metrics\n')
+
+    with mock.patch('os.replace', wraps=os.replace) as mock_replace:
+        gimmecert.commands.metrics(io.StringIO(), io.StringIO(), sample_project_directory.strpath, textfile.strpath)
+
+    assert mock_replace.call_count == 1
+    temporary_path, destination_path = mock_replace.call_args[0]
+    assert temporary_path.startswith(textfile.strpath + '.')
+    assert temporary_path.endswith('.tmp')
+    assert destination_path == textfile.strpath
+    assert textfile.read().startswith('# HELP gimmecert_certificate_expiry_seconds ')
+
+
+def test_metrics_reports_error_if_textfile_cannot_be_written(sample_project_directory, tmpdir):
+    textfile = tmpdir.join('gimmecert.prom')
+    textfile.write('previous metrics\n')
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch('os.replace', side_effect=PermissionError("Permission denied")):
+        status_code = gimmecert.commands.metrics(stdout_stream, stderr_stream, sample_project_directory.strpath, textfile.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_METRICS_WRITE_FAILED
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue() == "Failed to write metrics to %s: Permission denied\n" % textfile.strpath
+    assert textfile.read() == 'previous metrics\n'
+    assert [path.basename for path in tmpdir.listdir(lambda path: path.basename.endswith('.tmp'))] == []
+
+
+def test_metrics_reports_error_if_textfile_directory_does_not_exist(sample_project_directory, tmpdir):
+    textfile = tmpdir.join('missing', 'gimmecert.prom')
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.metrics(io.StringIO(), stderr_stream, sample_project_directory.strpath, textfile.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_METRICS_WRITE_FAILED
+    assert stderr_stream.getvalue().startswith("Failed to write metrics to %s: " % textfile.strpath)
+
+
+def test_renew_updates_index(sample_project_directory):
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), sample_project_directory.strpath, 'server', 'server-with-csr-1', True, None, None)
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'server', 'server-with-csr-1.cert.pem').strpath)
+
+    index = gimmecert.storage.read_index(sample_project_directory.strpath)
+
+    assert index['server']['server-with-csr-1']['serial'] == certificate.serial_number
+    assert index['server']['server-with-csr-1']['key_or_csr'] == 'key'
+
+
+def test_batch_updates_index(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1", "dns_names": ["myserver1.local"]},
+        {"type": "client", "name": "myclient1"}
+    ]""")
+
+    gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath)
+
+    index = gimmecert.storage.read_index(tmpdir.strpath)
+
+    assert index['server']['myserver1']['dns_names'] == ['myserver1', 'myserver1.local']
+    assert index['server']['myserver1']['key_or_csr'] == 'key'
+    assert sorted(index['client']) == ['myclient1']
+
+
+def test_batch_writes_all_artefacts_within_single_transaction(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1"},
+        {"type": "server", "name": "myserver2"},
+        {"type": "client", "name": "myclient1"}
+    ]""")
+
+    with mock.patch('gimmecert.storage.ArtefactWriter.commit', autospec=True,
+                    side_effect=gimmecert.storage.ArtefactWriter.commit) as mock_commit, \
+            mock.patch('os.fsync', wraps=os.fsync) as mock_fsync:
+        gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath, jobs=1)
+
+    # Six artefacts, server and client directories.
+    assert mock_commit.call_count == 1
+    assert mock_fsync.call_count == 8
+
+
+def test_batch_takes_private_keys_from_private_key_provider_once_per_entity(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    provided_private_key = gimmecert.crypto.generate_private_key(('ed25519', None), use_provider=False)
+    provider = mock.Mock(side_effect=[provided_private_key, None])
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1", "key_specification": "ed25519"},
+        {"type": "client", "name": "myclient1", "key_specification": "ed25519"}
+    ]""")
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        status_code = gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath, jobs=1)
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    server_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'server', 'myserver1.key.pem').strpath)
+    client_private_key = gimmecert.storage.read_private_key(tmpdir.join('.gimmecert', 'client', 'myclient1.key.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert provider.call_count == 2
+    assert gimmecert.parallel.private_key_to_der(server_private_key) == gimmecert.parallel.private_key_to_der(provided_private_key)
+    assert gimmecert.parallel.private_key_to_der(client_private_key) != gimmecert.parallel.private_key_to_der(provided_private_key)
+
+
+def test_batch_returns_pooled_private_keys_to_pool_if_issuance_fails(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+    pooled_private_keys = [gimmecert.crypto.generate_private_key(('ed25519', None)) for _ in range(2)]
+    for pooled_private_key in pooled_private_keys:
+        gimmecert.storage.add_pooled_private_key(tmpdir.strpath, pooled_private_key, ('ed25519', None))
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver1", "key_specification": "ed25519"},
+        {"type": "client", "name": "myclient1", "key_specification": "ed25519"}
+    ]""")
+
+    with mock.patch('gimmecert.parallel.run_tasks', side_effect=RuntimeError("Worker process died")):
+        with pytest.raises(RuntimeError):
+            gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath, jobs=1)
+
+    returned_public_keys = set()
+    while gimmecert.storage.count_pooled_private_keys(tmpdir.strpath, ('ed25519', None)):
+        private_key = gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('ed25519', None))
+        returned_public_keys.add(gimmecert.parallel.public_key_to_der(private_key.public_key()))
+
+    assert returned_public_keys == {gimmecert.parallel.public_key_to_der(key.public_key()) for key in pooled_private_keys}
+    assert not tmpdir.join('.gimmecert', 'server', 'myserver1.cert.pem').check()
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl", "csv"])
+def test_status_reports_uninitialised_directory_on_stderr_for_machine_readable_formats(tmpdir, output_format):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.status(stdout_stream, stderr_stream, tmpdir.strpath, output_format=output_format)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue() == "CA hierarchy has not been initialised in current directory.\n"
+
+
+def test_get_status_records_produces_records_for_ca_hierarchy_and_entities(sample_project_directory):
+    records = list(gimmecert.commands.get_status_records(sample_project_directory.strpath))
+
+    assert [(record['type'], record['name']) for record in records] == [
+        ('ca', 'level1'),
+        ('server', 'server-with-csr-1'), ('server', 'server-with-csr-2'),
+        ('server', 'server-with-privkey-1'), ('server', 'server-with-privkey-2'),
+        ('client', 'client-with-csr-1'), ('client', 'client-with-csr-2'),
+        ('client', 'client-with-privkey-1'), ('client', 'client-with-privkey-2'),
+    ]
+    assert all(tuple(record) == gimmecert.commands.STATUS_RECORD_FIELDS for record in records)
+
+    ca_record, server_with_csr_record, server_with_privkey_record = records[0], records[1], records[3]
+
+    assert ca_record['subject'] == "CN=%s Level 1 CA" % sample_project_directory.basename
+    assert ca_record['private_key'] == '.gimmecert/ca/level1.key.pem'
+    assert ca_record['certificate'] == '.gimmecert/ca/level1.cert.pem'
+    assert ca_record['validity_status'] == 'valid'
+
+    assert server_with_csr_record['subject'] == "CN=server-with-csr-1"
+    assert server_with_csr_record['dns_names'] == ['server-with-csr-1']
+    assert server_with_csr_record['private_key'] is None
+    assert server_with_csr_record['csr'] == '.gimmecert/server/server-with-csr-1.csr.pem'
+
+    assert server_with_privkey_record['private_key'] == '.gimmecert/server/server-with-privkey-1.key.pem'
+    assert server_with_privkey_record['csr'] is None
+    assert server_with_privkey_record['certificate'] == '.gimmecert/server/server-with-privkey-1.cert.pem'
+
+
+def test_status_reports_information_in_jsonl_format(sample_project_directory):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.status(stdout_stream, stderr_stream, sample_project_directory.strpath, output_format='jsonl')
+
+    records = [json.loads(line) for line in stdout_stream.getvalue().splitlines()]
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stderr_stream.getvalue() == ""
+    assert records == list(gimmecert.commands.get_status_records(sample_project_directory.strpath))
+
+
+def test_status_reports_information_in_json_format(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.status(stdout_stream, io.StringIO(), sample_project_directory.strpath, output_format='json')
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert json.loads(stdout_stream.getvalue()) == list(gimmecert.commands.get_status_records(sample_project_directory.strpath))
+
+
+def test_status_reports_information_in_csv_format(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.status(stdout_stream, io.StringIO(), sample_project_directory.strpath, output_format='csv')
+
+    rows = list(csv.DictReader(io.StringIO(stdout_stream.getvalue())))
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert len(rows) == 9
+    assert tuple(rows[0]) == gimmecert.commands.STATUS_RECORD_FIELDS
+    assert rows[1]['name'] == 'server-with-csr-1'
+    assert rows[1]['dns_names'] == 'server-with-csr-1'
+    assert rows[1]['private_key'] == ''
+    assert rows[1]['csr'] == '.gimmecert/server/server-with-csr-1.csr.pem'
+
+
+def test_renew_bulk_reports_error_if_directory_is_not_initialised(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.renew_bulk(stdout_stream, stderr_stream, tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert "No CA hierarchy has been initialised yet." in stderr_stream.getvalue()
+
+
+@pytest.mark.parametrize("entity_types, name_glob, expected_renewed", [
+    (['server', 'client'], None, ['server-with-csr-1', 'server-with-csr-2', 'server-with-privkey-1', 'server-with-privkey-2',
+                                  'client-with-csr-1', 'client-with-csr-2', 'client-with-privkey-1', 'client-with-privkey-2']),
+    (['client'], None, ['client-with-csr-1', 'client-with-csr-2', 'client-with-privkey-1', 'client-with-privkey-2']),
+    (['server', 'client'], '*-with-csr-?', ['server-with-csr-1', 'server-with-csr-2', 'client-with-csr-1', 'client-with-csr-2']),
+    (['server'], '*-1', ['server-with-csr-1', 'server-with-privkey-1']),
+])
+def test_renew_bulk_renews_selected_certificates(sample_project_directory, entity_types, name_glob, expected_renewed):
+    old_certificates = {}
+    for entity_type in ('server', 'client'):
+        for certificate_file in sample_project_directory.join('.gimmecert', entity_type).listdir('*.cert.pem'):
+            old_certificates[certificate_file.strpath] = gimmecert.storage.read_certificate(certificate_file.strpath)
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.renew_bulk(stdout_stream, stderr_stream, sample_project_directory.strpath, entity_types, name_glob, None, 1)
+
+    stdout_lines = stdout_stream.getvalue().splitlines()
+    renewed = [line.split()[-1].rstrip('.') for line in stdout_lines if line.startswith("Renewed certificate for ")]
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stderr_stream.getvalue() == ""
+    assert renewed == expected_renewed
+    assert stdout_lines[-1] == "Renewed %d certificates." % len(expected_renewed)
+
+    for certificate_path, old_certificate in old_certificates.items():
+        entity_name = os.path.basename(certificate_path)[:-len('.cert.pem')]
+        certificate = gimmecert.storage.read_certificate(certificate_path)
+
+        if entity_name in expected_renewed:
+            assert certificate != old_certificate
+            assert certificate.subject == old_certificate.subject
+            assert certificate.public_key().public_numbers() == old_certificate.public_key().public_numbers()
+            assert gimmecert.utils.get_dns_names(certificate) == gimmecert.utils.get_dns_names(old_certificate)
+        else:
+            assert certificate == old_certificate
+
+
+def test_renew_bulk_renews_certificates_expiring_within_passed_in_number_of_days(tmpdir):
+
+    with freeze_time('2018-01-01 00:15:00'):
+        gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1)
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver2', None, None)
+
+    # Certificate validity gets capped by the CA validity, so go back
+    # in time to get certificate expiring earlier.
+    with freeze_time('2017-06-01 00:15:00'):
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver1', None, None)
+
+    stdout_stream = io.StringIO()
+
+    with freeze_time('2018-05-15 00:15:00'):
+        status_code = gimmecert.commands.renew_bulk(stdout_stream, io.StringIO(), tmpdir.strpath, expiring_within=30)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Renewed certificate for server myserver1." in stdout_stream.getvalue()
+    assert "myserver2" not in stdout_stream.getvalue()
+
+
+def test_renew_bulk_reports_if_no_certificates_match(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy') as mock_read_ca_hierarchy:
+        status_code = gimmecert.commands.renew_bulk(stdout_stream, io.StringIO(), sample_project_directory.strpath, name_glob='nonexistent')
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == "No certificates matched the selection criteria.\n"
+    assert mock_read_ca_hierarchy.called is False
+
+
+def test_renew_bulk_reads_ca_hierarchy_once_and_does_not_read_private_keys(sample_project_directory):
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy', wraps=gimmecert.storage.read_ca_hierarchy) as mock_read_ca_hierarchy, \
+         mock.patch('gimmecert.storage.read_private_key') as mock_read_private_key:
+        gimmecert.commands.renew_bulk(io.StringIO(), io.StringIO(), sample_project_directory.strpath, jobs=1)
+
+    assert mock_read_ca_hierarchy.call_count == 1
+    assert mock_read_private_key.called is False
+
+
+def test_renew_bulk_renews_certificates_using_multiple_worker_processes(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    with mock.patch('gimmecert.parallel.run_tasks', wraps=gimmecert.parallel.run_tasks) as mock_run_tasks:
+        status_code = gimmecert.commands.renew_bulk(stdout_stream, io.StringIO(), sample_project_directory.strpath, ['server'], jobs=2)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert mock_run_tasks.call_args[0][2] == 2
+    assert "Renewed 4 certificates." in stdout_stream.getvalue()
+    assert [f.basename for f in sample_project_directory.join('.gimmecert', 'server').listdir() if f.basename.endswith('.tmp')] == []
+
+
+def test_renew_bulk_updates_index(sample_project_directory):
+    gimmecert.commands.renew_bulk(io.StringIO(), io.StringIO(), sample_project_directory.strpath, ['client'], 'client-with-csr-1', jobs=1)
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'client', 'client-with-csr-1.cert.pem').strpath)
+
+    with mock.patch('gimmecert.storage.read_certificate') as mock_read_certificate:
+        index = gimmecert.storage.refresh_index(sample_project_directory.strpath)
+
+    assert mock_read_certificate.called is False
+    assert index['client']['client-with-csr-1']['serial'] == certificate.serial_number
+
+
+def test_storage_backend_names_match_available_storage_backends():
+    assert sorted(gimmecert.commands.STORAGE_BACKEND_NAMES) == sorted(gimmecert.storage.STORAGE_BACKENDS)
+
+
+def test_init_generates_ca_hierarchy_using_passed_in_number_of_jobs(tmpdir):
+
+    with mock.patch('gimmecert.crypto.generate_ca_hierarchy', wraps=gimmecert.crypto.generate_ca_hierarchy) as mock_generate_ca_hierarchy:
+        status_code = gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 3, jobs=2)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    mock_generate_ca_hierarchy.assert_called_once_with(tmpdir.basename, 3, ('rsa', 2048), 2)
+
+
+def test_init_stores_ca_hierarchy_using_sqlite_storage_backend(tmpdir):
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.init(stdout_stream, io.StringIO(), tmpdir.strpath, tmpdir.basename, 2, ('ed25519', None), 'sqlite')
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert tmpdir.join('.gimmecert').listdir() == [tmpdir.join('.gimmecert', gimmecert.storage.SQLITE_DATABASE_FILENAME)]
+    assert len(gimmecert.storage.get_storage_backend(tmpdir.strpath).read_ca_hierarchy()) == 2
+    assert "Run the gimmecert export-files command" in stdout_stream.getvalue()
+
+
+def test_commands_work_with_sqlite_storage_backend(tmpdir, key_with_csr):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None), 'sqlite')
+    manifest = tmpdir.join('manifest.json')
+    manifest.write('[{"type": "server", "name": "myserver2"}, {"type": "client", "name": "myclient2", "csr": "%s"}]' % key_with_csr.csr_path)
+
+    results = [
+        gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver1', ['myserver1.local'], None, ('ed25519', None)),
+        gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myclient1', key_with_csr.csr_path),
+        gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, manifest.strpath, jobs=1),
+        gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', 'myserver1', False, key_with_csr.csr_path, None),
+        gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'client', 'myclient1', True, None, None, ('ed25519', None)),
+        gimmecert.commands.renew_bulk(io.StringIO(), io.StringIO(), tmpdir.strpath, ['server'], jobs=1),
+    ]
+
+    stdout_stream = io.StringIO()
+    status_code = gimmecert.commands.status(stdout_stream, io.StringIO(), tmpdir.strpath, output_format='json')
+    records = {record['name']: record for record in json.loads(stdout_stream.getvalue())}
+
+    assert results == [gimmecert.commands.ExitCode.SUCCESS] * 6
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert sorted(records) == ['level1', 'myclient1', 'myclient2', 'myserver1', 'myserver2']
+    assert records['myserver1']['dns_names'] == ['myserver1', 'myserver1.local']
+    assert records['myserver1']['csr'] == '.gimmecert/server/myserver1.csr.pem'
+    assert records['myclient1']['private_key'] == '.gimmecert/client/myclient1.key.pem'
+    assert records['myclient2']['csr'] == '.gimmecert/client/myclient2.csr.pem'
+    assert sorted(tmpdir.join('.gimmecert').listdir()) == [tmpdir.join('.gimmecert', gimmecert.locking.LOCK_DIRECTORY_NAME),
+                                                           tmpdir.join('.gimmecert', gimmecert.storage.SQLITE_DATABASE_FILENAME)]
+
+
+def test_export_files_reports_error_if_directory_is_not_initialised(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.export_files(stdout_stream, stderr_stream, tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert "must be initialised" in stderr_stream.getvalue()
+
+
+def test_export_files_does_nothing_by_default_for_files_storage_backend(sample_project_directory):
+    stdout_stream = io.StringIO()
+
+    with mock.patch('gimmecert.storage.ArtefactWriter') as mock_artefact_writer:
+        status_code = gimmecert.commands.export_files(stdout_stream, io.StringIO(), sample_project_directory.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "already stored as files" in stdout_stream.getvalue()
+    assert mock_artefact_writer.called is False
+
+
+def test_export_files_writes_out_artefacts_to_output_directory(sample_project_directory, tmpdir):
+    output_directory = tmpdir.join('exported')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.export_files(stdout_stream, io.StringIO(), sample_project_directory.strpath, output_directory.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Server certificates: 4" in stdout_stream.getvalue()
+    assert "Client certificates: 4" in stdout_stream.getvalue()
+
+    for sub_directory in ('ca', 'server', 'client'):
+        expected_files = sorted(f.basename for f in sample_project_directory.join('.gimmecert', sub_directory).listdir(lambda f: f.ext == '.pem'))
+        exported_files = sorted(f.basename for f in output_directory.join(sub_directory).listdir())
+
+        assert exported_files == expected_files
+
+        for file_name in exported_files:
+            assert output_directory.join(sub_directory, file_name).read() == sample_project_directory.join('.gimmecert', sub_directory, file_name).read()
+
+
+def test_export_files_writes_out_artefacts_stored_in_sqlite_storage_backend(tmpdir, key_with_csr):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2, ('ed25519', None), 'sqlite')
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', [], None, ('ed25519', None))
+    gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myclient', key_with_csr.csr_path)
+
+    status_code = gimmecert.commands.export_files(io.StringIO(), io.StringIO(), tmpdir.strpath)
+
+    storage = gimmecert.storage.get_storage_backend(tmpdir.strpath)
+    ca_hierarchy = storage.read_ca_hierarchy()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert isinstance(storage, gimmecert.storage.SQLiteBackend)
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'ca').listdir()) == [
+        'chain-full.cert.pem', 'level1.cert.pem', 'level1.key.pem', 'level2.cert.pem', 'level2.key.pem'
+    ]
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'server').listdir()) == ['myserver.cert.pem', 'myserver.key.pem']
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'client').listdir()) == ['myclient.cert.pem', 'myclient.csr.pem']
+    assert gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'ca', 'level2.cert.pem').strpath) == ca_hierarchy[1][1]
+    assert gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').strpath) == \
+        storage.read_certificate('server', 'myserver')
+    assert tmpdir.join('.gimmecert', 'client', 'myclient.csr.pem').read() == key_with_csr.csr_pem
+
+
+def test_export_files_removes_stale_private_keys_and_csrs(tmpdir, key_with_csr):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None), 'sqlite')
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', [], None, ('ed25519', None))
+    gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myclient', key_with_csr.csr_path)
+    gimmecert.commands.export_files(io.StringIO(), io.StringIO(), tmpdir.strpath)
+
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', 'myserver', False, key_with_csr.csr_path, None)
+    gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'client', 'myclient', True, None, None, ('ed25519', None))
+    gimmecert.commands.export_files(io.StringIO(), io.StringIO(), tmpdir.strpath)
+
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'server').listdir()) == ['myserver.cert.pem', 'myserver.csr.pem']
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'client').listdir()) == ['myclient.cert.pem', 'myclient.key.pem']
+
+
+def is_locked(path, exclusive):
+    """
+    Helper function that checks, without blocking, if a lock is held
+    on the passed-in path. If exclusive is True, only exclusive locks
+    are taken into account. Otherwise any lock is taken into account.
+    """
+
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if exclusive else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+    return False
+
+
+def test_init_holds_exclusive_project_lock(tmpdir):
+    generate_ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy
+    lock_states = []
+
+    def generate_ca_hierarchy_and_check_lock(*args, **kwargs):
+        lock_states.append(is_locked(tmpdir.strpath, exclusive=True))
+        return generate_ca_hierarchy(*args, **kwargs)
+
+    with mock.patch('gimmecert.crypto.generate_ca_hierarchy', side_effect=generate_ca_hierarchy_and_check_lock):
+        gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+
+    assert lock_states == [True]
+    assert not is_locked(tmpdir.strpath, exclusive=True)
+
+
+@pytest.mark.parametrize("entity_type, issue_function", [
+    ('server', 'issue_server_certificate'),
+    ('client', 'issue_client_certificate'),
+])
+def test_issuing_certificate_holds_shared_project_lock_and_entity_lock(tmpdir, entity_type, issue_function):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    original_function = getattr(gimmecert.crypto, issue_function)
+    lock_states = []
+
+    def issue_and_check_locks(*args, **kwargs):
+        lock_states.append((is_locked(tmpdir.strpath, exclusive=False),
+                            is_locked(tmpdir.strpath, exclusive=True),
+                            is_locked(tmpdir.join('.gimmecert', 'locks', '%s-myentity.lock' % entity_type).strpath, exclusive=True)))
+        return original_function(*args, **kwargs)
+
+    with mock.patch('gimmecert.crypto.%s' % issue_function, side_effect=issue_and_check_locks):
+        if entity_type == 'server':
+            gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', [], None, ('ed25519', None))
+        else:
+            gimmecert.commands.client(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myentity', None, ('ed25519', None))
+
+    # Exclusive lock is held on project, but shared lock could be taken
+    # by others.
+    assert lock_states == [(True, False, True)]
+
+
+def test_renew_holds_entity_lock(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', [], None, ('ed25519', None))
+    renew_certificate = gimmecert.crypto.renew_certificate
+    lock_states = []
+
+    def renew_and_check_lock(*args, **kwargs):
+        lock_states.append(is_locked(tmpdir.join('.gimmecert', 'locks', 'server-myserver.lock').strpath, exclusive=True))
+        return renew_certificate(*args, **kwargs)
+
+    with mock.patch('gimmecert.crypto.renew_certificate', side_effect=renew_and_check_lock):
+        gimmecert.commands.renew(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', 'myserver', False, None, None)
+
+    assert lock_states == [True]
+
+
+def test_bulk_commands_hold_exclusive_project_lock(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', [], None, ('ed25519', None))
+    tmpdir.join('manifest.json').write(json.dumps([{'type': 'client', 'name': 'myclient'}]))
+    run_tasks = gimmecert.parallel.run_tasks
+    lock_states = []
+
+    def run_tasks_and_check_lock(*args, **kwargs):
+        lock_states.append(is_locked(tmpdir.strpath, exclusive=True))
+        return run_tasks(*args, **kwargs)
+
+    with mock.patch('gimmecert.parallel.run_tasks', side_effect=run_tasks_and_check_lock):
+        gimmecert.commands.renew_bulk(io.StringIO(), io.StringIO(), tmpdir.strpath, jobs=1)
+        gimmecert.commands.batch(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.join('manifest.json').strpath, 1, ('ed25519', None))
+
+    assert lock_states == [True, True]
+
+
+def test_status_holds_shared_project_lock(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    lock_states = []
+
+    original_get_storage_backend = gimmecert.storage.get_storage_backend
+
+    def get_storage_backend_and_check_lock(*args, **kwargs):
+        lock_states.append((is_locked(tmpdir.strpath, exclusive=False), is_locked(tmpdir.strpath, exclusive=True)))
+        return original_get_storage_backend(*args, **kwargs)
+
+    with mock.patch('gimmecert.storage.get_storage_backend', side_effect=get_storage_backend_and_check_lock):
+        gimmecert.commands.status(io.StringIO(), io.StringIO(), tmpdir.strpath)
+
+    assert lock_states == [(True, False)]
+
+
+def test_concurrent_init_initialises_project_only_once(tmpdir):
+    results = []
+
+    def run_init():
+        results.append(gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None)))
+
+    threads = [threading.Thread(target=run_init) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [gimmecert.commands.ExitCode.SUCCESS] + [gimmecert.commands.ExitCode.ERROR_ALREADY_INITIALISED] * 3
+
+
+@pytest.mark.parametrize("storage_backend", gimmecert.commands.STORAGE_BACKEND_NAMES)
+def test_concurrent_issuance_for_same_entity_issues_certificate_only_once(tmpdir, storage_backend):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None), storage_backend)
+    results = []
+
+    def run_server(entity_name):
+        results.append((entity_name, gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, entity_name, [], None, ('ed25519', None))))
+
+    threads = [threading.Thread(target=run_server, args=(entity_name, )) for entity_name in ['myserver1'] * 4 + ['myserver2', 'myserver3']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [('myserver1', gimmecert.commands.ExitCode.SUCCESS)] + \
+        [('myserver1', gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED)] * 3 + \
+        [('myserver2', gimmecert.commands.ExitCode.SUCCESS), ('myserver3', gimmecert.commands.ExitCode.SUCCESS)]
+
+    storage = gimmecert.storage.get_storage_backend(tmpdir.strpath)
+    assert sorted(name for _, name, _, _, _ in storage.read_entities()) == ['myserver1', 'myserver2', 'myserver3']
+    assert sorted(storage.get_index(False)['server']) == ['myserver1', 'myserver2', 'myserver3']
+
+
+def write_csr_file(path, name, tamper=False):
+    """
+    Helper function that generates a CSR (using Ed25519 private key),
+    and writes it to the passed-in path. If name is None, CSR subject
+    will not include a common name. If tamper is True, CSR signature
+    will be invalidated.
+    """
+
+    if name is None:
+        name = cryptography.x509.Name([cryptography.x509.NameAttribute(cryptography.x509.oid.NameOID.ORGANIZATION_NAME, "My Organisation")])
+
+    csr = gimmecert.crypto.generate_csr(name, gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    if tamper:
+        csr_der = gimmecert.parallel.csr_to_der(csr)
+        csr = gimmecert.parallel.csr_from_der(csr_der[:-1] + bytes([csr_der[-1] ^ 0xff]))
+
+    gimmecert.storage.write_csr(csr, path)
+
+    return csr
+
+
+def test_sign_requires_initialised_project(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, stderr_stream, tmpdir.strpath, 'server', tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert "must be initialised" in stderr_stream.getvalue()
+
+
+@pytest.mark.parametrize("entity_type", ['server', 'client'])
+def test_sign_issues_certificates_for_csrs_in_directory(tmpdir, entity_type):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    csr1 = write_csr_file(spool.join('first.csr.pem').strpath, 'myentity1')
+    csr2 = write_csr_file(spool.join('second.csr').strpath, None)
+    spool.join('unrelated.txt').write('Not a CSR')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, entity_type, spool.strpath, jobs=1)
+
+    stdout = stdout_stream.getvalue()
+    entity_directory = tmpdir.join('.gimmecert', entity_type)
+    certificate1 = gimmecert.storage.read_certificate(entity_directory.join('myentity1.cert.pem').strpath)
+    certificate2 = gimmecert.storage.read_certificate(entity_directory.join('second.cert.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert sorted(f.basename for f in entity_directory.listdir()) == ['myentity1.cert.pem', 'myentity1.csr.pem', 'second.cert.pem', 'second.csr.pem']
+    assert gimmecert.storage.read_csr(entity_directory.join('myentity1.csr.pem').strpath) == csr1
+    assert gimmecert.parallel.public_key_to_der(certificate1.public_key()) == gimmecert.parallel.public_key_to_der(csr1.public_key())
+    assert gimmecert.parallel.public_key_to_der(certificate2.public_key()) == gimmecert.parallel.public_key_to_der(csr2.public_key())
+    assert gimmecert.utils.dn_to_str(certificate1.subject) == "CN=myentity1"
+    assert gimmecert.utils.dn_to_str(certificate2.subject) == "CN=second"
+    assert stdout.splitlines()[0].split() == ["Source", "Name", "Result"]
+    assert "first.csr.pem  myentity1  Issued: .gimmecert/%s/myentity1.cert.pem" % entity_type in stdout
+    assert "second.csr     second     Issued: .gimmecert/%s/second.cert.pem" % entity_type in stdout
+    assert "unrelated.txt" not in stdout
+    assert "Processed 2 CSRs, issued 2 %s certificates, 0 failures." % entity_type in stdout
+
+    if entity_type == 'server':
+        assert gimmecert.utils.get_dns_names(certificate1) == ['myentity1']
+
+
+def test_sign_issues_certificates_for_csrs_in_file(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    write_csr_file(tmpdir.join('csr1.pem').strpath, 'myclient1')
+    write_csr_file(tmpdir.join('csr2.pem').strpath, 'myclient2')
+    tmpdir.join('bundle.pem').write(tmpdir.join('csr1.pem').read() + tmpdir.join('csr2.pem').read())
+    write_csr_file(tmpdir.join('myclient3.csr.pem').strpath, None)
+    stdout_stream = io.StringIO()
+
+    status_code_bundle = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, 'client', tmpdir.join('bundle.pem').strpath, jobs=1)
+    status_code_single = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, 'client', tmpdir.join('myclient3.csr.pem').strpath, jobs=1)
+
+    stdout = stdout_stream.getvalue()
+
+    assert status_code_bundle == gimmecert.commands.ExitCode.SUCCESS
+    assert status_code_single == gimmecert.commands.ExitCode.SUCCESS
+    assert "bundle.pem #1  myclient1" in stdout
+    assert "bundle.pem #2  myclient2" in stdout
+    assert "myclient3.csr.pem  myclient3" in stdout
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'client').listdir(lambda f: f.basename.endswith('.cert.pem'))) == [
+        'myclient1.cert.pem', 'myclient2.cert.pem', 'myclient3.cert.pem'
+    ]
+
+
+def test_sign_uses_full_file_name_as_fallback_name_for_file_without_csr_suffix(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    write_csr_file(tmpdir.join('request').strpath, None)
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, 'client', tmpdir.join('request').strpath, jobs=1)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "request  request  Issued: .gimmecert/client/request.cert.pem" in stdout_stream.getvalue()
+
+
+@mock.patch('gimmecert.utils.read_input')
+def test_sign_reads_csrs_from_standard_input(mock_read_input, tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    write_csr_file(tmpdir.join('csr1.pem').strpath, 'myserver1')
+    write_csr_file(tmpdir.join('csr2.pem').strpath, 'myserver2')
+    mock_read_input.return_value = tmpdir.join('csr1.pem').read() + tmpdir.join('csr2.pem').read()
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, stderr_stream, tmpdir.strpath, 'server', '-', jobs=1)
+
+    stdout = stdout_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "stdin #1  myserver1" in stdout
+    assert "stdin #2  myserver2" in stdout
+    assert tmpdir.join('.gimmecert', 'server', 'myserver1.cert.pem').check(file=1)
+    assert tmpdir.join('.gimmecert', 'server', 'myserver2.cert.pem').check(file=1)
+    mock_read_input.assert_called_once_with(sys.stdin, stderr_stream, "Please enter the CSRs")
+
+
+@pytest.mark.parametrize("csr_source", ['missing', 'empty.pem', '-'])
+@mock.patch('gimmecert.utils.read_input')
+def test_sign_fails_if_csrs_cannot_be_read(mock_read_input, tmpdir, csr_source):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    tmpdir.join('empty.pem').write('')
+    mock_read_input.return_value = ''
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    if csr_source != '-':
+        csr_source = tmpdir.join(csr_source).strpath
+
+    status_code = gimmecert.commands.sign(stdout_stream, stderr_stream, tmpdir.strpath, 'server', csr_source, jobs=1)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_SIGNING_FAILED
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue().startswith("Failed to read CSRs from %s: " % csr_source)
+    assert tmpdir.join('.gimmecert', 'server').listdir() == []
+
+
+def test_sign_reports_empty_directory(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, 'server', spool.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == "No CSRs found in %s.\n" % spool.strpath
+
+
+def test_sign_continues_on_failures_and_reports_them(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'existing', [], None, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    write_csr_file(spool.join('1-existing.csr.pem').strpath, 'existing')
+    write_csr_file(spool.join('2-valid.csr.pem').strpath, 'valid')
+    write_csr_file(spool.join('3-duplicate.csr.pem').strpath, 'valid')
+    write_csr_file(spool.join('4-tampered.csr.pem').strpath, 'tampered', tamper=True)
+    write_csr_file(spool.join('5-invalid-name.csr.pem').strpath, '../escape')
+    spool.join('6-unreadable.csr.pem').write('Not a CSR')
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.commands.sign(stdout_stream, io.StringIO(), tmpdir.strpath, 'server', spool.strpath, jobs=1)
+
+    stdout = stdout_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_SIGNING_FAILED
+    assert sorted(f.basename for f in tmpdir.join('.gimmecert', 'server').listdir(lambda f: f.basename.endswith('.cert.pem'))) == [
+        'existing.cert.pem', 'valid.cert.pem'
+    ]
+    assert "1-existing.csr.pem      existing  Failed: Certificate has already been issued." in stdout
+    assert "2-valid.csr.pem         valid     Issued: .gimmecert/server/valid.cert.pem" in stdout
+    assert "3-duplicate.csr.pem     valid     Failed: Certificate has already been issued." in stdout
+    assert "4-tampered.csr.pem      -         Failed: Invalid CSR signature." in stdout
+    assert "5-invalid-name.csr.pem  -         Failed: Unable to determine entity name." in stdout
+    assert "6-unreadable.csr.pem    -         Failed: Failed to read CSR: " in stdout
+    assert "Processed 6 CSRs, issued 1 server certificates, 5 failures." in stdout
+    assert not tmpdir.join('.gimmecert', 'server', 'tampered.cert.pem').check()
+
+
+def test_sign_verifies_csr_signatures_in_worker_processes(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    csrs = [write_csr_file(spool.join('myserver%d.csr.pem' % i).strpath, 'myserver%d' % i) for i in range(3)]
+
+    with mock.patch('gimmecert.parallel.run_tasks', wraps=gimmecert.parallel.run_tasks) as mock_run_tasks:
+        status_code = gimmecert.commands.sign(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', spool.strpath, jobs=2)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    mock_run_tasks.assert_called_once_with(gimmecert.parallel.verify_csr_task, [(gimmecert.parallel.csr_to_der(csr), ) for csr in csrs], 2)
+
+
+def test_sign_reads_ca_hierarchy_once_and_writes_artefacts_within_single_transaction(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    for i in range(3):
+        write_csr_file(spool.join('myserver%d.csr.pem' % i).strpath, 'myserver%d' % i)
+
+    with mock.patch.object(gimmecert.storage.FilesystemBackend, 'read_ca_hierarchy', autospec=True,
+                           side_effect=gimmecert.storage.FilesystemBackend.read_ca_hierarchy) as mock_read_ca_hierarchy, \
+            mock.patch.object(gimmecert.storage.ArtefactWriter, 'commit', autospec=True,
+                              side_effect=gimmecert.storage.ArtefactWriter.commit) as mock_commit:
+        gimmecert.commands.sign(io.StringIO(), io.StringIO(), tmpdir.strpath, 'server', spool.strpath, jobs=1)
+
+    assert mock_read_ca_hierarchy.call_count == 1
+    assert mock_commit.call_count == 1
+
+
+def test_sign_works_with_sqlite_storage_backend(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None), 'sqlite')
+    spool = tmpdir.mkdir('spool')
+    csr = write_csr_file(spool.join('myclient.csr.pem').strpath, 'myclient')
+
+    status_code = gimmecert.commands.sign(io.StringIO(), io.StringIO(), tmpdir.strpath, 'client', spool.strpath, jobs=1)
+
+    storage = gimmecert.storage.get_storage_backend(tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert storage.get_key_or_csr('client', 'myclient') == 'csr'
+    certificate = storage.read_certificate('client', 'myclient')
+    assert gimmecert.parallel.public_key_to_der(certificate.public_key()) == gimmecert.parallel.public_key_to_der(csr.public_key())
+
+
+class ScriptedWatcher:
+    """
+    Helper class for replacing spool directory watcher in tests. Each
+    time the watcher is waited on, next action from the script is run,
+    with return value used as an indicator of whether anything has
+    changed. Once the script is exhausted, keyboard interrupt is raised
+    in order to stop watching.
+    """
+
+    name = 'scripted'
+
+    def __init__(self, *actions):
+        self.actions = list(actions)
+        self.closed = False
+
+    def wait(self, timeout=None):
+        if not self.actions:
+            raise KeyboardInterrupt()
+
+        return self.actions.pop(0)()
+
+    def close(self):
+        self.closed = True
+
+
+def test_watch_spool_requires_initialised_project(tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, tmpdir.strpath, 'server')
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_NOT_INITIALISED
+    assert stdout_stream.getvalue() == ""
+    assert "must be initialised" in stderr_stream.getvalue()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watch_spool_fails_if_spool_directory_cannot_be_watched(tmpdir, use_inotify):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, tmpdir.join('missing').strpath, 'server',
+                                                 use_inotify=use_inotify)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_SIGNING_FAILED
+    assert stdout_stream.getvalue() == ""
+    assert "Failed to watch spool directory %s" % tmpdir.join('missing').strpath in stderr_stream.getvalue()
+
+
+@pytest.mark.parametrize("entity_type", ["server", "client"])
+def test_watch_spool_issues_certificates_for_existing_and_new_csrs(tmpdir, entity_type):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    existing_csr = write_csr_file(spool.join('existing.csr.pem').strpath, 'myentity1')
+    spool.join('notes.txt').write('not a csr')
+    new_csrs = []
+
+    def drop_csr():
+        new_csrs.append(write_csr_file(spool.join('new.csr.pem').strpath, None))
+        return True
+
+    watcher = ScriptedWatcher(drop_csr, lambda: False)
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=watcher):
+        status_code = gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, spool.strpath, entity_type)
+
+    stdout = stdout_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stderr_stream.getvalue() == ""
+    assert watcher.closed
+    assert "Watching spool directory %s for %s CSRs (using scripted)." % (spool.strpath, entity_type) in stdout
+    assert "Issued %s certificate for existing.csr.pem: .gimmecert/%s/myentity1.cert.pem" % (entity_type, entity_type) in stdout
+    assert "Issued %s certificate for new.csr.pem: .gimmecert/%s/new.cert.pem" % (entity_type, entity_type) in stdout
+    assert "Issued 2 %s certificates, rejected 0 CSRs." % entity_type in stdout
+
+    # CSRs have been moved from spool directory into project storage.
+    assert sorted(os.listdir(spool.strpath)) == ['notes.txt']
+
+    for entity_name, csr in [('myentity1', existing_csr), ('new', new_csrs[0])]:
+        stored_csr = gimmecert.storage.read_csr(tmpdir.join('.gimmecert', entity_type, '%s.csr.pem' % entity_name).strpath)
+        assert gimmecert.parallel.csr_to_der(stored_csr) == gimmecert.parallel.csr_to_der(csr)
+        certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', entity_type, '%s.cert.pem' % entity_name).strpath)
+        assert gimmecert.parallel.public_key_to_der(certificate.public_key()) == gimmecert.parallel.public_key_to_der(csr.public_key())
+
+
+def test_watch_spool_rejects_csrs_that_cannot_be_processed(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver1', None, None, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    write_csr_file(spool.join('existing.csr.pem').strpath, 'myserver1')
+    write_csr_file(spool.join('tampered.csr.pem').strpath, 'myserver2', tamper=True)
+    write_csr_file(spool.join('valid.csr.pem').strpath, 'myserver3')
+    spool.join('garbage.csr.pem').write('not a csr')
+
+    # Unreadable files are rejected only once they have not been
+    # modified for a while.
+    modified = time.time() - 60
+    os.utime(spool.join('garbage.csr.pem').strpath, (modified, modified))
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=ScriptedWatcher()):
+        status_code = gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, spool.strpath, 'server', debounce=0)
+
+    stdout = stdout_stream.getvalue()
+    stderr = stderr_stream.getvalue()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Rejected existing.csr.pem: Certificate has already been issued." in stderr
+    assert "Rejected tampered.csr.pem: Invalid CSR signature." in stderr
+    assert "Rejected garbage.csr.pem: Failed to read CSR" in stderr
+    assert "Issued server certificate for valid.csr.pem: .gimmecert/server/myserver3.cert.pem" in stdout
+    assert "Issued 1 server certificates, rejected 3 CSRs." in stdout
+
+    assert sorted(os.listdir(spool.strpath)) == ['rejected']
+    assert sorted(os.listdir(spool.join('rejected').strpath)) == ['existing.csr.pem', 'garbage.csr.pem', 'tampered.csr.pem']
+    assert not tmpdir.join('.gimmecert', 'server', 'myserver2.cert.pem').check()
+
+
+def test_watch_spool_leaves_csrs_that_are_being_written_in_place(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    spool.join('partial.csr.pem').write('-----BEGIN CERTIFICATE REQUEST-----\n')
+    timeouts = []
+
+    class RecordingWatcher(ScriptedWatcher):
+        def wait(self, timeout=None):
+            timeouts.append(timeout)
+            return super().wait(timeout)
+
+    def finish_csr():
+        write_csr_file(spool.join('partial.csr.pem').strpath, 'myserver')
+        return False
+
+    watcher = RecordingWatcher(finish_csr)
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=watcher):
+        gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, spool.strpath, 'server', debounce=0.5, poll_interval=1)
+
+    assert stderr_stream.getvalue() == ""
+    assert "Issued server certificate for partial.csr.pem: .gimmecert/server/myserver.cert.pem" in stdout_stream.getvalue()
+    # Deferred CSR is revisited after timeout, even if nothing else happens in spool directory.
+    assert timeouts == [2, None]
+
+
+def test_watch_spool_ignores_csr_files_removed_while_processing(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    spool.join('removed.csr.pem').write('not a csr')
+
+    def read_csr(path):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=ScriptedWatcher()), \
+            mock.patch.object(gimmecert.storage, 'read_csr', side_effect=read_csr):
+        gimmecert.commands.watch_spool(stdout_stream, stderr_stream, tmpdir.strpath, spool.strpath, 'server')
+
+    assert stderr_stream.getvalue() == ""
+    assert "Issued 0 server certificates, rejected 0 CSRs." in stdout_stream.getvalue()
+
+
+def test_watch_spool_reads_ca_hierarchy_once_and_writes_each_batch_within_single_transaction(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 2, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+
+    def drop_csrs(*names):
+        def action():
+            for name in names:
+                write_csr_file(spool.join('%s.csr.pem' % name).strpath, name)
+            return True
+        return action
+
+    watcher = ScriptedWatcher(drop_csrs('myserver1', 'myserver2'), lambda: False, drop_csrs('myserver3'), lambda: False)
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=watcher), \
+            mock.patch.object(gimmecert.storage.FilesystemBackend, 'read_ca_hierarchy', autospec=True,
+                              side_effect=gimmecert.storage.FilesystemBackend.read_ca_hierarchy) as mock_read_ca_hierarchy, \
+            mock.patch.object(gimmecert.storage.FilesystemBackend, 'write_entities', autospec=True,
+                              side_effect=gimmecert.storage.FilesystemBackend.write_entities) as mock_write_entities:
+        gimmecert.commands.watch_spool(io.StringIO(), io.StringIO(), tmpdir.strpath, spool.strpath, 'server')
+
+    assert mock_read_ca_hierarchy.call_count == 1
+    assert [len(call[0][1]) for call in mock_write_entities.call_args_list] == [2, 1]
+
+    for name in ['myserver1', 'myserver2', 'myserver3']:
+        assert tmpdir.join('.gimmecert', 'server', '%s.cert.pem' % name).check()
+
+
+def test_watch_spool_works_with_sqlite_storage_backend(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None), 'sqlite')
+    spool = tmpdir.mkdir('spool')
+    csr = write_csr_file(spool.join('myclient.csr.pem').strpath, 'myclient')
+
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=ScriptedWatcher()):
+        status_code = gimmecert.commands.watch_spool(io.StringIO(), io.StringIO(), tmpdir.strpath, spool.strpath, 'client')
+
+    storage = gimmecert.storage.get_storage_backend(tmpdir.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert os.listdir(spool.strpath) == []
+    assert storage.get_key_or_csr('client', 'myclient') == 'csr'
+    certificate = storage.read_certificate('client', 'myclient')
+    assert gimmecert.parallel.public_key_to_der(certificate.public_key()) == gimmecert.parallel.public_key_to_der(csr.public_key())
+
+
+def test_watch_spool_processes_csrs_using_real_watcher(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    stdout_stream = io.StringIO()
+
+    def drop_csr_and_interrupt():
+        write_csr_file(spool.join('myserver.csr.pem').strpath, 'myserver')
+
+        # Give watcher a chance to pick-up the CSR prior to stopping it.
+        deadline = time.monotonic() + 10
+        while spool.join('myserver.csr.pem').check() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        signal.pthread_kill(main_thread_id, signal.SIGINT)
+
+    main_thread_id = threading.get_ident()
+    dropper = threading.Timer(0.2, drop_csr_and_interrupt)
+    dropper.start()
+
+    try:
+        status_code = gimmecert.commands.watch_spool(stdout_stream, io.StringIO(), tmpdir.strpath, spool.strpath, 'server', debounce=0.05)
+    finally:
+        dropper.join()
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "(using inotify)" in stdout_stream.getvalue()
+    assert "Issued server certificate for myserver.csr.pem" in stdout_stream.getvalue()
+    assert tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').check()
+
+
+def test_watch_spool_completes_batch_when_interrupted(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, tmpdir.basename, 1, ('ed25519', None))
+    spool = tmpdir.mkdir('spool')
+    write_csr_file(spool.join('myserver1.csr.pem').strpath, 'myserver1')
+    write_csr_file(spool.join('myserver2.csr.pem').strpath, 'myserver2')
+
+    original_issue_csr_certificates = gimmecert.commands.issue_csr_certificates
+
+    def issue_csr_certificates(*args, **kwargs):
+        os.kill(os.getpid(), signal.SIGTERM)
+        return original_issue_csr_certificates(*args, **kwargs)
+
+    stdout_stream = io.StringIO()
+
+    # Watcher must never be waited on, since interrupt is raised once the first batch completes.
+    with mock.patch.object(gimmecert.spool, 'get_watcher', return_value=ScriptedWatcher(lambda: pytest.fail("Watcher waited on."))), \
+            mock.patch.object(gimmecert.commands, 'issue_csr_certificates', side_effect=issue_csr_certificates):
+        status_code = gimmecert.commands.watch_spool(stdout_stream, io.StringIO(), tmpdir.strpath, spool.strpath, 'server')
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert os.listdir(spool.strpath) == []
+    assert "Issued 2 server certificates, rejected 0 CSRs." in stdout_stream.getvalue()
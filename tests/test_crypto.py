@@ -21,13 +21,18 @@
 
 import datetime
 
+import cryptography.hazmat.backends
 import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.hazmat.primitives.hashes
 import cryptography.x509
 from dateutil.relativedelta import relativedelta
 
 import gimmecert.crypto
+import gimmecert.parallel
 
 from freezegun import freeze_time
+import pytest
+from unittest import mock
 
 
 def test_generate_private_key_returns_private_key():
@@ -614,3 +619,283 @@ def test_generate_csr_returns_csr_with_passed_in_name():
 
     assert csr.public_key().public_numbers() == private_key.public_key().public_numbers()
     assert csr.subject == expected_subject_dn
+
+
+@pytest.mark.parametrize("key_specification", gimmecert.crypto.get_supported_key_specifications())
+def test_generate_private_key_returns_private_key_matching_key_specification(key_specification):
+
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == key_specification
+
+
+@pytest.mark.parametrize("key_specification", [
+    ('rsa', 1024),
+    ('ecdsa', 'secp192r1'),
+    ('ed25519', 'something'),
+    ('dsa', 2048),
+])
+def test_generate_private_key_raises_exception_for_unsupported_key_specification(key_specification):
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.crypto.generate_private_key(key_specification)
+
+    assert str(e_info.value) == "Unsupported key specification: %s" % (key_specification,)
+
+
+def test_get_supported_key_specifications_returns_all_key_specifications():
+
+    key_specifications = gimmecert.crypto.get_supported_key_specifications()
+
+    assert key_specifications == [
+        ('rsa', 2048),
+        ('rsa', 3072),
+        ('rsa', 4096),
+        ('ecdsa', 'secp256r1'),
+        ('ecdsa', 'secp384r1'),
+        ('ed25519', None),
+    ]
+
+
+def test_key_specification_from_public_key_raises_exception_for_unsupported_public_key():
+
+    public_key = cryptography.hazmat.primitives.asymmetric.rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=1024,
+        backend=cryptography.hazmat.backends.default_backend()
+    ).public_key()
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.crypto.key_specification_from_public_key(public_key)
+
+    assert "Unsupported public key" in str(e_info.value)
+
+
+@pytest.mark.parametrize("key_specification, expected_hash_algorithm", [
+    (('rsa', 2048), cryptography.hazmat.primitives.hashes.SHA256),
+    (('ecdsa', 'secp256r1'), cryptography.hazmat.primitives.hashes.SHA256),
+    (('ecdsa', 'secp384r1'), cryptography.hazmat.primitives.hashes.SHA384),
+])
+def test_get_signature_hash_algorithm_returns_hash_algorithm_matching_private_key(key_specification, expected_hash_algorithm):
+
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+
+    hash_algorithm = gimmecert.crypto.get_signature_hash_algorithm(private_key)
+
+    assert isinstance(hash_algorithm, expected_hash_algorithm)
+
+
+def test_get_signature_hash_algorithm_returns_none_for_ed25519_private_key():
+
+    private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+
+    assert gimmecert.crypto.get_signature_hash_algorithm(private_key) is None
+
+
+@pytest.mark.parametrize("key_specification", gimmecert.crypto.get_supported_key_specifications())
+def test_generate_ca_hierarchy_uses_passed_in_key_specification(key_specification):
+
+    hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 2, key_specification)
+
+    for private_key, certificate in hierarchy:
+        assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == key_specification
+        assert gimmecert.crypto.key_specification_from_public_key(certificate.public_key()) == key_specification
+
+
+@pytest.mark.parametrize("key_specification", [
+    ('ecdsa', 'secp256r1'),
+    ('ecdsa', 'secp384r1'),
+    ('ed25519', None),
+])
+def test_issue_server_certificate_does_not_set_key_encipherment_for_non_rsa_keys(key_specification):
+
+    ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 1, key_specification)
+    issuer_private_key, issuer_certificate = ca_hierarchy[0]
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+
+    certificate = gimmecert.crypto.issue_server_certificate('myserver', private_key.public_key(), issuer_private_key, issuer_certificate)
+
+    key_usage = certificate.extensions.get_extension_for_class(cryptography.x509.KeyUsage).value
+    assert key_usage.digital_signature is True
+    assert key_usage.key_encipherment is False
+
+
+@pytest.mark.parametrize("key_specification", [
+    ('ecdsa', 'secp256r1'),
+    ('ecdsa', 'secp384r1'),
+    ('ed25519', None),
+])
+def test_issue_client_certificate_does_not_set_key_encipherment_for_non_rsa_keys(key_specification):
+
+    ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 1, key_specification)
+    issuer_private_key, issuer_certificate = ca_hierarchy[0]
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+
+    certificate = gimmecert.crypto.issue_client_certificate('myclient', private_key.public_key(), issuer_private_key, issuer_certificate)
+
+    key_usage = certificate.extensions.get_extension_for_class(cryptography.x509.KeyUsage).value
+    assert key_usage.digital_signature is True
+    assert key_usage.key_encipherment is False
+
+
+@pytest.mark.parametrize("key_specification", gimmecert.crypto.get_supported_key_specifications())
+def test_generate_csr_supports_all_key_specifications(key_specification):
+
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+
+    csr = gimmecert.crypto.generate_csr('testcsr', private_key)
+
+    assert csr.is_signature_valid
+    assert gimmecert.crypto.key_specification_from_public_key(csr.public_key()) == key_specification
+
+
+@pytest.mark.no_key_cache
+def test_set_private_key_provider_returns_previous_provider():
+    provider_1 = mock.Mock()
+    provider_2 = mock.Mock()
+
+    try:
+        assert gimmecert.crypto.set_private_key_provider(provider_1) is None
+        assert gimmecert.crypto.set_private_key_provider(provider_2) is provider_1
+    finally:
+        assert gimmecert.crypto.set_private_key_provider(None) is provider_2
+
+
+def test_take_provided_private_key_returns_none_if_no_provider_is_installed():
+    previous_provider = gimmecert.crypto.set_private_key_provider(None)
+    try:
+        private_key = gimmecert.crypto.take_provided_private_key(('ed25519', None))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    assert private_key is None
+
+
+def test_take_provided_private_key_returns_key_from_provider():
+    provided_private_key = mock.Mock()
+    provider = mock.Mock(return_value=provided_private_key)
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key = gimmecert.crypto.take_provided_private_key(('ed25519', None))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    provider.assert_called_once_with(('ed25519', None))
+    assert private_key is provided_private_key
+
+
+def test_generate_private_key_uses_private_key_provider():
+    provided_private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+    provider = mock.Mock(return_value=provided_private_key)
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    provider.assert_called_once_with(('ed25519', None))
+    assert private_key is provided_private_key
+
+
+def test_generate_private_key_generates_key_if_private_key_provider_has_none_available():
+    provider = mock.Mock(return_value=None)
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key = gimmecert.crypto.generate_private_key(('ecdsa', 'secp256r1'))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    provider.assert_called_once_with(('ecdsa', 'secp256r1'))
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ecdsa', 'secp256r1')
+
+
+def test_generate_private_key_bypasses_private_key_provider_if_requested():
+    provider = mock.Mock()
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key = gimmecert.crypto.generate_private_key(('ed25519', None), use_provider=False)
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    assert provider.called is False
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
+
+
+def test_generate_private_keys_takes_private_keys_from_private_key_provider():
+    provided_private_keys = [gimmecert.crypto.generate_private_key(('rsa', 2048), use_provider=False) for _ in range(3)]
+    provider = mock.Mock(side_effect=provided_private_keys)
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        with mock.patch('gimmecert.parallel.run_tasks') as mock_run_tasks:
+            private_keys = gimmecert.crypto.generate_private_keys(3, ('rsa', 2048))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    assert private_keys == provided_private_keys
+    assert mock_run_tasks.called is False
+
+
+@pytest.mark.no_key_cache
+def test_generate_private_keys_generates_rsa_private_keys_in_worker_processes():
+    with mock.patch('gimmecert.parallel.run_tasks', wraps=gimmecert.parallel.run_tasks) as mock_run_tasks:
+        private_keys = gimmecert.crypto.generate_private_keys(3, ('rsa', 2048), jobs=2)
+
+    mock_run_tasks.assert_called_once_with(gimmecert.parallel.generate_private_key_task, [(('rsa', 2048),)] * 3, 2)
+    assert len(private_keys) == 3
+    assert len(set(private_key.private_numbers().d for private_key in private_keys)) == 3
+    assert all(gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('rsa', 2048) for private_key in private_keys)
+
+
+@pytest.mark.no_key_cache
+def test_generate_private_keys_generates_remaining_private_keys_if_private_key_provider_runs_out():
+    provided_private_key = gimmecert.crypto.generate_private_key(('rsa', 2048), use_provider=False)
+    provider = mock.Mock(side_effect=[provided_private_key, None])
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        with mock.patch('gimmecert.parallel.run_tasks', wraps=gimmecert.parallel.run_tasks) as mock_run_tasks:
+            private_keys = gimmecert.crypto.generate_private_keys(3, ('rsa', 2048), jobs=1)
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    mock_run_tasks.assert_called_once_with(gimmecert.parallel.generate_private_key_task, [(('rsa', 2048),)] * 2, 1)
+    assert len(private_keys) == 3
+    assert private_keys[0] is provided_private_key
+
+
+@pytest.mark.no_key_cache
+@pytest.mark.parametrize("count, key_specification", [
+    (1, ('rsa', 2048)),
+    (3, ('ecdsa', 'secp256r1')),
+    (3, ('ed25519', None)),
+])
+def test_generate_private_keys_generates_private_keys_in_current_process_if_worker_processes_would_not_pay_off(count, key_specification):
+    with mock.patch('gimmecert.parallel.run_tasks') as mock_run_tasks:
+        private_keys = gimmecert.crypto.generate_private_keys(count, key_specification)
+
+    assert mock_run_tasks.called is False
+    assert len(private_keys) == count
+    assert all(gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == key_specification for private_key in private_keys)
+
+
+@pytest.mark.no_key_cache
+def test_generate_private_keys_raises_exception_for_unsupported_key_specification():
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.crypto.generate_private_keys(2, ('rsa', 1024), jobs=2)
+
+    assert str(e_info.value) == "Unsupported key specification: ('rsa', 1024)"
+
+
+def test_generate_ca_hierarchy_generates_private_keys_up_front():
+
+    with mock.patch('gimmecert.crypto.generate_private_keys', wraps=gimmecert.crypto.generate_private_keys) as mock_generate_private_keys:
+        hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 4, ('rsa', 2048), jobs=2)
+
+    mock_generate_private_keys.assert_called_once_with(4, ('rsa', 2048), 2)
+    assert len(set(private_key.private_numbers().d for private_key, _ in hierarchy)) == 4
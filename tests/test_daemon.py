@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import gimmecert.commands
+import gimmecert.crypto
+import gimmecert.daemon
+import gimmecert.storage
+
+import pytest
+from unittest import mock
+
+
+#: Arguments for the status command, as sent by the CLI by default.
+STATUS_ARGUMENTS = {'rebuild_index': False, 'output_format': 'text'}
+
+
+@pytest.fixture
+def socket_path():
+    """
+    Fixture that provides path for daemon socket. Path is kept short,
+    since Unix socket paths are limited in length (and pytest temporary
+    directory paths can get quite long).
+    """
+
+    socket_directory = tempfile.mkdtemp(prefix='gimmecert-')
+
+    yield os.path.join(socket_directory, 'daemon.sock')
+
+    shutil.rmtree(socket_directory)
+
+
+@pytest.fixture
+def running_daemon(sample_project_directory, socket_path):
+    """
+    Fixture that runs daemon for sample project directory in a
+    background thread. Daemon socket path is exposed via environment
+    variable for the duration of the test.
+    """
+
+    daemon = gimmecert.daemon.Daemon(socket_path, sample_project_directory.strpath)
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+
+    with mock.patch.dict('os.environ', {gimmecert.daemon.SOCKET_PATH_ENVIRONMENT_VARIABLE: socket_path}):
+        yield daemon
+
+    daemon.shutdown()
+    daemon.server_close()
+    thread.join()
+
+
+def wait_for(condition, timeout=30):
+    """
+    Helper function that waits for condition to become true.
+    """
+
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline, "Timed-out waiting for condition."
+        time.sleep(0.01)
+
+
+def test_get_socket_path_returns_path_within_project_directory(tmpdir):
+
+    with mock.patch.dict('os.environ', clear=True):
+        socket_path = gimmecert.daemon.get_socket_path(tmpdir.strpath)
+
+    assert socket_path == tmpdir.join('.gimmecert', 'daemon.sock').strpath
+
+
+def test_get_socket_path_returns_path_from_environment(tmpdir):
+
+    with mock.patch.dict('os.environ', {'GIMMECERT_SOCKET': '/tmp/mydaemon.sock'}):
+        socket_path = gimmecert.daemon.get_socket_path(tmpdir.strpath)
+
+    assert socket_path == '/tmp/mydaemon.sock'
+
+
+def test_is_running_returns_false_if_daemon_is_not_running(socket_path):
+
+    assert gimmecert.daemon.is_running(socket_path) is False
+
+
+def test_is_running_returns_true_if_daemon_is_running(running_daemon, socket_path):
+
+    assert gimmecert.daemon.is_running(socket_path) is True
+
+
+def test_forward_command_returns_none_if_socket_does_not_exist(sample_project_directory, socket_path):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch.dict('os.environ', {'GIMMECERT_SOCKET': socket_path}):
+        status_code = gimmecert.daemon.forward_command(stdout_stream, stderr_stream, sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+
+    assert status_code is None
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue() == ""
+
+
+def test_forward_command_returns_none_if_daemon_is_not_listening_on_socket(sample_project_directory, socket_path):
+    with open(socket_path, 'w'):
+        pass
+
+    with mock.patch.dict('os.environ', {'GIMMECERT_SOCKET': socket_path}):
+        status_code = gimmecert.daemon.forward_command(io.StringIO(), io.StringIO(), sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+
+    assert status_code is None
+
+
+def test_forward_command_returns_none_if_daemon_serves_different_project(running_daemon, tmpdir):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.daemon.forward_command(stdout_stream, stderr_stream, tmpdir.join('otherproject').strpath, 'status', STATUS_ARGUMENTS)
+
+    assert status_code is None
+    assert stdout_stream.getvalue() == ""
+    assert stderr_stream.getvalue() == ""
+
+
+def test_forward_command_reports_error_if_daemon_fails_to_run_command(running_daemon, sample_project_directory):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    with mock.patch('gimmecert.commands.status', side_effect=RuntimeError("disk on fire")):
+        status_code = gimmecert.daemon.forward_command(stdout_stream, stderr_stream, sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_DAEMON_REQUEST_FAILED
+    assert stdout_stream.getvalue() == ""
+    assert "Failed to run command status via daemon" in stderr_stream.getvalue()
+    assert "disk on fire" in stderr_stream.getvalue()
+
+
+def test_forward_command_reports_error_if_daemon_closes_connection_without_response(running_daemon, sample_project_directory):
+    stderr_stream = io.StringIO()
+
+    with mock.patch.object(running_daemon, 'process_request_data', side_effect=RuntimeError("daemon crashed")):
+        status_code = gimmecert.daemon.forward_command(io.StringIO(), stderr_stream, sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_DAEMON_REQUEST_FAILED
+    assert "Failed to run command status via daemon" in stderr_stream.getvalue()
+
+
+def test_daemon_socket_is_accessible_to_owner_only(sample_project_directory, socket_path):
+    os.chmod(os.path.dirname(socket_path), 0o755)
+    daemon = gimmecert.daemon.Daemon(socket_path, sample_project_directory.strpath)
+
+    try:
+        mode = os.stat(socket_path).st_mode & 0o777
+    finally:
+        daemon.server_close()
+
+    assert mode == 0o600
+
+
+def test_forward_command_issues_server_certificate(running_daemon, sample_project_directory):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.daemon.forward_command(stdout_stream, stderr_stream, sample_project_directory.strpath, 'server', {
+        'entity_name': 'myserver',
+        'extra_dns_names': ['myserver.example.com'],
+        'custom_csr_path': None,
+        'key_specification': ['ecdsa', 'secp256r1'],
+    })
+
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'server', 'myserver.cert.pem').strpath)
+    private_key = gimmecert.storage.read_private_key(sample_project_directory.join('.gimmecert', 'server', 'myserver.key.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Server certificate issued." in stdout_stream.getvalue()
+    assert stderr_stream.getvalue() == ""
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ecdsa', 'secp256r1')
+    assert certificate.public_key().public_numbers() == private_key.public_key().public_numbers()
+
+
+def test_forward_command_issues_client_certificate_using_csr(running_daemon, sample_project_directory, key_with_csr):
+    stdout_stream = io.StringIO()
+
+    status_code = gimmecert.daemon.forward_command(stdout_stream, io.StringIO(), sample_project_directory.strpath, 'client', {
+        'entity_name': 'myclient',
+        'custom_csr_path': key_with_csr.csr_path,
+        'key_specification': None,
+    })
+
+    certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'client', 'myclient.cert.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert "Client certificate issued." in stdout_stream.getvalue()
+    assert certificate.public_key().public_numbers() == key_with_csr.private_key.public_key().public_numbers()
+
+
+def test_forward_command_reports_command_errors(running_daemon, sample_project_directory):
+    stdout_stream = io.StringIO()
+    stderr_stream = io.StringIO()
+
+    status_code = gimmecert.daemon.forward_command(stdout_stream, stderr_stream, sample_project_directory.strpath, 'client', {
+        'entity_name': 'client-with-privkey-1',
+        'custom_csr_path': None,
+        'key_specification': None,
+    })
+
+    assert status_code == gimmecert.commands.ExitCode.ERROR_CERTIFICATE_ALREADY_ISSUED
+    assert "already been issued" in stderr_stream.getvalue()
+
+
+def test_forward_command_renews_certificate(running_daemon, sample_project_directory):
+    old_certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'server', 'server-with-privkey-1.cert.pem').strpath)
+
+    status_code = gimmecert.daemon.forward_command(io.StringIO(), io.StringIO(), sample_project_directory.strpath, 'renew', {
+        'entity_type': 'server',
+        'entity_name': 'server-with-privkey-1',
+        'generate_new_private_key': True,
+        'custom_csr_path': None,
+        'dns_names': None,
+        'key_specification': ['ed25519', None],
+    })
+
+    new_certificate = gimmecert.storage.read_certificate(sample_project_directory.join('.gimmecert', 'server', 'server-with-privkey-1.cert.pem').strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert new_certificate != old_certificate
+    assert gimmecert.crypto.key_specification_from_public_key(new_certificate.public_key()) == ('ed25519', None)
+
+
+def test_forward_command_shows_status(running_daemon, sample_project_directory):
+    stdout_stream = io.StringIO()
+    local_stdout_stream = io.StringIO()
+
+    status_code = gimmecert.daemon.forward_command(stdout_stream, io.StringIO(), sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+    gimmecert.commands.status(local_stdout_stream, io.StringIO(), sample_project_directory.strpath)
+
+    assert status_code == gimmecert.commands.ExitCode.SUCCESS
+    assert stdout_stream.getvalue() == local_stdout_stream.getvalue()
+
+
+@pytest.mark.parametrize("request_data, expected_error", [
+    (b"not json\n", "Invalid request"),
+    (b'{"command": "status"}\n', "Invalid request"),
+    (b'{"project_directory": "%(project)s", "command": "init", "arguments": {}}\n', "Unsupported command: init"),
+    (b'{"project_directory": "%(project)s", "command": "status", "arguments": {"entity_name": "x"}}\n', "Invalid arguments for command status"),
+    (b'{"project_directory": "%(project)s", "command": "renew", "arguments": {"entity_type": "client", "entity_name": "client-with-privkey-1", '
+     b'"generate_new_private_key": false, "custom_csr_path": null, "dns_names": ["myclient.local"], "key_specification": null}}\n',
+     "Failed to run command renew"),
+])
+def test_daemon_responds_with_error_to_invalid_requests(sample_project_directory, socket_path, request_data, expected_error):
+    daemon = gimmecert.daemon.Daemon(socket_path, sample_project_directory.strpath)
+
+    try:
+        response = daemon.process_request_data(request_data % {b'project': sample_project_directory.strpath.encode()})
+    finally:
+        daemon.server_close()
+
+    assert list(response) == ['error']
+    assert expected_error in response['error']
+
+
+def test_daemon_responds_with_project_mismatch_to_requests_for_other_projects(sample_project_directory, socket_path):
+    daemon = gimmecert.daemon.Daemon(socket_path, sample_project_directory.strpath)
+
+    try:
+        response = daemon.process_request_data(b'{"project_directory": "/nonexistent", "command": "status", "arguments": {}}\n')
+    finally:
+        daemon.server_close()
+
+    assert response['project_mismatch'] is True
+    assert "different project directory" in response['error']
+
+
+def test_daemon_handles_requests_over_socket(running_daemon, sample_project_directory, socket_path):
+    request = {'project_directory': sample_project_directory.strpath, 'command': 'status', 'arguments': STATUS_ARGUMENTS}
+
+    with mock.patch.object(running_daemon, 'process_request_data', wraps=running_daemon.process_request_data) as mock_process_request_data:
+        gimmecert.daemon.forward_command(io.StringIO(), io.StringIO(), sample_project_directory.strpath, 'status', STATUS_ARGUMENTS)
+
+    mock_process_request_data.assert_called_once_with((json.dumps(request) + "\n").encode())
+
+
+def test_warm_key_pool_is_empty_until_started():
+    key_pool = gimmecert.daemon.WarmKeyPool(2, [('ed25519', None)])
+
+    assert key_pool.count(('ed25519', None)) == 0
+    assert key_pool.take(('ed25519', None)) is None
+
+    key_pool.stop()
+
+
+def test_warm_key_pool_fills_pool_in_background():
+    key_pool = gimmecert.daemon.WarmKeyPool(2, [('ed25519', None)])
+    key_pool.start()
+
+    try:
+        wait_for(lambda: key_pool.count(('ed25519', None)) == 2)
+        private_key = key_pool.take(('ed25519', None))
+        wait_for(lambda: key_pool.count(('ed25519', None)) == 2)
+    finally:
+        key_pool.stop()
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
+    assert key_pool.count(('ed25519', None)) == 2
+
+
+def test_warm_key_pool_starts_filling_keys_for_newly_requested_key_specification():
+    key_pool = gimmecert.daemon.WarmKeyPool(1, [('ed25519', None)])
+    key_pool.start()
+
+    try:
+        assert key_pool.take(('ecdsa', 'secp256r1')) is None
+        wait_for(lambda: key_pool.count(('ecdsa', 'secp256r1')) == 1)
+        private_key = key_pool.take(['ecdsa', 'secp256r1'])
+    finally:
+        key_pool.stop()
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ecdsa', 'secp256r1')
+
+
+def test_warm_key_pool_ignores_unsupported_key_specifications():
+    key_pool = gimmecert.daemon.WarmKeyPool(1, [])
+
+    assert key_pool.take(('rsa', 1024)) is None
+    assert key_pool.count(('rsa', 1024)) == 0
+
+
+def test_warm_key_pool_can_be_used_as_private_key_provider():
+    key_pool = gimmecert.daemon.WarmKeyPool(1, [('ed25519', None)])
+    key_pool.start()
+    previous_provider = gimmecert.crypto.set_private_key_provider(key_pool.take)
+
+    try:
+        wait_for(lambda: key_pool.count(('ed25519', None)) == 1)
+        with mock.patch('cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PrivateKey.generate') as mock_generate:
+            private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+        key_pool.stop()
+
+    assert mock_generate.called is False
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
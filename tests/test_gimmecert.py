@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import subprocess
+import sys
+
+import gimmecert
+import gimmecert.project
+
+
+def test_project_is_exported_from_package():
+
+    assert gimmecert.Project is gimmecert.project.Project
+
+
+def test_importing_package_does_not_import_cryptography():
+    script = """
+import sys
+import gimmecert
+print(",".join(sorted(name for name in sys.modules if name.split(".")[0] in ("cryptography", "dateutil"))))
+"""
+
+    output = subprocess.check_output([sys.executable, "-c", script], universal_newlines=True)
+
+    assert output.splitlines()[-1] == ""
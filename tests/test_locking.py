@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import fcntl
+import os
+
+import gimmecert.locking
+
+import pytest
+
+
+def is_locked(path, exclusive):
+    """
+    Helper function that checks, without blocking, if a lock is held
+    on the passed-in path. If exclusive is True, only exclusive locks
+    are taken into account. Otherwise any lock is taken into account.
+    """
+
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if exclusive else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+    return False
+
+
+def test_get_lock_path_returns_path_within_locks_directory(tmpdir):
+
+    lock_path = gimmecert.locking.get_lock_path(tmpdir.strpath, 'mylock')
+
+    assert lock_path == tmpdir.join('.gimmecert', 'locks', 'mylock.lock').strpath
+
+
+def test_project_lock_is_shared_by_default(tmpdir):
+
+    with gimmecert.locking.project_lock(tmpdir.strpath):
+        assert is_locked(tmpdir.strpath, exclusive=False)
+        assert not is_locked(tmpdir.strpath, exclusive=True)
+
+        # Multiple shared locks can be held at the same time.
+        with gimmecert.locking.project_lock(tmpdir.strpath):
+            pass
+
+    assert not is_locked(tmpdir.strpath, exclusive=False)
+
+
+def test_project_lock_can_be_exclusive(tmpdir):
+
+    with gimmecert.locking.project_lock(tmpdir.strpath, exclusive=True):
+        assert is_locked(tmpdir.strpath, exclusive=True)
+
+    assert not is_locked(tmpdir.strpath, exclusive=True)
+
+
+def test_project_lock_does_not_create_any_files(tmpdir):
+
+    with gimmecert.locking.project_lock(tmpdir.strpath, exclusive=True):
+        pass
+
+    assert tmpdir.listdir() == []
+
+
+def test_project_lock_raises_exception_for_missing_project_directory(tmpdir):
+
+    with pytest.raises(FileNotFoundError):
+        with gimmecert.locking.project_lock(tmpdir.join('missing').strpath):
+            pass
+
+
+def test_named_lock_creates_lock_file(tmpdir):
+    tmpdir.mkdir('.gimmecert')
+
+    with gimmecert.locking.named_lock(tmpdir.strpath, 'mylock'):
+        assert is_locked(tmpdir.join('.gimmecert', 'locks', 'mylock.lock').strpath, exclusive=True)
+
+    # Lock files are kept around after being released.
+    assert tmpdir.join('.gimmecert', 'locks', 'mylock.lock').check(file=1)
+    assert not is_locked(tmpdir.join('.gimmecert', 'locks', 'mylock.lock').strpath, exclusive=True)
+
+
+def test_named_lock_can_be_reacquired(tmpdir):
+    tmpdir.mkdir('.gimmecert')
+
+    with gimmecert.locking.named_lock(tmpdir.strpath, 'mylock'):
+        pass
+
+    with gimmecert.locking.named_lock(tmpdir.strpath, 'mylock'):
+        assert is_locked(tmpdir.join('.gimmecert', 'locks', 'mylock.lock').strpath, exclusive=True)
+
+
+def test_entity_lock_uses_lock_named_after_entity(tmpdir):
+    tmpdir.mkdir('.gimmecert')
+
+    with gimmecert.locking.entity_lock(tmpdir.strpath, 'server', 'myserver'):
+        assert is_locked(tmpdir.join('.gimmecert', 'locks', 'server-myserver.lock').strpath, exclusive=True)
+        assert not tmpdir.join('.gimmecert', 'locks', 'client-myserver.lock').check()
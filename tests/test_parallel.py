@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+
+import cryptography.hazmat.primitives.asymmetric.rsa
+import cryptography.x509
+
+import gimmecert.crypto
+import gimmecert.parallel
+import gimmecert.utils
+
+from unittest import mock
+
+
+def test_get_default_jobs_returns_number_of_cpus():
+    with mock.patch('os.cpu_count', return_value=7):
+        assert gimmecert.parallel.get_default_jobs() == 7
+
+
+def test_get_default_jobs_returns_one_if_number_of_cpus_is_unknown():
+    with mock.patch('os.cpu_count', return_value=None):
+        assert gimmecert.parallel.get_default_jobs() == 1
+
+
+def test_run_tasks_processes_tasks_in_current_process_for_single_job():
+    results = gimmecert.parallel.run_tasks(os.getpid, [(), (), ()], jobs=1)
+
+    assert results == [os.getpid()] * 3
+
+
+def test_run_tasks_uses_default_number_of_jobs():
+    with mock.patch('gimmecert.parallel.get_default_jobs', return_value=1) as mock_get_default_jobs:
+        results = gimmecert.parallel.run_tasks(pow, [(2, 1), (2, 2)])
+
+    mock_get_default_jobs.assert_called_once_with()
+    assert results == [2, 4]
+
+
+def test_run_tasks_processes_tasks_in_worker_processes_and_preserves_order():
+    tasks = [(2, i) for i in range(20)]
+
+    results = gimmecert.parallel.run_tasks(pow, tasks, jobs=3)
+    worker_pids = gimmecert.parallel.run_tasks(os.getpid, [()] * 4, jobs=2)
+
+    assert results == [2 ** i for i in range(20)]
+    assert os.getpid() not in worker_pids
+
+
+def test_private_key_der_conversion_round_trip():
+    private_key = gimmecert.crypto.generate_private_key()
+
+    private_key_der = gimmecert.parallel.private_key_to_der(private_key)
+    converted_private_key = gimmecert.parallel.private_key_from_der(private_key_der)
+
+    assert isinstance(private_key_der, bytes)
+    assert isinstance(converted_private_key, cryptography.hazmat.primitives.asymmetric.rsa.RSAPrivateKey)
+    assert converted_private_key.private_numbers() == private_key.private_numbers()
+
+
+def test_public_key_der_conversion_round_trip():
+    public_key = gimmecert.crypto.generate_private_key().public_key()
+
+    public_key_der = gimmecert.parallel.public_key_to_der(public_key)
+
+    assert isinstance(public_key_der, bytes)
+    assert gimmecert.parallel.public_key_from_der(public_key_der).public_numbers() == public_key.public_numbers()
+
+
+def test_certificate_der_conversion_round_trip():
+    _, certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+
+    certificate_der = gimmecert.parallel.certificate_to_der(certificate)
+
+    assert isinstance(certificate_der, bytes)
+    assert gimmecert.parallel.certificate_from_der(certificate_der) == certificate
+
+
+def test_csr_der_conversion_round_trip():
+    csr = gimmecert.crypto.generate_csr('mycsr', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    csr_der = gimmecert.parallel.csr_to_der(csr)
+
+    assert isinstance(csr_der, bytes)
+    assert gimmecert.parallel.csr_from_der(csr_der) == csr
+
+
+def test_verify_csr_task_accepts_valid_signature():
+    csr = gimmecert.crypto.generate_csr('mycsr', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    assert gimmecert.parallel.verify_csr_task(gimmecert.parallel.csr_to_der(csr)) is True
+
+
+def test_verify_csr_task_rejects_invalid_signature():
+    csr = gimmecert.crypto.generate_csr('mycsr', gimmecert.crypto.generate_private_key(('ed25519', None)))
+    csr_der = gimmecert.parallel.csr_to_der(csr)
+
+    # Signature is stored at the very end of DER-encoded CSR.
+    tampered_csr_der = csr_der[:-1] + bytes([csr_der[-1] ^ 0xff])
+
+    assert gimmecert.parallel.verify_csr_task(tampered_csr_der) is False
+
+
+def test_generate_private_key_task_generates_private_key():
+    provider = mock.Mock()
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key_der = gimmecert.parallel.generate_private_key_task(('ecdsa', 'secp256r1'))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    private_key = gimmecert.parallel.private_key_from_der(private_key_der)
+
+    assert provider.called is False
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ecdsa', 'secp256r1')
+
+
+def test_issue_certificate_task_generates_private_key_for_server():
+    issuer_private_key, issuer_certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+
+    private_key_der, certificate_der = gimmecert.parallel.issue_certificate_task(
+        'server', 'myserver', ['myserver.local'], None, ('rsa', 2048),
+        gimmecert.parallel.private_key_to_der(issuer_private_key), gimmecert.parallel.certificate_to_der(issuer_certificate))
+
+    private_key = gimmecert.parallel.private_key_from_der(private_key_der)
+    certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+
+    assert certificate.public_key().public_numbers() == private_key.public_key().public_numbers()
+    assert certificate.issuer == issuer_certificate.subject
+    assert certificate.subject == gimmecert.crypto.get_dn('myserver')
+    assert gimmecert.utils.get_dns_names(certificate) == ['myserver', 'myserver.local']
+
+
+def test_issue_certificate_task_does_not_consult_private_key_provider():
+    issuer_private_key, issuer_certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+    provider = mock.Mock()
+
+    previous_provider = gimmecert.crypto.set_private_key_provider(provider)
+    try:
+        private_key_der, certificate_der = gimmecert.parallel.issue_certificate_task(
+            'server', 'myserver', [], None, ('ed25519', None),
+            gimmecert.parallel.private_key_to_der(issuer_private_key), gimmecert.parallel.certificate_to_der(issuer_certificate))
+    finally:
+        gimmecert.crypto.set_private_key_provider(previous_provider)
+
+    private_key = gimmecert.parallel.private_key_from_der(private_key_der)
+
+    assert provider.called is False
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
+
+
+def test_issue_certificate_task_uses_passed_in_public_key_for_client():
+    issuer_private_key, issuer_certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+    public_key = gimmecert.crypto.generate_private_key().public_key()
+
+    private_key_der, certificate_der = gimmecert.parallel.issue_certificate_task(
+        'client', 'myclient', [], gimmecert.parallel.public_key_to_der(public_key), ('rsa', 2048),
+        gimmecert.parallel.private_key_to_der(issuer_private_key), gimmecert.parallel.certificate_to_der(issuer_certificate))
+
+    certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+    extended_key_usage = certificate.extensions.get_extension_for_class(cryptography.x509.ExtendedKeyUsage).value
+
+    assert private_key_der is None
+    assert certificate.public_key().public_numbers() == public_key.public_numbers()
+    assert certificate.subject == gimmecert.crypto.get_dn('myclient')
+    assert list(extended_key_usage) == [cryptography.x509.oid.ExtendedKeyUsageOID.CLIENT_AUTH]
+
+
+def test_renew_certificate_task_renews_certificate():
+    issuer_private_key, issuer_certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+    public_key = gimmecert.crypto.generate_private_key().public_key()
+    old_certificate = gimmecert.crypto.issue_server_certificate('myserver', public_key, issuer_private_key, issuer_certificate, ['myserver.local'])
+
+    certificate_der = gimmecert.parallel.renew_certificate_task(
+        gimmecert.parallel.certificate_to_der(old_certificate),
+        gimmecert.parallel.private_key_to_der(issuer_private_key),
+        gimmecert.parallel.certificate_to_der(issuer_certificate))
+
+    certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+
+    assert certificate != old_certificate
+    assert certificate.subject == old_certificate.subject
+    assert certificate.public_key().public_numbers() == public_key.public_numbers()
+    assert gimmecert.utils.get_dns_names(certificate) == ['myserver', 'myserver.local']
+
+
+def test_renew_certificate_task_uses_passed_in_public_key():
+    issuer_private_key, issuer_certificate = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)[0]
+    public_key = gimmecert.crypto.generate_private_key().public_key()
+    new_public_key = gimmecert.crypto.generate_private_key().public_key()
+    old_certificate = gimmecert.crypto.issue_client_certificate('myclient', public_key, issuer_private_key, issuer_certificate)
+
+    certificate_der = gimmecert.parallel.renew_certificate_task(
+        gimmecert.parallel.certificate_to_der(old_certificate),
+        gimmecert.parallel.private_key_to_der(issuer_private_key),
+        gimmecert.parallel.certificate_to_der(issuer_certificate),
+        gimmecert.parallel.public_key_to_der(new_public_key))
+
+    certificate = gimmecert.parallel.certificate_from_der(certificate_der)
+
+    assert certificate.subject == old_certificate.subject
+    assert certificate.public_key().public_numbers() == new_public_key.public_numbers()
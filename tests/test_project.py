@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+
+import cryptography.x509
+
+import gimmecert.commands
+import gimmecert.crypto
+import gimmecert.project
+import gimmecert.storage
+import gimmecert.utils
+
+import pytest
+from unittest import mock
+
+
+#: Encoding and format arguments for comparing public keys of any type.
+PUBLIC_KEY_DER = (cryptography.hazmat.primitives.serialization.Encoding.DER,
+                  cryptography.hazmat.primitives.serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+@pytest.fixture
+def project(tmpdir):
+    """
+    Fixture that initialises a project with a two-level CA hierarchy
+    within tmpdir, and provides Project instance for it.
+    """
+
+    project = gimmecert.project.Project(tmpdir.strpath)
+    project.initialise('My Project', 2, ('ed25519', None))
+
+    return project
+
+
+def test_project_uses_absolute_project_directory(tmpdir):
+    with tmpdir.as_cwd():
+        project = gimmecert.project.Project('.')
+
+    assert project.project_directory == tmpdir.strpath
+
+
+def test_project_is_initialised(tmpdir):
+    project = gimmecert.project.Project(tmpdir.strpath)
+
+    assert project.is_initialised() is False
+
+    project.initialise('My Project', 1, ('ed25519', None))
+
+    assert project.is_initialised() is True
+
+
+def test_initialise_generates_ca_hierarchy(tmpdir):
+    project = gimmecert.project.Project(tmpdir.strpath)
+
+    ca_hierarchy = project.initialise('My Project', 2, ('ed25519', None))
+
+    assert [gimmecert.utils.get_common_name(certificate.subject) for _, certificate in ca_hierarchy] == ['My Project Level 1 CA',
+                                                                                                         'My Project Level 2 CA']
+    assert project.ca_hierarchy.certificates == [certificate for _, certificate in ca_hierarchy]
+
+
+def test_initialise_uses_passed_in_storage_backend(tmpdir):
+    project = gimmecert.project.Project(tmpdir.strpath)
+
+    project.initialise('My Project', 1, ('ed25519', None), 'sqlite')
+
+    assert isinstance(project.storage, gimmecert.storage.SQLiteBackend)
+
+
+def test_initialise_raises_exception_if_already_initialised(project):
+
+    with pytest.raises(gimmecert.project.AlreadyInitialisedError) as e_info:
+        project.initialise('My Project', 1, ('ed25519', None))
+
+    assert str(e_info.value) == "CA hierarchy has already been initialised in %s." % project.project_directory
+
+
+@pytest.mark.parametrize("operation", [
+    lambda project: project.storage,
+    lambda project: project.ca_hierarchy,
+    lambda project: project.issue_server('myserver'),
+    lambda project: project.issue_client('myclient'),
+    lambda project: project.renew('server', 'myserver'),
+    lambda project: list(project.inventory()),
+])
+def test_operations_raise_exception_if_project_is_not_initialised(tmpdir, operation):
+    project = gimmecert.project.Project(tmpdir.strpath)
+
+    with pytest.raises(gimmecert.project.NotInitialisedError) as e_info:
+        operation(project)
+
+    assert str(e_info.value) == "CA hierarchy has not been initialised in %s." % tmpdir.strpath
+    assert not tmpdir.join('.gimmecert').check()
+
+
+def test_ca_hierarchy_is_read_only_once(project):
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy', wraps=gimmecert.storage.read_ca_hierarchy) as mock_read_ca_hierarchy:
+        project.issue_server('myserver1', key_specification=('ed25519', None))
+        project.issue_server('myserver2', key_specification=('ed25519', None))
+        project.issue_client('myclient1', key_specification=('ed25519', None))
+
+    assert mock_read_ca_hierarchy.call_count == 1
+
+
+def test_issue_server_returns_issued_entity(project):
+
+    entity = project.issue_server('myserver', ['service.example.com'], key_specification=('ecdsa', 'secp256r1'))
+
+    base_path = os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver')
+    issuer_certificate = project.ca_hierarchy.certificates[-1]
+
+    assert entity.entity_type == 'server'
+    assert entity.entity_name == 'myserver'
+    assert entity.csr is None
+    assert entity.private_key.public_key().public_numbers() == entity.certificate.public_key().public_numbers()
+    assert gimmecert.crypto.key_specification_from_public_key(entity.certificate.public_key()) == ('ecdsa', 'secp256r1')
+    assert entity.certificate.issuer == issuer_certificate.subject
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service.example.com']
+    assert entity.certificate_path == base_path + '.cert.pem'
+    assert entity.private_key_path == base_path + '.key.pem'
+    assert entity.csr_path is None
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+    assert os.path.exists(entity.private_key_path)
+
+
+def test_issue_server_with_csr_stores_csr(project):
+    private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+    csr = gimmecert.crypto.generate_csr('mycustom', private_key)
+
+    entity = project.issue_server('myserver', csr=csr)
+
+    assert entity.private_key is None
+    assert entity.csr == csr
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == private_key.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert gimmecert.utils.get_common_name(entity.certificate.subject) == 'myserver'
+    assert entity.private_key_path is None
+    assert entity.csr_path == os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.csr.pem')
+    assert gimmecert.storage.read_csr(entity.csr_path).public_bytes(cryptography.hazmat.primitives.serialization.Encoding.PEM) == \
+        csr.public_bytes(cryptography.hazmat.primitives.serialization.Encoding.PEM)
+
+
+def test_issue_server_raises_exception_if_certificate_already_issued(project):
+    project.issue_server('myserver', key_specification=('ed25519', None))
+
+    with pytest.raises(gimmecert.project.CertificateAlreadyIssuedError) as e_info:
+        project.issue_server('myserver', key_specification=('ed25519', None))
+
+    assert str(e_info.value) == "Certificate has already been issued for server myserver."
+
+
+def test_issue_client_returns_issued_entity(project):
+
+    entity = project.issue_client('myclient', key_specification=('ed25519', None))
+
+    assert entity.entity_type == 'client'
+    assert entity.entity_name == 'myclient'
+    assert gimmecert.utils.get_common_name(entity.certificate.subject) == 'myclient'
+    assert entity.private_key_path == os.path.join(project.project_directory, '.gimmecert', 'client', 'myclient.key.pem')
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+
+def test_issue_client_raises_exception_if_certificate_already_issued(project):
+    project.issue_client('myclient', key_specification=('ed25519', None))
+
+    with pytest.raises(gimmecert.project.CertificateAlreadyIssuedError) as e_info:
+        project.issue_client('myclient', key_specification=('ed25519', None))
+
+    assert str(e_info.value) == "Certificate has already been issued for client myclient."
+
+
+def test_issue_uses_pooled_private_key(project):
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    with mock.patch('gimmecert.crypto.generate_private_key') as mock_generate_private_key:
+        project.issue_client('myclient', key_specification=('ed25519', None))
+
+    assert mock_generate_private_key.called is False
+
+
+def test_issue_returns_pooled_private_key_to_pool_if_storing_fails(project):
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    with mock.patch.object(gimmecert.storage.FilesystemBackend, 'write_entities', side_effect=OSError("No space left on device")):
+        with pytest.raises(OSError):
+            project.issue_server('myserver', key_specification=('ed25519', None))
+
+    assert gimmecert.storage.count_pooled_private_keys(project.project_directory, ('ed25519', None)) == 1
+
+
+def test_renew_returns_pooled_private_key_to_pool_if_signing_fails(project):
+    project.issue_client('myclient', key_specification=('ed25519', None))
+    gimmecert.commands.pool_fill(io.StringIO(), io.StringIO(), project.project_directory, 1, ('ed25519', None))
+
+    with mock.patch('gimmecert.crypto.renew_certificate', side_effect=RuntimeError("Signing failed")):
+        with pytest.raises(RuntimeError):
+            project.renew('client', 'myclient', generate_new_private_key=True)
+
+    assert gimmecert.storage.count_pooled_private_keys(project.project_directory, ('ed25519', None)) == 1
+
+
+def test_renew_keeps_private_key(project):
+    issued = project.issue_server('myserver', key_specification=('ed25519', None))
+
+    entity = project.renew('server', 'myserver')
+
+    assert entity.private_key is None
+    assert entity.csr is None
+    assert entity.private_key_path == issued.private_key_path
+    assert entity.certificate != issued.certificate
+    assert entity.certificate.public_key().public_bytes(*PUBLIC_KEY_DER) == issued.certificate.public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+
+def test_renew_generates_new_private_key(project):
+    project.issue_client('myclient', key_specification=('ecdsa', 'secp256r1'))
+
+    entity = project.renew('client', 'myclient', generate_new_private_key=True)
+
+    assert entity.private_key is not None
+    assert entity.private_key.public_key().public_numbers() == entity.certificate.public_key().public_numbers()
+    assert gimmecert.crypto.key_specification_from_public_key(entity.certificate.public_key()) == ('ecdsa', 'secp256r1')
+
+
+def test_renew_replaces_private_key_with_csr(project):
+    project.issue_server('myserver', key_specification=('ed25519', None))
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = project.renew('server', 'myserver', csr=csr)
+
+    assert entity.csr == csr
+    assert entity.private_key_path is None
+    assert entity.csr_path == os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.csr.pem')
+    assert not os.path.exists(os.path.join(project.project_directory, '.gimmecert', 'server', 'myserver.key.pem'))
+
+
+def test_renew_updates_dns_names(project):
+    project.issue_server('myserver', ['service1.example.com'], key_specification=('ed25519', None))
+
+    entity = project.renew('server', 'myserver', dns_names=['service2.example.com'])
+
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service2.example.com']
+
+
+def test_renew_raises_exception_for_unknown_entity(project):
+
+    with pytest.raises(gimmecert.project.UnknownEntityError) as e_info:
+        project.renew('client', 'myclient')
+
+    assert str(e_info.value) == "No existing certificate found for client myclient."
+
+
+@pytest.mark.parametrize("arguments, expected_message", [
+    (dict(entity_type='server', generate_new_private_key=True, csr=mock.Mock()),
+     "Only one of the following two parameters should be specified: generate_new_private_key, csr."),
+    (dict(entity_type='client', dns_names=['service.example.com']),
+     "Updating DNS subject alternative names can be done only for server certificates."),
+    (dict(entity_type='server', key_specification=('ed25519', None)),
+     "Key specification can be passed-in only when generating new private key."),
+])
+def test_renew_raises_exception_for_conflicting_arguments(project, arguments, expected_message):
+
+    with pytest.raises(ValueError) as e_info:
+        project.renew(entity_name='myentity', **arguments)
+
+    assert str(e_info.value) == expected_message
+
+
+def test_sign_csr_uses_common_name_from_csr(project):
+    csr = gimmecert.crypto.generate_csr('mycustom', gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = project.sign_csr('server', csr, 'fallback')
+
+    assert entity.entity_type == 'server'
+    assert entity.entity_name == 'mycustom'
+    assert entity.csr == csr
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['mycustom']
+
+
+def test_sign_csr_uses_fallback_name(project):
+    csr = gimmecert.crypto.generate_csr(cryptography.x509.Name([]), gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    entity = project.sign_csr('client', csr, 'fallback')
+
+    assert entity.entity_type == 'client'
+    assert entity.entity_name == 'fallback'
+
+
+def test_sign_csr_raises_exception_if_entity_name_cannot_be_determined(project):
+    csr = gimmecert.crypto.generate_csr(cryptography.x509.Name([]), gimmecert.crypto.generate_private_key(('ed25519', None)))
+
+    with pytest.raises(gimmecert.project.InvalidCSRError) as e_info:
+        project.sign_csr('client', csr)
+
+    assert str(e_info.value) == "Unable to determine entity name."
+
+
+def test_sign_csr_raises_exception_if_csr_signature_is_invalid(project):
+    csr = mock.Mock(is_signature_valid=False)
+
+    with pytest.raises(gimmecert.project.InvalidCSRError) as e_info:
+        project.sign_csr('client', csr)
+
+    assert str(e_info.value) == "Invalid CSR signature."
+
+
+def test_inventory_produces_records_for_ca_hierarchy_and_entities(project):
+    project.issue_server('myserver', ['service.example.com'], key_specification=('ed25519', None))
+    project.issue_client('myclient', gimmecert.crypto.generate_csr('myclient', gimmecert.crypto.generate_private_key(('ed25519', None))))
+
+    records = list(project.inventory())
+
+    assert [(record['type'], record['name']) for record in records] == [('ca', 'level1'), ('ca', 'level2'), ('server', 'myserver'), ('client', 'myclient')]
+    assert records[2]['dns_names'] == ['myserver', 'service.example.com']
+    assert records[2]['private_key'] == '.gimmecert/server/myserver.key.pem'
+    assert records[3]['private_key'] is None
+    assert records[3]['csr'] == '.gimmecert/client/myclient.csr.pem'
+    assert {record['validity_status'] for record in records} == {'valid'}
+
+
+def test_inventory_does_not_load_ca_private_keys(tmpdir):
+    gimmecert.project.Project(tmpdir.strpath).initialise('My Project', 2, ('ed25519', None))
+    project = gimmecert.project.Project(tmpdir.strpath)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True), \
+            mock.patch('gimmecert.storage.read_private_key', wraps=gimmecert.storage.read_private_key) as mock_read_private_key:
+        records = list(project.inventory())
+
+    assert len(records) == 2
+    assert mock_read_private_key.called is False
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import datetime
+
+import cryptography.hazmat.primitives.serialization
+
+import gimmecert.pytest_plugin
+import gimmecert.storage
+import gimmecert.utils
+
+import pytest
+from unittest import mock
+
+
+pytest_plugins = ['pytester']
+
+#: Encoding, format, and encryption arguments for comparing private keys of any type.
+PRIVATE_KEY_DER = (cryptography.hazmat.primitives.serialization.Encoding.DER,
+                   cryptography.hazmat.primitives.serialization.PrivateFormat.PKCS8,
+                   cryptography.hazmat.primitives.serialization.NoEncryption())
+
+
+#: Test module exercising all of the plugin fixtures.
+FIXTURES_TEST_MODULE = """
+import os
+
+import gimmecert.utils
+
+
+def test_project(gimmecert_project):
+    assert gimmecert_project.is_initialised()
+    assert len(gimmecert_project.ca_hierarchy) == 2
+
+
+def test_server_cert(gimmecert_project, gimmecert_server_cert):
+    entity = gimmecert_server_cert('myserver', dns=['service.local'])
+
+    assert entity.certificate.issuer == gimmecert_project.ca_hierarchy.certificates[-1].subject
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service.local']
+    assert entity.private_key is not None
+    assert os.path.exists(entity.certificate_path)
+    assert os.path.exists(entity.private_key_path)
+
+
+def test_client_cert(gimmecert_client_cert):
+    entity = gimmecert_client_cert('myclient')
+
+    assert gimmecert.utils.get_common_name(entity.certificate.subject) == 'myclient'
+    assert entity.private_key is not None
+    assert gimmecert_client_cert('myclient') is entity
+"""
+
+
+@pytest.fixture
+def plugin_testdir(testdir, monkeypatch):
+    """
+    Fixture that sets-up pytest testdir for running test sessions with
+    the plugin, using cheap private keys and two-level CA hierarchy.
+    """
+
+    # Plugin is loaded explicitly, even if it is installed.
+    monkeypatch.setenv('PYTEST_DISABLE_PLUGIN_AUTOLOAD', '1')
+
+    testdir.makeini("""
+        [pytest]
+        gimmecert_key_specification = ed25519
+        gimmecert_ca_hierarchy_depth = 2
+    """)
+    testdir.makepyfile(FIXTURES_TEST_MODULE)
+
+    return testdir
+
+
+@pytest.fixture
+def project(tmpdir):
+    """
+    Fixture that provides initialised project within tmpdir.
+    """
+
+    return gimmecert.pytest_plugin.open_project(tmpdir.strpath, 1, ('ed25519', None))
+
+
+def test_fixtures_provide_certificates(plugin_testdir):
+
+    result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin')
+
+    result.assert_outcomes(passed=3)
+    assert len(plugin_testdir.tmpdir.join('.pytest_cache', 'd', 'gimmecert').listdir()) == 1
+
+
+def test_fixtures_reuse_artefacts_across_sessions(plugin_testdir):
+    plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin').assert_outcomes(passed=3)
+
+    with mock.patch('gimmecert.crypto.generate_private_key') as mock_generate_private_key, \
+            mock.patch('gimmecert.crypto.generate_ca_hierarchy') as mock_generate_ca_hierarchy:
+        result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin')
+
+    result.assert_outcomes(passed=3)
+    assert mock_generate_private_key.called is False
+    assert mock_generate_ca_hierarchy.called is False
+
+
+def test_fixtures_use_separate_project_for_different_parameters(plugin_testdir):
+    plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin').assert_outcomes(passed=3)
+
+    result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin', '-o', 'gimmecert_ca_hierarchy_depth=1', '-k', 'client')
+
+    result.assert_outcomes(passed=1)
+    assert len(plugin_testdir.tmpdir.join('.pytest_cache', 'd', 'gimmecert').listdir()) == 2
+
+
+def test_fixtures_use_configured_cache_directory(plugin_testdir):
+
+    result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin', '-o', 'gimmecert_cache_dir=certificates')
+
+    result.assert_outcomes(passed=3)
+    assert len(plugin_testdir.tmpdir.join('certificates').listdir()) == 1
+
+
+def test_fixtures_use_temporary_directory_without_pytest_cache(plugin_testdir):
+
+    result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin', '-p', 'no:cacheprovider')
+
+    result.assert_outcomes(passed=3)
+    assert not plugin_testdir.tmpdir.join('.pytest_cache').check()
+
+
+def test_server_cert_fixture_rejects_different_dns_names_within_session(plugin_testdir):
+    plugin_testdir.makepyfile(test_conflict="""
+        import pytest
+
+
+        def test_conflict(gimmecert_server_cert):
+            gimmecert_server_cert('myserver', dns=['service1.local'])
+
+            with pytest.raises(ValueError) as e_info:
+                gimmecert_server_cert('myserver', dns=['service2.local'])
+
+            assert str(e_info.value) == "Server certificate for myserver has already been requested with different DNS names."
+    """)
+
+    result = plugin_testdir.runpytest('-p', 'gimmecert.pytest_plugin', 'test_conflict.py')
+
+    result.assert_outcomes(passed=1)
+
+
+def test_open_project_initialises_project(tmpdir):
+
+    project = gimmecert.pytest_plugin.open_project(tmpdir.join('project').strpath, 2, ('ed25519', None))
+
+    assert project.is_initialised()
+    assert [gimmecert.utils.get_common_name(certificate.subject) for certificate in project.ca_hierarchy.certificates] == \
+        ['Gimmecert pytest Level 1 CA', 'Gimmecert pytest Level 2 CA']
+
+
+def test_open_project_reuses_ca_hierarchy(project):
+
+    reopened_project = gimmecert.pytest_plugin.open_project(project.project_directory, 1, ('ed25519', None))
+
+    assert reopened_project.ca_hierarchy.certificates == project.ca_hierarchy.certificates
+
+
+def test_open_project_reinitialises_expiring_ca_hierarchy(project):
+    project.issue_client('myclient', key_specification=('ed25519', None))
+
+    with mock.patch('gimmecert.pytest_plugin.MINIMUM_VALIDITY', datetime.timedelta(days=5000)):
+        reopened_project = gimmecert.pytest_plugin.open_project(project.project_directory, 1, ('ed25519', None))
+
+    assert reopened_project.ca_hierarchy.certificates != project.ca_hierarchy.certificates
+    assert not reopened_project.storage.entity_exists('client', 'myclient')
+
+
+def test_get_entity_issues_certificate(project):
+
+    entity = gimmecert.pytest_plugin.get_entity(project, 'server', 'myserver', ['service.local'], ('ed25519', None))
+
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service.local']
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+
+def test_get_entity_reuses_stored_artefacts(project):
+    issued = gimmecert.pytest_plugin.get_entity(project, 'client', 'myclient', [], ('ed25519', None))
+
+    entity = gimmecert.pytest_plugin.get_entity(project, 'client', 'myclient', [], ('ed25519', None))
+
+    assert entity.certificate == issued.certificate
+    assert entity.private_key.private_bytes(*PRIVATE_KEY_DER) == issued.private_key.private_bytes(*PRIVATE_KEY_DER)
+    assert entity.certificate_path == issued.certificate_path
+    assert entity.private_key_path == issued.private_key_path
+    assert entity.csr is None
+    assert entity.csr_path is None
+
+
+def test_get_entity_renews_expiring_certificate(project):
+    issued = gimmecert.pytest_plugin.get_entity(project, 'client', 'myclient', [], ('ed25519', None))
+
+    with mock.patch('gimmecert.pytest_plugin.MINIMUM_VALIDITY', datetime.timedelta(days=5000)):
+        entity = gimmecert.pytest_plugin.get_entity(project, 'client', 'myclient', [], ('ed25519', None))
+
+    assert entity.certificate != issued.certificate
+    assert entity.private_key.private_bytes(*PRIVATE_KEY_DER) == issued.private_key.private_bytes(*PRIVATE_KEY_DER)
+    assert gimmecert.storage.read_certificate(entity.certificate_path) == entity.certificate
+
+
+def test_get_entity_renews_server_certificate_with_different_dns_names(project):
+    issued = gimmecert.pytest_plugin.get_entity(project, 'server', 'myserver', ['service1.local'], ('ed25519', None))
+
+    entity = gimmecert.pytest_plugin.get_entity(project, 'server', 'myserver', ['service2.local'], ('ed25519', None))
+
+    assert gimmecert.utils.get_dns_names(entity.certificate) == ['myserver', 'service2.local']
+    assert entity.private_key.private_bytes(*PRIVATE_KEY_DER) == issued.private_key.private_bytes(*PRIVATE_KEY_DER)
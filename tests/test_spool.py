@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import signal
+import threading
+import time
+from unittest import mock
+
+import gimmecert.spool
+
+import pytest
+
+
+def test_inotify_watcher_reports_written_files(tmpdir):
+    watcher = gimmecert.spool.InotifyWatcher(tmpdir.strpath)
+
+    try:
+        assert watcher.wait(0) is False
+
+        tmpdir.join('myserver.csr.pem').write('data')
+
+        assert watcher.wait(1) is True
+        # Events have been consumed.
+        assert watcher.wait(0) is False
+
+        tmpdir.join('incoming').write('data')
+        os.rename(tmpdir.join('incoming').strpath, tmpdir.join('myclient.csr.pem').strpath)
+
+        assert watcher.wait(1) is True
+    finally:
+        watcher.close()
+
+
+def test_inotify_watcher_waits_indefinitely_without_timeout(tmpdir):
+    watcher = gimmecert.spool.InotifyWatcher(tmpdir.strpath)
+    writer = threading.Timer(0.1, tmpdir.join('myserver.csr.pem').write, ['data'])
+    writer.start()
+
+    try:
+        assert watcher.wait() is True
+    finally:
+        writer.join()
+        watcher.close()
+
+
+def test_inotify_watcher_raises_exception_for_missing_directory(tmpdir):
+    with pytest.raises(OSError):
+        gimmecert.spool.InotifyWatcher(tmpdir.join('missing').strpath)
+
+
+def test_inotify_watcher_raises_exception_if_inotify_is_not_supported(tmpdir):
+    with mock.patch('ctypes.CDLL', return_value=object()):
+        with pytest.raises(OSError) as e_info:
+            gimmecert.spool.InotifyWatcher(tmpdir.strpath)
+
+    assert "not supported" in str(e_info.value)
+
+
+def test_inotify_watcher_raises_exception_if_inotify_cannot_be_initialised(tmpdir):
+    with mock.patch('ctypes.CDLL') as mock_cdll:
+        mock_cdll.return_value.inotify_init1.return_value = -1
+
+        with pytest.raises(OSError) as e_info:
+            gimmecert.spool.InotifyWatcher(tmpdir.strpath)
+
+    assert "Failed to initialise inotify" in str(e_info.value)
+
+
+def test_polling_watcher_reports_changed_csr_files(tmpdir):
+    tmpdir.join('existing.csr.pem').write('data')
+    watcher = gimmecert.spool.PollingWatcher(tmpdir.strpath, 0.01)
+
+    assert watcher.wait(0.05) is False
+
+    # Non-CSR files are ignored.
+    tmpdir.join('notes.txt').write('data')
+    assert watcher.wait(0.05) is False
+
+    tmpdir.join('myserver.csr.pem').write('data')
+    assert watcher.wait(0.05) is True
+    assert watcher.wait(0.05) is False
+
+    tmpdir.join('existing.csr.pem').write('more data')
+    assert watcher.wait() is True
+
+    watcher.close()
+
+
+def test_polling_watcher_raises_exception_for_missing_directory(tmpdir):
+    with pytest.raises(OSError):
+        gimmecert.spool.PollingWatcher(tmpdir.join('missing').strpath, 1)
+
+
+def test_get_watcher_prefers_inotify(tmpdir):
+    watcher = gimmecert.spool.get_watcher(tmpdir.strpath, 1)
+
+    assert isinstance(watcher, gimmecert.spool.InotifyWatcher)
+    assert watcher.name == 'inotify'
+
+    watcher.close()
+
+
+@pytest.mark.parametrize("use_inotify, inotify_error", [
+    (True, OSError("Inotify is not supported on this platform.")),
+    (False, None),
+])
+def test_get_watcher_falls_back_to_polling(tmpdir, use_inotify, inotify_error):
+    with mock.patch.object(gimmecert.spool, 'InotifyWatcher', side_effect=inotify_error) as mock_inotify_watcher:
+        watcher = gimmecert.spool.get_watcher(tmpdir.strpath, 3, use_inotify)
+
+    assert isinstance(watcher, gimmecert.spool.PollingWatcher)
+    assert watcher.name == 'polling'
+    assert watcher.interval == 3
+    assert mock_inotify_watcher.called is use_inotify
+
+
+def test_wait_for_batch_waits_until_changes_stop():
+    watcher = mock.Mock()
+    watcher.wait.side_effect = [True, True, True, False]
+
+    gimmecert.spool.wait_for_batch(watcher, 0.1, 10)
+
+    assert watcher.wait.call_count == 4
+    assert watcher.wait.call_args_list[0] == mock.call(None)
+    assert watcher.wait.call_args_list[1] == mock.call(0.1)
+
+
+def test_wait_for_batch_does_not_wait_past_maximum_delay():
+    watcher = mock.Mock()
+
+    def wait(timeout=None):
+        time.sleep(0.05)
+        return True
+
+    watcher.wait.side_effect = wait
+
+    start = time.monotonic()
+    gimmecert.spool.wait_for_batch(watcher, 0.1, 0.2)
+
+    assert time.monotonic() - start < 1
+
+
+def test_wait_for_batch_returns_on_timeout_without_changes():
+    watcher = mock.Mock()
+    watcher.wait.return_value = False
+
+    gimmecert.spool.wait_for_batch(watcher, 0.1, 10, 5)
+
+    watcher.wait.assert_called_once_with(5)
+
+
+def test_list_csr_files_returns_sorted_csr_files_only(tmpdir):
+    tmpdir.join('b.csr.pem').write('data')
+    tmpdir.join('a.csr.pem').write('data')
+    tmpdir.join('c.csr').write('data')
+    tmpdir.join('notes.txt').write('data')
+    tmpdir.mkdir('directory.csr.pem')
+
+    assert gimmecert.spool.list_csr_files(tmpdir.strpath) == ['a.csr.pem', 'b.csr.pem']
+
+
+def test_reject_csr_file_moves_file_into_rejected_directory(tmpdir):
+    tmpdir.join('myserver.csr.pem').write('first')
+
+    rejected_path = gimmecert.spool.reject_csr_file(tmpdir.strpath, 'myserver.csr.pem')
+
+    assert rejected_path == tmpdir.join('rejected', 'myserver.csr.pem').strpath
+    assert not tmpdir.join('myserver.csr.pem').check()
+    assert tmpdir.join('rejected', 'myserver.csr.pem').read() == 'first'
+
+    # Previously rejected file gets replaced.
+    tmpdir.join('myserver.csr.pem').write('second')
+    gimmecert.spool.reject_csr_file(tmpdir.strpath, 'myserver.csr.pem')
+
+    assert tmpdir.join('rejected', 'myserver.csr.pem').read() == 'second'
+
+
+@pytest.mark.parametrize("signum", [signal.SIGINT, signal.SIGTERM])
+def test_deferred_interrupts_raises_keyboard_interrupt_once_block_completes(signum):
+    previous_handlers = signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)
+    completed = False
+
+    with pytest.raises(KeyboardInterrupt):
+        with gimmecert.spool.deferred_interrupts():
+            os.kill(os.getpid(), signum)
+            completed = True
+
+    assert completed
+    assert (signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)) == previous_handlers
+
+
+def test_deferred_interrupts_does_nothing_without_signals():
+    previous_handlers = signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)
+
+    with gimmecert.spool.deferred_interrupts():
+        assert signal.getsignal(signal.SIGINT) != previous_handlers[0]
+
+    assert (signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)) == previous_handlers
+
+
+def test_deferred_interrupts_does_nothing_outside_of_main_thread():
+    handlers = []
+
+    def work():
+        with gimmecert.spool.deferred_interrupts():
+            handlers.append(signal.getsignal(signal.SIGINT))
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+    assert handlers == [signal.getsignal(signal.SIGINT)]
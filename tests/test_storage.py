@@ -18,16 +18,28 @@
 # Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import datetime
 import os
 import io
+import sqlite3
 
 import cryptography
 
 import gimmecert.commands
 import gimmecert.crypto
+import gimmecert.parallel
 import gimmecert.storage
+import gimmecert.timings
 import gimmecert.utils
 
+import pytest
+from unittest import mock
+
+
+#: Encoding and format arguments for comparing public keys of any type.
+PUBLIC_KEY_DER = (cryptography.hazmat.primitives.serialization.Encoding.DER,
+                  cryptography.hazmat.primitives.serialization.PublicFormat.SubjectPublicKeyInfo)
+
 
 def test_initialise_storage(tmpdir):
     tmpdir.chdir()
@@ -186,6 +198,157 @@ def test_write_csr(tmpdir):
     assert csr_file_content.endswith('-----END CERTIFICATE REQUEST-----\n')
 
 
+def test_artefact_writer_moves_files_into_place_on_commit(tmpdir):
+    tmpdir.mkdir('dir1')
+    tmpdir.mkdir('dir2')
+
+    with gimmecert.storage.ArtefactWriter() as writer:
+        writer.write(tmpdir.join('dir1', 'file1').strpath, b'content1')
+        writer.write(tmpdir.join('dir2', 'file2').strpath, b'content2')
+
+        assert not tmpdir.join('dir1', 'file1').check()
+        assert not tmpdir.join('dir2', 'file2').check()
+
+    assert tmpdir.join('dir1', 'file1').read_binary() == b'content1'
+    assert tmpdir.join('dir2', 'file2').read_binary() == b'content2'
+    assert sorted(os.listdir(tmpdir.join('dir1').strpath)) == ['file1']
+    assert sorted(os.listdir(tmpdir.join('dir2').strpath)) == ['file2']
+
+
+def test_artefact_writer_uses_last_write_to_same_path(tmpdir):
+    with gimmecert.storage.ArtefactWriter() as writer:
+        writer.write(tmpdir.join('file').strpath, b'old content')
+        writer.write(tmpdir.join('file').strpath, b'new content')
+
+    assert tmpdir.join('file').read_binary() == b'new content'
+    assert os.listdir(tmpdir.strpath) == ['file']
+
+
+def test_get_temporary_path_returns_unique_path_next_to_destination(tmpdir):
+    path = tmpdir.join('file').strpath
+
+    temporary_path1 = gimmecert.storage.get_temporary_path(path)
+    temporary_path2 = gimmecert.storage.get_temporary_path(path)
+
+    assert temporary_path1 != temporary_path2
+    for temporary_path in (temporary_path1, temporary_path2):
+        assert temporary_path.startswith(path + '.')
+        assert temporary_path.endswith('.tmp')
+
+
+def test_concurrent_artefact_writers_do_not_share_temporary_files(tmpdir):
+    path = tmpdir.join('file').strpath
+    writer1 = gimmecert.storage.ArtefactWriter()
+    writer2 = gimmecert.storage.ArtefactWriter()
+
+    writer1.write(path, b'content1')
+    writer2.write(path, b'content2')
+    writer2.abort()
+    writer1.commit()
+
+    assert tmpdir.join('file').read_binary() == b'content1'
+    assert os.listdir(tmpdir.strpath) == ['file']
+
+
+def test_artefact_writer_reuses_temporary_file_when_writing_same_path_again(tmpdir):
+    with gimmecert.storage.ArtefactWriter() as writer:
+        writer.write(tmpdir.join('file').strpath, b'content1')
+        writer.write(tmpdir.join('file').strpath, b'content2')
+
+        assert len(os.listdir(tmpdir.strpath)) == 1
+
+    assert tmpdir.join('file').read_binary() == b'content2'
+    assert os.listdir(tmpdir.strpath) == ['file']
+
+
+def test_artefact_writer_syncs_every_file_and_each_directory_once(tmpdir):
+    tmpdir.mkdir('dir1')
+    tmpdir.mkdir('dir2')
+
+    with mock.patch('os.fsync', wraps=os.fsync) as fsync:
+        with gimmecert.storage.ArtefactWriter() as writer:
+            for i in range(5):
+                writer.write(tmpdir.join('dir1', 'file%d' % i).strpath, b'content')
+            writer.write(tmpdir.join('dir2', 'file').strpath, b'content')
+
+    # 6 files, 2 directories.
+    assert fsync.call_count == 8
+
+
+def test_artefact_writer_does_not_sync_if_not_durable(tmpdir):
+    with mock.patch('os.fsync') as fsync:
+        with gimmecert.storage.ArtefactWriter(durable=False) as writer:
+            writer.write(tmpdir.join('file').strpath, b'content')
+
+    assert tmpdir.join('file').read_binary() == b'content'
+    assert not fsync.called
+
+
+def test_artefact_writer_leaves_existing_files_untouched_on_error(tmpdir):
+    tmpdir.join('file1').write_binary(b'original content')
+
+    with pytest.raises(RuntimeError):
+        with gimmecert.storage.ArtefactWriter() as writer:
+            writer.write(tmpdir.join('file1').strpath, b'new content')
+            writer.write(tmpdir.join('file2').strpath, b'new content')
+            raise RuntimeError("Failure")
+
+    assert tmpdir.join('file1').read_binary() == b'original content'
+    assert os.listdir(tmpdir.strpath) == ['file1']
+
+
+def test_artefact_writer_cleans_up_if_write_fails(tmpdir):
+    writer = gimmecert.storage.ArtefactWriter()
+
+    with mock.patch('builtins.open', mock.mock_open()) as mock_open:
+        mock_open.return_value.write.side_effect = OSError("No space left on device")
+
+        with pytest.raises(OSError):
+            writer.write(tmpdir.join('file').strpath, b'content')
+
+    temporary_path = mock_open.call_args[0][0]
+    with open(temporary_path, 'wb') as temporary_file:
+        temporary_file.write(b'partial')
+    writer.abort()
+
+    assert os.listdir(tmpdir.strpath) == []
+
+
+def test_artefact_writer_cleans_up_if_commit_fails(tmpdir):
+    writer = gimmecert.storage.ArtefactWriter()
+    writer.write(tmpdir.join('file1').strpath, b'content1')
+    writer.write(tmpdir.join('file2').strpath, b'content2')
+
+    replace = os.replace
+
+    def failing_replace(source, destination):
+        if destination.endswith('file2'):
+            raise OSError("Failure")
+        replace(source, destination)
+
+    with mock.patch('os.replace', side_effect=failing_replace):
+        with pytest.raises(OSError):
+            writer.commit()
+
+    assert os.listdir(tmpdir.strpath) == ['file1']
+
+
+def test_write_functions_defer_writes_to_passed_in_writer(tmpdir):
+    private_key = gimmecert.crypto.generate_private_key()
+    csr = gimmecert.crypto.generate_csr('test', private_key)
+    ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 1)
+
+    with gimmecert.storage.ArtefactWriter() as writer:
+        gimmecert.storage.write_private_key(private_key, tmpdir.join('test.key.pem').strpath, writer)
+        gimmecert.storage.write_csr(csr, tmpdir.join('test.csr.pem').strpath, writer)
+        gimmecert.storage.write_certificate(ca_hierarchy[0][1], tmpdir.join('test.cert.pem').strpath, writer)
+        gimmecert.storage.write_certificate_chain([ca_hierarchy[0][1]], tmpdir.join('chain.cert.pem').strpath, writer)
+
+        assert not tmpdir.listdir(lambda f: f.ext == '.pem')
+
+    assert sorted(f.basename for f in tmpdir.listdir()) == ['chain.cert.pem', 'test.cert.pem', 'test.csr.pem', 'test.key.pem']
+
+
 def test_read_csr(tmpdir):
     csr_file = tmpdir.join('mycsr.csr.pem')
 
@@ -198,3 +361,774 @@ def test_read_csr(tmpdir):
 
     assert isinstance(csr, cryptography.x509.CertificateSigningRequest)
     assert csr == original_csr
+
+
+def test_read_csrs_returns_all_csrs_from_file(tmpdir):
+    csrs_file = tmpdir.join('csrs.pem')
+    original_csrs = [gimmecert.crypto.generate_csr('mycsr%d' % i, gimmecert.crypto.generate_private_key(('ed25519', None))) for i in range(2)]
+
+    for i, csr in enumerate(original_csrs):
+        gimmecert.storage.write_csr(csr, tmpdir.join('mycsr%d.csr.pem' % i).strpath)
+        csrs_file.write(tmpdir.join('mycsr%d.csr.pem' % i).read(), mode='a')
+
+    csrs = gimmecert.storage.read_csrs(csrs_file.strpath)
+
+    assert csrs == original_csrs
+
+
+def test_read_csrs_raises_exception_for_file_without_csrs(tmpdir):
+    tmpdir.join('empty.pem').write('')
+
+    with pytest.raises(ValueError):
+        gimmecert.storage.read_csrs(tmpdir.join('empty.pem').strpath)
+
+
+def test_count_pooled_private_keys_returns_zero_if_pool_does_not_exist(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+
+
+def test_add_pooled_private_key_adds_key_to_pool(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(), ('rsa', 2048))
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(), ('rsa', 2048))
+
+    pool_files = tmpdir.join('.gimmecert', 'pool').listdir()
+
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 2
+    assert len(pool_files) == 2
+    assert all(f.basename.endswith('.key.pem') for f in pool_files)
+
+
+def test_take_pooled_private_key_returns_none_if_pool_is_empty(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+
+    assert gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('rsa', 2048)) is None
+
+
+def test_take_pooled_private_key_removes_key_from_pool(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+    private_key = gimmecert.crypto.generate_private_key()
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, private_key, ('rsa', 2048))
+
+    pooled_private_key = gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('rsa', 2048))
+
+    assert pooled_private_key.public_key().public_numbers() == private_key.public_key().public_numbers()
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+    assert tmpdir.join('.gimmecert', 'pool').listdir() == []
+    assert gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('rsa', 2048)) is None
+
+
+def test_read_manifest_reads_json_manifest(tmpdir):
+    manifest = tmpdir.join('manifest.json')
+    manifest.write("""[
+        {"type": "server", "name": "myserver", "dns_names": ["myserver.local", "service.example.com"]},
+        {"type": "client", "name": "myclient", "csr": "myclient.csr.pem"}
+    ]""")
+
+    entities = gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert entities == [
+        {'type': 'server', 'name': 'myserver', 'dns_names': ['myserver.local', 'service.example.com'], 'csr': None, 'key_specification': None},
+        {'type': 'client', 'name': 'myclient', 'dns_names': [], 'csr': tmpdir.join('myclient.csr.pem').strpath, 'key_specification': None},
+    ]
+
+
+def test_read_manifest_reads_csv_manifest(tmpdir):
+    manifest = tmpdir.join('manifest.csv')
+    manifest.write("type,name,dns_names,csr\n"
+                   "server,myserver,myserver.local service.example.com,\n"
+                   "client,myclient,,/tmp/myclient.csr.pem\n")
+
+    entities = gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert entities == [
+        {'type': 'server', 'name': 'myserver', 'dns_names': ['myserver.local', 'service.example.com'], 'csr': None, 'key_specification': None},
+        {'type': 'client', 'name': 'myclient', 'dns_names': [], 'csr': '/tmp/myclient.csr.pem', 'key_specification': None},
+    ]
+
+
+def test_read_manifest_reads_yaml_manifest(tmpdir):
+    manifest = tmpdir.join('manifest.yaml')
+    manifest.write("- type: server\n"
+                   "  name: myserver\n"
+                   "  dns_names:\n"
+                   "    - myserver.local\n"
+                   "- type: client\n"
+                   "  name: myclient\n")
+
+    entities = gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert entities == [
+        {'type': 'server', 'name': 'myserver', 'dns_names': ['myserver.local'], 'csr': None, 'key_specification': None},
+        {'type': 'client', 'name': 'myclient', 'dns_names': [], 'csr': None, 'key_specification': None},
+    ]
+
+
+def test_read_manifest_raises_exception_if_yaml_support_is_not_available(tmpdir):
+    manifest = tmpdir.join('manifest.yml')
+    manifest.write("- type: client\n  name: myclient\n")
+
+    with mock.patch.dict('sys.modules', {'yaml': None}):
+        with pytest.raises(gimmecert.storage.InvalidManifest) as e_info:
+            gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert "PyYAML" in str(e_info.value)
+
+
+@pytest.mark.parametrize(
+    "filename, content, expected_error",
+    [
+        ("manifest.txt", "", "Unsupported manifest format"),
+        ("missing.json", None, "Failed to read manifest"),
+        ("manifest.json", "[{", "Failed to read manifest"),
+        ("manifest.yaml", "- [unclosed", "Failed to read manifest"),
+        ("manifest.json", '{"type": "server"}', "must contain a list of entities"),
+        ("manifest.json", '["server"]', "entry 1 is not a mapping"),
+        ("manifest.json", '[{"type": "ca", "name": "myca"}]', "entry 1 has invalid type"),
+        ("manifest.json", '[{"type": "server"}]', "entry 1 is missing the entity name"),
+        ("manifest.json", '[{"type": "server", "name": "myserver", "dns_names": "myserver.local"}]', "entry 1 must list additional DNS names"),
+        ("manifest.json", '[{"type": "client", "name": "myclient", "dns_names": ["myclient.local"]}]', "valid only for server entities"),
+        ("manifest.json", '[{"type": "client", "name": "myclient", "key_specification": "rsa:1024"}]', "entry 1 has invalid key specification"),
+    ]
+)
+def test_read_manifest_raises_exception_for_invalid_manifest(tmpdir, filename, content, expected_error):
+    manifest = tmpdir.join(filename)
+
+    if content is not None:
+        manifest.write(content)
+
+    with pytest.raises(gimmecert.storage.InvalidManifest) as e_info:
+        gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert expected_error in str(e_info.value)
+
+
+def test_take_pooled_private_key_skips_keys_claimed_by_other_processes(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(), ('rsa', 2048))
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(), ('rsa', 2048))
+
+    original_rename = os.rename
+
+    def rename_claimed_by_other_process(source, destination):
+        # Simulate another process claiming the first key right before us.
+        if not rename_claimed_by_other_process.called:
+            rename_claimed_by_other_process.called = True
+            os.remove(source)
+        return original_rename(source, destination)
+    rename_claimed_by_other_process.called = False
+
+    with mock.patch('os.rename', side_effect=rename_claimed_by_other_process):
+        private_key = gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('rsa', 2048))
+
+    assert private_key is not None
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 0
+
+
+@pytest.mark.parametrize("key_specification", gimmecert.crypto.get_supported_key_specifications())
+def test_read_private_key_returns_private_key_for_all_key_specifications(tmpdir, key_specification):
+    private_key_path = tmpdir.join('private.key.pem').strpath
+    private_key = gimmecert.crypto.generate_private_key(key_specification)
+    gimmecert.storage.write_private_key(private_key, private_key_path)
+
+    my_private_key = gimmecert.storage.read_private_key(private_key_path)
+
+    assert gimmecert.crypto.key_specification_from_public_key(my_private_key.public_key()) == key_specification
+    assert my_private_key.public_key().public_bytes(*PUBLIC_KEY_DER) == private_key.public_key().public_bytes(*PUBLIC_KEY_DER)
+
+
+def test_pooled_private_keys_are_kept_separate_per_key_specification(tmpdir):
+    gimmecert.storage.initialise_storage(tmpdir.strpath)
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(('ecdsa', 'secp256r1')), ('ecdsa', 'secp256r1'))
+    gimmecert.storage.add_pooled_private_key(tmpdir.strpath, gimmecert.crypto.generate_private_key(('ed25519', None)), ('ed25519', None))
+
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 2
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath, ('ecdsa', 'secp256r1')) == 1
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath, ('rsa', 2048)) == 0
+    assert gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('rsa', 2048)) is None
+
+    private_key = gimmecert.storage.take_pooled_private_key(tmpdir.strpath, ('ed25519', None))
+
+    assert gimmecert.crypto.key_specification_from_public_key(private_key.public_key()) == ('ed25519', None)
+    assert gimmecert.storage.count_pooled_private_keys(tmpdir.strpath) == 1
+
+
+def test_read_manifest_reads_key_specification(tmpdir):
+    manifest = tmpdir.join('manifest.json')
+    manifest.write('[{"type": "server", "name": "myserver", "key_specification": "ecdsa:secp384r1"}]')
+
+    entities = gimmecert.storage.read_manifest(manifest.strpath)
+
+    assert entities[0]['key_specification'] == ('ecdsa', 'secp384r1')
+
+
+def test_get_ca_hierarchy_fingerprint_returns_empty_tuple_if_directory_does_not_exist(tmpdir):
+
+    assert gimmecert.storage.get_ca_hierarchy_fingerprint(tmpdir.join('nonexistent').strpath) == ()
+
+
+def test_get_ca_hierarchy_fingerprint_includes_only_complete_ca_levels(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 3)
+    tmpdir.join('.gimmecert', 'ca', 'level2.key.pem').remove()
+
+    fingerprint = gimmecert.storage.get_ca_hierarchy_fingerprint(tmpdir.join('.gimmecert', 'ca').strpath)
+
+    assert len(fingerprint) == 1
+
+
+def test_read_ca_hierarchy_returns_empty_list_if_directory_does_not_exist(tmpdir):
+
+    assert gimmecert.storage.read_ca_hierarchy(tmpdir.join('nonexistent').strpath) == []
+
+
+def test_read_ca_hierarchy_writes_cache(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 2)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    cache_file = ca_directory.join(gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        gimmecert.storage.read_ca_hierarchy(ca_directory.strpath).certificates
+
+    assert cache_file.check(file=1)
+    assert cache_file.read_binary().startswith(gimmecert.storage.CA_HIERARCHY_CACHE_MAGIC)
+    assert [f.basename for f in ca_directory.listdir() if f.basename.endswith('.tmp')] == []
+
+
+def test_read_ca_hierarchy_uses_cache_without_parsing_certificate_pem(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 3)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        original_ca_hierarchy = list(gimmecert.storage.read_ca_hierarchy(ca_directory.strpath))
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        with mock.patch('gimmecert.storage.read_certificate') as mock_read_certificate:
+            ca_hierarchy = list(gimmecert.storage.read_ca_hierarchy(ca_directory.strpath))
+
+    assert mock_read_certificate.called is False
+    assert len(ca_hierarchy) == 3
+
+    for (private_key, certificate), (original_private_key, original_certificate) in zip(ca_hierarchy, original_ca_hierarchy):
+        assert private_key.public_key().public_numbers() == original_private_key.public_key().public_numbers()
+        assert certificate == original_certificate
+
+
+def test_read_ca_hierarchy_returns_memoised_ca_hierarchy(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 2)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+
+    ca_hierarchy_1 = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    with mock.patch('gimmecert.storage.read_ca_hierarchy_cache') as mock_read_ca_hierarchy_cache:
+        ca_hierarchy_2 = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    assert mock_read_ca_hierarchy_cache.called is False
+    assert ca_hierarchy_2 is ca_hierarchy_1
+    assert ca_hierarchy_2[0][0] is ca_hierarchy_1[0][0]
+
+
+def test_read_ca_hierarchy_invalidates_caches_if_ca_files_change(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    # Replace the CA with a new one, making sure modification time differs.
+    new_private_key, new_certificate = gimmecert.crypto.generate_ca_hierarchy('My New Project', 1)[0]
+    gimmecert.storage.write_private_key(new_private_key, ca_directory.join('level1.key.pem').strpath)
+    gimmecert.storage.write_certificate(new_certificate, ca_directory.join('level1.cert.pem').strpath)
+    for ca_file in ('level1.key.pem', 'level1.cert.pem'):
+        stat = os.stat(ca_directory.join(ca_file).strpath)
+        os.utime(ca_directory.join(ca_file).strpath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    ca_hierarchy = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        ca_hierarchy_from_disk_cache = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    assert ca_hierarchy[0][1] == new_certificate
+    assert ca_hierarchy_from_disk_cache[0][1] == new_certificate
+
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"invalid",
+    gimmecert.storage.CA_HIERARCHY_CACHE_MAGIC + b"[]\n",
+])
+def test_read_ca_hierarchy_ignores_invalid_cache(tmpdir, content):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    cache_file = ca_directory.join(gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME)
+    cache_file.write_binary(content)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        ca_hierarchy = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    assert ca_hierarchy[0][1] == gimmecert.storage.read_certificate(ca_directory.join('level1.cert.pem').strpath)
+    assert cache_file.read_binary() != content
+
+
+def test_read_ca_hierarchy_ignores_truncated_cache(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    cache_file = ca_directory.join(gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)[0]
+    cache_file.write_binary(cache_file.read_binary()[:-100])
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        ca_hierarchy = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+    assert ca_hierarchy[0][1] == gimmecert.storage.read_certificate(ca_directory.join('level1.cert.pem').strpath)
+
+
+def test_read_ca_hierarchy_ignores_failure_to_write_cache(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        with mock.patch('os.replace', side_effect=PermissionError("Permission denied")):
+            ca_hierarchy = list(gimmecert.storage.read_ca_hierarchy(ca_directory.strpath))
+
+    assert len(ca_hierarchy) == 1
+    assert sorted(f.basename for f in ca_directory.listdir()) == ['chain-full.cert.pem', 'level1.cert.pem', 'level1.key.pem']
+
+
+def test_read_ca_hierarchy_cache_returns_none_for_truncated_entry_header(tmpdir):
+    cache_file = tmpdir.join('hierarchy.cache')
+    gimmecert.storage.write_ca_hierarchy_cache(cache_file.strpath, [[[1, 2, 3], [4, 5, 6]]], [b''])
+    cache_file.write_binary(cache_file.read_binary()[:-2])
+
+    assert gimmecert.storage.read_ca_hierarchy_cache(cache_file.strpath, [[[1, 2, 3], [4, 5, 6]]]) is None
+
+
+def test_read_ca_hierarchy_loads_artefacts_on_first_access(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 3)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True), \
+            mock.patch('gimmecert.storage.read_private_key', wraps=gimmecert.storage.read_private_key) as mock_read_private_key, \
+            mock.patch('gimmecert.storage.read_certificate', wraps=gimmecert.storage.read_certificate) as mock_read_certificate:
+
+        ca_hierarchy = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+
+        assert len(ca_hierarchy) == 3
+        assert mock_read_private_key.called is False
+        assert mock_read_certificate.called is False
+
+        certificates = ca_hierarchy.certificates
+
+        assert mock_read_private_key.called is False
+
+        private_key, certificate = ca_hierarchy[-1]
+
+    mock_read_private_key.assert_called_once_with(ca_directory.join('level3.key.pem').strpath)
+    assert [gimmecert.utils.get_common_name(c.subject) for c in certificates] == ['My Project Level 1 CA', 'My Project Level 2 CA', 'My Project Level 3 CA']
+    assert certificate is certificates[-1]
+    assert private_key.public_key().public_numbers() == certificate.public_key().public_numbers()
+
+
+def test_read_ca_hierarchy_does_not_cache_private_keys(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 3)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    cache_file = ca_directory.join(gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        ca_hierarchy = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)
+        private_key, certificate = ca_hierarchy[-1]
+
+    fingerprint = gimmecert.storage.get_ca_hierarchy_fingerprint(ca_directory.strpath)
+
+    assert gimmecert.storage.read_ca_hierarchy_cache(cache_file.strpath, fingerprint) == \
+        [gimmecert.parallel.certificate_to_der(c) for c in ca_hierarchy.certificates]
+    assert gimmecert.parallel.private_key_to_der(private_key) not in cache_file.read_binary()
+
+
+def test_read_ca_hierarchy_ignores_invalid_cached_artefacts(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    ca_directory = tmpdir.join('.gimmecert', 'ca')
+    cache_path = ca_directory.join(gimmecert.storage.CA_HIERARCHY_CACHE_FILENAME).strpath
+    fingerprint = gimmecert.storage.get_ca_hierarchy_fingerprint(ca_directory.strpath)
+    gimmecert.storage.write_ca_hierarchy_cache(cache_path, fingerprint, [b'invalid'])
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True):
+        private_key, certificate = gimmecert.storage.read_ca_hierarchy(ca_directory.strpath)[0]
+
+    assert certificate == gimmecert.storage.read_certificate(ca_directory.join('level1.cert.pem').strpath)
+    assert private_key.public_key().public_numbers() == certificate.public_key().public_numbers()
+    assert gimmecert.storage.read_ca_hierarchy_cache(cache_path, fingerprint) == [gimmecert.parallel.certificate_to_der(certificate)]
+
+
+def test_ca_hierarchy_loads_artefacts_once():
+    private_key_loader = mock.Mock(return_value='private key')
+    certificate_loader = mock.Mock(return_value='certificate')
+    ca_hierarchy = gimmecert.storage.CAHierarchy([private_key_loader], [certificate_loader])
+
+    assert ca_hierarchy[0] == ('private key', 'certificate')
+    assert ca_hierarchy[-1] == ('private key', 'certificate')
+    assert ca_hierarchy.certificates == ['certificate']
+    assert private_key_loader.call_count == 1
+    assert certificate_loader.call_count == 1
+
+
+def test_ca_hierarchy_behaves_as_sequence():
+    ca_hierarchy = gimmecert.storage.CAHierarchy([lambda: 'key1', lambda: 'key2', lambda: 'key3'], [lambda: 'cert1', lambda: 'cert2', lambda: 'cert3'])
+
+    assert len(ca_hierarchy) == 3
+    assert list(ca_hierarchy) == [('key1', 'cert1'), ('key2', 'cert2'), ('key3', 'cert3')]
+    assert ca_hierarchy[-2] == ('key2', 'cert2')
+    assert ca_hierarchy[1:] == [('key2', 'cert2'), ('key3', 'cert3')]
+    assert ca_hierarchy.get_private_key(2) == 'key3'
+    assert ca_hierarchy.get_certificate(0) == 'cert1'
+    assert ca_hierarchy == [('key1', 'cert1'), ('key2', 'cert2'), ('key3', 'cert3')]
+    assert ca_hierarchy != [('key1', 'cert1')]
+    assert ca_hierarchy != 1
+    assert gimmecert.storage.CAHierarchy([], []) == []
+
+    with pytest.raises(IndexError):
+        ca_hierarchy[3]
+
+    with pytest.raises(IndexError):
+        ca_hierarchy.get_certificate(-4)
+
+
+def test_ca_hierarchy_records_loading_time():
+    ca_hierarchy = gimmecert.storage.CAHierarchy([lambda: 'key1'], [lambda: 'cert1'])
+
+    with mock.patch('gimmecert.timings.phase', wraps=gimmecert.timings.phase) as mock_phase:
+        ca_hierarchy.get_private_key(0)
+
+    mock_phase.assert_called_once_with('ca.load')
+
+
+def test_read_index_returns_empty_index_if_index_does_not_exist(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+
+    assert gimmecert.storage.read_index(tmpdir.strpath) == {'server': {}, 'client': {}}
+
+
+@pytest.mark.parametrize("content", [
+    "",
+    "invalid",
+    "[]",
+    '{"version": 0, "server": {}, "client": {}}',
+    '{"version": 1, "server": {"myserver": {"not_before": "invalid"}}, "client": {}}',
+])
+def test_read_index_returns_empty_index_if_index_is_invalid(tmpdir, content):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    tmpdir.join('.gimmecert', 'index.json').write(content)
+
+    assert gimmecert.storage.read_index(tmpdir.strpath) == {'server': {}, 'client': {}}
+
+
+def test_write_index_writes_index_that_can_be_read_back(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+    gimmecert.commands.server(io.StringIO(), io.StringIO(), tmpdir.strpath, 'myserver', ['myserver.local'], None)
+    certificate = gimmecert.storage.read_certificate(tmpdir.join('.gimmecert', 'server', 'myserver.cert.pem').strpath)
+    index = {
+        'server': {'myserver': gimmecert.storage.get_index_entry(certificate, (1, 2, 3), 'key')},
+        'client': {},
+    }
+
+    gimmecert.storage.write_index(tmpdir.strpath, index)
+
+    assert gimmecert.storage.read_index(tmpdir.strpath) == index
+    assert index['server']['myserver']['subject'] == 'CN=myserver'
+    assert index['server']['myserver']['dns_names'] == ['myserver', 'myserver.local']
+    assert index['server']['myserver']['not_after'] == certificate.not_valid_after
+    assert [f.basename for f in tmpdir.join('.gimmecert').listdir() if f.basename.endswith('.tmp')] == []
+
+
+def test_write_index_ignores_failure_to_write_index(tmpdir):
+    gimmecert.commands.init(io.StringIO(), io.StringIO(), tmpdir.strpath, 'My Project', 1)
+
+    with mock.patch('os.replace', side_effect=PermissionError("Permission denied")):
+        gimmecert.storage.write_index(tmpdir.strpath, {'server': {}, 'client': {}})
+
+    assert [f.basename for f in tmpdir.join('.gimmecert').listdir() if f.basename.startswith('index.json')] == []
+
+
+def test_issuing_certificates_updates_index(sample_project_directory):
+    index = gimmecert.storage.read_index(sample_project_directory.strpath)
+
+    assert sorted(index['server']) == ['server-with-csr-1', 'server-with-csr-2', 'server-with-privkey-1', 'server-with-privkey-2']
+    assert sorted(index['client']) == ['client-with-csr-1', 'client-with-csr-2', 'client-with-privkey-1', 'client-with-privkey-2']
+    assert index['server']['server-with-privkey-1']['key_or_csr'] == 'key'
+    assert index['server']['server-with-csr-1']['key_or_csr'] == 'csr'
+
+
+def test_refresh_index_does_not_parse_unchanged_certificates(sample_project_directory):
+    index = gimmecert.storage.read_index(sample_project_directory.strpath)
+
+    with mock.patch('gimmecert.storage.read_certificate') as mock_read_certificate, \
+         mock.patch('gimmecert.storage.write_index') as mock_write_index:
+        refreshed_index = gimmecert.storage.refresh_index(sample_project_directory.strpath)
+
+    assert mock_read_certificate.called is False
+    assert mock_write_index.called is False
+    assert refreshed_index == index
+
+
+def test_refresh_index_picks_up_certificate_changes(sample_project_directory):
+    server_directory = sample_project_directory.join('.gimmecert', 'server')
+    client_directory = sample_project_directory.join('.gimmecert', 'client')
+
+    # Certificates added or replaced outside of Gimmecert.
+    server_directory.join('server-with-privkey-1.cert.pem').copy(server_directory.join('myserver.cert.pem'))
+    server_directory.join('server-with-privkey-2.cert.pem').copy(server_directory.join('server-with-privkey-1.cert.pem'))
+
+    # Removed certificate and private key.
+    client_directory.join('client-with-privkey-1.cert.pem').remove()
+    client_directory.join('client-with-privkey-2.key.pem').remove()
+
+    index = gimmecert.storage.refresh_index(sample_project_directory.strpath)
+
+    assert index == gimmecert.storage.read_index(sample_project_directory.strpath)
+    assert index['server']['myserver']['subject'] == 'CN=server-with-privkey-1'
+    assert index['server']['myserver']['key_or_csr'] is None
+    assert index['server']['server-with-privkey-1']['subject'] == 'CN=server-with-privkey-2'
+    assert 'client-with-privkey-1' not in index['client']
+    assert index['client']['client-with-privkey-2']['key_or_csr'] is None
+
+
+def test_refresh_index_rebuilds_index_if_requested(sample_project_directory):
+    gimmecert.storage.write_index(sample_project_directory.strpath, {'server': {}, 'client': {}})
+
+    with mock.patch('gimmecert.storage.read_certificate', wraps=gimmecert.storage.read_certificate) as mock_read_certificate:
+        index = gimmecert.storage.refresh_index(sample_project_directory.strpath, rebuild=True)
+
+    assert mock_read_certificate.call_count == 8
+    assert len(index['server']) == 4
+    assert len(index['client']) == 4
+    assert gimmecert.storage.read_index(sample_project_directory.strpath) == index
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def storage_backend(request, tmpdir):
+    """
+    Creates a storage backend of each type, initialises it in the
+    temporary directory, and populates it with single-level CA
+    hierarchy using Ed25519 keys.
+    """
+
+    storage = gimmecert.storage.STORAGE_BACKENDS[request.param](tmpdir.strpath)
+    storage.initialise()
+    storage.ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 1, ('ed25519', None))
+    storage.write_ca_hierarchy(storage.ca_hierarchy)
+
+    return storage
+
+
+def issue_entity(storage, entity_type, entity_name, with_csr=False, not_before=None, not_after=None):
+    """
+    Helper that issues certificate for entity using the CA hierarchy
+    stored in passed-in storage backend, and returns entity tuple
+    suitable for passing to storage backend write_entities method.
+    """
+
+    issuer_private_key, issuer_certificate = storage.ca_hierarchy[-1]
+    private_key = gimmecert.crypto.generate_private_key(('ed25519', None))
+
+    if not_before is None:
+        not_before, not_after = gimmecert.crypto.get_validity_range()
+
+    certificate = gimmecert.crypto.issue_certificate(issuer_certificate.subject, gimmecert.crypto.get_dn(entity_name),
+                                                     issuer_private_key, private_key.public_key(), not_before, not_after)
+
+    if with_csr:
+        return (entity_type, entity_name, certificate, None, gimmecert.crypto.generate_csr(entity_name, private_key))
+
+    return (entity_type, entity_name, certificate, private_key, None)
+
+
+def test_get_storage_backend_returns_backend_used_by_project(tmpdir):
+    files_project = tmpdir.mkdir('files')
+    sqlite_project = tmpdir.mkdir('sqlite')
+    gimmecert.storage.FilesystemBackend(files_project.strpath).initialise()
+    gimmecert.storage.SQLiteBackend(sqlite_project.strpath).initialise()
+
+    assert isinstance(gimmecert.storage.get_storage_backend(files_project.strpath), gimmecert.storage.FilesystemBackend)
+    assert isinstance(gimmecert.storage.get_storage_backend(sqlite_project.strpath), gimmecert.storage.SQLiteBackend)
+
+
+def test_sqlite_backend_stores_artefacts_in_single_database(tmpdir):
+    storage = gimmecert.storage.SQLiteBackend(tmpdir.strpath)
+    storage.initialise()
+
+    assert os.listdir(tmpdir.join('.gimmecert').strpath) == [gimmecert.storage.SQLITE_DATABASE_FILENAME]
+
+    with sqlite3.connect(storage.database_path) as connection:
+        indexed_columns = {row[0] for index in ('entity_name', 'entity_not_after', 'entity_serial')
+                           for row in connection.execute("SELECT name FROM pragma_index_info(?)", (index,))}
+
+    assert indexed_columns == {'name', 'not_after', 'serial'}
+
+
+def test_storage_backend_reads_ca_hierarchy(storage_backend):
+    ca_hierarchy = storage_backend.read_ca_hierarchy()
+
+    assert len(ca_hierarchy) == 1
+    assert ca_hierarchy[0][1] == storage_backend.ca_hierarchy[0][1]
+    assert ca_hierarchy[0][0].public_key().public_bytes(*PUBLIC_KEY_DER) == storage_backend.ca_hierarchy[0][0].public_key().public_bytes(*PUBLIC_KEY_DER)
+
+
+def test_sqlite_backend_caches_ca_hierarchy_in_process(tmpdir):
+    storage = gimmecert.storage.SQLiteBackend(tmpdir.strpath)
+    storage.initialise()
+    storage.write_ca_hierarchy(gimmecert.crypto.generate_ca_hierarchy('My Project', 2, ('ed25519', None)))
+
+    ca_hierarchy = storage.read_ca_hierarchy()
+
+    with mock.patch('gimmecert.parallel.private_key_from_der') as mock_private_key_from_der:
+        cached_ca_hierarchy = gimmecert.storage.SQLiteBackend(tmpdir.strpath).read_ca_hierarchy()
+
+    assert cached_ca_hierarchy == ca_hierarchy
+    assert mock_private_key_from_der.called is False
+
+
+def test_sqlite_backend_reads_ca_private_keys_on_first_access(tmpdir):
+    storage = gimmecert.storage.SQLiteBackend(tmpdir.strpath)
+    storage.initialise()
+    generated_ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 3, ('ed25519', None))
+    storage.write_ca_hierarchy(generated_ca_hierarchy)
+
+    with mock.patch.dict('gimmecert.storage._ca_hierarchy_memo', clear=True), \
+            mock.patch('gimmecert.parallel.private_key_from_der', wraps=gimmecert.parallel.private_key_from_der) as mock_private_key_from_der:
+        ca_hierarchy = storage.read_ca_hierarchy()
+        certificates = ca_hierarchy.certificates
+
+        assert mock_private_key_from_der.called is False
+
+        private_key, _ = ca_hierarchy[-1]
+
+    mock_private_key_from_der.assert_called_once_with(gimmecert.parallel.private_key_to_der(generated_ca_hierarchy[-1][0]))
+    assert certificates == [certificate for _, certificate in generated_ca_hierarchy]
+    assert private_key.public_key().public_bytes(*PUBLIC_KEY_DER) == generated_ca_hierarchy[-1][0].public_key().public_bytes(*PUBLIC_KEY_DER)
+
+
+def test_storage_backend_reports_non_existing_entity(storage_backend):
+    assert storage_backend.entity_exists('server', 'myserver') is False
+    assert storage_backend.get_key_or_csr('server', 'myserver') is None
+    assert storage_backend.read_certificate('server', 'myserver') is None
+
+
+def test_storage_backend_writes_entities(storage_backend):
+    server = issue_entity(storage_backend, 'server', 'myserver')
+    client = issue_entity(storage_backend, 'client', 'myclient', with_csr=True)
+
+    storage_backend.write_entities([server, client])
+
+    assert storage_backend.entity_exists('server', 'myserver') is True
+    assert storage_backend.entity_exists('client', 'myserver') is False
+    assert storage_backend.get_key_or_csr('server', 'myserver') == 'key'
+    assert storage_backend.get_key_or_csr('client', 'myclient') == 'csr'
+    assert storage_backend.read_certificate('server', 'myserver') == server[2]
+    assert storage_backend.read_certificate('client', 'myclient') == client[2]
+
+
+@pytest.mark.parametrize("old_with_csr, new_artefact, expected_key_or_csr", [
+    (False, None, 'key'),
+    (True, None, 'csr'),
+    (False, 'csr', 'csr'),
+    (True, 'key', 'key'),
+])
+def test_storage_backend_replaces_private_key_and_csr_when_writing_entities(storage_backend, old_with_csr, new_artefact, expected_key_or_csr):
+    storage_backend.write_entities([issue_entity(storage_backend, 'server', 'myserver', with_csr=old_with_csr)])
+
+    entity_type, entity_name, certificate, private_key, csr = issue_entity(storage_backend, 'server', 'myserver', with_csr=new_artefact == 'csr')
+
+    if new_artefact is None:
+        private_key, csr = None, None
+
+    storage_backend.write_entities([(entity_type, entity_name, certificate, private_key, csr)])
+
+    assert storage_backend.get_key_or_csr('server', 'myserver') == expected_key_or_csr
+    assert storage_backend.read_certificate('server', 'myserver') == certificate
+    assert storage_backend.get_index()['server']['myserver']['key_or_csr'] == expected_key_or_csr
+
+    (_, _, _, stored_private_key, stored_csr), = storage_backend.read_entities()
+
+    assert (stored_private_key is not None) == (expected_key_or_csr == 'key')
+    assert (stored_csr is not None) == (expected_key_or_csr == 'csr')
+
+
+def test_storage_backend_reads_entities_ordered_by_type_and_name(storage_backend):
+    entities = [
+        issue_entity(storage_backend, 'client', 'myclient'),
+        issue_entity(storage_backend, 'server', 'myserver2', with_csr=True),
+        issue_entity(storage_backend, 'server', 'myserver1'),
+    ]
+    storage_backend.write_entities(entities)
+
+    read_entities = list(storage_backend.read_entities())
+
+    assert [(entity_type, entity_name) for entity_type, entity_name, _, _, _ in read_entities] == [
+        ('server', 'myserver1'), ('server', 'myserver2'), ('client', 'myclient')
+    ]
+    assert read_entities[0][2] == entities[2][2]
+    assert read_entities[0][3].public_key().public_bytes(*PUBLIC_KEY_DER) == entities[2][3].public_key().public_bytes(*PUBLIC_KEY_DER)
+    assert read_entities[0][4] is None
+    assert read_entities[1][3] is None
+    assert read_entities[1][4] == entities[1][4]
+
+
+def test_storage_backend_returns_index_of_issued_certificates(storage_backend):
+    server = issue_entity(storage_backend, 'server', 'myserver')
+    storage_backend.write_entities([server])
+
+    index = storage_backend.get_index()
+
+    assert index['client'] == {}
+    assert list(index['server']) == ['myserver']
+
+    entry = index['server']['myserver']
+    assert entry['subject'] == 'CN=myserver'
+    assert entry['dns_names'] == []
+    assert entry['not_before'] == server[2].not_valid_before
+    assert entry['not_after'] == server[2].not_valid_after
+    assert entry['serial'] == server[2].serial_number
+    assert entry['key_or_csr'] == 'key'
+    assert storage_backend.get_index(rebuild=True)['server']['myserver']['serial'] == server[2].serial_number
+
+
+def test_sqlite_backend_rebuilds_indexed_columns_if_requested(tmpdir):
+    storage = gimmecert.storage.SQLiteBackend(tmpdir.strpath)
+    storage.initialise()
+    storage.ca_hierarchy = gimmecert.crypto.generate_ca_hierarchy('My Project', 1, ('ed25519', None))
+    storage.write_ca_hierarchy(storage.ca_hierarchy)
+    storage.write_entities([issue_entity(storage, 'server', 'myserver')])
+
+    with sqlite3.connect(storage.database_path) as connection:
+        connection.execute("UPDATE entity SET subject = 'CN=wrong'")
+
+    assert storage.get_index()['server']['myserver']['subject'] == 'CN=wrong'
+    assert storage.get_index(rebuild=True)['server']['myserver']['subject'] == 'CN=myserver'
+    assert storage.get_index()['server']['myserver']['subject'] == 'CN=myserver'
+
+
+@pytest.mark.parametrize("entity_types, name_glob, expiring_within, expected_entities", [
+    (['server', 'client'], None, None, [('server', 'myserver1'), ('server', 'myserver2'), ('client', 'myclient1')]),
+    (['client', 'server'], None, None, [('server', 'myserver1'), ('server', 'myserver2'), ('client', 'myclient1')]),
+    (['server'], None, None, [('server', 'myserver1'), ('server', 'myserver2')]),
+    (['server', 'client'], '*1', None, [('server', 'myserver1'), ('client', 'myclient1')]),
+    (['server', 'client'], 'myserver[!1]', None, [('server', 'myserver2')]),
+    (['server', 'client'], None, 30, [('server', 'myserver2'), ('client', 'myclient1')]),
+    (['client'], 'myserver*', None, []),
+])
+def test_storage_backend_selects_entities(storage_backend, entity_types, name_glob, expiring_within, expected_entities):
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    soon = (now - datetime.timedelta(days=1), now + datetime.timedelta(days=10))
+    later = (now - datetime.timedelta(days=1), now + datetime.timedelta(days=100))
+
+    storage_backend.write_entities([
+        issue_entity(storage_backend, 'server', 'myserver1', not_before=later[0], not_after=later[1]),
+        issue_entity(storage_backend, 'server', 'myserver2', not_before=soon[0], not_after=soon[1]),
+        issue_entity(storage_backend, 'client', 'myclient1', with_csr=True, not_before=soon[0], not_after=soon[1]),
+    ])
+
+    expiring_before = now + datetime.timedelta(days=expiring_within) if expiring_within is not None else None
+
+    assert storage_backend.select_entities(entity_types, name_glob, expiring_before) == expected_entities
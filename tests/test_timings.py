@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Branko Majic
+#
+# This file is part of Gimmecert.
+#
+# Gimmecert is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Gimmecert is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Gimmecert.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import io
+import threading
+from unittest import mock
+
+import gimmecert.timings
+
+import pytest
+
+
+@pytest.fixture
+def recorder():
+    """
+    Records timings for the duration of the test, using fake clock that
+    advances by one second on every reading.
+    """
+
+    clock = iter(range(1000))
+
+    with mock.patch('time.perf_counter', side_effect=lambda: float(next(clock))):
+        recorder = gimmecert.timings.start_recording()
+
+        yield recorder
+
+        gimmecert.timings.stop_recording()
+
+
+def test_phases_have_descriptions():
+    for name, description in gimmecert.timings.PHASES.items():
+        assert '.' in name
+        assert description
+
+
+def test_phase_does_nothing_if_timings_are_not_recorded():
+    with gimmecert.timings.phase('ca.load'):
+        pass
+
+    assert gimmecert.timings.stop_recording() is None
+
+
+def test_timed_does_nothing_if_timings_are_not_recorded():
+
+    @gimmecert.timings.timed('ca.load')
+    def load(value):
+        return value
+
+    assert load(42) == 42
+    assert gimmecert.timings.stop_recording() is None
+
+
+def test_timed_preserves_function_metadata():
+
+    @gimmecert.timings.timed('ca.load')
+    def load():
+        """Loads stuff."""
+
+    assert load.__name__ == 'load'
+    assert load.__doc__ == 'Loads stuff.'
+
+
+def test_phase_records_time_and_count(recorder):
+    # Clock reading 0 is used as start time.
+    with gimmecert.timings.phase('ca.load'):  # Clock reading 1.
+        pass  # Clock reading 2.
+
+    with gimmecert.timings.phase('ca.load'):  # Clock reading 3.
+        pass  # Clock reading 4.
+
+    assert recorder.durations == {'ca.load': 2.0}
+    assert recorder.counts == {'ca.load': 2}
+
+
+def test_timed_records_time_and_count_and_passes_through_results(recorder):
+
+    @gimmecert.timings.timed('certificate.sign')
+    def sign(value):
+        return value * 2
+
+    assert sign(21) == 42
+    assert recorder.durations == {'certificate.sign': 1.0}
+    assert recorder.counts == {'certificate.sign': 1}
+
+
+def test_timed_records_time_if_exception_is_raised(recorder):
+
+    @gimmecert.timings.timed('storage.write')
+    def write():
+        raise OSError("Disk full.")
+
+    with pytest.raises(OSError):
+        write()
+
+    assert recorder.durations == {'storage.write': 1.0}
+
+
+def test_nested_phases_record_exclusive_time(recorder):
+    with gimmecert.timings.phase('storage.write'):  # 1
+        with gimmecert.timings.phase('index.update'):  # 2
+            pass  # 3
+        with gimmecert.timings.phase('lock.wait'):  # 4
+            pass  # 5
+        pass  # 6
+
+    # Outer phase is credited with 1-2, 3-4, and 5-6.
+    assert recorder.durations == {'storage.write': 3.0, 'index.update': 1.0, 'lock.wait': 1.0}
+
+
+def test_nested_phases_with_same_name_are_merged(recorder):
+    with gimmecert.timings.phase('storage.write'):  # 1
+        with gimmecert.timings.phase('storage.write'):
+            pass
+        pass  # 2
+
+    assert recorder.durations == {'storage.write': 1.0}
+    assert recorder.counts == {'storage.write': 1}
+
+
+def test_phases_entered_from_other_threads_are_not_recorded(recorder):
+
+    def work():
+        with gimmecert.timings.phase('key.generate'):
+            pass
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+    assert recorder.durations == {}
+
+
+def test_add_records_time_spent_outside_of_recorder(recorder):
+    recorder.add('cli.parse', 0.5)
+
+    assert recorder.durations == {'cli.parse': 0.5}
+    assert recorder.counts == {'cli.parse': 1}
+
+
+def test_report_lists_entered_phases_in_fixed_order(recorder):
+    with gimmecert.timings.phase('storage.write'):  # 1
+        pass  # 2
+
+    with gimmecert.timings.phase('ca.load'):  # 3
+        pass  # 4
+
+    output = io.StringIO()
+    recorder.report(output)  # 5
+
+    lines = output.getvalue().splitlines()
+
+    assert lines[0] == "Timings (wall time):"
+    assert [line.split()[0] for line in lines[1:]] == ['ca.load', 'storage.write', 'other', 'total']
+    assert lines[1].split() == ['ca.load', '1000.00', 'ms', '1', 'calls']
+    assert lines[3].split() == ['other', '3000.00', 'ms']
+    assert lines[4].split() == ['total', '5000.00', 'ms']
+
+
+def test_start_recording_uses_passed_in_start_time():
+    recorder = gimmecert.timings.start_recording(12.5)
+
+    assert gimmecert.timings.stop_recording() is recorder
+    assert recorder.start == 12.5
@@ -24,6 +24,7 @@ import io
 
 import cryptography.x509
 import cryptography.hazmat.backends
+import cryptography.hazmat.primitives.serialization
 
 import gimmecert.crypto
 import gimmecert.utils
@@ -64,6 +65,18 @@ def test_dn_to_str_raises_for_unsupported_field_type():
         gimmecert.utils.dn_to_str(dn)
 
 
+@pytest.mark.parametrize("name_attributes, expected_common_name", [
+    ([], None),
+    ([(cryptography.x509.oid.NameOID.ORGANIZATION_NAME, "My Organisation")], None),
+    ([(cryptography.x509.oid.NameOID.COMMON_NAME, "myname")], "myname"),
+    ([(cryptography.x509.oid.NameOID.COMMON_NAME, "first"), (cryptography.x509.oid.NameOID.COMMON_NAME, "last")], "last"),
+])
+def test_get_common_name_returns_last_common_name(name_attributes, expected_common_name):
+    dn = cryptography.x509.Name([cryptography.x509.NameAttribute(oid, value) for oid, value in name_attributes])
+
+    assert gimmecert.utils.get_common_name(dn) == expected_common_name
+
+
 def test_date_range_to_str():
     begin = datetime.datetime(2017, 1, 2, 3, 4, 5)
     end = datetime.datetime(2018, 6, 7, 8, 9, 10)
@@ -130,6 +143,36 @@ lines.
     assert returned_input == provided_input
 
 
+def test_read_input_stops_reading_at_first_empty_read():
+
+    class TerminalInput:
+        """
+        Input stream that mimics reads from terminal, where Ctrl-D on an
+        empty line results in an empty read, but more input can follow.
+        """
+
+        def __init__(self, lines):
+            self.lines = list(lines)
+
+        def readline(self):
+            return self.lines.pop(0)
+
+    input_stream = TerminalInput(["first line\n", "second line\n", "", "not read\n"])
+
+    returned_input = gimmecert.utils.read_input(input_stream, io.StringIO(), "My prompt")
+
+    assert returned_input == "first line\nsecond line\n"
+    assert input_stream.lines == ["not read\n"]
+
+
+def test_read_input_reads_large_input():
+    provided_input = "%s\n" % ("a" * 64) * 100000
+
+    returned_input = gimmecert.utils.read_input(io.StringIO(provided_input), io.StringIO(), "My prompt")
+
+    assert returned_input == provided_input
+
+
 def test_csr_from_pem(key_with_csr):
 
     csr = gimmecert.utils.csr_from_pem(key_with_csr.csr_pem)
@@ -137,3 +180,150 @@ def test_csr_from_pem(key_with_csr):
     assert isinstance(csr, cryptography.x509.CertificateSigningRequest)
     assert csr.public_key().public_numbers() == key_with_csr.csr.public_key().public_numbers()
     assert csr.subject == key_with_csr.csr.subject
+
+
+def test_csrs_from_pem_returns_all_csrs_in_order():
+    csrs = [gimmecert.crypto.generate_csr('mycsr%d' % i, gimmecert.crypto.generate_private_key(('ed25519', None))) for i in range(3)]
+    csrs_pem = "Leading content\n" + "\n".join(
+        csr.public_bytes(cryptography.hazmat.primitives.serialization.Encoding.PEM).decode() + "Trailing content %d\n" % i
+        for i, csr in enumerate(csrs)
+    )
+
+    parsed_csrs = gimmecert.utils.csrs_from_pem(csrs_pem)
+
+    assert [csr.subject for csr in parsed_csrs] == [csr.subject for csr in csrs]
+    assert parsed_csrs == csrs
+
+
+def test_csrs_from_pem_accepts_legacy_pem_label(key_with_csr):
+    csr_pem = key_with_csr.csr_pem.replace("CERTIFICATE REQUEST", "NEW CERTIFICATE REQUEST")
+
+    parsed_csrs = gimmecert.utils.csrs_from_pem(csr_pem)
+
+    assert parsed_csrs == [key_with_csr.csr]
+
+
+@pytest.mark.parametrize("csrs_pem", [
+    "",
+    "Not a CSR\n",
+    "-----BEGIN CERTIFICATE REQUEST-----\nMIIB\n",
+])
+def test_csrs_from_pem_raises_exception_if_no_csr_is_found(csrs_pem):
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.utils.csrs_from_pem(csrs_pem)
+
+    assert str(e_info.value) == "No CSR in PEM format found in input."
+
+
+def test_csrs_from_pem_raises_exception_for_invalid_csr(key_with_csr):
+    csrs_pem = key_with_csr.csr_pem + "-----BEGIN CERTIFICATE REQUEST-----\nbm90IGEgQ1NS\n-----END CERTIFICATE REQUEST-----\n"
+
+    with pytest.raises(ValueError):
+        gimmecert.utils.csrs_from_pem(csrs_pem)
+
+
+@pytest.mark.parametrize("specification, expected_key_specification", [
+    ('rsa:2048', ('rsa', 2048)),
+    ('rsa:3072', ('rsa', 3072)),
+    ('rsa:4096', ('rsa', 4096)),
+    ('ecdsa:secp256r1', ('ecdsa', 'secp256r1')),
+    ('ecdsa:secp384r1', ('ecdsa', 'secp384r1')),
+    ('ed25519', ('ed25519', None)),
+    ('RSA:2048', ('rsa', 2048)),
+])
+def test_key_specification_returns_key_specification_tuple(specification, expected_key_specification):
+
+    assert gimmecert.utils.key_specification(specification) == expected_key_specification
+
+
+@pytest.mark.parametrize("specification", [
+    '',
+    'rsa',
+    'rsa:1024',
+    'rsa:abc',
+    'ecdsa',
+    'ecdsa:secp192r1',
+    'ed25519:256',
+    'dsa:2048',
+])
+def test_key_specification_raises_exception_for_unsupported_specification(specification):
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.utils.key_specification(specification)
+
+    assert str(e_info.value) == "Unsupported key specification: %s" % specification
+
+
+@pytest.mark.parametrize("key_specification, expected_specification", [
+    (('rsa', 2048), 'rsa:2048'),
+    (('ecdsa', 'secp384r1'), 'ecdsa:secp384r1'),
+    (('ed25519', None), 'ed25519'),
+])
+def test_key_specification_to_str_returns_string_representation(key_specification, expected_specification):
+
+    specification = gimmecert.utils.key_specification_to_str(key_specification)
+
+    assert specification == expected_specification
+    assert gimmecert.utils.key_specification(specification) == key_specification
+
+
+RECORDS = [
+    {'name': 'first', 'dns_names': ['a.example.com', 'b.example.com'], 'csr': None, 'ignored': 'value'},
+    {'name': 'second', 'dns_names': [], 'csr': 'second.csr.pem', 'ignored': 'value'},
+]
+
+
+@pytest.mark.parametrize("output_format, records, expected_output", [
+    ('json', RECORDS,
+     '[\n{"name": "first", "dns_names": ["a.example.com", "b.example.com"], "csr": null},\n'
+     '{"name": "second", "dns_names": [], "csr": "second.csr.pem"}\n]\n'),
+    ('json', [], '[]\n'),
+    ('jsonl', RECORDS,
+     '{"name": "first", "dns_names": ["a.example.com", "b.example.com"], "csr": null}\n'
+     '{"name": "second", "dns_names": [], "csr": "second.csr.pem"}\n'),
+    ('jsonl', [], ''),
+    ('csv', RECORDS,
+     'name,dns_names,csr\n'
+     'first,"a.example.com,b.example.com",\n'
+     'second,,second.csr.pem\n'),
+    ('csv', [], 'name,dns_names,csr\n'),
+])
+def test_write_records_writes_records_in_requested_format(output_format, records, expected_output):
+    output_stream = io.StringIO()
+
+    gimmecert.utils.write_records(records, output_stream, output_format, ['name', 'dns_names', 'csr'])
+
+    assert output_stream.getvalue() == expected_output
+
+
+@pytest.mark.parametrize("output_format", ['json', 'jsonl', 'csv'])
+def test_write_records_writes_out_each_record_before_producing_next_one(output_format):
+    output_stream = io.StringIO()
+
+    def produce_records():
+        yield {'name': 'first'}
+        assert 'first' in output_stream.getvalue()
+        yield {'name': 'second'}
+        assert 'second' in output_stream.getvalue()
+
+    gimmecert.utils.write_records(produce_records(), output_stream, output_format, ['name'])
+
+
+def test_write_records_raises_exception_for_unsupported_format():
+
+    with pytest.raises(ValueError) as e_info:
+        gimmecert.utils.write_records(RECORDS, io.StringIO(), 'xml', ['name'])
+
+    assert str(e_info.value) == "Unsupported output format: xml"
+
+
+@pytest.mark.parametrize("name, labels, value, expected_sample", [
+    ('my_metric', [], 1, 'my_metric 1'),
+    ('my_metric', [('type', 'server')], 10, 'my_metric{type="server"} 10'),
+    ('my_metric', [('type', 'server'), ('name', 'myserver')], 1.5, 'my_metric{type="server",name="myserver"} 1.5'),
+    ('my_metric', [('name', 'my"server\\\n')], -3.0, 'my_metric{name="my\\"server\\\\\\n"} -3.0'),
+])
+def test_format_metric_sample_returns_correct_sample(name, labels, value, expected_sample):
+
+    assert gimmecert.utils.format_metric_sample(name, labels, value) == expected_sample